@@ -0,0 +1,167 @@
+-- ============================================================================
+-- Migration: Contadores incrementais das campanhas (triggers)
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: campaigns.leads_total, leads_processed, leads_exported e
+--            total_cost_brl passam a ser mantidos por triggers de statement
+--            em campaign_leads. Cada INSERT/UPDATE/DELETE soma apenas a
+--            diferença das linhas alteradas (transition tables), em vez de
+--            CampaignService._update_campaign_metrics recontar a campanha
+--            inteira (4 subqueries + SUM sobre o JSON de metadados).
+--
+--            Com os triggers instalados, _update_campaign_metrics não
+--            recalcula mais nada (campaigns/metrics.py detecta os triggers).
+--            Desvios (ex: arredondamento de total_cost_brl, NUMERIC(10,4),
+--            a cada statement) são corrigidos pelo job de reconciliação:
+--              python -m src.multi_tenant.campaigns.metrics
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. FUNÇÃO: APLICAR DELTAS
+-- ============================================================================
+-- Mesmos critérios da recontagem (campaigns/metrics.py):
+--   leads_processed = status IN ('processed', 'exported')
+--   leads_exported  = status = 'exported'
+--   total_cost_brl  = SUM(generation_metadata->>'cost_brl')
+
+CREATE OR REPLACE FUNCTION campaign_apply_metric_delta(
+    p_campaign_id INTEGER,
+    p_total BIGINT,
+    p_processed BIGINT,
+    p_exported BIGINT,
+    p_cost_brl NUMERIC
+)
+RETURNS VOID AS $$
+    UPDATE campaigns
+    SET
+        leads_total = COALESCE(leads_total, 0) + p_total,
+        leads_processed = COALESCE(leads_processed, 0) + p_processed,
+        leads_exported = COALESCE(leads_exported, 0) + p_exported,
+        total_cost_brl = COALESCE(total_cost_brl, 0) + p_cost_brl,
+        updated_at = NOW()
+    WHERE id = p_campaign_id
+      AND (p_total <> 0 OR p_processed <> 0 OR p_exported <> 0 OR p_cost_brl <> 0);
+$$ LANGUAGE sql;
+
+-- Linhas novas contam +1, antigas -1 (UPDATE = as duas); um delta por campanha
+CREATE OR REPLACE FUNCTION campaign_leads_apply_metric_deltas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM campaign_apply_metric_delta(
+            campaign_id,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE status IN ('processed', 'exported')),
+            COUNT(*) FILTER (WHERE status = 'exported'),
+            COALESCE(SUM((generation_metadata->>'cost_brl')::numeric), 0)
+        )
+        FROM new_rows
+        GROUP BY campaign_id;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM campaign_apply_metric_delta(
+            campaign_id,
+            -COUNT(*),
+            -COUNT(*) FILTER (WHERE status IN ('processed', 'exported')),
+            -COUNT(*) FILTER (WHERE status = 'exported'),
+            -COALESCE(SUM((generation_metadata->>'cost_brl')::numeric), 0)
+        )
+        FROM old_rows
+        GROUP BY campaign_id;
+
+    ELSE
+        PERFORM campaign_apply_metric_delta(
+            campaign_id,
+            SUM(sign),
+            COALESCE(SUM(sign) FILTER (WHERE status IN ('processed', 'exported')), 0),
+            COALESCE(SUM(sign) FILTER (WHERE status = 'exported'), 0),
+            COALESCE(SUM(sign * (generation_metadata->>'cost_brl')::numeric), 0)
+        )
+        FROM (
+            SELECT campaign_id, 1 AS sign, status, generation_metadata FROM new_rows
+            UNION ALL
+            SELECT campaign_id, -1 AS sign, status, generation_metadata FROM old_rows
+        ) AS changes
+        GROUP BY campaign_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION campaign_leads_apply_metric_deltas IS
+'Soma a diferença das linhas alteradas de campaign_leads aos contadores de campaigns (triggers de statement).';
+
+-- ============================================================================
+-- 2. TRIGGERS (um por evento: transition tables exigem evento único)
+-- ============================================================================
+
+DROP TRIGGER IF EXISTS campaign_leads_metrics_insert ON campaign_leads;
+CREATE TRIGGER campaign_leads_metrics_insert
+    AFTER INSERT ON campaign_leads
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION campaign_leads_apply_metric_deltas();
+
+DROP TRIGGER IF EXISTS campaign_leads_metrics_update ON campaign_leads;
+CREATE TRIGGER campaign_leads_metrics_update
+    AFTER UPDATE ON campaign_leads
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION campaign_leads_apply_metric_deltas();
+
+DROP TRIGGER IF EXISTS campaign_leads_metrics_delete ON campaign_leads;
+CREATE TRIGGER campaign_leads_metrics_delete
+    AFTER DELETE ON campaign_leads
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION campaign_leads_apply_metric_deltas();
+
+-- ============================================================================
+-- 3. RECONTAGEM INICIAL (ponto de partida dos deltas)
+-- ============================================================================
+
+UPDATE campaigns c
+SET
+    leads_total = COALESCE(m.total, 0),
+    leads_processed = COALESCE(m.processed, 0),
+    leads_exported = COALESCE(m.exported, 0),
+    total_cost_brl = COALESCE(m.cost_brl, 0),
+    updated_at = NOW()
+FROM campaigns c2
+LEFT JOIN (
+    SELECT
+        campaign_id,
+        COUNT(*) AS total,
+        COUNT(*) FILTER (WHERE status IN ('processed', 'exported')) AS processed,
+        COUNT(*) FILTER (WHERE status = 'exported') AS exported,
+        SUM((generation_metadata->>'cost_brl')::numeric) AS cost_brl
+    FROM campaign_leads
+    GROUP BY campaign_id
+) m ON m.campaign_id = c2.id
+WHERE c.id = c2.id;
+
+-- ============================================================================
+-- 4. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT tgname, tgenabled
+FROM pg_trigger
+WHERE tgrelid = 'campaign_leads'::regclass
+  AND tgname LIKE 'campaign_leads_metrics_%';
+
+SELECT id, name, leads_total, leads_processed, leads_exported, total_cost_brl
+FROM campaigns
+ORDER BY id DESC
+LIMIT 10;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_add_campaign_metric_triggers.sql
+-- ============================================================================
@@ -0,0 +1,53 @@
+-- ============================================================================
+-- Migration: Fingerprints de detecção de mudança em conversations_analytics
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: Adiciona hashes calculados pelo ConversationTransformer:
+--            - content_hash: conteúdo da conversa vindo do Chatwoot
+--              (exceto conversation_updated_at). Igual ao salvo = linha não
+--              mudou, o loader não regrava nada.
+--            - analysis_input_hash: entradas do analyzer (message_compiled e
+--              demais colunas usadas na análise). Igual ao salvo = a análise
+--              não é refeita e message_compiled/colunas de análise não são
+--              regravadas.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. ADICIONAR COLUNAS
+-- ============================================================================
+
+ALTER TABLE conversations_analytics
+ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+
+COMMENT ON COLUMN conversations_analytics.content_hash IS
+'MD5 do conteúdo extraído do Chatwoot (exceto conversation_updated_at). Usado pelo ETL para pular conversas sem mudança.';
+
+ALTER TABLE conversations_analytics
+ADD COLUMN IF NOT EXISTS analysis_input_hash VARCHAR(32);
+
+COMMENT ON COLUMN conversations_analytics.analysis_input_hash IS
+'MD5 das entradas do analyzer (analyzer + message_compiled + colunas auxiliares). Usado pelo ETL para não reanalisar conversas cujo conteúdo não mudou.';
+
+-- ============================================================================
+-- 2. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE table_name = 'conversations_analytics'
+AND column_name IN ('content_hash', 'analysis_input_hash')
+ORDER BY ordinal_position;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_add_change_detection_hashes.sql
+-- ============================================================================
@@ -0,0 +1,45 @@
+-- ============================================================================
+-- Migration: Índice da tabela de remarketing paginada por keyset
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: A seção de remarketing do dashboard busca cada página no banco
+--            ordenando por (mc_last_message_at DESC NULLS LAST,
+--            conversation_id DESC) a partir do último lead da página
+--            anterior. O índice parcial cobre só os leads prontos para
+--            disparo (analisados e com sugestão), então cada página lê
+--            ~20 entradas do índice, independente do total de leads.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. ÍNDICE
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_conversations_remarketing_keyset
+ON conversations_analytics (tenant_id, mc_last_message_at DESC NULLS LAST, conversation_id DESC)
+WHERE is_lead = TRUE
+  AND analisado_em IS NOT NULL
+  AND sugestao_disparo IS NOT NULL
+  AND sugestao_disparo <> '';
+
+COMMENT ON INDEX idx_conversations_remarketing_keyset IS
+'Paginação keyset da tabela de remarketing do dashboard (leads prontos para disparo).';
+
+-- ============================================================================
+-- 2. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename = 'conversations_analytics'
+  AND indexname = 'idx_conversations_remarketing_keyset';
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_add_remarketing_keyset_index.sql
+-- ============================================================================
@@ -0,0 +1,79 @@
+-- ============================================================================
+-- Migration: Índices parciais das queries de remarketing e backlog
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: As queries mais frequentes do remarketing filtram
+--            is_lead = true AND tipo_conversa IS NULL
+--            AND mc_last_message_at < NOW() - INTERVAL '24 hours':
+--            - analyze_inactive_leads (pré-filtro e busca, etl_v4/remarketing_analyzer.py)
+--            - BacklogProcessor.get_active_tenants (etl_v4/run_backlog_processor.py)
+--            - scripts/analysis/run_continuous_analysis.sh (contagem de pendentes)
+--            O índice de sql/11 (idx_conversations_inactive_leads_analysis)
+--            usa analise_ia IS NULL, critério antigo, e não atende esse filtro.
+--            CampaignService.get_eligible_leads ordena por
+--            ai_probability_score DESC NULLS LAST, mc_last_message_at DESC.
+--
+--            O ETL (run_all_tenants) e o BacklogProcessor conferem os planos
+--            na inicialização (etl_v4/query_plans.py) e avisam quando alguma
+--            dessas queries volta a usar Seq Scan.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. LEADS PENDENTES DE ANÁLISE DE REMARKETING
+-- ============================================================================
+-- Só os leads ainda não classificados entram no índice (fração pequena da
+-- tabela). Ordenado por mc_last_message_at: a busca "mais antigos primeiro"
+-- com LIMIT lê apenas o início do range; contact_messages_count incluído
+-- para o filtro do backlog (>= 3).
+
+CREATE INDEX IF NOT EXISTS idx_conversations_remarketing_pending
+ON conversations_analytics (tenant_id, mc_last_message_at)
+INCLUDE (contact_messages_count)
+WHERE is_lead = TRUE
+  AND tipo_conversa IS NULL;
+
+COMMENT ON INDEX idx_conversations_remarketing_pending IS
+'Leads pendentes de análise de remarketing (tipo_conversa IS NULL), por inatividade. Remarketing, backlog e análise contínua.';
+
+-- ============================================================================
+-- 2. LEADS ELEGÍVEIS PARA CAMPANHAS
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_conversations_campaign_eligible
+ON conversations_analytics (tenant_id, ai_probability_score DESC NULLS LAST, mc_last_message_at DESC)
+WHERE is_lead = TRUE
+  AND contact_phone IS NOT NULL
+  AND contact_phone <> '';
+
+COMMENT ON INDEX idx_conversations_campaign_eligible IS
+'Leads com telefone ordenados por score e última mensagem (CampaignService.get_eligible_leads).';
+
+ANALYZE conversations_analytics;
+
+-- ============================================================================
+-- 3. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename = 'conversations_analytics'
+  AND indexname IN ('idx_conversations_remarketing_pending', 'idx_conversations_campaign_eligible');
+
+EXPLAIN
+SELECT COUNT(*)
+FROM conversations_analytics
+WHERE tenant_id = 1
+  AND is_lead = true
+  AND tipo_conversa IS NULL
+  AND mc_last_message_at < NOW() - INTERVAL '24 hours';
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_add_remarketing_pending_indexes.sql
+-- ============================================================================
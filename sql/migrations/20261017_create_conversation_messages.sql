@@ -0,0 +1,144 @@
+-- ============================================================================
+-- Migration: Mensagens normalizadas (conversation_messages)
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: Cria conversation_messages, uma linha por mensagem de
+--            conversations_analytics.message_compiled. Mantida pelo ETL
+--            (etl_v4/conversation_messages.py): cada conversa carregada com
+--            message_compiled novo tem suas mensagens substituídas
+--            (DELETE + INSERT) na mesma carga.
+--            Consultas por remetente ("o bot/agente respondeu?") viram
+--            predicados SQL indexados, sem decodificar o JSON da conversa.
+--
+--            Conversões tolerantes (backfill e ETL): message_type, private e
+--            sent_at malformados viram NULL/FALSE; um elemento inválido não
+--            aborta o INSERT.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. TABELA
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    conversation_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,                  -- posição no message_compiled (1-based)
+
+    sender VARCHAR(50),                    -- Contact, AgentBot, User, Agent...
+    sender_name VARCHAR(255),
+    message_type SMALLINT,                 -- 2/3 = mensagens do sistema
+    is_private BOOLEAN NOT NULL DEFAULT FALSE,
+    sent_at TIMESTAMPTZ,
+    text TEXT,
+
+    PRIMARY KEY (tenant_id, conversation_id, seq)
+);
+
+COMMENT ON TABLE conversation_messages IS
+'Mensagens de conversations_analytics.message_compiled, uma por linha. Mantida pelo ETL a cada carga.';
+
+-- ============================================================================
+-- 2. CONVERSÃO TOLERANTE DE sent_at
+-- ============================================================================
+-- Texto que não é um timestamp válido vira NULL (o cast direto abortaria o
+-- statement inteiro). STABLE: a conversão depende do TimeZone da sessão.
+
+CREATE OR REPLACE FUNCTION conversation_messages_try_timestamptz(value TEXT)
+RETURNS TIMESTAMPTZ AS $$
+BEGIN
+    IF value IS NULL OR value !~ '^\s*[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN
+        RETURN NULL;
+    END IF;
+
+    RETURN value::TIMESTAMPTZ;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION conversation_messages_try_timestamptz IS
+'sent_at de message_compiled como TIMESTAMPTZ, ou NULL se inválido (etl_v4/conversation_messages.py).';
+
+-- ============================================================================
+-- 3. ÍNDICES
+-- ============================================================================
+
+-- "Tem resposta do bot/agente?" (remarketing): EXISTS resolvido só no índice
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_responder
+    ON conversation_messages (tenant_id, conversation_id)
+    WHERE sender IN ('AgentBot', 'User', 'Agent');
+
+-- ============================================================================
+-- 4. RLS E PERMISSÕES (mesmas regras de conversations_analytics)
+-- ============================================================================
+
+ALTER TABLE conversation_messages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY tenant_own_conversation_messages ON conversation_messages
+    FOR SELECT
+    TO authenticated_users
+    USING (tenant_id = get_current_tenant_id());
+
+CREATE POLICY admin_all_conversation_messages ON conversation_messages
+    FOR SELECT
+    TO admin_users
+    USING (TRUE);
+
+CREATE POLICY etl_manage_conversation_messages ON conversation_messages
+    FOR ALL
+    TO etl_service
+    USING (TRUE)
+    WITH CHECK (TRUE);
+
+GRANT SELECT ON conversation_messages TO authenticated_users;
+
+-- ============================================================================
+-- 5. BACKFILL (todos os tenants)
+-- ============================================================================
+-- Mesma conversão de etl_v4/conversation_messages.py; para um tenant:
+--   python -m src.multi_tenant.etl_v4.conversation_messages --tenant-id 1
+
+INSERT INTO conversation_messages (
+    tenant_id, conversation_id, seq, sender, sender_name, message_type, is_private, sent_at, text
+)
+SELECT
+    ca.tenant_id,
+    ca.conversation_id,
+    m.seq::INTEGER,
+    LEFT(m.msg->>'sender', 50),
+    LEFT(m.msg->>'sender_name', 255),
+    CASE WHEN m.msg->>'message_type' ~ '^-?[0-9]{1,4}$' THEN (m.msg->>'message_type')::SMALLINT END,
+    COALESCE(LOWER(m.msg->>'private') IN ('true', 't', '1'), FALSE),
+    conversation_messages_try_timestamptz(m.msg->>'sent_at'),
+    m.msg->>'text'
+FROM conversations_analytics ca
+CROSS JOIN LATERAL jsonb_array_elements(ca.message_compiled) WITH ORDINALITY AS m(msg, seq)
+WHERE ca.message_compiled IS NOT NULL
+  AND jsonb_typeof(ca.message_compiled) = 'array'
+ON CONFLICT (tenant_id, conversation_id, seq) DO NOTHING;
+
+ANALYZE conversation_messages;
+
+-- ============================================================================
+-- 6. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT
+    tenant_id,
+    COUNT(DISTINCT conversation_id) AS conversas,
+    COUNT(*) AS mensagens,
+    COUNT(*) FILTER (WHERE sender IN ('AgentBot', 'User', 'Agent')) AS respostas
+FROM conversation_messages
+GROUP BY tenant_id
+ORDER BY tenant_id;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_create_conversation_messages.sql
+-- ============================================================================
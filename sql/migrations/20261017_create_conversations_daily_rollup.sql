@@ -0,0 +1,123 @@
+-- ============================================================================
+-- Migration: Rollup diário de conversas (KPIs e gráficos do dashboard)
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: Cria conversations_daily_rollup, agregado por
+--            (tenant_id, conversation_date, inbox_id, periodo).
+--            Mantida pelo ETL (etl_v4/daily_rollup.py) após cada carga:
+--            os dias tocados pelo chunk são recalculados a partir de
+--            conversations_analytics (DELETE + INSERT ... SELECT).
+--            O dashboard lê este agregado em vez de agregar em pandas
+--            todas as conversas do período.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. TABELA
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS conversations_daily_rollup (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    conversation_date DATE NOT NULL,
+    inbox_id INTEGER NOT NULL DEFAULT -1,          -- -1 = sem inbox
+    periodo VARCHAR(20) NOT NULL DEFAULT '',       -- Madrugada/Manhã/Tarde/Noite ('' = sem horário)
+    inbox_name VARCHAR(255),
+
+    total_conversas INTEGER NOT NULL DEFAULT 0,
+    total_leads INTEGER NOT NULL DEFAULT 0,
+    total_sem_resposta INTEGER NOT NULL DEFAULT 0, -- Leads com tipo_conversa = 'SKIP_NO_RESPONSE'
+    total_visitas INTEGER NOT NULL DEFAULT 0,
+    total_crm INTEGER NOT NULL DEFAULT 0,
+    total_ia INTEGER NOT NULL DEFAULT 0,           -- has_human_intervention = false
+    total_humano INTEGER NOT NULL DEFAULT 0,       -- has_human_intervention = true
+    total_resolvidas INTEGER NOT NULL DEFAULT 0,
+
+    -- Média de primeira resposta = soma / quantidade (somável entre dias)
+    response_time_sum NUMERIC(14,1) NOT NULL DEFAULT 0,
+    response_time_count INTEGER NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (tenant_id, conversation_date, inbox_id, periodo)
+);
+
+COMMENT ON TABLE conversations_daily_rollup IS
+'Agregado diário de conversations_analytics por inbox e período do dia. Mantido incrementalmente pelo ETL.';
+
+-- ============================================================================
+-- 2. RLS E PERMISSÕES (mesmas regras de conversations_analytics)
+-- ============================================================================
+
+ALTER TABLE conversations_daily_rollup ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY tenant_own_daily_rollup ON conversations_daily_rollup
+    FOR SELECT
+    TO authenticated_users
+    USING (tenant_id = get_current_tenant_id());
+
+CREATE POLICY admin_all_daily_rollup ON conversations_daily_rollup
+    FOR SELECT
+    TO admin_users
+    USING (TRUE);
+
+CREATE POLICY etl_manage_daily_rollup ON conversations_daily_rollup
+    FOR ALL
+    TO etl_service
+    USING (TRUE)
+    WITH CHECK (TRUE);
+
+GRANT SELECT ON conversations_daily_rollup TO authenticated_users;
+
+-- ============================================================================
+-- 3. BACKFILL (todos os tenants)
+-- ============================================================================
+
+INSERT INTO conversations_daily_rollup (
+    tenant_id, conversation_date, inbox_id, periodo, inbox_name,
+    total_conversas, total_leads, total_sem_resposta, total_visitas, total_crm,
+    total_ia, total_humano, total_resolvidas, response_time_sum, response_time_count,
+    updated_at
+)
+SELECT
+    tenant_id,
+    conversation_date,
+    COALESCE(inbox_id, -1),
+    COALESCE(conversation_period, ''),
+    MAX(inbox_name),
+    COUNT(*),
+    COUNT(*) FILTER (WHERE is_lead),
+    COUNT(*) FILTER (WHERE is_lead AND tipo_conversa = 'SKIP_NO_RESPONSE'),
+    COUNT(*) FILTER (WHERE visit_scheduled),
+    COUNT(*) FILTER (WHERE crm_converted),
+    COUNT(*) FILTER (WHERE has_human_intervention = FALSE),
+    COUNT(*) FILTER (WHERE has_human_intervention = TRUE),
+    COUNT(*) FILTER (WHERE is_resolved),
+    COALESCE(SUM(first_response_time_minutes), 0),
+    COUNT(first_response_time_minutes),
+    NOW()
+FROM conversations_analytics
+WHERE conversation_date IS NOT NULL
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (tenant_id, conversation_date, inbox_id, periodo) DO NOTHING;
+
+-- ============================================================================
+-- 4. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT
+    tenant_id,
+    COUNT(*) AS linhas_rollup,
+    SUM(total_conversas) AS conversas
+FROM conversations_daily_rollup
+GROUP BY tenant_id
+ORDER BY tenant_id;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_create_conversations_daily_rollup.sql
+-- ============================================================================
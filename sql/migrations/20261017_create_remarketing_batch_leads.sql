@@ -0,0 +1,73 @@
+-- ============================================================================
+-- Migration: Leads enviados ao Batch API (remarketing_batch_leads)
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: Um batch do remarketing (etl_v4/remarketing_batch.py) fica até
+--            24h pendente na OpenAI. Enquanto isso os leads continuam com
+--            tipo_conversa IS NULL e seriam selecionados (e pagos) de novo
+--            pela próxima execução do backlog ou do ETL.
+--
+--            submit_inactive_leads_batch grava aqui cada lead enviado com o
+--            batch_id; fetch_inactive_leads ignora esses leads e
+--            apply_batch_results remove as linhas do batch ao aplicar o
+--            resultado (leads com falha voltam a ficar pendentes).
+--            Batches terminados que ninguém aplicou (--resume-batch) são
+--            aplicados na próxima execução em modo Batch API.
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. TABELA
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS remarketing_batch_leads (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    conversation_id INTEGER NOT NULL,
+    batch_id VARCHAR(100) NOT NULL,        -- ID do batch na OpenAI
+    submitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (tenant_id, conversation_id)
+);
+
+-- Liberação por batch (apply_batch_results) e batches pendentes do tenant
+CREATE INDEX IF NOT EXISTS idx_remarketing_batch_leads_batch
+    ON remarketing_batch_leads (batch_id);
+
+COMMENT ON TABLE remarketing_batch_leads IS
+'Leads em batch pendente do Batch API (remarketing). Excluídos da seleção até o resultado ser aplicado.';
+
+-- ============================================================================
+-- 2. RLS E PERMISSÕES
+-- ============================================================================
+
+ALTER TABLE remarketing_batch_leads ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY admin_all_remarketing_batch_leads ON remarketing_batch_leads
+    FOR SELECT
+    TO admin_users
+    USING (TRUE);
+
+CREATE POLICY etl_manage_remarketing_batch_leads ON remarketing_batch_leads
+    FOR ALL
+    TO etl_service
+    USING (TRUE)
+    WITH CHECK (TRUE);
+
+-- ============================================================================
+-- 3. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT tenant_id, batch_id, COUNT(*) AS leads, MIN(submitted_at) AS enviado_em
+FROM remarketing_batch_leads
+GROUP BY tenant_id, batch_id
+ORDER BY enviado_em;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_create_remarketing_batch_leads.sql
+-- ============================================================================
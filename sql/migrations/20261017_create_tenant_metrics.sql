@@ -0,0 +1,103 @@
+-- ============================================================================
+-- Migration: Contadores por tenant (visão geral do painel admin)
+-- ============================================================================
+-- Data: 2026-10-17
+-- Descrição: Cria tenant_metrics, uma linha por tenant com os totais
+--            exibidos no painel admin. Mantida pelo ETL
+--            (etl_v4/tenant_metrics.py):
+--            - ConversationLoader soma a diferença (antes/depois) de cada
+--              chunk aos contadores e adiciona os contact_id do chunk aos
+--              sketches HyperLogLog
+--            - refresh_tenant_metrics recalcula tudo a partir de
+--              conversations_analytics (reconciliação/backfill)
+--            O painel admin lê O(tenants) linhas em vez de contar
+--            conversations_analytics inteira a cada render.
+--
+-- PÓS-MIGRATION: o backfill abaixo preenche só os contadores. Os sketches
+--            de contatos (contacts_hll, lead_contacts_hll) vêm da
+--            reconciliação; até ela rodar, o painel conta os contatos direto
+--            (mais lento). Execute uma vez e habilite o timer diário:
+--              python -m src.multi_tenant.etl_v4.tenant_metrics
+--              sudo cp systemd/tenant-metrics-reconcile.* /etc/systemd/system/
+--              sudo systemctl daemon-reload
+--              sudo systemctl enable --now tenant-metrics-reconcile.timer
+-- ============================================================================
+
+-- Verificar conexão
+SELECT current_database(), current_user, now() as execution_time;
+
+-- ============================================================================
+-- 1. TABELA
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS tenant_metrics (
+    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+
+    total_conversations BIGINT NOT NULL DEFAULT 0,
+    total_visits BIGINT NOT NULL DEFAULT 0,            -- status = 1 (mesmo critério do painel admin)
+    total_lead_conversations BIGINT NOT NULL DEFAULT 0,
+
+    -- Sketches HyperLogLog (precision 12) de contact_id distintos
+    contacts_hll BYTEA,                                -- todas as conversas
+    lead_contacts_hll BYTEA,                           -- conversas com is_lead = TRUE
+
+    last_sync TIMESTAMP,                               -- última carga do ETL
+    refreshed_at TIMESTAMP,                            -- última reconciliação completa
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE tenant_metrics IS
+'Contadores por tenant do painel admin. Mantidos incrementalmente pelo ETL e reconciliados por refresh_tenant_metrics.';
+
+-- ============================================================================
+-- 2. RLS E PERMISSÕES
+-- ============================================================================
+
+ALTER TABLE tenant_metrics ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY admin_all_tenant_metrics ON tenant_metrics
+    FOR SELECT
+    TO admin_users
+    USING (TRUE);
+
+CREATE POLICY etl_manage_tenant_metrics ON tenant_metrics
+    FOR ALL
+    TO etl_service
+    USING (TRUE)
+    WITH CHECK (TRUE);
+
+-- ============================================================================
+-- 3. BACKFILL DOS CONTADORES
+-- ============================================================================
+-- Os sketches são preenchidos pelo job de reconciliação (ver PÓS-MIGRATION);
+-- refreshed_at fica NULL até lá e o painel conta os contatos direto.
+
+INSERT INTO tenant_metrics (
+    tenant_id, total_conversations, total_visits, total_lead_conversations, last_sync, updated_at
+)
+SELECT
+    tenant_id,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE status = 1),
+    COUNT(*) FILTER (WHERE is_lead),
+    MAX(etl_updated_at),
+    NOW()
+FROM conversations_analytics
+GROUP BY tenant_id
+ON CONFLICT (tenant_id) DO NOTHING;
+
+-- ============================================================================
+-- 4. VERIFICAÇÃO FINAL
+-- ============================================================================
+
+SELECT tenant_id, total_conversations, total_visits, total_lead_conversations, last_sync
+FROM tenant_metrics
+ORDER BY tenant_id;
+
+-- ============================================================================
+-- FIM DA MIGRATION
+-- ============================================================================
+-- Para executar:
+-- psql -U johan_geniai -d geniai_analytics \
+--     -f sql/migrations/20261017_create_tenant_metrics.sql
+-- ============================================================================
@@ -4,9 +4,137 @@ Metrics Calculator - Cálculo de KPIs e Métricas
 
 import pandas as pd
 import json
+import re
 from datetime import datetime, timedelta
 
 
+# ===================================================================
+# TRANSCRIÇÕES (message_compiled)
+# ===================================================================
+
+# Colunas com o texto já extraído (parse do JSON uma única vez)
+TRANSCRIPT_TEXT_COLUMN = 'transcript_text'
+TRANSCRIPT_BOT_TEXT_COLUMN = 'transcript_bot_text'
+
+# message_type de mensagens do sistema (ignoradas na categorização)
+SYSTEM_MESSAGE_TYPES = (2, 3)
+BOT_SENDER = 'AgentBot'
+
+# Keywords de agendamento
+VISIT_CONFIRMATION_KEYWORDS = [
+    'visita agendada',
+    'agendei sua visita',
+    'agendamento confirmado',
+    'te espero',
+    'esperamos você',
+    'confirmada sua visita',
+    'anotei aqui',
+    'pode vir',
+    'comparecer',
+]
+
+# Keywords de data
+VISIT_DATE_KEYWORDS = [
+    'hoje',
+    'amanhã',
+    'segunda',
+    'terça',
+    'quarta',
+    'quinta',
+    'sexta',
+    'sábado',
+    'domingo',
+    '/',  # Para datas como 17/10
+]
+
+# Keywords de hora
+VISIT_TIME_KEYWORDS = [
+    'h',
+    ':',
+    'manhã',
+    'tarde',
+    'noite',
+]
+
+
+def flatten_transcript(message_compiled):
+    """
+    Extrai o texto de uma transcrição (um único json.loads)
+
+    Args:
+        message_compiled: JSON string (ou lista já decodificada) com as mensagens
+
+    Returns:
+        tuple: (texto das mensagens sem as de sistema, texto só do bot), ambos em minúsculas
+    """
+    if message_compiled is None or message_compiled == 'null':
+        return '', ''
+
+    try:
+        if isinstance(message_compiled, str):
+            messages = json.loads(message_compiled)
+        else:
+            messages = message_compiled
+
+        texts = []
+        bot_texts = []
+        for msg in messages or []:
+            text = (msg.get('text') or '').lower()
+
+            if msg.get('sender') == BOT_SENDER:
+                bot_texts.append(text)
+
+            # Pular mensagens do sistema
+            if text and msg.get('message_type') not in SYSTEM_MESSAGE_TYPES:
+                texts.append(text)
+
+        return ' '.join(texts), ' '.join(bot_texts)
+    except (ValueError, TypeError, AttributeError):
+        return '', ''
+
+
+def add_transcript_text_columns(df, column='message_compiled'):
+    """
+    Adiciona as colunas de texto extraído das transcrições
+
+    Cada transcrição é decodificada uma única vez; categorização e detecção
+    de visitas trabalham sobre as colunas de texto com operações .str.
+    Se as colunas já existirem, o DataFrame é retornado sem reprocessar.
+
+    Args:
+        df: DataFrame com a coluna de transcrições
+        column: Nome da coluna com o JSON das mensagens
+
+    Returns:
+        pd.DataFrame: Cópia do df com TRANSCRIPT_TEXT_COLUMN e TRANSCRIPT_BOT_TEXT_COLUMN
+
+    Example:
+        >>> details = add_transcript_text_columns(details)
+        >>> categories = categorize_conversations(details)
+        >>> visits = detect_visits_scheduled(details)
+    """
+    if TRANSCRIPT_TEXT_COLUMN in df.columns and TRANSCRIPT_BOT_TEXT_COLUMN in df.columns:
+        return df
+
+    if column in df.columns:
+        flattened = [flatten_transcript(value) for value in df[column].tolist()]
+    else:
+        flattened = []
+
+    texts = [text for text, _ in flattened] or [''] * len(df)
+    bot_texts = [bot_text for _, bot_text in flattened] or [''] * len(df)
+
+    return df.assign(**{
+        TRANSCRIPT_TEXT_COLUMN: pd.Series(texts, index=df.index, dtype=object),
+        TRANSCRIPT_BOT_TEXT_COLUMN: pd.Series(bot_texts, index=df.index, dtype=object),
+    })
+
+
+def _any_keyword_regex(keywords):
+    """Regex que casa qualquer keyword como substring literal"""
+    return '|'.join(re.escape(keyword) for keyword in keywords)
+
+
 def calculate_total_contacts(df):
     """
     Total de contatos válidos (leads que engajaram)
@@ -39,6 +167,8 @@ def detect_visit_scheduled(message_compiled):
     - Horário específico
     - Endereço da academia
 
+    Para várias conversas use detect_visits_scheduled() (vetorizado).
+
     Args:
         message_compiled: JSON string com todas as mensagens
 
@@ -48,61 +178,44 @@ def detect_visit_scheduled(message_compiled):
     if not message_compiled or message_compiled == 'null':
         return False
 
-    try:
-        messages = json.loads(message_compiled)
-
-        # Keywords de agendamento
-        keywords_agendamento = [
-            'visita agendada',
-            'agendei sua visita',
-            'agendamento confirmado',
-            'te espero',
-            'esperamos você',
-            'confirmada sua visita',
-            'anotei aqui',
-            'pode vir',
-            'comparecer',
-        ]
+    _, bot_text = flatten_transcript(message_compiled)
 
-        # Keywords de data
-        keywords_data = [
-            'hoje',
-            'amanhã',
-            'segunda',
-            'terça',
-            'quarta',
-            'quinta',
-            'sexta',
-            'sábado',
-            'domingo',
-            '/',  # Para datas como 17/10
-        ]
+    # Verificar se tem confirmação + data/hora
+    has_confirmation = any(kw in bot_text for kw in VISIT_CONFIRMATION_KEYWORDS)
+    has_date = any(kw in bot_text for kw in VISIT_DATE_KEYWORDS)
+    has_time = any(kw in bot_text for kw in VISIT_TIME_KEYWORDS)
 
-        # Keywords de hora
-        keywords_hora = [
-            'h',
-            ':',
-            'manhã',
-            'tarde',
-            'noite',
-        ]
+    return has_confirmation and (has_date or has_time)
 
-        # Converter para texto único
-        all_text = ' '.join([
-            msg.get('text', '').lower()
-            for msg in messages
-            if msg.get('sender') == 'AgentBot'  # Apenas mensagens do bot
-        ])
 
-        # Verificar se tem confirmação + data/hora
-        has_confirmation = any(kw in all_text for kw in keywords_agendamento)
-        has_date = any(kw in all_text for kw in keywords_data)
-        has_time = any(kw in all_text for kw in keywords_hora)
+def detect_visits_scheduled(df):
+    """
+    Versão vetorizada de detect_visit_scheduled() para um DataFrame
 
-        return has_confirmation and (has_date or has_time)
+    Args:
+        df: DataFrame com coluna 'message_compiled' (ou já com TRANSCRIPT_BOT_TEXT_COLUMN)
 
-    except:
-        return False
+    Returns:
+        pd.Series: bool por conversa (mesmo índice do df)
+    """
+    bot_text = add_transcript_text_columns(df)[TRANSCRIPT_BOT_TEXT_COLUMN]
+
+    has_confirmation = bot_text.str.contains(_any_keyword_regex(VISIT_CONFIRMATION_KEYWORDS), regex=True)
+    has_date = bot_text.str.contains(_any_keyword_regex(VISIT_DATE_KEYWORDS), regex=True)
+    has_time = bot_text.str.contains(_any_keyword_regex(VISIT_TIME_KEYWORDS), regex=True)
+
+    return has_confirmation & (has_date | has_time)
+
+
+def count_visits_scheduled(df):
+    """
+    Total de conversas com agendamento detectado por palavras-chave
+
+    Diferente de calculate_visits_scheduled() (GPT-4, banco), usa só as transcrições.
+    """
+    if df.empty:
+        return 0
+    return int(detect_visits_scheduled(df).sum())
 
 
 def calculate_visits_scheduled(df):
@@ -654,6 +767,123 @@ def get_crm_conversions_detail(engine):
 # CATEGORIZAÇÃO DE CONVERSAS (Adicionado 2025-11-19)
 # ===================================================================
 
+# Padrões de categorização (baseados em análise real)
+CATEGORY_PATTERNS = {
+    'AGENDAMENTO': {
+        'label': '📅 Agendamentos',
+        'color': '#28a745',  # Verde
+        'keywords': [
+            r'\bagendar\b', r'\bagendamento\b', r'\bmarcar\b', r'\bhorário\b',
+            r'\bvisita\b', r'\bdata\b', r'\bhora\b', r'\bquando\b',
+            r'\bexperimental\b', r'\btreino experimental\b', r'\baula experimental\b',
+            r'\bpode ser\b', r'\bagendado\b', r'\bconfirmado\b', r'\bok\s*✅\b',
+            r'\bagendei\b', r'\tte espero\b', r'\bmarcado\b'
+        ],
+        'weight': 2  # Prioridade alta
+    },
+
+    'PREÇO/PLANOS': {
+        'label': '💰 Preços & Planos',
+        'color': '#ffc107',  # Amarelo
+        'keywords': [
+            r'\bpreço\b', r'\bvalor\b', r'\bcusto\b', r'\bquanto\b',
+            r'\bplano\b', r'\bmensalidade\b', r'\bmatrícula\b',
+            r'\bpagamento\b', r'\bforma de pagamento\b', r'\bpagar\b',
+            r'\bpix\b', r'\bcartão\b', r'\bparcela\b', r'\bdinheiro\b',
+            r'\bcondição\b', r'\bpromoção\b', r'\bdesconto\b'
+        ],
+        'weight': 2
+    },
+
+    'INFORMAÇÕES GERAIS': {
+        'label': 'ℹ️ Informações Gerais',
+        'color': '#17a2b8',  # Azul claro
+        'keywords': [
+            r'\binformação\b', r'\bsobre\b', r'\bcomo funciona\b',
+            r'\bfunciona\b', r'\bdetalhes\b', r'\bme fala\b',
+            r'\bme explica\b', r'\bquero saber\b', r'\bgostaria de saber\b',
+            r'\bconhecer\b', r'\bserviços\b'
+        ],
+        'weight': 1
+    },
+
+    'SUPORTE/DÚVIDAS': {
+        'label': '❓ Suporte & Dúvidas',
+        'color': '#20c997',  # Verde água
+        'keywords': [
+            r'\bajuda\b', r'\bdúvida\b', r'\bnão entendi\b',
+            r'\bcomo faz\b', r'\bcomo faço\b', r'\bpreciso de ajuda\b',
+            r'\bsuporte\b', r'\batendimento\b', r'\bproblema\b'
+        ],
+        'weight': 1
+    },
+
+    'CANCELAMENTO/RECLAMAÇÃO': {
+        'label': '🚫 Cancelamentos',
+        'color': '#dc3545',  # Vermelho
+        'keywords': [
+            r'\bcancelar\b', r'\bcancelamento\b', r'\bdesistir\b',
+            r'\breclamação\b', r'\bnão funcionou\b',
+            r'\binsatisfeito\b', r'\bruim\b', r'\bpéssimo\b'
+        ],
+        'weight': 2
+    }
+}
+
+OTHER_CATEGORY_KEY = 'OUTROS'
+OTHER_CATEGORY = {
+    'label': '📦 Outros',
+    'color': '#6c757d'
+}
+
+
+def categorize_conversations(df):
+    """
+    Categoriza cada conversa pelas palavras-chave (vetorizado)
+
+    Score da categoria = peso x número de padrões encontrados; vence o maior
+    score (empate: ordem de CATEGORY_PATTERNS). Sem nenhum padrão: OUTROS.
+
+    Args:
+        df: DataFrame com coluna 'message_compiled' (ou já com TRANSCRIPT_TEXT_COLUMN)
+
+    Returns:
+        pd.Series: Chave da categoria por conversa (mesmo índice do df)
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+
+    texts = add_transcript_text_columns(df)[TRANSCRIPT_TEXT_COLUMN]
+
+    scores = pd.DataFrame({
+        category: sum(
+            texts.str.contains(pattern, regex=True).astype(int)
+            for pattern in config['keywords']
+        ) * config['weight']
+        for category, config in CATEGORY_PATTERNS.items()
+    }, index=df.index)
+
+    categories = scores.idxmax(axis=1).astype(object)
+    categories[scores.max(axis=1) == 0] = OTHER_CATEGORY_KEY
+
+    return categories
+
+
+def count_conversation_categories(df):
+    """
+    Conta conversas por categoria
+
+    Args:
+        df: DataFrame com coluna 'message_compiled'
+
+    Returns:
+        pd.Series: categoria -> quantidade, da mais frequente para a menos
+        frequente (empate: ordem de primeira ocorrência)
+    """
+    counts = categorize_conversations(df).value_counts(sort=False)
+    return counts.sort_values(ascending=False, kind='stable')
+
+
 def calculate_conversation_categories(df, min_threshold=5.0):
     """
     Categoriza conversas em tipos principais baseado em palavras-chave.
@@ -675,155 +905,24 @@ def calculate_conversation_categories(df, min_threshold=5.0):
         - percentual: Percentual do total
         - cor: Cor hex para gráfico
     """
-    import re
-    import json
-
-    # ===================================================================
-    # PADRÕES DE CATEGORIZAÇÃO (baseados em análise real)
-    # ===================================================================
-    CATEGORY_PATTERNS = {
-        'AGENDAMENTO': {
-            'label': '📅 Agendamentos',
-            'color': '#28a745',  # Verde
-            'keywords': [
-                r'\bagendar\b', r'\bagendamento\b', r'\bmarcar\b', r'\bhorário\b',
-                r'\bvisita\b', r'\bdata\b', r'\bhora\b', r'\bquando\b',
-                r'\bexperimental\b', r'\btreino experimental\b', r'\baula experimental\b',
-                r'\bpode ser\b', r'\bagendado\b', r'\bconfirmado\b', r'\bok\s*✅\b',
-                r'\bagendei\b', r'\tte espero\b', r'\bmarcado\b'
-            ],
-            'weight': 2  # Prioridade alta
-        },
-
-        'PREÇO/PLANOS': {
-            'label': '💰 Preços & Planos',
-            'color': '#ffc107',  # Amarelo
-            'keywords': [
-                r'\bpreço\b', r'\bvalor\b', r'\bcusto\b', r'\bquanto\b',
-                r'\bplano\b', r'\bmensalidade\b', r'\bmatrícula\b',
-                r'\bpagamento\b', r'\bforma de pagamento\b', r'\bpagar\b',
-                r'\bpix\b', r'\bcartão\b', r'\bparcela\b', r'\bdinheiro\b',
-                r'\bcondição\b', r'\bpromoção\b', r'\bdesconto\b'
-            ],
-            'weight': 2
-        },
-
-        'INFORMAÇÕES GERAIS': {
-            'label': 'ℹ️ Informações Gerais',
-            'color': '#17a2b8',  # Azul claro
-            'keywords': [
-                r'\binformação\b', r'\bsobre\b', r'\bcomo funciona\b',
-                r'\bfunciona\b', r'\bdetalhes\b', r'\bme fala\b',
-                r'\bme explica\b', r'\bquero saber\b', r'\bgostaria de saber\b',
-                r'\bconhecer\b', r'\bserviços\b'
-            ],
-            'weight': 1
-        },
-
-        'SUPORTE/DÚVIDAS': {
-            'label': '❓ Suporte & Dúvidas',
-            'color': '#20c997',  # Verde água
-            'keywords': [
-                r'\bajuda\b', r'\bdúvida\b', r'\bnão entendi\b',
-                r'\bcomo faz\b', r'\bcomo faço\b', r'\bpreciso de ajuda\b',
-                r'\bsuporte\b', r'\batendimento\b', r'\bproblema\b'
-            ],
-            'weight': 1
-        },
-
-        'CANCELAMENTO/RECLAMAÇÃO': {
-            'label': '🚫 Cancelamentos',
-            'color': '#dc3545',  # Vermelho
-            'keywords': [
-                r'\bcancelar\b', r'\bcancelamento\b', r'\bdesistir\b',
-                r'\breclamação\b', r'\bnão funcionou\b',
-                r'\binsatisfeito\b', r'\bruim\b', r'\bpéssimo\b'
-            ],
-            'weight': 2
-        }
-    }
-
-    def extract_messages_text(message_compiled):
-        """Extrai texto limpo das mensagens compiladas"""
-        try:
-            if isinstance(message_compiled, str):
-                messages = json.loads(message_compiled)
-            else:
-                messages = message_compiled
-
-            texts = []
-            for msg in messages:
-                # Pular mensagens do sistema
-                if msg.get('message_type') in [2, 3]:
-                    continue
-
-                text = msg.get('text', '')
-                if text:
-                    texts.append(text.lower())
-
-            return ' '.join(texts)
-        except:
-            return ''
-
-    def categorize_single_conversation(message_text):
-        """Categoriza uma conversa baseada em palavras-chave"""
-        category_scores = {}
-
-        for category, config in CATEGORY_PATTERNS.items():
-            score = 0
-
-            for pattern in config['keywords']:
-                if re.search(pattern, message_text):
-                    score += config['weight']
-
-            if score > 0:
-                category_scores[category] = score
-
-        # Se não encontrou nenhuma categoria, retornar OUTROS
-        if not category_scores:
-            return 'OUTROS'
-
-        # Retornar categoria com maior score
-        primary_category = max(category_scores, key=category_scores.get)
-        return primary_category
-
-    # ===================================================================
-    # PROCESSAR TODAS AS CONVERSAS
-    # ===================================================================
-    categories = []
-
-    for _, row in df.iterrows():
-        message_compiled = row.get('message_compiled')
-        if not message_compiled or message_compiled == 'null':
-            categories.append('OUTROS')
-            continue
-
-        message_text = extract_messages_text(message_compiled)
-        category = categorize_single_conversation(message_text)
-        categories.append(category)
-
     # ===================================================================
     # CALCULAR ESTATÍSTICAS
     # ===================================================================
-    from collections import Counter
-    category_counter = Counter(categories)
-    total = len(categories)
+    category_counts = count_conversation_categories(df)
+    total = int(category_counts.sum())
 
     # Criar DataFrame de resultado
     result_data = []
 
-    for category, count in category_counter.most_common():
+    for category, count in category_counts.items():
         percentage = (count / total * 100) if total > 0 else 0
 
         # Pegar configuração da categoria (ou usar padrão para OUTROS)
-        config = CATEGORY_PATTERNS.get(category, {
-            'label': '📦 Outros',
-            'color': '#6c757d'
-        })
+        config = CATEGORY_PATTERNS.get(category, OTHER_CATEGORY)
 
         result_data.append({
             'categoria': config['label'],
-            'quantidade': count,
+            'quantidade': int(count),
             'percentual': round(percentage, 1),
             'cor': config['color']
         })
@@ -3,16 +3,17 @@ Módulo de autenticação multi-tenant - GeniAI Analytics
 Responsável por: login, logout, validação de sessão, gerenciamento de database engine
 """
 
-import os
 import bcrypt
 import uuid
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 import streamlit as st
 
+from ..utils.db_engines import get_engine
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -25,38 +26,18 @@ logging.basicConfig(
 # DATABASE ENGINE
 # ============================================================================
 
-@st.cache_resource
 def get_database_engine() -> Engine:
     """
-    Retorna engine SQLAlchemy com cache (singleton)
+    Retorna engine SQLAlchemy do dashboard (singleton por processo)
 
     Credenciais lidas de variáveis de ambiente ou padrões do projeto
+    (ver multi_tenant.utils.db_engines). O pool é compartilhado por todas
+    as sessões e reruns do Streamlit.
 
     Returns:
         Engine: SQLAlchemy engine conectado ao geniai_analytics
     """
-    # Credenciais do banco (conforme DB_DOCUMENTATION.md)
-    db_host = os.getenv('LOCAL_DB_HOST', 'localhost')
-    db_port = os.getenv('LOCAL_DB_PORT', '5432')
-    db_name = os.getenv('LOCAL_DB_NAME', 'geniai_analytics')
-    db_user = os.getenv('LOCAL_DB_USER', 'isaac')
-    db_password = os.getenv('LOCAL_DB_PASSWORD', 'AllpFit2024@Analytics')
-
-    # Connection string (URL encode password para tratar caracteres especiais)
-    from urllib.parse import quote_plus
-    password_encoded = quote_plus(db_password)
-    database_url = f"postgresql://{db_user}:{password_encoded}@{db_host}:{db_port}/{db_name}"
-
-    # Criar engine
-    engine = create_engine(
-        database_url,
-        pool_size=5,
-        max_overflow=10,
-        pool_pre_ping=True,  # Verificar conexão antes de usar
-        echo=False
-    )
-
-    return engine
+    return get_engine('dashboard')
 
 
 def get_etl_engine() -> Engine:
@@ -78,30 +59,9 @@ def get_etl_engine() -> Engine:
     - Em endpoints expostos ao usuário final
 
     Returns:
-        Engine: SQLAlchemy engine com permissões ETL
+        Engine: SQLAlchemy engine com permissões ETL (singleton por processo)
     """
-    # Credenciais ETL (usuário johan_geniai com role etl_service)
-    db_host = os.getenv('LOCAL_DB_HOST', 'localhost')
-    db_port = os.getenv('LOCAL_DB_PORT', '5432')
-    db_name = os.getenv('LOCAL_DB_NAME', 'geniai_analytics')
-    db_user = 'johan_geniai'  # Role: etl_service (bypass RLS)
-    db_password = 'vlVMVM6UNz2yYSBlzodPjQvZh'
-
-    # Connection string
-    from urllib.parse import quote_plus
-    password_encoded = quote_plus(db_password)
-    database_url = f"postgresql://{db_user}:{password_encoded}@{db_host}:{db_port}/{db_name}"
-
-    # Criar engine
-    engine = create_engine(
-        database_url,
-        pool_size=10,  # ETL pode precisar de mais conexões
-        max_overflow=20,
-        pool_pre_ping=True,
-        echo=False
-    )
-
-    return engine
+    return get_engine('etl')
 
 
 # ============================================================================
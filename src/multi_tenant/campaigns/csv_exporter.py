@@ -9,18 +9,31 @@ Formato do CSV:
     telefone,nome,variavel_1,variavel_2
     5511999999999,João,contexto personalizado,oferta da campanha
 
+Exportação em streaming (memória constante):
+    - iter_csv_chunks / export_to_file aceitam qualquer iterável de leads
+      (ex: CampaignService.iter_exportable_leads, cursor no servidor) e
+      escrevem em blocos, com tamanho e estatísticas calculados na escrita
+    - CampaignXLSXExporter usa workbook write-only do openpyxl
+
 Autor: Isaac (via Claude Code)
 Data: 2025-11-26
 """
 
 import csv
 import io
+import os
 import re
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from .models import CampaignLead, Campaign
 
+# Destino de export_to_file: caminho ou arquivo binário aberto
+ExportTarget = Union[str, os.PathLike, BinaryIO]
+
+# Bytes acumulados antes de cada bloco do CSV em streaming
+CSV_CHUNK_SIZE = 64 * 1024
+
 
 class CampaignCSVExporter:
     """
@@ -175,29 +188,54 @@ class CampaignCSVExporter:
             "variavel_2": self._sanitize_text(lead.var3 or "", self.MAX_LEN_VAR2, "variavel_2"),
         }
 
-    def export(
+    def _new_stats(self) -> Dict[str, Any]:
+        """Estatísticas iniciais de uma exportação"""
+        return {
+            "total_leads": 0,
+            "exported": 0,
+            "skipped_no_phone": 0,
+            "skipped_no_vars": 0,
+            "file_size_bytes": 0,
+        }
+
+    def iter_csv_chunks(
         self,
-        leads: List[CampaignLead],
-        campaign: Optional[Campaign] = None
-    ) -> Tuple[str, Dict[str, Any]]:
+        leads: Iterable[CampaignLead],
+        stats: Optional[Dict[str, Any]] = None,
+        chunk_size: int = CSV_CHUNK_SIZE
+    ) -> Iterator[bytes]:
         """
-        Exporta leads para CSV.
+        Gera o CSV em blocos de bytes, lendo os leads sob demanda.
+
+        As estatísticas (contagens e file_size_bytes) são atualizadas em
+        `stats` durante a geração e ficam completas ao fim do iterador.
 
         Args:
-            leads: Lista de leads processados
-            campaign: Campanha (opcional, para metadados)
+            leads: Iterável de leads (lista ou gerador, ex: iter_exportable_leads)
+            stats: Dicionário a preencher (default: novo, descartado)
+            chunk_size: Tamanho aproximado de cada bloco em bytes
 
         Returns:
-            Tupla (conteúdo CSV como string, estatísticas)
+            Iterador de blocos de bytes do arquivo
+
+        Example:
+            >>> stats = {}
+            >>> with open("campanha.csv", "wb") as f:
+            ...     for chunk in exporter.iter_csv_chunks(service.iter_exportable_leads(7), stats):
+            ...         f.write(chunk)
         """
-        output = io.StringIO()
+        if stats is None:
+            stats = {}
+        stats.update(self._new_stats())
+
+        buffer = io.StringIO()
 
         # Adicionar BOM se configurado (para Excel)
         if self.add_bom:
-            output.write('\ufeff')
+            buffer.write('\ufeff')
 
         writer = csv.DictWriter(
-            output,
+            buffer,
             fieldnames=self.COLUMNS,
             delimiter=self.DELIMITER,
             quotechar=self.QUOTECHAR,
@@ -209,16 +247,17 @@ class CampaignCSVExporter:
         if self.include_header:
             writer.writeheader()
 
-        # Estatísticas
-        stats = {
-            "total_leads": len(leads),
-            "exported": 0,
-            "skipped_no_phone": 0,
-            "skipped_no_vars": 0,
-        }
+        def flush() -> bytes:
+            chunk = buffer.getvalue().encode(self.ENCODING)
+            buffer.seek(0)
+            buffer.truncate()
+            stats["file_size_bytes"] += len(chunk)
+            return chunk
 
         # Processar leads
         for lead in leads:
+            stats["total_leads"] += 1
+
             # Validações
             if not lead.contact_phone:
                 stats["skipped_no_phone"] += 1
@@ -228,23 +267,69 @@ class CampaignCSVExporter:
                 stats["skipped_no_vars"] += 1
                 continue
 
-            # Converter para linha CSV
-            row = self._lead_to_row(lead)
-
-            # Escrever linha
-            writer.writerow(row)
+            # Converter para linha CSV e escrever
+            writer.writerow(self._lead_to_row(lead))
             stats["exported"] += 1
 
-        csv_content = output.getvalue()
+            if buffer.tell() >= chunk_size:
+                yield flush()
+
+        chunk = flush()
+        if chunk:
+            yield chunk
+
+    def export_to_file(
+        self,
+        leads: Iterable[CampaignLead],
+        target: ExportTarget,
+        campaign: Optional[Campaign] = None
+    ) -> Dict[str, Any]:
+        """
+        Exporta leads para arquivo em streaming (memória constante).
+
+        Args:
+            leads: Iterável de leads
+            target: Caminho do arquivo ou arquivo binário aberto
+            campaign: Campanha (opcional, para metadados)
+
+        Returns:
+            Estatísticas (inclui file_size_bytes)
+        """
+        stats: Dict[str, Any] = {}
+
+        if hasattr(target, "write"):
+            for chunk in self.iter_csv_chunks(leads, stats):
+                target.write(chunk)
+        else:
+            with open(target, "wb") as f:
+                for chunk in self.iter_csv_chunks(leads, stats):
+                    f.write(chunk)
+
+        return stats
 
-        # Calcular tamanho
-        stats["file_size_bytes"] = len(csv_content.encode(self.ENCODING))
+    def export(
+        self,
+        leads: Iterable[CampaignLead],
+        campaign: Optional[Campaign] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Exporta leads para CSV.
 
-        return csv_content, stats
+        Para campanhas grandes prefira export_to_file / iter_csv_chunks.
+
+        Args:
+            leads: Lista de leads processados
+            campaign: Campanha (opcional, para metadados)
+
+        Returns:
+            Tupla (conteúdo CSV como string, estatísticas)
+        """
+        csv_bytes, stats = self.export_to_bytes(leads, campaign)
+        return csv_bytes.decode(self.ENCODING), stats
 
     def export_to_bytes(
         self,
-        leads: List[CampaignLead],
+        leads: Iterable[CampaignLead],
         campaign: Optional[Campaign] = None
     ) -> Tuple[bytes, Dict[str, Any]]:
         """
@@ -257,8 +342,9 @@ class CampaignCSVExporter:
         Returns:
             Tupla (bytes do CSV, estatísticas)
         """
-        csv_content, stats = self.export(leads, campaign)
-        return csv_content.encode(self.ENCODING), stats
+        stats: Dict[str, Any] = {}
+        csv_bytes = b"".join(self.iter_csv_chunks(leads, stats))
+        return csv_bytes, stats
 
     def generate_filename(
         self,
@@ -385,39 +471,51 @@ class CampaignXLSXExporter:
                 "Instale com: pip install openpyxl"
             )
 
-    def export(
+    def export_to_file(
         self,
-        leads: List[CampaignLead],
+        leads: Iterable[CampaignLead],
+        target: ExportTarget,
         campaign: Optional[Campaign] = None
-    ) -> Tuple[bytes, Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         """
-        Exporta leads para XLSX.
+        Exporta leads para XLSX em streaming (workbook write-only).
+
+        As linhas vão para arquivos temporários do openpyxl à medida que os
+        leads são lidos; a planilha não fica inteira em memória.
 
         Args:
-            leads: Lista de leads
+            leads: Iterável de leads (lista ou gerador)
+            target: Caminho do arquivo ou arquivo binário aberto
             campaign: Campanha
 
         Returns:
-            Tupla (bytes do arquivo, estatísticas)
+            Estatísticas (inclui file_size_bytes)
         """
-        wb = self._openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Campanha"
+        wb = self._openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Campanha")
 
-        # Cabeçalhos
-        headers = ["telefone", "nome", "variavel_1", "variavel_2"]
-        ws.append(headers)
+        # Ajustar largura das colunas (antes das linhas no modo write-only)
+        ws.column_dimensions['A'].width = 15
+        ws.column_dimensions['B'].width = 15
+        ws.column_dimensions['C'].width = 50
+        ws.column_dimensions['D'].width = 50
 
-        # Formatar cabeçalhos
-        for cell in ws[1]:
+        # Cabeçalhos em negrito
+        headers = []
+        for header in CampaignCSVExporter.COLUMNS:
+            cell = self._openpyxl.cell.WriteOnlyCell(ws, value=header)
             cell.font = self._openpyxl.styles.Font(bold=True)
+            headers.append(cell)
+        ws.append(headers)
 
         # CSV exporter para reutilizar lógica
         csv_exporter = CampaignCSVExporter(add_bom=False)
 
-        stats = {"exported": 0, "skipped": 0}
+        stats = {"exported": 0, "skipped": 0, "total_leads": 0}
 
         for lead in leads:
+            stats["total_leads"] += 1
+
             if not lead.contact_phone:
                 stats["skipped"] += 1
                 continue
@@ -426,18 +524,32 @@ class CampaignXLSXExporter:
             ws.append([row["telefone"], row["nome"], row["variavel_1"], row["variavel_2"]])
             stats["exported"] += 1
 
-        # Ajustar largura das colunas
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 50
-        ws.column_dimensions['D'].width = 50
+        wb.save(target)
 
-        # Salvar em bytes
-        output = io.BytesIO()
-        wb.save(output)
-        xlsx_bytes = output.getvalue()
+        if hasattr(target, "write"):
+            stats["file_size_bytes"] = target.tell()
+        else:
+            stats["file_size_bytes"] = os.path.getsize(target)
+
+        return stats
+
+    def export(
+        self,
+        leads: Iterable[CampaignLead],
+        campaign: Optional[Campaign] = None
+    ) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        Exporta leads para XLSX.
 
-        stats["file_size_bytes"] = len(xlsx_bytes)
-        stats["total_leads"] = len(leads)
+        Para campanhas grandes prefira export_to_file.
 
-        return xlsx_bytes, stats
+        Args:
+            leads: Lista de leads
+            campaign: Campanha
+
+        Returns:
+            Tupla (bytes do arquivo, estatísticas)
+        """
+        output = io.BytesIO()
+        stats = self.export_to_file(leads, output, campaign)
+        return output.getvalue(), stats
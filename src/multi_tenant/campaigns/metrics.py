@@ -0,0 +1,208 @@
+"""
+Campaign Metrics - Contadores das Campanhas
+===========================================
+
+Mantém campaigns.leads_total, leads_processed, leads_exported e
+total_cost_brl.
+
+Manutenção incremental (sql/migrations/20261017_add_campaign_metric_triggers.sql):
+    - Triggers de statement em campaign_leads somam a diferença das linhas
+      alteradas (O(leads alterados) por statement)
+    - Com os triggers instalados, CampaignService._update_campaign_metrics
+      não recalcula nada; sem eles (migration pendente) faz a recontagem
+      completa da campanha, como antes
+
+Reconciliação (reconcile_campaign_metrics / __main__):
+    - Recontagem set-based a partir de campaign_leads, gravando apenas as
+      campanhas com desvio (ex: arredondamento de total_cost_brl)
+    - Agendada por systemd/campaign-metrics-reconcile.timer
+
+Fase: 10.1 - Campaign Metrics
+Data: 2026-10-17
+"""
+
+import logging
+from threading import Lock
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Triggers criados pela migration (um por evento)
+METRIC_TRIGGERS = (
+    'campaign_leads_metrics_insert',
+    'campaign_leads_metrics_update',
+    'campaign_leads_metrics_delete',
+)
+
+# Mesmos critérios dos triggers; total_cost_brl é NUMERIC(10, 4)
+_RECOUNT = """
+    WITH counts AS (
+        SELECT
+            c.id AS campaign_id,
+            COUNT(cl.id) AS leads_total,
+            COUNT(cl.id) FILTER (WHERE cl.status IN ('processed', 'exported')) AS leads_processed,
+            COUNT(cl.id) FILTER (WHERE cl.status = 'exported') AS leads_exported,
+            ROUND(COALESCE(SUM((cl.generation_metadata->>'cost_brl')::numeric), 0), 4) AS total_cost_brl
+        FROM campaigns c
+        LEFT JOIN campaign_leads cl ON cl.campaign_id = c.id
+        WHERE {condition}
+        GROUP BY c.id
+    )
+    UPDATE campaigns c
+    SET
+        leads_total = counts.leads_total,
+        leads_processed = counts.leads_processed,
+        leads_exported = counts.leads_exported,
+        total_cost_brl = counts.total_cost_brl,
+        updated_at = NOW()
+    FROM counts
+    WHERE c.id = counts.campaign_id{drift_condition}
+    RETURNING c.id
+"""
+
+_DRIFT_CONDITION = """
+      AND (
+          c.leads_total IS DISTINCT FROM counts.leads_total
+          OR c.leads_processed IS DISTINCT FROM counts.leads_processed
+          OR c.leads_exported IS DISTINCT FROM counts.leads_exported
+          OR c.total_cost_brl IS DISTINCT FROM counts.total_cost_brl
+      )"""
+
+
+def recount_campaign_metrics(
+    conn,
+    campaign_id: Optional[int] = None,
+    tenant_id: Optional[int] = None,
+    only_drifted: bool = False
+) -> List[int]:
+    """
+    Recalcula os contadores a partir de campaign_leads (um statement).
+
+    Args:
+        conn: Conexão SQLAlchemy (a transação é do chamador)
+        campaign_id: Apenas esta campanha
+        tenant_id: Apenas campanhas deste tenant
+        only_drifted: Gravar só campanhas cujos contadores divergem
+
+    Returns:
+        IDs das campanhas atualizadas
+
+    Example:
+        >>> recount_campaign_metrics(conn, campaign_id=7)
+        [7]
+    """
+    conditions = []
+    params: Dict[str, int] = {}
+
+    if campaign_id is not None:
+        conditions.append("c.id = :campaign_id")
+        params['campaign_id'] = campaign_id
+    if tenant_id is not None:
+        conditions.append("c.tenant_id = :tenant_id")
+        params['tenant_id'] = tenant_id
+
+    query = text(_RECOUNT.format(
+        condition=' AND '.join(conditions) or 'TRUE',
+        drift_condition=_DRIFT_CONDITION if only_drifted else ''
+    ))
+
+    return [row[0] for row in conn.execute(query, params)]
+
+
+# Bancos onde os triggers já foram encontrados (migration aplicada)
+_triggers_installed: Dict[str, bool] = {}
+_triggers_installed_lock = Lock()
+
+
+def metric_triggers_installed(engine: Engine) -> bool:
+    """
+    Verifica se os triggers de contadores estão ativos (positivo cacheado por banco).
+
+    Args:
+        engine: Engine do banco
+
+    Returns:
+        bool: True se a migration foi aplicada e os triggers estão habilitados
+    """
+    key = str(engine.url)
+
+    with _triggers_installed_lock:
+        if key in _triggers_installed:
+            return _triggers_installed[key]
+
+    try:
+        with engine.connect() as conn:
+            installed = conn.execute(
+                text("""
+                    SELECT COUNT(*)
+                    FROM pg_trigger
+                    WHERE tgrelid = to_regclass('campaign_leads')
+                      AND tgname = ANY(:names)
+                      AND tgenabled <> 'D'
+                """),
+                {'names': list(METRIC_TRIGGERS)}
+            ).scalar() == len(METRIC_TRIGGERS)
+    except Exception as e:
+        logger.warning(f"Não foi possível verificar os triggers de métricas de campanha: {e}")
+        return False
+
+    if not installed:
+        # Não cacheado: passa a valer assim que a migration for aplicada
+        logger.info("Triggers de métricas de campanha ausentes: recontagem completa (migration pendente)")
+        return False
+
+    with _triggers_installed_lock:
+        _triggers_installed[key] = True
+
+    return True
+
+
+def reset_metric_triggers_cache() -> None:
+    """Esquece a verificação de metric_triggers_installed (útil para testes)."""
+    with _triggers_installed_lock:
+        _triggers_installed.clear()
+
+
+def reconcile_campaign_metrics(engine: Engine, tenant_id: Optional[int] = None) -> int:
+    """
+    Corrige desvios dos contadores incrementais (job periódico).
+
+    Args:
+        engine: Engine do banco (etl: owner, sem RLS)
+        tenant_id: Apenas campanhas deste tenant (default: todas)
+
+    Returns:
+        int: Número de campanhas corrigidas
+    """
+    with engine.begin() as conn:
+        fixed = recount_campaign_metrics(conn, tenant_id=tenant_id, only_drifted=True)
+
+    if fixed:
+        logger.warning(f"Contadores de {len(fixed)} campanha(s) corrigidos: {sorted(fixed)}")
+    else:
+        logger.info("Contadores das campanhas conferidos: sem desvios")
+
+    return len(fixed)
+
+
+# Job de reconciliação
+if __name__ == "__main__":
+    # Executar da raiz do projeto: python -m src.multi_tenant.campaigns.metrics
+    import argparse
+
+    from ..utils.db_engines import get_engine
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='Reconcilia os contadores das campanhas com campaign_leads')
+    parser.add_argument('--tenant-id', type=int, help='Reconciliar apenas este tenant')
+    args = parser.parse_args()
+
+    print(f"{reconcile_campaign_metrics(get_engine('etl'), args.tenant_id)} campanha(s) corrigida(s)")
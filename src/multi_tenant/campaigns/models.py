@@ -448,6 +448,11 @@ class Campaign:
         return cls(**data)
 
 
+# Chave em generation_metadata marcada na regeneração manual de variáveis:
+# a próxima geração ignora o cache de respostas LLM (mesmo prompt, nova resposta)
+REGENERATE_METADATA_KEY = "regenerate"
+
+
 @dataclass
 class CampaignLead:
     """
@@ -527,6 +532,11 @@ class CampaignLead:
         """Verifica se teve erro"""
         return self.status == LeadStatus.ERROR
 
+    @property
+    def regeneration_requested(self) -> bool:
+        """Usuário pediu novas variáveis (geração ignora o cache LLM)"""
+        return bool((self.generation_metadata or {}).get(REGENERATE_METADATA_KEY))
+
     @property
     def first_name(self) -> str:
         """Extrai primeiro nome do contact_name"""
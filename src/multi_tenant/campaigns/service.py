@@ -21,7 +21,7 @@ import logging
 import re
 import unicodedata
 from datetime import datetime, date
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 
 
 def remove_accents(text: str) -> str:
@@ -32,6 +32,7 @@ def remove_accents(text: str) -> str:
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from .metrics import metric_triggers_installed, recount_campaign_metrics
 from .models import (
     Campaign,
     CampaignLead,
@@ -40,11 +41,38 @@ from .models import (
     CampaignType,
     CampaignTone,
     LeadStatus,
+    REGENERATE_METADATA_KEY,
 )
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Colunas aceitas por update_leads_batch (coluna, tipo no VALUES)
+LEAD_BATCH_UPDATE_COLUMNS = (
+    ("var1", "TEXT"),
+    ("var2", "TEXT"),
+    ("var3", "TEXT"),
+    ("message_preview", "TEXT"),
+    ("status", "TEXT"),
+    ("error_message", "TEXT"),
+    ("generation_metadata", "JSONB"),
+)
+
+# Leads por statement em update_leads_batch (limita o número de parâmetros)
+LEAD_BATCH_UPDATE_CHUNK_SIZE = 500
+
+# Colunas de campaign_leads lidas na exportação (ordem de _row_to_lead)
+EXPORT_LEAD_COLUMNS = """
+                id, campaign_id, conversation_id,
+                contact_phone, contact_name,
+                var1, var2, var3, message_preview,
+                status, error_message, generation_metadata,
+                export_count, last_exported_at,
+                created_at, processed_at, updated_at"""
+
+# Linhas por lote do cursor no servidor em iter_exportable_leads
+EXPORT_FETCH_SIZE = 1000
+
 
 class CampaignService:
     """
@@ -707,6 +735,43 @@ class CampaignService:
             limit=limit
         )
 
+    def _exportable_leads_query(self, only_not_exported: bool, columns: str) -> str:
+        """Query dos leads exportáveis (processed ou exported) de uma campanha"""
+        query = f"""
+            SELECT {columns}
+            FROM campaign_leads
+            WHERE campaign_id = :campaign_id
+              AND status IN ('processed', 'exported')
+        """
+
+        if only_not_exported:
+            query += " AND export_count = 0"
+
+        return query
+
+    @staticmethod
+    def _row_to_lead(row) -> CampaignLead:
+        """Converte linha de campaign_leads (colunas de EXPORT_LEAD_COLUMNS) em CampaignLead"""
+        return CampaignLead(
+            id=row[0],
+            campaign_id=row[1],
+            conversation_id=row[2],
+            contact_phone=row[3],
+            contact_name=row[4],
+            var1=row[5],
+            var2=row[6],
+            var3=row[7],
+            message_preview=row[8],
+            status=LeadStatus(row[9]),
+            error_message=row[10],
+            generation_metadata=row[11] or {},
+            export_count=row[12] or 0,
+            last_exported_at=row[13],
+            created_at=row[14],
+            processed_at=row[15],
+            updated_at=row[16]
+        )
+
     def get_exportable_leads(
         self,
         campaign_id: int,
@@ -715,6 +780,9 @@ class CampaignService:
         """
         Busca leads que podem ser exportados (processed ou exported).
 
+        Carrega todos os leads em memória; para exportar campanhas grandes
+        use iter_exportable_leads.
+
         Args:
             campaign_id: ID da campanha
             only_not_exported: Se True, apenas leads nunca exportados
@@ -722,56 +790,85 @@ class CampaignService:
         Returns:
             Lista de leads exportáveis
         """
-        query = """
-            SELECT
-                id, campaign_id, conversation_id,
-                contact_phone, contact_name,
-                var1, var2, var3, message_preview,
-                status, error_message, generation_metadata,
-                export_count, last_exported_at,
-                created_at, processed_at, updated_at
-            FROM campaign_leads
-            WHERE campaign_id = :campaign_id
-              AND status IN ('processed', 'exported')
+        query = self._exportable_leads_query(only_not_exported, EXPORT_LEAD_COLUMNS)
+        query += " ORDER BY created_at"
+
+        try:
+            with self.engine.connect() as conn:
+                self._set_tenant_context(conn)
+                result = conn.execute(text(query), {"campaign_id": campaign_id})
+                return [self._row_to_lead(row) for row in result.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Erro ao buscar leads exportáveis: {e}")
+            raise
+
+    def iter_exportable_leads(
+        self,
+        campaign_id: int,
+        only_not_exported: bool = True,
+        batch_size: int = EXPORT_FETCH_SIZE
+    ) -> Iterator[CampaignLead]:
         """
+        Itera os leads exportáveis com cursor no servidor (memória constante).
 
-        if only_not_exported:
-            query += " AND export_count = 0"
+        As linhas chegam do PostgreSQL em lotes de `batch_size`; a conexão
+        fica aberta até o iterador ser consumido ou fechado.
+
+        Args:
+            campaign_id: ID da campanha
+            only_not_exported: Se True, apenas leads nunca exportados
+            batch_size: Linhas por lote do cursor
+
+        Returns:
+            Iterador de CampaignLead, na ordem de criação
 
+        Example:
+            >>> leads = service.iter_exportable_leads(7)
+            >>> stats = CampaignCSVExporter().export_to_file(leads, "campanha.csv")
+        """
+        query = self._exportable_leads_query(only_not_exported, EXPORT_LEAD_COLUMNS)
         query += " ORDER BY created_at"
 
         try:
             with self.engine.connect() as conn:
                 self._set_tenant_context(conn)
-                result = conn.execute(text(query), {"campaign_id": campaign_id})
-                rows = result.fetchall()
+                result = conn.execution_options(
+                    stream_results=True,
+                    yield_per=batch_size
+                ).execute(text(query), {"campaign_id": campaign_id})
 
-                leads = []
-                for row in rows:
-                    leads.append(CampaignLead(
-                        id=row[0],
-                        campaign_id=row[1],
-                        conversation_id=row[2],
-                        contact_phone=row[3],
-                        contact_name=row[4],
-                        var1=row[5],
-                        var2=row[6],
-                        var3=row[7],
-                        message_preview=row[8],
-                        status=LeadStatus(row[9]),
-                        error_message=row[10],
-                        generation_metadata=row[11] or {},
-                        export_count=row[12] or 0,
-                        last_exported_at=row[13],
-                        created_at=row[14],
-                        processed_at=row[15],
-                        updated_at=row[16]
-                    ))
+                for row in result:
+                    yield self._row_to_lead(row)
 
-                return leads
+        except Exception as e:
+            logger.error(f"Erro ao iterar leads exportáveis da campanha {campaign_id}: {e}")
+            raise
+
+    def count_exportable_leads(
+        self,
+        campaign_id: int,
+        only_not_exported: bool = True
+    ) -> int:
+        """
+        Conta os leads exportáveis sem carregá-los.
+
+        Args:
+            campaign_id: ID da campanha
+            only_not_exported: Se True, apenas leads nunca exportados
+
+        Returns:
+            int: Número de leads exportáveis
+        """
+        query = self._exportable_leads_query(only_not_exported, "COUNT(*)")
+
+        try:
+            with self.engine.connect() as conn:
+                self._set_tenant_context(conn)
+                return conn.execute(text(query), {"campaign_id": campaign_id}).scalar() or 0
 
         except Exception as e:
-            logger.error(f"Erro ao buscar leads exportáveis: {e}")
+            logger.error(f"Erro ao contar leads exportáveis: {e}")
             raise
 
     def update_lead(
@@ -904,6 +1001,134 @@ class CampaignService:
             logger.error(f"Erro ao marcar leads como exportados: {e}")
             raise
 
+    def update_leads_batch(
+        self,
+        campaign_id: int,
+        updates: List[Dict[str, Any]],
+        update_metrics: bool = True
+    ) -> int:
+        """
+        Atualiza vários leads da campanha com um UPDATE ... FROM (VALUES ...).
+
+        Cada item segue os parâmetros de update_lead: campos ausentes ou None
+        mantêm o valor atual. As métricas da campanha são recalculadas uma
+        vez, na mesma transação.
+
+        Args:
+            campaign_id: ID da campanha
+            updates: Lista de dicts com lead_id e var1, var2, var3,
+                message_preview, status, error_message, generation_metadata
+            update_metrics: Recalcular _update_campaign_metrics ao final
+
+        Returns:
+            Quantidade de leads atualizados
+
+        Example:
+            >>> service.update_leads_batch(campaign.id, [
+            ...     {"lead_id": 10, "var1": "Ana", "status": LeadStatus.PROCESSED},
+            ...     {"lead_id": 11, "status": LeadStatus.ERROR, "error_message": "timeout"},
+            ... ])
+        """
+        if not updates:
+            return 0
+
+        columns = [column for column, _ in LEAD_BATCH_UPDATE_COLUMNS]
+        assignments = [f"{column} = COALESCE(v.{column}, cl.{column})" for column in columns]
+        assignments.append(
+            "processed_at = CASE WHEN v.status = 'processed' THEN NOW() ELSE cl.processed_at END"
+        )
+        assignments.append("updated_at = NOW()")
+
+        updated = 0
+
+        try:
+            with self.engine.connect() as conn:
+                self._set_tenant_context(conn)
+
+                for start in range(0, len(updates), LEAD_BATCH_UPDATE_CHUNK_SIZE):
+                    chunk = updates[start:start + LEAD_BATCH_UPDATE_CHUNK_SIZE]
+                    params = {"campaign_id": campaign_id}
+                    rows = []
+
+                    for i, item in enumerate(chunk):
+                        placeholders = [f"CAST(:lead_id_{i} AS INTEGER)"]
+                        params[f"lead_id_{i}"] = item["lead_id"]
+
+                        for column, sql_type in LEAD_BATCH_UPDATE_COLUMNS:
+                            value = item.get(column)
+                            if value is not None and column == "status":
+                                value = str(value)
+                            elif value is not None and column == "generation_metadata":
+                                value = json.dumps(value)
+                            placeholders.append(f"CAST(:{column}_{i} AS {sql_type})")
+                            params[f"{column}_{i}"] = value
+
+                        rows.append(f"({', '.join(placeholders)})")
+
+                    query = text(f"""
+                        UPDATE campaign_leads cl
+                        SET {', '.join(assignments)}
+                        FROM (VALUES {', '.join(rows)}) AS v(lead_id, {', '.join(columns)})
+                        WHERE cl.id = v.lead_id
+                          AND cl.campaign_id = :campaign_id
+                    """)
+
+                    updated += conn.execute(query, params).rowcount
+
+                if update_metrics:
+                    self._update_campaign_metrics(conn, campaign_id)
+
+                conn.commit()
+
+            logger.info(f"Atualizados {updated}/{len(updates)} leads da campanha {campaign_id} em lote")
+            return updated
+
+        except Exception as e:
+            logger.error(f"Erro ao atualizar leads em lote: {e}")
+            raise
+
+    def save_generation_results(
+        self,
+        campaign_id: int,
+        results: List[Dict[str, Any]],
+        update_metrics: bool = True
+    ) -> int:
+        """
+        Grava em lote os resultados de CampaignVariableGenerator.generate_batch.
+
+        Sucesso: var1..var3, message_preview, status PROCESSED e metadados.
+        Erro: status ERROR e error_message (200 caracteres).
+
+        Args:
+            campaign_id: ID da campanha
+            results: Resultados (com lead_id) do gerador
+            update_metrics: Recalcular métricas da campanha ao final
+
+        Returns:
+            Quantidade de leads atualizados
+        """
+        updates = []
+
+        for result in results:
+            if result.get("status") == LeadStatus.PROCESSED:
+                updates.append({
+                    "lead_id": result["lead_id"],
+                    "var1": result.get("var1", ""),
+                    "var2": result.get("var2", ""),
+                    "var3": result.get("var3", ""),
+                    "message_preview": result.get("message_preview"),
+                    "status": LeadStatus.PROCESSED,
+                    "generation_metadata": result.get("metadata", {}),
+                })
+            else:
+                updates.append({
+                    "lead_id": result["lead_id"],
+                    "status": LeadStatus.ERROR,
+                    "error_message": (result.get("error_message") or "Erro desconhecido")[:200],
+                })
+
+        return self.update_leads_batch(campaign_id, updates, update_metrics=update_metrics)
+
     # =========================================================================
     # EXPORTAÇÕES
     # =========================================================================
@@ -1047,35 +1272,17 @@ class CampaignService:
     # =========================================================================
 
     def _update_campaign_metrics(self, conn, campaign_id: int) -> None:
-        """Atualiza métricas agregadas da campanha"""
-        query = text("""
-            UPDATE campaigns c
-            SET
-                leads_total = (
-                    SELECT COUNT(*) FROM campaign_leads
-                    WHERE campaign_id = :campaign_id
-                ),
-                leads_processed = (
-                    SELECT COUNT(*) FROM campaign_leads
-                    WHERE campaign_id = :campaign_id
-                    AND status IN ('processed', 'exported')
-                ),
-                leads_exported = (
-                    SELECT COUNT(*) FROM campaign_leads
-                    WHERE campaign_id = :campaign_id
-                    AND status = 'exported'
-                ),
-                total_cost_brl = (
-                    SELECT COALESCE(SUM((generation_metadata->>'cost_brl')::numeric), 0)
-                    FROM campaign_leads
-                    WHERE campaign_id = :campaign_id
-                    AND generation_metadata IS NOT NULL
-                ),
-                updated_at = NOW()
-            WHERE id = :campaign_id
-        """)
+        """
+        Atualiza métricas agregadas da campanha.
 
-        conn.execute(query, {"campaign_id": campaign_id})
+        Com os triggers de contadores instalados (campaigns/metrics.py) os
+        valores já foram ajustados pelo próprio statement; sem eles, recontagem
+        completa da campanha.
+        """
+        if metric_triggers_installed(self.engine):
+            return
+
+        recount_campaign_metrics(conn, campaign_id=campaign_id)
 
     def get_campaign_stats(self, campaign_id: int) -> Dict[str, Any]:
         """
@@ -1577,36 +1784,6 @@ class CampaignService:
             logger.error(f"Erro ao resetar leads com erro: {e}")
             raise
 
-    def _update_campaign_cost(self, campaign_id: int, additional_cost: float) -> None:
-        """
-        Atualiza o custo total da campanha somando um valor adicional.
-
-        Args:
-            campaign_id: ID da campanha
-            additional_cost: Custo adicional a ser somado (em BRL)
-        """
-        query = text("""
-            UPDATE campaigns
-            SET
-                total_cost_brl = COALESCE(total_cost_brl, 0) + :additional_cost,
-                updated_at = NOW()
-            WHERE id = :campaign_id
-        """)
-
-        try:
-            with self.engine.connect() as conn:
-                self._set_tenant_context(conn)
-                conn.execute(query, {
-                    "campaign_id": campaign_id,
-                    "additional_cost": additional_cost
-                })
-                conn.commit()
-
-                logger.debug(f"Atualizado custo da campanha {campaign_id}: +R$ {additional_cost:.3f}")
-
-        except Exception as e:
-            logger.error(f"Erro ao atualizar custo da campanha: {e}")
-
     # =========================================================================
     # CICLO DE VIDA DOS LEADS - RESET E REGENERAÇÃO
     # =========================================================================
@@ -1616,7 +1793,8 @@ class CampaignService:
         lead_id: int,
         new_status: LeadStatus = LeadStatus.PROCESSED,
         clear_variables: bool = False,
-        reason: Optional[str] = None
+        reason: Optional[str] = None,
+        regenerate: bool = False
     ) -> bool:
         """
         Reseta o status de um lead, permitindo re-exportação ou reprocessamento.
@@ -1631,6 +1809,8 @@ class CampaignService:
             new_status: Novo status (PENDING, PROCESSED ou EXPORTED)
             clear_variables: Se True, limpa var1, var2, var3 e message_preview
             reason: Motivo do reset (salvo em generation_metadata.reset_history)
+            regenerate: Regeneração manual: a próxima geração ignora o cache LLM
+                        (marca REGENERATE_METADATA_KEY em generation_metadata)
 
         Returns:
             True se atualizado com sucesso
@@ -1678,6 +1858,8 @@ class CampaignService:
             } if clear_variables else None
         })
         current_metadata['reset_history'] = reset_history
+        if regenerate:
+            current_metadata[REGENERATE_METADATA_KEY] = True
 
         updates.append("generation_metadata = CAST(:metadata AS jsonb)")
         params["metadata"] = json.dumps(current_metadata)
@@ -1739,7 +1921,8 @@ class CampaignService:
         campaign_id: int,
         new_status: LeadStatus = LeadStatus.PROCESSED,
         clear_variables: bool = False,
-        reason: Optional[str] = None
+        reason: Optional[str] = None,
+        regenerate: bool = False
     ) -> int:
         """
         Reseta múltiplos leads em lote.
@@ -1750,6 +1933,7 @@ class CampaignService:
             new_status: Novo status
             clear_variables: Se True, limpa variáveis
             reason: Motivo do reset
+            regenerate: Regeneração manual: a próxima geração ignora o cache LLM
 
         Returns:
             Quantidade de leads resetados
@@ -1780,6 +1964,13 @@ class CampaignService:
                 "message_preview = NULL"
             ])
 
+        if regenerate:
+            updates.append(
+                "generation_metadata = jsonb_set("
+                "COALESCE(generation_metadata, '{}'::jsonb), CAST(ARRAY[:regenerate_key] AS TEXT[]), 'true'::jsonb)"
+            )
+            params["regenerate_key"] = REGENERATE_METADATA_KEY
+
         query = text(f"""
             UPDATE campaign_leads
             SET {', '.join(updates)}
@@ -1819,6 +2010,7 @@ class CampaignService:
         Diferente de reset_leads_batch, este método:
         - Sempre volta para PENDING
         - Sempre limpa variáveis
+        - Marca a regeneração: a próxima geração ignora o cache LLM
         - Opcionalmente mantém histórico das variáveis anteriores
 
         Args:
@@ -1832,30 +2024,76 @@ class CampaignService:
         if not lead_ids:
             return 0
 
-        if keep_history:
-            # Precisamos buscar as variáveis atuais antes de limpar
-            # Fazer um por um para manter o histórico
-            count = 0
-            for lead_id in lead_ids:
-                success = self.reset_lead_status(
-                    lead_id=lead_id,
-                    new_status=LeadStatus.PENDING,
-                    clear_variables=True,
-                    reason="Marcado para regeneração de variáveis"
-                )
-                if success:
-                    count += 1
-            return count
-        else:
+        if not keep_history:
             # Pode fazer em batch sem histórico
             return self.reset_leads_batch(
                 lead_ids=lead_ids,
                 campaign_id=campaign_id,
                 new_status=LeadStatus.PENDING,
                 clear_variables=True,
-                reason="Regeneração em lote"
+                reason="Regeneração em lote",
+                regenerate=True
             )
 
+        # Um UPDATE para o lote: o histórico (mesmo formato de reset_lead_status)
+        # é montado no banco a partir dos valores anteriores da linha
+        query = text("""
+            UPDATE campaign_leads
+            SET
+                status = 'pending',
+                processed_at = NULL,
+                var1 = NULL,
+                var2 = NULL,
+                var3 = NULL,
+                message_preview = NULL,
+                generation_metadata = jsonb_set(
+                    jsonb_set(
+                        COALESCE(generation_metadata, '{}'::jsonb),
+                        '{reset_history}',
+                        COALESCE(generation_metadata->'reset_history', '[]'::jsonb) || jsonb_build_array(
+                            jsonb_build_object(
+                                'from_status', status,
+                                'to_status', 'pending',
+                                'cleared_variables', TRUE,
+                                'reason', CAST(:reason AS TEXT),
+                                'timestamp', CAST(:timestamp AS TEXT),
+                                'previous_vars', jsonb_build_object('var1', var1, 'var2', var2, 'var3', var3)
+                            )
+                        )
+                    ),
+                    CAST(ARRAY[:regenerate_key] AS TEXT[]),
+                    'true'::jsonb
+                ),
+                updated_at = NOW()
+            WHERE id = ANY(:lead_ids)
+              AND campaign_id = :campaign_id
+        """)
+
+        try:
+            with self.engine.connect() as conn:
+                self._set_tenant_context(conn)
+                result = conn.execute(query, {
+                    "lead_ids": list(lead_ids),
+                    "campaign_id": campaign_id,
+                    "reason": "Marcado para regeneração de variáveis",
+                    "timestamp": datetime.now().isoformat(),
+                    "regenerate_key": REGENERATE_METADATA_KEY,
+                })
+
+                count = result.rowcount
+
+                if count > 0:
+                    self._update_campaign_metrics(conn, campaign_id)
+
+                conn.commit()
+
+                logger.info(f"Marcados {count} leads para regeneração")
+                return count
+
+        except Exception as e:
+            logger.error(f"Erro ao marcar leads para regeneração: {e}")
+            raise
+
     def get_lead_history(self, lead_id: int) -> List[Dict[str, Any]]:
         """
         Retorna o histórico de resets de um lead.
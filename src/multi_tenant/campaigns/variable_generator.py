@@ -8,8 +8,13 @@ para campanhas de remarketing.
 Funcionalidades:
     - Geração de variáveis {{1}}, {{2}}, {{3}} baseadas em análise prévia
     - Processamento em lote com callback de progresso
+    - Lote concorrente (pool de threads) com callbacks na ordem dos leads
     - Controle de custos e tokens
-    - Rate limiting integrado
+    - Rate limiting integrado (token bucket compartilhado no processo)
+
+Configuração (env):
+    - CAMPAIGN_GENERATION_WORKERS: threads do generate_batch (default: 8; 1 = serial)
+    - CAMPAIGN_GENERATION_RPM: requisições por minuto à OpenAI (default: 400)
 
 Autor: Isaac (via Claude Code)
 Data: 2025-11-26
@@ -17,14 +22,19 @@ Data: 2025-11-26
 
 import json
 import logging
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Callable, Tuple
+from threading import Lock
+from typing import Dict, Any, Iterator, List, Optional, Callable, Tuple
 
 from openai import OpenAI
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from ..utils.llm_cache import LLMResponseCache, get_llm_cache
+from ..utils.rate_limiter import TokenBucket, get_token_bucket
 from .models import (
     Campaign,
     CampaignLead,
@@ -41,13 +51,46 @@ COST_PER_1K_INPUT_TOKENS_USD = 0.00015
 COST_PER_1K_OUTPUT_TOKENS_USD = 0.0006
 USD_TO_BRL = 5.80  # Taxa aproximada
 
+# Prompt de sistema da geração de variáveis
+SYSTEM_PROMPT = "Você é um assistente especializado em remarketing. Responda apenas em JSON válido."
+
+# Namespace no cache de respostas (ver utils.llm_cache)
+CACHE_NAMESPACE = 'campaign_variables'
+
+# Nome do token bucket compartilhado entre geradores do processo (mesma cota OpenAI)
+RATE_LIMIT_BUCKET = 'campaign_variables'
+
+# Defaults de concorrência/taxa (80% do RPM Tier 1 do gpt-4o-mini, como RateLimiter)
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RATE_LIMIT_RPM = 400
+
+# Campos da análise prévia usados no prompt (sem message_compiled)
+LEAD_ANALYSIS_QUERY = """
+    SELECT
+        ca.conversation_id,
+        ca.contact_name,
+        ca.contact_phone,
+        ca.nome_mapeado_bot,
+        ca.mc_last_message_at,
+        ca.tipo_conversa,
+        ca.nivel_interesse,
+        ca.analise_ia,
+        ca.sugestao_disparo,
+        ca.dados_extraidos_ia
+    FROM conversations_analytics ca
+    WHERE ca.tenant_id = :tenant_id
+"""
+
+# Leads submetidos além dos workers em execução (limita trabalho descartado ao interromper)
+SUBMIT_AHEAD_FACTOR = 2
+
 
 class CampaignVariableGenerator:
     """
     Gera variáveis de campanha usando OpenAI GPT-4o-mini.
 
     Esta classe é responsável por:
-    1. Buscar dados de análise prévia do lead (conversas_analytics_ai)
+    1. Buscar dados de análise prévia do lead (conversations_analytics, em lote no generate_batch)
     2. Construir prompt com contexto da campanha
     3. Chamar OpenAI para gerar variáveis personalizadas
     4. Retornar variáveis com metadados de custo
@@ -156,7 +199,9 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         model: str = "gpt-4o-mini",
         temperature: float = 0.7,
         max_tokens: int = 400,
-        rate_limit_rpm: int = 60
+        rate_limit_rpm: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        rate_limiter: Optional[TokenBucket] = None
     ):
         """
         Inicializa o gerador de variáveis.
@@ -169,6 +214,11 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
             temperature: Temperatura para geração (0.0-1.0)
             max_tokens: Máximo de tokens na resposta
             rate_limit_rpm: Limite de requisições por minuto
+                (default: env CAMPAIGN_GENERATION_RPM ou 400)
+            max_workers: Threads do generate_batch
+                (default: env CAMPAIGN_GENERATION_WORKERS ou 8)
+            rate_limiter: Token bucket a usar (default: bucket compartilhado
+                do processo, ver get_token_bucket)
         """
         self.client = OpenAI(api_key=openai_api_key)
         self.engine = engine
@@ -176,13 +226,24 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+
+        if rate_limit_rpm is None:
+            rate_limit_rpm = int(os.getenv('CAMPAIGN_GENERATION_RPM', str(DEFAULT_RATE_LIMIT_RPM)))
+        if max_workers is None:
+            max_workers = int(os.getenv('CAMPAIGN_GENERATION_WORKERS', str(DEFAULT_MAX_WORKERS)))
+
         self.rate_limit_rpm = rate_limit_rpm
+        self.max_workers = max(1, max_workers)
 
-        # Controle de rate limiting
-        self._last_request_time = 0
-        self._min_interval = 60.0 / rate_limit_rpm
+        # Controle de rate limiting (compartilhado entre workers e geradores)
+        self._rate_limiter = rate_limiter or get_token_bucket(RATE_LIMIT_BUCKET, rate_limit_rpm)
 
-        # Estatísticas da sessão
+        # Análises carregadas em lote (prefetch_lead_analyses)
+        self._analyses_lock = Lock()
+        self._prefetched_analyses: Dict[int, Dict[str, Any]] = {}
+
+        # Estatísticas da sessão (atualizadas pelos workers)
+        self._stats_lock = Lock()
         self._stats = {
             "calls": 0,
             "tokens_input": 0,
@@ -190,17 +251,23 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
             "tokens_total": 0,
             "cost_brl": 0.0,
             "errors": 0,
+            "cache_hits": 0,
         }
 
-        logger.info(f"CampaignVariableGenerator inicializado (model={model}, tenant={tenant_id})")
+        logger.info(
+            f"CampaignVariableGenerator inicializado (model={model}, tenant={tenant_id}, "
+            f"workers={self.max_workers}, rpm={rate_limit_rpm})"
+        )
 
     def _wait_rate_limit(self) -> None:
         """Aguarda se necessário para respeitar rate limit"""
-        now = time.time()
-        elapsed = now - self._last_request_time
-        if elapsed < self._min_interval:
-            time.sleep(self._min_interval - elapsed)
-        self._last_request_time = time.time()
+        self._rate_limiter.acquire()
+
+    def _add_stats(self, **deltas) -> None:
+        """Soma valores às estatísticas da sessão (thread-safe)"""
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
 
     def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """
@@ -218,10 +285,108 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         total_usd = input_cost + output_cost
         return round(total_usd * USD_TO_BRL, 6)
 
+    def _build_lead_analysis(self, row) -> Dict[str, Any]:
+        """
+        Converte uma linha de LEAD_ANALYSIS_QUERY no dicionário usado no prompt.
+
+        Args:
+            row: Linha (mapping) de conversations_analytics
+
+        Returns:
+            Dicionário com dados da análise
+        """
+        # Calcular dias de inatividade
+        dias_inativo = 0
+        if row["mc_last_message_at"]:
+            delta = datetime.now() - row["mc_last_message_at"]
+            dias_inativo = delta.days
+
+        # Extrair dados do JSON (dados_extraidos_ia)
+        dados_ia = row["dados_extraidos_ia"] or {}
+        if isinstance(dados_ia, str):
+            try:
+                dados_ia = json.loads(dados_ia)
+            except:
+                dados_ia = {}
+
+        # Formatar objeções como string
+        objecoes = dados_ia.get("objecoes_identificadas", dados_ia.get("objecoes", []))
+        if isinstance(objecoes, list):
+            objecoes = ", ".join(objecoes) if objecoes else "nenhuma identificada"
+
+        return {
+            "contact_name": row["nome_mapeado_bot"] or row["contact_name"] or "Lead",
+            "contact_phone": row["contact_phone"] or "",
+            "tipo_conversa": row["tipo_conversa"] or "não classificada",
+            "interesse": dados_ia.get("interesse_mencionado", dados_ia.get("interesse", "não identificado")),
+            "objetivo": dados_ia.get("objetivo", "não identificado"),
+            "objecoes": objecoes,
+            "contexto_conversa": row["analise_ia"] or dados_ia.get("contexto_resumido", "conversa padrão"),
+            "sugestao_remarketing": row["sugestao_disparo"] or "",
+            "dias_inativo": dias_inativo,
+            "nivel_interesse": row["nivel_interesse"] or "não definido",
+        }
+
+    def prefetch_lead_analyses(self, conversation_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Carrega a análise prévia de vários leads em uma única query.
+
+        O resultado fica guardado no gerador e é usado por _get_lead_analysis
+        (generate_for_lead) sem novo acesso ao banco. generate_batch chama
+        este método para o lote inteiro.
+
+        Args:
+            conversation_ids: IDs das conversas
+
+        Returns:
+            {conversation_id: análise} ({} para conversas não encontradas)
+
+        Example:
+            >>> generator.prefetch_lead_analyses([lead.conversation_id for lead in leads])
+        """
+        ids = sorted({int(cid) for cid in conversation_ids if cid is not None})
+        if not ids:
+            return {}
+
+        query = text(LEAD_ANALYSIS_QUERY + " AND ca.conversation_id = ANY(:conversation_ids)")
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, {
+                "conversation_ids": ids,
+                "tenant_id": self.tenant_id
+            }).mappings().all()
+
+        # Conversas não encontradas ficam vazias (sem nova consulta por lead)
+        analyses = {cid: {} for cid in ids}
+        analyses.update({row["conversation_id"]: self._build_lead_analysis(row) for row in rows})
+
+        with self._analyses_lock:
+            self._prefetched_analyses.update(analyses)
+
+        logger.debug(f"Análises pré-carregadas: {len(rows)}/{len(ids)} conversas")
+        return analyses
+
+    def clear_prefetched_analyses(self, conversation_ids: Optional[List[int]] = None) -> None:
+        """
+        Descarta análises pré-carregadas.
+
+        Args:
+            conversation_ids: Conversas a descartar (None = todas)
+        """
+        with self._analyses_lock:
+            if conversation_ids is None:
+                self._prefetched_analyses.clear()
+            else:
+                for cid in conversation_ids:
+                    self._prefetched_analyses.pop(cid, None)
+
     def _get_lead_analysis(self, conversation_id: int) -> Dict[str, Any]:
         """
         Busca análise prévia do lead em conversations_analytics.
 
+        Usa o resultado de prefetch_lead_analyses quando disponível; senão
+        consulta só esta conversa.
+
         Os dados de análise estão armazenados em:
         - analise_ia: Texto resumido da análise
         - dados_extraidos_ia: JSON com interesse, objeções, etc.
@@ -234,64 +399,23 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         Returns:
             Dicionário com dados da análise
         """
-        query = text("""
-            SELECT
-                ca.contact_name,
-                ca.contact_phone,
-                ca.nome_mapeado_bot,
-                ca.message_compiled,
-                ca.mc_last_message_at,
-                ca.tipo_conversa,
-                ca.nivel_interesse,
-                ca.analise_ia,
-                ca.sugestao_disparo,
-                ca.dados_extraidos_ia
-            FROM conversations_analytics ca
-            WHERE ca.conversation_id = :conversation_id
-              AND ca.tenant_id = :tenant_id
-        """)
+        with self._analyses_lock:
+            analysis = self._prefetched_analyses.get(conversation_id)
+        if analysis is not None:
+            return analysis
+
+        query = text(LEAD_ANALYSIS_QUERY + " AND ca.conversation_id = :conversation_id")
 
         with self.engine.connect() as conn:
-            result = conn.execute(query, {
+            row = conn.execute(query, {
                 "conversation_id": conversation_id,
                 "tenant_id": self.tenant_id
-            })
-            row = result.fetchone()
-
-            if not row:
-                return {}
-
-            # Calcular dias de inatividade
-            dias_inativo = 0
-            if row[4]:  # mc_last_message_at
-                delta = datetime.now() - row[4]
-                dias_inativo = delta.days
-
-            # Extrair dados do JSON (dados_extraidos_ia)
-            dados_ia = row[9] or {}
-            if isinstance(dados_ia, str):
-                try:
-                    dados_ia = json.loads(dados_ia)
-                except:
-                    dados_ia = {}
-
-            # Formatar objeções como string
-            objecoes = dados_ia.get("objecoes_identificadas", dados_ia.get("objecoes", []))
-            if isinstance(objecoes, list):
-                objecoes = ", ".join(objecoes) if objecoes else "nenhuma identificada"
+            }).mappings().fetchone()
 
-            return {
-                "contact_name": row[2] or row[0] or "Lead",  # nome_mapeado_bot ou contact_name
-                "contact_phone": row[1] or "",
-                "tipo_conversa": row[5] or "não classificada",
-                "interesse": dados_ia.get("interesse_mencionado", dados_ia.get("interesse", "não identificado")),
-                "objetivo": dados_ia.get("objetivo", "não identificado"),
-                "objecoes": objecoes,
-                "contexto_conversa": row[7] or dados_ia.get("contexto_resumido", "conversa padrão"),  # analise_ia
-                "sugestao_remarketing": row[8] or "",  # sugestao_disparo
-                "dias_inativo": dias_inativo,
-                "nivel_interesse": row[6] or "não definido",
-            }
+        if not row:
+            return {}
+
+        return self._build_lead_analysis(row)
 
     def _build_prompt(
         self,
@@ -388,7 +512,8 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
     def generate_for_lead(
         self,
         campaign: Campaign,
-        lead: CampaignLead
+        lead: CampaignLead,
+        bypass_cache: Optional[bool] = None
     ) -> Dict[str, Any]:
         """
         Gera variáveis para um lead específico.
@@ -396,6 +521,8 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         Args:
             campaign: Campanha com template e contexto
             lead: Lead a processar
+            bypass_cache: Ignora respostas em cache e chama a OpenAI (a nova
+                resposta substitui a do cache). Default: lead.regeneration_requested
 
         Returns:
             Dicionário com var1, var2, var3, message_preview, metadata
@@ -406,56 +533,75 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         start_time = time.time()
 
         try:
-            # Rate limiting
-            self._wait_rate_limit()
-
             # Buscar análise prévia
             analysis = self._get_lead_analysis(lead.conversation_id)
 
             # Construir prompt
             prompt = self._build_prompt(campaign, lead, analysis)
 
-            # Chamar OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um assistente especializado em remarketing. Responda apenas em JSON válido."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-            )
-
-            # Extrair resposta
-            content = response.choices[0].message.content.strip()
+            # Mesmo prompt já gerado antes (ex: reprocessamento): sem tokens nem
+            # rate limit. Regeneração manual pede outra resposta: não lê o cache
+            if bypass_cache is None:
+                bypass_cache = lead.regeneration_requested
 
-            # Limpar markdown se presente
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-                content = content.strip()
+            cache = get_llm_cache()
+            cache_key = LLMResponseCache.make_key(
+                CACHE_NAMESPACE, self.model, SYSTEM_PROMPT, prompt,
+                temperature=self.temperature, max_tokens=self.max_tokens
+            )
+            variables = None if bypass_cache else cache.get(cache_key)
+            cache_hit = variables is not None
 
-            # Parse JSON
-            variables = json.loads(content)
+            if cache_hit:
+                input_tokens = output_tokens = total_tokens = 0
+                cost_brl = 0.0
+                self._add_stats(cache_hits=1)
+            else:
+                # Rate limiting
+                self._wait_rate_limit()
+
+                # Chamar OpenAI
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                )
+
+                # Extrair resposta
+                content = response.choices[0].message.content.strip()
+
+                # Limpar markdown se presente
+                if content.startswith("```"):
+                    content = content.split("```")[1]
+                    if content.startswith("json"):
+                        content = content[4:]
+                    content = content.strip()
+
+                # Parse JSON
+                variables = json.loads(content)
+                cache.set(cache_key, variables, namespace=CACHE_NAMESPACE, model=self.model)
+
+                # Extrair tokens e calcular custo
+                input_tokens = response.usage.prompt_tokens
+                output_tokens = response.usage.completion_tokens
+                total_tokens = response.usage.total_tokens
+                cost_brl = self._calculate_cost(input_tokens, output_tokens)
+
+                # Atualizar estatísticas
+                self._add_stats(
+                    calls=1,
+                    tokens_input=input_tokens,
+                    tokens_output=output_tokens,
+                    tokens_total=total_tokens,
+                    cost_brl=cost_brl,
+                )
 
-            # Extrair tokens e calcular custo
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = response.usage.total_tokens
-            cost_brl = self._calculate_cost(input_tokens, output_tokens)
             duration = time.time() - start_time
 
-            # Atualizar estatísticas
-            self._stats["calls"] += 1
-            self._stats["tokens_input"] += input_tokens
-            self._stats["tokens_output"] += output_tokens
-            self._stats["tokens_total"] += total_tokens
-            self._stats["cost_brl"] += cost_brl
-
             # Preparar resultado
             var1 = variables.get("var1", self._extract_first_name(lead.contact_name))[:50]
             var2 = variables.get("var2", "")[:150]
@@ -478,6 +624,7 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
                     "cost_brl": cost_brl,
                     "duration_seconds": round(duration, 2),
                     "generated_at": datetime.now().isoformat(),
+                    "cache_hit": cache_hit,
                 }
             }
 
@@ -485,7 +632,7 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
             return result
 
         except json.JSONDecodeError as e:
-            self._stats["errors"] += 1
+            self._add_stats(errors=1)
             logger.error(f"Erro ao parsear JSON da OpenAI para lead {lead.id}: {e}")
             return {
                 "status": LeadStatus.ERROR,
@@ -494,7 +641,7 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
             }
 
         except Exception as e:
-            self._stats["errors"] += 1
+            self._add_stats(errors=1)
             logger.error(f"Erro ao gerar variáveis para lead {lead.id}: {e}")
             return {
                 "status": LeadStatus.ERROR,
@@ -502,29 +649,95 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
                 "metadata": {"error_type": type(e).__name__}
             }
 
+    def _generate_batch_item(self, campaign: Campaign, lead: CampaignLead) -> Dict[str, Any]:
+        """Gera variáveis de um lead do lote, sem propagar exceções"""
+        try:
+            result = self.generate_for_lead(campaign, lead)
+        except Exception as e:
+            logger.error(f"Erro inesperado no batch (lead {lead.id}): {e}")
+            result = {
+                "status": LeadStatus.ERROR,
+                "error_message": str(e),
+            }
+
+        result["lead_id"] = lead.id
+        result["conversation_id"] = lead.conversation_id
+        return result
+
+    def _iter_batch(
+        self,
+        campaign: Campaign,
+        leads: List[CampaignLead],
+        max_workers: int
+    ) -> Iterator[Tuple[int, CampaignLead, Dict[str, Any]]]:
+        """
+        Gera (índice, lead, resultado) na ordem dos leads.
+
+        Com mais de um worker os leads rodam em um pool de threads, com no
+        máximo max_workers * SUBMIT_AHEAD_FACTOR submetidos à frente do
+        resultado aguardado. Ao fechar o iterador (ex: break por erros),
+        os ainda não iniciados são cancelados e os em execução concluem
+        (respostas ficam no cache LLM).
+        """
+        if max_workers <= 1:
+            for i, lead in enumerate(leads):
+                yield i, lead, self._generate_batch_item(campaign, lead)
+            return
+
+        window = max_workers * SUBMIT_AHEAD_FACTOR
+        pending = {}
+        next_index = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="campaign-vars") as executor:
+            try:
+                for i, lead in enumerate(leads):
+                    while next_index < len(leads) and next_index < i + window:
+                        pending[next_index] = executor.submit(
+                            self._generate_batch_item, campaign, leads[next_index]
+                        )
+                        next_index += 1
+
+                    yield i, lead, pending.pop(i).result()
+            finally:
+                for future in pending.values():
+                    future.cancel()
+
     def generate_batch(
         self,
         campaign: Campaign,
         leads: List[CampaignLead],
         on_progress: Optional[Callable[[int, int, CampaignLead], None]] = None,
-        max_errors: int = 5
+        max_errors: int = 5,
+        on_result: Optional[Callable[[int, int, CampaignLead, Dict[str, Any]], None]] = None,
+        max_workers: Optional[int] = None
     ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
         Processa múltiplos leads em lote.
 
+        Os leads são gerados em paralelo (max_workers threads, rate limit
+        compartilhado), mas resultados e callbacks seguem a ordem de `leads`
+        e rodam na thread que chamou generate_batch (seguro para Streamlit).
+
         Args:
             campaign: Campanha com template e contexto
             leads: Lista de leads a processar
             on_progress: Callback (current, total, lead) chamado após cada lead
             max_errors: Máximo de erros consecutivos antes de parar
+            on_result: Callback (current, total, lead, resultado) chamado para
+                cada resultado retornado (inclusive erros)
+            max_workers: Threads simultâneas (default: self.max_workers; 1 = serial)
 
         Returns:
             Tupla (lista de resultados, estatísticas do batch)
+
+        Example:
+            >>> results, stats = generator.generate_batch(campaign, leads, max_workers=8)
         """
         results = []
         consecutive_errors = 0
+        total = len(leads)
         batch_stats = {
-            "total": len(leads),
+            "total": total,
             "processed": 0,
             "errors": 0,
             "cost_brl": 0.0,
@@ -533,12 +746,18 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         }
 
         start_time = time.time()
+        workers = max(1, min(max_workers or self.max_workers, total or 1))
 
-        for i, lead in enumerate(leads):
-            try:
-                result = self.generate_for_lead(campaign, lead)
-                result["lead_id"] = lead.id
-                result["conversation_id"] = lead.conversation_id
+        # Uma query para as análises do lote (falha: cada lead consulta a sua)
+        conversation_ids = [lead.conversation_id for lead in leads]
+        try:
+            self.prefetch_lead_analyses(conversation_ids)
+        except Exception as e:
+            logger.warning(f"Pré-carga das análises falhou, buscando por lead: {e}")
+
+        batch = self._iter_batch(campaign, leads, workers)
+        try:
+            for i, lead, result in batch:
                 results.append(result)
 
                 if result.get("status") == LeadStatus.PROCESSED:
@@ -550,6 +769,9 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
                     batch_stats["errors"] += 1
                     consecutive_errors += 1
 
+                if on_result:
+                    on_result(i + 1, total, lead, result)
+
                 # Verificar limite de erros
                 if consecutive_errors >= max_errors:
                     logger.warning(f"Interrompendo batch: {max_errors} erros consecutivos")
@@ -557,27 +779,17 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
 
                 # Callback de progresso
                 if on_progress:
-                    on_progress(i + 1, len(leads), lead)
-
-            except Exception as e:
-                logger.error(f"Erro inesperado no batch (lead {lead.id}): {e}")
-                consecutive_errors += 1
-                batch_stats["errors"] += 1
-                results.append({
-                    "lead_id": lead.id,
-                    "conversation_id": lead.conversation_id,
-                    "status": LeadStatus.ERROR,
-                    "error_message": str(e),
-                })
-
-                if consecutive_errors >= max_errors:
-                    break
+                    on_progress(i + 1, total, lead)
+        finally:
+            batch.close()
+            self.clear_prefetched_analyses(conversation_ids)
 
         batch_stats["duration_seconds"] = round(time.time() - start_time, 2)
 
         logger.info(
             f"Batch concluído: {batch_stats['processed']}/{batch_stats['total']} processados, "
-            f"{batch_stats['errors']} erros, R$ {batch_stats['cost_brl']:.4f}"
+            f"{batch_stats['errors']} erros, R$ {batch_stats['cost_brl']:.4f} "
+            f"({batch_stats['duration_seconds']}s, {workers} workers)"
         )
 
         return results, batch_stats
@@ -589,18 +801,21 @@ RESPONDA APENAS EM JSON VÁLIDO (sem markdown, sem explicações):
         Returns:
             Dicionário com estatísticas acumuladas
         """
-        return self._stats.copy()
+        with self._stats_lock:
+            return self._stats.copy()
 
     def reset_stats(self) -> None:
         """Reseta estatísticas da sessão"""
-        self._stats = {
-            "calls": 0,
-            "tokens_input": 0,
-            "tokens_output": 0,
-            "tokens_total": 0,
-            "cost_brl": 0.0,
-            "errors": 0,
-        }
+        with self._stats_lock:
+            self._stats = {
+                "calls": 0,
+                "tokens_input": 0,
+                "tokens_output": 0,
+                "tokens_total": 0,
+                "cost_brl": 0.0,
+                "errors": 0,
+                "cache_hits": 0,
+            }
 
     def estimate_batch_cost(self, num_leads: int) -> Dict[str, float]:
         """
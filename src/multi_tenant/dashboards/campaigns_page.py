@@ -23,6 +23,8 @@ from datetime import date, datetime, timedelta
 from pathlib import Path
 import sys
 import json
+import tempfile
+from itertools import islice
 
 # Adicionar src ao path
 src_path = str(Path(__file__).parent.parent.parent)
@@ -42,6 +44,9 @@ from multi_tenant.campaigns import (
     LeadStatus,
 )
 
+# Resultados da geração gravados por statement (service.save_generation_results)
+GENERATION_SAVE_BATCH_SIZE = 50
+
 # ============================================================================
 # CONSTANTES DE DISPLAY
 # ============================================================================
@@ -1567,7 +1572,10 @@ def render_campaign_leads_tab(service: CampaignService, campaign_id: int, stats:
                         st.rerun()
                 elif lead.status in [LeadStatus.PROCESSED, LeadStatus.EXPORTED]:
                     if st.button("🔄", key=f"regen_{lead.id}", help="Regenerar variáveis com IA"):
-                        service.reset_lead_status(lead.id, LeadStatus.PENDING, clear_variables=True, reason="Regeneração manual")
+                        service.reset_lead_status(
+                            lead.id, LeadStatus.PENDING, clear_variables=True,
+                            reason="Regeneração manual", regenerate=True
+                        )
                         st.rerun()
 
             with btn_col2:
@@ -1833,108 +1841,98 @@ def process_leads_with_progress(service: CampaignService, campaign_id: int, camp
     results_container = st.container()
 
     # Estatísticas
-    processed_count = 0
-    error_count = 0
-    total_cost = 0.0
-    total_tokens = 0
+    stats = {'processed': 0, 'errors': 0, 'cost': 0.0, 'tokens': 0}
     start_time = time.time()
 
     # Lista de resultados para exibição
     results_log = []
 
+    status_container.markdown(f"**Progresso:** 0/{total_leads} leads | ⚙️ {generator.max_workers} em paralelo")
+
     # =========================================================================
     # PROCESSAMENTO
     # =========================================================================
-    for i, lead in enumerate(pending_leads):
-        lead_start_time = time.time()
+    # Leads gerados em paralelo (generate_batch); este callback roda na thread
+    # do Streamlit, na ordem dos leads. Resultados são gravados em lote
+    # (um UPDATE a cada GENERATION_SAVE_BATCH_SIZE leads + métricas da campanha)
+    pending_results = []
+
+    def flush_results() -> None:
+        if pending_results:
+            service.save_generation_results(campaign_id, pending_results)
+            pending_results.clear()
+
+    def save_result(done: int, total: int, lead, result: dict) -> None:
+        pending_results.append(result)
+
+        if result.get('status') == LeadStatus.PROCESSED:
+            # Sucesso!
+            metadata = result.get('metadata', {})
+
+            # Atualizar estatísticas
+            stats['processed'] += 1
+            lead_cost = metadata.get('cost_brl', 0.003)
+            lead_tokens = metadata.get('tokens_total', 900)
+            stats['cost'] += lead_cost
+            stats['tokens'] += lead_tokens
+
+            results_log.append({
+                'name': lead.contact_name or 'Lead',
+                'status': 'success',
+                'var1': result.get('var1', ''),
+                'cost': lead_cost
+            })
+
+        else:
+            # Erro na geração
+            error_msg = result.get('error_message', 'Erro desconhecido')
+            stats['errors'] += 1
+            results_log.append({
+                'name': lead.contact_name or 'Lead',
+                'status': 'error',
+                'error': error_msg[:50]
+            })
+
+        if len(pending_results) >= GENERATION_SAVE_BATCH_SIZE:
+            flush_results()
 
         # Atualizar status
         elapsed = time.time() - start_time
-        avg_time_per_lead = elapsed / (i + 1) if i > 0 else 2.5
-        remaining_leads = total_leads - i - 1
-        estimated_remaining = remaining_leads * avg_time_per_lead
+        estimated_remaining = (total - done) * elapsed / done
 
         status_container.markdown(f"""
-        **Progresso:** {i + 1}/{total_leads} leads ({((i + 1) / total_leads * 100):.0f}%)
-        | ✅ {processed_count} processados | ❌ {error_count} erros
+        **Progresso:** {done}/{total} leads ({(done / total * 100):.0f}%)
+        | ✅ {stats['processed']} processados | ❌ {stats['errors']} erros
         | ⏱️ Restante: ~{estimated_remaining:.0f}s
         """)
 
-        current_lead_container.info(f"🔄 Processando: **{lead.contact_name or 'Lead sem nome'}** ({lead.contact_phone})")
+        current_lead_container.info(f"✔️ Último processado: **{lead.contact_name or 'Lead sem nome'}** ({lead.contact_phone})")
 
         # Atualizar progress bar
-        progress_bar.progress((i + 1) / total_leads)
+        progress_bar.progress(done / total)
 
+    try:
+        # max_errors=total: processa todos, como antes (erros ficam registrados por lead)
+        generator.generate_batch(
+            campaign,
+            pending_leads,
+            max_errors=total_leads,
+            on_result=save_result
+        )
+    except Exception as e:
+        st.error(f"❌ Erro no processamento: {str(e)}")
+    finally:
+        # Grava os leads já gerados mesmo se o lote for interrompido
+        # (erro, st.stop/rerun): sem isso o custo já pago seria perdido
         try:
-            # Gerar variáveis com IA
-            result = generator.generate_for_lead(campaign, lead)
-
-            if result.get('status') == LeadStatus.PROCESSED:
-                # Sucesso!
-                var1 = result.get('var1', '')
-                var2 = result.get('var2', '')
-                var3 = result.get('var3', '')
-                metadata = result.get('metadata', {})
-
-                # Gerar preview
-                preview = campaign.template_text
-                preview = preview.replace("{{1}}", var1)
-                preview = preview.replace("{{2}}", var2)
-                preview = preview.replace("{{3}}", var3)
-
-                # Salvar no banco
-                service.update_lead(
-                    lead_id=lead.id,
-                    var1=var1,
-                    var2=var2,
-                    var3=var3,
-                    message_preview=preview,
-                    status=LeadStatus.PROCESSED,
-                    generation_metadata=metadata
-                )
-
-                # Atualizar estatísticas
-                processed_count += 1
-                lead_cost = metadata.get('cost_brl', 0.003)
-                lead_tokens = metadata.get('tokens_total', 900)
-                total_cost += lead_cost
-                total_tokens += lead_tokens
-
-                results_log.append({
-                    'name': lead.contact_name or 'Lead',
-                    'status': 'success',
-                    'var1': var1,
-                    'cost': lead_cost
-                })
-
-            else:
-                # Erro na geração
-                error_msg = result.get('error_message', 'Erro desconhecido')
-                service.update_lead(
-                    lead_id=lead.id,
-                    status=LeadStatus.ERROR,
-                    error_message=error_msg[:200]
-                )
-                error_count += 1
-                results_log.append({
-                    'name': lead.contact_name or 'Lead',
-                    'status': 'error',
-                    'error': error_msg[:50]
-                })
-
+            flush_results()
         except Exception as e:
-            # Erro inesperado
-            service.update_lead(
-                lead_id=lead.id,
-                status=LeadStatus.ERROR,
-                error_message=str(e)[:200]
-            )
-            error_count += 1
-            results_log.append({
-                'name': lead.contact_name or 'Lead',
-                'status': 'error',
-                'error': str(e)[:50]
-            })
+            st.error(f"❌ Erro ao salvar resultados: {str(e)}")
+
+    processed_count = stats['processed']
+    error_count = stats['errors']
+    total_cost = stats['cost']
+    total_tokens = stats['tokens']
 
     # =========================================================================
     # FINALIZAÇÃO
@@ -1946,8 +1944,7 @@ def process_leads_with_progress(service: CampaignService, campaign_id: int, camp
     status_container.empty()
     current_lead_container.empty()
 
-    # Atualizar métricas da campanha
-    service._update_campaign_cost(campaign_id, total_cost)
+    # Métricas da campanha (incluindo custo) já recalculadas por save_generation_results
 
     # =========================================================================
     # RESUMO FINAL
@@ -2025,41 +2022,52 @@ def render_export_tab(service: CampaignService, campaign_id: int, campaign, stat
         return
 
     only_new = st.checkbox("Apenas não exportados", value=False, help="Desmarque para incluir leads já exportados anteriormente")
-    leads = service.get_exportable_leads(campaign_id, only_not_exported=only_new)
+    total = service.count_exportable_leads(campaign_id, only_not_exported=only_new)
 
-    if not leads:
+    if not total:
         st.info("Nenhum lead disponível.")
         return
 
-    st.markdown(f"**{len(leads)}** leads para exportar")
+    st.markdown(f"**{total}** leads para exportar")
 
     with st.expander("👁️ Preview"):
-        for lead in leads[:3]:
+        preview = service.iter_exportable_leads(campaign_id, only_not_exported=only_new, batch_size=3)
+        for lead in islice(preview, 3):
             st.text(f"{lead.contact_phone} | {lead.var1} | {(lead.var2 or '')[:30]}...")
+        preview.close()
 
-    if st.button(f"📥 Gerar CSV ({len(leads)} leads)", type="primary", use_container_width=True):
+    if st.button(f"📥 Gerar CSV ({total} leads)", type="primary", use_container_width=True):
         try:
-            lead_ids = [l.id for l in leads]
+            lead_ids = []
 
-            # Criar exporter e gerar CSV passando os objetos CampaignLead diretamente
-            exporter = CampaignCSVExporter()
-            csv_content, export_stats = exporter.export(leads, campaign)
+            def tracked_leads():
+                # Leads lidos do cursor, escritos um a um (memória constante)
+                for lead in service.iter_exportable_leads(campaign_id, only_not_exported=only_new):
+                    lead_ids.append(lead.id)
+                    yield lead
 
             filename = f"campanha_{campaign.slug}_{datetime.now():%Y%m%d_%H%M}.csv"
 
-            # Registrar exportação no histórico
-            service.register_export(
-                campaign_id=campaign_id,
-                file_name=filename,
-                leads_count=export_stats['exported'],
-                lead_ids=lead_ids,
-                file_size_bytes=export_stats['file_size_bytes']
-            )
+            with tempfile.TemporaryFile() as csv_file:
+                # Gerar CSV direto no arquivo temporário
+                exporter = CampaignCSVExporter()
+                export_stats = exporter.export_to_file(tracked_leads(), csv_file, campaign)
+
+                # Registrar exportação no histórico
+                service.register_export(
+                    campaign_id=campaign_id,
+                    file_name=filename,
+                    leads_count=export_stats['exported'],
+                    lead_ids=lead_ids,
+                    file_size_bytes=export_stats['file_size_bytes']
+                )
+
+                # Marcar leads como exportados
+                service.mark_leads_as_exported(lead_ids, campaign_id)
 
-            # Marcar leads como exportados
-            service.mark_leads_as_exported(lead_ids, campaign_id)
+                csv_file.seek(0)
+                st.download_button("📥 Baixar CSV", csv_file, filename, "text/csv", use_container_width=True)
 
-            st.download_button("📥 Baixar CSV", csv_content, filename, "text/csv", use_container_width=True)
             st.success(f"✅ {export_stats['exported']} leads exportados!")
 
             if export_stats.get('skipped_no_phone', 0) > 0:
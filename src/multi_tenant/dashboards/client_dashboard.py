@@ -21,6 +21,7 @@ from multi_tenant.auth import get_database_engine, logout_user
 from multi_tenant.auth.middleware import clear_session_state, set_rls_context
 from multi_tenant.dashboards.branding import get_tenant_branding, apply_branding, render_header_with_logo
 from multi_tenant.dashboards.campaigns_page import show_campaigns_page
+from multi_tenant.utils.query_cache import get_query_cache, tenant_query_cache
 from app.config import format_number, format_percentage
 
 
@@ -28,18 +29,30 @@ from app.config import format_number, format_percentage
 # QUERIES DE DADOS (COM RLS AUTOMÁTICO)
 # ============================================================================
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+# Colunas pesadas (transcrição e JSON da IA): fora de load_conversations,
+# buscadas sob demanda só para as conversas exibidas (ver load_conversation_details)
+CONVERSATION_DETAIL_COLUMNS = {
+    'conversa_compilada': 'message_compiled',
+    'analise_ia': 'analise_ia',
+    'dados_extraidos_ia': 'dados_extraidos_ia',
+    'metadados_analise_ia': 'metadados_analise_ia',
+}
+
+@tenant_query_cache('conversations', get_database_engine)  # Compartilhado entre sessões, válido até o próximo ETL
 def load_conversations(tenant_id, date_start=None, date_end=None, inbox_filter=None, status_filter=None):
     """
     Carrega conversas do tenant (filtrado automaticamente via RLS)
 
+    Traz apenas colunas escalares (KPIs, gráficos, filtros). Transcrição e
+    análise IA completa ficam em load_conversation_details().
+
     Args:
-        tenant_id: ID do tenant (IMPORTANTE: usado como chave de cache!)
+        tenant_id: ID do tenant (IMPORTANTE: usado como chave de cache e de versão!)
         date_start: Data início do filtro (opcional)
         date_end: Data fim do filtro (opcional)
 
     Returns:
-        pd.DataFrame: Conversas do tenant
+        pd.DataFrame: Conversas do tenant (compartilhado: não alterar in-place)
     """
     # IMPORTANTE: Configurar RLS DENTRO da função para garantir cache correto por tenant
     engine = get_database_engine()
@@ -47,6 +60,8 @@ def load_conversations(tenant_id, date_start=None, date_end=None, inbox_filter=N
 
     # Query base (RLS filtra automaticamente por tenant_id)
     # OTIMIZADO 2025-11-25: Removidas colunas não utilizadas (is_weekday, is_business_hours, contact_email)
+    # OTIMIZADO 2026-10-17: message_compiled/analise_ia/dados_extraidos_ia/metadados_analise_ia
+    #                       carregadas sob demanda (cache não cresce com o tamanho das conversas)
     query = """
         SELECT
             id,
@@ -77,13 +92,10 @@ def load_conversations(tenant_id, date_start=None, date_end=None, inbox_filter=N
             nome_mapeado_bot,
             mc_first_message_at as primeiro_contato,
             mc_last_message_at as ultimo_contato,
-            message_compiled as conversa_compilada,
             tipo_conversa,
-            analise_ia,
+            (analise_ia IS NOT NULL AND analise_ia <> '') as has_analise_ia,
             sugestao_disparo,
             score_prioridade,
-            dados_extraidos_ia,
-            metadados_analise_ia,
             analisado_em
         FROM conversations_analytics
         WHERE 1=1
@@ -120,6 +132,384 @@ def load_conversations(tenant_id, date_start=None, date_end=None, inbox_filter=N
     return df
 
 
+def _query_conversation_details(tenant_id, conversation_ids, columns):
+    """Consulta (sem cache) das colunas pesadas por conversation_id"""
+    if not conversation_ids:
+        return pd.DataFrame(columns=['conversation_id', *columns])
+
+    engine = get_database_engine()
+    set_rls_context(engine, tenant_id, tenant_id)
+
+    select_columns = ", ".join(f"{CONVERSATION_DETAIL_COLUMNS[col]} as {col}" for col in columns)
+    query = f"""
+        SELECT conversation_id, {select_columns}
+        FROM conversations_analytics
+        WHERE tenant_id = :tenant_id
+          AND conversation_id = ANY(:conversation_ids)
+    """
+
+    with engine.connect() as conn:
+        df = pd.read_sql(
+            text(query),
+            conn,
+            params={'tenant_id': tenant_id, 'conversation_ids': [int(cid) for cid in conversation_ids]}
+        )
+
+    return df
+
+
+@st.cache_data(ttl=300, max_entries=50)
+def load_conversation_details(tenant_id, conversation_ids, columns=tuple(CONVERSATION_DETAIL_COLUMNS)):
+    """
+    Carrega colunas pesadas apenas das conversas informadas (ex: página atual)
+
+    Args:
+        tenant_id: ID do tenant (chave de cache)
+        conversation_ids: Tupla de conversation_id (hashable para o cache)
+        columns: Colunas de CONVERSATION_DETAIL_COLUMNS a buscar
+
+    Returns:
+        pd.DataFrame: conversation_id + colunas pedidas
+    """
+    return _query_conversation_details(tenant_id, conversation_ids, columns)
+
+
+def attach_conversation_details(df, tenant_id, columns=tuple(CONVERSATION_DETAIL_COLUMNS)):
+    """
+    Adiciona colunas pesadas a um recorte pequeno do DataFrame (mantém ordem e índice)
+
+    Args:
+        df: Recorte de conversas (ex: página da tabela)
+        tenant_id: ID do tenant
+        columns: Colunas de CONVERSATION_DETAIL_COLUMNS a buscar
+
+    Returns:
+        pd.DataFrame: df com as colunas pedidas
+    """
+    conversation_ids = tuple(sorted(df['conversation_id'].dropna().astype(int).unique().tolist()))
+    details = load_conversation_details(tenant_id, conversation_ids, tuple(columns))
+
+    merged = df.drop(columns=[col for col in columns if col in df.columns]).merge(
+        details, on='conversation_id', how='left'
+    )
+    merged.index = df.index
+    return merged
+
+
+@st.cache_data(ttl=300, max_entries=20)
+def load_conversation_categories(tenant_id, conversation_ids):
+    """
+    Categoriza conversas lendo as transcrições só durante o cálculo
+
+    O cache guarda apenas o resultado agregado (poucas linhas), não o texto.
+
+    Args:
+        tenant_id: ID do tenant (chave de cache)
+        conversation_ids: Tupla de conversation_id
+
+    Returns:
+        pd.DataFrame: Categorias com quantidade, percentual e cor
+    """
+    from app.utils.metrics import calculate_conversation_categories
+
+    details = _query_conversation_details(tenant_id, conversation_ids, ('conversa_compilada',))
+    details = details.rename(columns={'conversa_compilada': 'message_compiled'})
+
+    return calculate_conversation_categories(details, min_threshold=5.0)
+
+
+@tenant_query_cache('daily_rollup', get_database_engine)
+def load_daily_rollup(tenant_id, date_start=None, date_end=None):
+    """
+    Carrega o rollup diário (conversations_daily_rollup) do período
+
+    Poucas centenas de linhas por ano (dia x inbox x período), mantidas
+    pelo ETL. Usado pelos KPIs e gráficos no lugar de agregar em pandas.
+
+    Limitação: economiza a agregação, não a leitura. O dashboard continua
+    carregando as conversas do período (load_conversations) para a tabela
+    de leads e seu export completo, as categorias e a seção de remarketing,
+    e select_rollup confere o rollup contra essas linhas.
+
+    Args:
+        tenant_id: ID do tenant (chave de cache)
+        date_start: Data início do filtro (opcional)
+        date_end: Data fim do filtro (opcional)
+
+    Returns:
+        pd.DataFrame ou None se o rollup não estiver disponível
+    """
+    engine = get_database_engine()
+    set_rls_context(engine, tenant_id, tenant_id)
+
+    query = """
+        SELECT
+            conversation_date,
+            inbox_id,
+            inbox_name,
+            periodo,
+            total_conversas,
+            total_leads,
+            total_sem_resposta,
+            total_visitas,
+            total_crm,
+            total_ia,
+            total_humano,
+            total_resolvidas,
+            response_time_sum,
+            response_time_count,
+            updated_at
+        FROM conversations_daily_rollup
+        WHERE tenant_id = :tenant_id
+    """
+    params = {'tenant_id': tenant_id}
+
+    if date_start:
+        query += " AND conversation_date >= :date_start"
+        params['date_start'] = date_start
+
+    if date_end:
+        query += " AND conversation_date <= :date_end"
+        params['date_end'] = date_end
+
+    try:
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn, params=params)
+    except Exception:
+        # Migration do rollup ainda não aplicada: dashboard agrega em pandas
+        return None
+
+    df['response_time_sum'] = df['response_time_sum'].astype(float)
+    return df
+
+
+# Paginação da tabela de remarketing (keyset: última mensagem DESC, conversation_id DESC)
+REMARKETING_PAGE_SIZE = 20
+
+REMARKETING_ORDER_BY = "mc_last_message_at DESC NULLS LAST, conversation_id DESC"
+
+# Leads prontos para disparo: analisados e com sugestão preenchida
+REMARKETING_READY_CONDITION = """
+    analisado_em IS NOT NULL
+    AND sugestao_disparo IS NOT NULL
+    AND sugestao_disparo <> ''
+"""
+
+
+def _escape_like(value):
+    """Escapa curingas do LIKE (busca parcial literal)"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_remarketing_filters(tenant_id, filters=None, tipo_filter=None, score_min=0):
+    """
+    Monta o WHERE da seção de remarketing (mesmos filtros rápidos do dashboard)
+
+    Args:
+        tenant_id: ID do tenant
+        filters: Dict com date_start, date_end, inbox_name, inbox_names,
+                 contact_name, contact_phone, status_values, classificacao, score_min
+        tipo_filter: Tipos de remarketing (aplicado só à tabela)
+        score_min: Score de prioridade mínimo (aplicado só à tabela)
+
+    Returns:
+        tuple: (where_base, condicao_tabela, params) - a tabela usa
+               where_base AND condicao_tabela
+    """
+    filters = filters or {}
+    conditions = ["tenant_id = :tenant_id", "is_lead = TRUE"]
+    params = {'tenant_id': tenant_id}
+
+    if filters.get('date_start'):
+        conditions.append("conversation_date >= :date_start")
+        params['date_start'] = filters['date_start']
+
+    if filters.get('date_end'):
+        conditions.append("conversation_date <= :date_end")
+        params['date_end'] = filters['date_end']
+
+    if filters.get('inbox_name'):
+        conditions.append("inbox_name = :inbox_name")
+        params['inbox_name'] = filters['inbox_name']
+
+    if filters.get('inbox_names'):
+        conditions.append("inbox_name = ANY(:inbox_names)")
+        params['inbox_names'] = list(filters['inbox_names'])
+
+    if filters.get('contact_name'):
+        conditions.append("contact_name ILIKE :contact_name")
+        params['contact_name'] = f"%{_escape_like(filters['contact_name'])}%"
+
+    if filters.get('contact_phone'):
+        conditions.append("contact_phone LIKE :contact_phone")
+        params['contact_phone'] = f"%{_escape_like(filters['contact_phone'])}%"
+
+    if filters.get('status_values'):
+        conditions.append("status = ANY(:status_values)")
+        params['status_values'] = list(filters['status_values'])
+
+    if filters.get('classificacao'):
+        conditions.append("ai_probability_label = ANY(:classificacao)")
+        params['classificacao'] = list(filters['classificacao'])
+
+    if filters.get('score_min'):
+        conditions.append("ai_probability_score >= :ai_score_min")
+        params['ai_score_min'] = filters['score_min']
+
+    table_conditions = [REMARKETING_READY_CONDITION]
+
+    if tipo_filter:
+        table_conditions.append("tipo_conversa = ANY(:tipo_filter)")
+        params['tipo_filter'] = list(tipo_filter)
+
+    if score_min:
+        table_conditions.append("score_prioridade >= :score_prioridade_min")
+        params['score_prioridade_min'] = score_min
+
+    return " AND ".join(conditions), " AND ".join(table_conditions), params
+
+
+def load_remarketing_summary(tenant_id, filters=None, tipo_filter=None, score_min=0):
+    """
+    Contagens da seção de remarketing calculadas no banco (inatividade via NOW())
+
+    Args:
+        tenant_id: ID do tenant
+        filters: Filtros rápidos (ver build_remarketing_filters)
+        tipo_filter: Tipos de remarketing da tabela
+        score_min: Score de prioridade mínimo da tabela
+
+    Returns:
+        dict: total_leads, analisados, aguardando_24h, ativos, total_prontos
+    """
+    engine = get_database_engine()
+    set_rls_context(engine, tenant_id, tenant_id)
+
+    where_base, table_condition, params = build_remarketing_filters(tenant_id, filters, tipo_filter, score_min)
+
+    query = f"""
+        SELECT
+            COUNT(*) AS total_leads,
+            COUNT(*) FILTER (WHERE analisado_em IS NOT NULL) AS analisados,
+            COUNT(*) FILTER (
+                WHERE analisado_em IS NULL
+                  AND mc_last_message_at <= NOW() - INTERVAL '24 hours'
+            ) AS aguardando_24h,
+            COUNT(*) FILTER (WHERE mc_last_message_at > NOW() - INTERVAL '24 hours') AS ativos,
+            COUNT(*) FILTER (WHERE {table_condition}) AS total_prontos
+        FROM conversations_analytics
+        WHERE {where_base}
+    """
+
+    with engine.connect() as conn:
+        row = conn.execute(text(query), params).mappings().one()
+
+    return {key: int(value or 0) for key, value in row.items()}
+
+
+def load_remarketing_page(tenant_id, filters=None, tipo_filter=None, score_min=0, cursor=None, limit=REMARKETING_PAGE_SIZE):
+    """
+    Carrega uma página de leads prontos para disparo (keyset, custo constante por página)
+
+    Args:
+        tenant_id: ID do tenant
+        filters: Filtros rápidos (ver build_remarketing_filters)
+        tipo_filter: Tipos de remarketing
+        score_min: Score de prioridade mínimo
+        cursor: (ultimo_contato, conversation_id) do último lead da página
+                anterior, ou None para a primeira página
+        limit: Leads por página
+
+    Returns:
+        pd.DataFrame: Leads da página (com horas_inativo calculado no banco)
+    """
+    engine = get_database_engine()
+    set_rls_context(engine, tenant_id, tenant_id)
+
+    where_base, table_condition, params = build_remarketing_filters(tenant_id, filters, tipo_filter, score_min)
+    keyset_condition = _keyset_condition(cursor, params)
+    params['limit'] = limit
+
+    query = f"""
+        SELECT
+            conversation_id,
+            display_id as conversation_display_id,
+            contact_name,
+            contact_phone,
+            tipo_conversa,
+            score_prioridade,
+            sugestao_disparo,
+            analisado_em,
+            mc_last_message_at as ultimo_contato,
+            EXTRACT(EPOCH FROM (NOW() - mc_last_message_at)) / 3600 AS horas_inativo
+        FROM conversations_analytics
+        WHERE {where_base} AND {table_condition}{keyset_condition}
+        ORDER BY {REMARKETING_ORDER_BY}
+        LIMIT :limit
+    """
+
+    with engine.connect() as conn:
+        df = pd.read_sql(text(query), conn, params=params)
+
+    df['horas_inativo'] = df['horas_inativo'].astype(float)
+    return df
+
+
+def seek_remarketing_cursor(tenant_id, page, filters=None, tipo_filter=None, score_min=0, page_size=REMARKETING_PAGE_SIZE):
+    """
+    Localiza o cursor de uma página ainda não visitada (salto direto de página)
+
+    Único caso que usa OFFSET; lê só a chave do índice, sem as colunas da página.
+
+    Returns:
+        tuple ou None: (ultimo_contato, conversation_id) do último lead antes da página
+    """
+    if page <= 1:
+        return None
+
+    engine = get_database_engine()
+    set_rls_context(engine, tenant_id, tenant_id)
+
+    where_base, table_condition, params = build_remarketing_filters(tenant_id, filters, tipo_filter, score_min)
+    params['offset'] = (page - 1) * page_size - 1
+
+    query = f"""
+        SELECT mc_last_message_at, conversation_id
+        FROM conversations_analytics
+        WHERE {where_base} AND {table_condition}
+        ORDER BY {REMARKETING_ORDER_BY}
+        OFFSET :offset
+        LIMIT 1
+    """
+
+    with engine.connect() as conn:
+        row = conn.execute(text(query), params).fetchone()
+
+    return (row[0], int(row[1])) if row else None
+
+
+def _keyset_condition(cursor, params):
+    """Condição "depois do cursor" na ordem mc_last_message_at DESC NULLS LAST, conversation_id DESC"""
+    if cursor is None:
+        return ""
+
+    last_contact, last_id = cursor
+    params['cursor_id'] = int(last_id)
+
+    if last_contact is None or pd.isna(last_contact):
+        # Já nos leads sem data (fim da ordenação)
+        return " AND mc_last_message_at IS NULL AND conversation_id < :cursor_id"
+
+    params['cursor_contact'] = pd.Timestamp(last_contact).to_pydatetime()
+    return """
+        AND (
+            mc_last_message_at < :cursor_contact
+            OR mc_last_message_at IS NULL
+            OR (mc_last_message_at = :cursor_contact AND conversation_id < :cursor_id)
+        )
+    """
+
+
 def get_tenant_info(tenant_id):
     """
     Retorna informações do tenant
@@ -326,6 +716,165 @@ def prepare_leads_by_inbox(df):
     return leads_by_inbox
 
 
+# ----------------------------------------------------------------------------
+# Versões baseadas no rollup diário (mesmo formato de saída das versões pandas)
+# ----------------------------------------------------------------------------
+
+def select_rollup(rollup, df, inbox_names=None):
+    """
+    Recorta o rollup pelas inboxes selecionadas e confere com as linhas carregadas
+
+    Só substitui a agregação em pandas: df (todas as conversas do período)
+    já foi lido para a tabela, as categorias e o remarketing, então o
+    custo de leitura de load_conversations não muda.
+
+    O total de conversas não basta: uma conversa atualizada (ex: virou lead)
+    mantém o total. Cada dia de df precisa ter sido recalculado no rollup
+    depois da última sincronização das suas conversas (synced_at <= updated_at).
+
+    Args:
+        rollup: DataFrame de load_daily_rollup (ou None)
+        df: Conversas já filtradas (para conferência de totais e sincronização)
+        inbox_names: Inboxes selecionadas (None/vazio = todas)
+
+    Returns:
+        pd.DataFrame ou None se o rollup não cobre exatamente as conversas de df
+    """
+    if rollup is None:
+        return None
+
+    if inbox_names:
+        rollup = rollup[rollup['inbox_name'].isin(inbox_names)]
+
+    # Rollup defasado ou sem backfill: usar o cálculo em pandas
+    if int(rollup['total_conversas'].sum()) != len(df):
+        return None
+
+    # Conversas sincronizadas depois do recálculo do dia (ex: falha no
+    # refresh do rollup durante a carga): mesmo total, agregados defasados
+    if not df.empty:
+        day_synced = df.groupby('conversation_date')['synced_at'].max()
+        day_refreshed = rollup.groupby('conversation_date')['updated_at'].min().reindex(day_synced.index)
+        if day_refreshed.isna().any() or (day_synced > day_refreshed).any():
+            return None
+
+    return rollup
+
+
+def prepare_leads_by_day_from_rollup(rollup):
+    """Leads por dia (consolidado) a partir do rollup diário"""
+    leads_by_day = rollup.groupby('conversation_date', as_index=False)['total_leads'].sum()
+    leads_by_day = leads_by_day[leads_by_day['total_leads'] > 0]
+
+    if leads_by_day.empty:
+        return pd.DataFrame(columns=['Data', 'Leads'])
+
+    leads_by_day.columns = ['Data', 'Leads']
+    return leads_by_day.sort_values('Data')
+
+
+def prepare_leads_by_day_with_inbox_from_rollup(rollup):
+    """Leads por dia E por inbox (stacked bar) a partir do rollup diário"""
+    leads_rollup = rollup[rollup['total_leads'] > 0]
+
+    if leads_rollup.empty:
+        return pd.DataFrame()
+
+    leads_grouped = leads_rollup.groupby(['conversation_date', 'inbox_name'], as_index=False)['total_leads'].sum()
+    leads_pivot = leads_grouped.pivot(index='conversation_date', columns='inbox_name', values='total_leads').fillna(0)
+
+    leads_pivot = leads_pivot.reset_index()
+    leads_pivot.rename(columns={'conversation_date': 'Data'}, inplace=True)
+
+    return leads_pivot.sort_values('Data')
+
+
+def prepare_leads_by_inbox_from_rollup(rollup):
+    """Leads por inbox a partir do rollup diário"""
+    leads_by_inbox = rollup.groupby('inbox_name', as_index=False)['total_leads'].sum()
+    leads_by_inbox = leads_by_inbox[leads_by_inbox['total_leads'] > 0]
+
+    if leads_by_inbox.empty:
+        return pd.DataFrame(columns=['Inbox', 'Leads'])
+
+    leads_by_inbox.columns = ['Inbox', 'Leads']
+    return leads_by_inbox.sort_values('Leads', ascending=False)
+
+
+def prepare_period_distribution_from_rollup(rollup):
+    """Distribuição por período do dia a partir do rollup diário"""
+    with_period = rollup[rollup['periodo'] != '']
+    period_dist = with_period.groupby('periodo', as_index=False)['total_conversas'].sum()
+    period_dist = period_dist[period_dist['total_conversas'] > 0]
+
+    if period_dist.empty:
+        return pd.DataFrame(columns=['Período', 'Quantidade'])
+
+    period_dist.columns = ['Período', 'Quantidade']
+
+    period_order = {'Manhã': 1, 'Tarde': 2, 'Noite': 3, 'Madrugada': 4}
+    period_dist['_order'] = period_dist['Período'].map(period_order).fillna(99)
+    return period_dist.sort_values('_order').drop('_order', axis=1)
+
+
+def prepare_inbox_metrics_from_rollup(rollup):
+    """
+    Métricas agregadas e por inbox a partir do rollup diário
+    (mesmo retorno de prepare_inbox_metrics)
+    """
+    if rollup.empty:
+        return {}, pd.DataFrame()
+
+    totals = rollup[[
+        'total_conversas', 'total_leads', 'total_sem_resposta', 'total_visitas',
+        'total_crm', 'response_time_sum', 'response_time_count'
+    ]].sum()
+
+    total_conversas = int(totals['total_conversas'])
+    total_leads = int(totals['total_leads'])
+    total_sem_resposta = int(totals['total_sem_resposta'])
+    total_crm = int(totals['total_crm'])
+
+    metrics_agregadas = {
+        'total_conversas': total_conversas,
+        'total_leads': total_leads,
+        'total_sem_resposta': total_sem_resposta,
+        'taxa_sem_resposta': (total_sem_resposta / total_leads * 100) if total_leads > 0 else 0,
+        'total_visitas': int(totals['total_visitas']),
+        'total_crm': total_crm,
+        'taxa_conversao_leads': (total_leads / total_conversas * 100) if total_conversas > 0 else 0,
+        'taxa_conversao_crm': (total_crm / total_leads * 100) if total_leads > 0 else 0,
+        'avg_response_time': (
+            totals['response_time_sum'] / totals['response_time_count']
+            if totals['response_time_count'] > 0 else float('nan')
+        )
+    }
+
+    inbox_groups = rollup.groupby('inbox_name', as_index=False)[[
+        'total_conversas', 'total_leads', 'total_visitas', 'total_crm',
+        'response_time_sum', 'response_time_count', 'total_sem_resposta'
+    ]].sum()
+
+    inbox_groups['avg_response_time'] = (
+        inbox_groups['response_time_sum'] / inbox_groups['response_time_count'].where(inbox_groups['response_time_count'] > 0)
+    )
+    inbox_groups = inbox_groups[[
+        'inbox_name', 'total_conversas', 'total_leads', 'total_visitas', 'total_crm',
+        'avg_response_time', 'total_sem_resposta'
+    ]]
+
+    # Calcular taxas de conversão
+    conversas = inbox_groups['total_conversas']
+    leads = inbox_groups['total_leads']
+    inbox_groups['taxa_leads'] = (leads / conversas.where(conversas > 0) * 100).fillna(0)
+    inbox_groups['taxa_sem_resposta'] = (inbox_groups['total_sem_resposta'] / leads.where(leads > 0) * 100).fillna(0)
+    inbox_groups['taxa_crm'] = (inbox_groups['total_crm'] / leads.where(leads > 0) * 100).fillna(0)
+
+    inbox_groups = inbox_groups.sort_values('total_conversas', ascending=False)
+
+    return metrics_agregadas, inbox_groups
+
+
 def prepare_numeric_score_distribution(df):
     """
     Prepara dados de distribuição de score numérico (0-5) para gráfico
@@ -441,7 +990,7 @@ def prepare_period_distribution(df):
     return period_dist
 
 
-def prepare_conversation_categories(df):
+def prepare_conversation_categories(df, tenant_id):
     """
     Prepara dados de categorização de conversas
     [NOVO - 2025-11-19]
@@ -450,26 +999,23 @@ def prepare_conversation_categories(df):
     para categorizar conversas por tipo (Preços, Agendamentos, etc.)
 
     Args:
-        df: DataFrame com conversas (deve conter conversa_compilada)
+        df: DataFrame com conversas (deve conter conversation_id)
+        tenant_id: ID do tenant (transcrições buscadas sob demanda)
 
     Returns:
         pd.DataFrame: Categorias com quantidade, percentual e cor
     """
-    if df.empty or 'conversa_compilada' not in df.columns:
+    if df.empty:
         return pd.DataFrame(columns=['categoria', 'quantidade', 'percentual', 'cor'])
 
     # Importar função de categorização
     import sys
     import os
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-    from app.utils.metrics import calculate_conversation_categories
 
     try:
-        # IMPORTANTE: Renomear coluna para compatibilidade com metrics.py
-        df_for_categorization = df.copy()
-        df_for_categorization['message_compiled'] = df_for_categorization['conversa_compilada']
-
-        categories = calculate_conversation_categories(df_for_categorization, min_threshold=5.0)
+        conversation_ids = tuple(sorted(df['conversation_id'].dropna().astype(int).unique().tolist()))
+        categories = load_conversation_categories(tenant_id, conversation_ids)
         return categories
     except Exception as e:
         logger.error(f"Erro ao categorizar conversas: {e}")
@@ -549,7 +1095,7 @@ def prepare_csv_export(df):
     return csv_buffer.getvalue()
 
 
-def prepare_ai_analysis_csv_export(df):
+def prepare_ai_analysis_csv_export(df, tenant_id):
     """
     Prepara dados para exportação CSV de leads com análise IA completa
     [NOVO - 2025-11-24]
@@ -560,6 +1106,7 @@ def prepare_ai_analysis_csv_export(df):
 
     Args:
         df: DataFrame com conversas
+        tenant_id: ID do tenant (analise_ia buscada só para os leads exportados)
 
     Returns:
         str: CSV formatado como string, ou None se não houver dados
@@ -575,8 +1122,7 @@ def prepare_ai_analysis_csv_export(df):
 
     # Filtrar leads com análise IA E sugestão de disparo (ambos preenchidos)
     leads_with_ai = leads_df[
-        (leads_df['analise_ia'].notna()) &
-        (leads_df['analise_ia'] != '') &
+        (leads_df['has_analise_ia'] == True) &
         (leads_df['sugestao_disparo'].notna()) &
         (leads_df['sugestao_disparo'] != '')
     ].copy()
@@ -584,6 +1130,8 @@ def prepare_ai_analysis_csv_export(df):
     if leads_with_ai.empty:
         return None
 
+    leads_with_ai = attach_conversation_details(leads_with_ai, tenant_id, columns=('analise_ia',))
+
     # Selecionar colunas essenciais (mais diretas)
     export_df = leads_with_ai[[
         'conversation_display_id',
@@ -690,13 +1238,14 @@ def render_kpis(metrics, total_leads_no_filter=None):
     # Data: 2025-11-11 (pós-apresentação)
 
 
-def render_leads_chart(leads_by_day, df_full=None):
+def render_leads_chart(leads_by_day, df_full=None, leads_by_day_inbox=None):
     """
     Renderiza gráfico de leads por dia (consolidado ou por inbox)
 
     Args:
         leads_by_day: DataFrame com leads agrupados por dia (consolidado)
         df_full: DataFrame completo com todas conversas (para split por inbox)
+        leads_by_day_inbox: Split por inbox já calculado (ex: rollup diário)
     """
     if leads_by_day.empty:
         st.info("ℹ️ Nenhum lead para exibir no período selecionado")
@@ -895,12 +1444,14 @@ def render_leads_chart(leads_by_day, df_full=None):
 
     else:
         # MODO POR INBOX: Stacked bar chart colorido 🎨
-        if df_full is None or df_full.empty:
+        if leads_by_day_inbox is not None:
+            leads_inbox_full = leads_by_day_inbox.copy()
+        elif df_full is None or df_full.empty:
             st.warning("⚠️ Dados completos não disponíveis para visualização por inbox")
             return
-
-        # Preparar dados por inbox
-        leads_inbox_full = prepare_leads_by_day_with_inbox(df_full)
+        else:
+            # Preparar dados por inbox
+            leads_inbox_full = prepare_leads_by_day_with_inbox(df_full)
 
         if leads_inbox_full.empty:
             st.info("ℹ️ Nenhum lead para exibir")
@@ -1279,17 +1830,23 @@ def format_conversation_readable(message_compiled_json, contact_name="Lead"):
     return "\n".join(formatted_lines) if formatted_lines else "Conversa vazia"
 
 
-def render_conversation_modal(conversation_id, message_compiled, contact_name):
+def render_conversation_modal(conversation_id, message_compiled, contact_name, tenant_id=None):
     """
     Renderiza modal expandido com conversa completa
 
     Args:
         conversation_id: ID da conversa
-        message_compiled: JSONB com todas as mensagens
+        message_compiled: JSONB com todas as mensagens (None = buscar sob demanda)
         contact_name: Nome do contato
+        tenant_id: ID do tenant (necessário para buscar a conversa sob demanda)
     """
     import json
 
+    if message_compiled is None and tenant_id is not None:
+        details = load_conversation_details(tenant_id, (int(conversation_id),), ('conversa_compilada',))
+        if not details.empty:
+            message_compiled = details.iloc[0]['conversa_compilada']
+
     with st.expander(f"💬 Conversa Completa - {contact_name} (ID: {conversation_id})"):
         # CORREÇÃO: Mesma lógica de format_message_preview()
         # Verificar tipo ANTES de usar pd.isna()
@@ -1456,7 +2013,7 @@ def prepare_inbox_metrics(df):
     return metrics_agregadas, inbox_groups
 
 
-def render_inbox_analysis(df):
+def render_inbox_analysis(df, rollup=None):
     """
     Renderiza seção de Análise por Inbox (FASE 5)
 
@@ -1466,6 +2023,7 @@ def render_inbox_analysis(df):
 
     Args:
         df: DataFrame com conversas
+        rollup: Rollup diário já recortado (opcional, evita agregar df)
     """
     st.markdown("# 📬 Análise por Inbox")
 
@@ -1474,7 +2032,10 @@ def render_inbox_analysis(df):
         return
 
     # Preparar dados
-    metrics_agregadas, inbox_metrics = prepare_inbox_metrics(df)
+    if rollup is not None:
+        metrics_agregadas, inbox_metrics = prepare_inbox_metrics_from_rollup(rollup)
+    else:
+        metrics_agregadas, inbox_metrics = prepare_inbox_metrics(df)
 
     # Toggle entre visão agregada e separada
     view_mode = st.radio(
@@ -1625,7 +2186,7 @@ def render_inbox_analysis(df):
                         st.caption(f"⏱️ Tempo Resp: {time_str}")
 
 
-def render_leads_table(df, df_original, tenant_name, date_start, date_end):
+def render_leads_table(df, df_original, tenant_name, date_start, date_end, tenant_id):
     """
     Renderiza tabela de leads genérica (multi-tenant)
 
@@ -1635,6 +2196,7 @@ def render_leads_table(df, df_original, tenant_name, date_start, date_end):
         tenant_name: Nome do tenant (para nome do arquivo)
         date_start: Data início (para nome do arquivo)
         date_end: Data fim (para nome do arquivo)
+        tenant_id: ID do tenant (conversas da página buscadas sob demanda)
     """
     # Header com botão de exportação
     col1, col2 = st.columns([3, 1])
@@ -1817,8 +2379,11 @@ def render_leads_table(df, df_original, tenant_name, date_start, date_end):
     # Calcular offset
     offset = (st.session_state.leads_page - 1) * LEADS_PER_PAGE
 
-    # Paginar os dados
+    # Paginar os dados (conversa/análise IA buscadas só para a página)
     leads_paginated = leads_df.iloc[offset:offset + LEADS_PER_PAGE].copy()
+    leads_paginated = attach_conversation_details(
+        leads_paginated, tenant_id, columns=('conversa_compilada', 'analise_ia')
+    )
 
     # === HEADER COM PAGINAÇÃO ===
     col_info, col_nav = st.columns([3, 2])
@@ -1954,122 +2519,75 @@ def render_leads_table(df, df_original, tenant_name, date_start, date_end):
 # ANÁLISE DE REMARKETING [FASE 8]
 # ============================================================================
 
-def calculate_inactivity_hours(ultimo_contato):
-    """
-    Calcula horas de inatividade desde última mensagem
-
-    Args:
-        ultimo_contato: Timestamp da última mensagem
-
-    Returns:
-        float: Horas de inatividade (ou None se não disponível)
+def format_inactivity_times(horas):
     """
-    if pd.isna(ultimo_contato):
-        return None
-
-    now = datetime.now()
-    if isinstance(ultimo_contato, str):
-        ultimo_contato = pd.to_datetime(ultimo_contato)
-
-    delta = now - ultimo_contato
-    return delta.total_seconds() / 3600
-
-
-def format_inactivity_time(horas):
-    """
-    Formata tempo de inatividade de forma legível
+    Formata o tempo de inatividade de forma legível (Series inteira de uma vez)
 
     Args:
-        horas: Horas de inatividade
+        horas: Series com horas de inatividade
 
     Returns:
-        str: Tempo formatado (ex: "2d 5h", "1sem")
+        pd.Series: Tempos formatados (ex: "5h", "2d 5h", "1sem", "2mes", "-")
     """
-    if pd.isna(horas) or horas is None:
-        return "-"
+    horas = pd.to_numeric(horas, errors='coerce')
+    formatted = pd.Series('-', index=horas.index, dtype=object)
+    valid = horas.notna()
+    h = horas.fillna(0)
+
+    under_day = valid & (h < 24)
+    under_week = valid & (h >= 24) & (h < 168)
+    under_month = valid & (h >= 168) & (h < 720)
+    months = valid & (h >= 720)
+
+    formatted[under_day] = h[under_day].astype(int).astype(str) + 'h'
+    formatted[under_week] = (
+        (h[under_week] // 24).astype(int).astype(str) + 'd ' +
+        (h[under_week] % 24).astype(int).astype(str) + 'h'
+    )
+    formatted[under_month] = (h[under_month] // 168).astype(int).astype(str) + 'sem'
+    formatted[months] = (h[months] // 720).astype(int).astype(str) + 'mes'
 
-    if horas < 24:
-        return f"{int(horas)}h"
-    elif horas < 168:  # < 7 dias
-        dias = int(horas // 24)
-        horas_rest = int(horas % 24)
-        return f"{dias}d {horas_rest}h"
-    elif horas < 720:  # < 30 dias
-        semanas = int(horas // 168)
-        return f"{semanas}sem"
-    else:  # 30+ dias
-        meses = int(horas // 720)
-        return f"{meses}mes"
+    return formatted
 
 
-def get_remarketing_status_badge(row):
+def add_remarketing_badges(leads):
     """
-    Retorna badge de status de análise de remarketing
+    Adiciona colunas de exibição aos leads de uma página (operações vetorizadas)
 
     Args:
-        row: Linha do DataFrame com dados do lead
+        leads: DataFrame da página (analisado_em, horas_inativo, tipo_conversa, score_prioridade)
 
     Returns:
-        str: Badge formatado
+        pd.DataFrame: Cópia com status_badge, tipo_badge, inatividade_formatada e score_visual
     """
-    # Lead com análise completa
-    if pd.notna(row.get('analisado_em')):
-        return '✅ Analisado'
+    leads = leads.copy()
+    horas = pd.to_numeric(leads['horas_inativo'], errors='coerce')
 
-    # Calcular horas de inatividade
-    horas_inativo = calculate_inactivity_hours(row.get('ultimo_contato'))
-
-    if horas_inativo is None:
-        return '⚠️ Sem data'
-
-    # Lead inativo 24h+ (aguardando análise)
-    if horas_inativo >= 24:
-        return '⏳ Aguardando Análise'
-
-    # Lead ativo (<24h)
-    horas_restantes = int(24 - horas_inativo)
-    return f'🔄 Ativo (análise em {horas_restantes}h)'
-
-
-def format_tipo_remarketing_badge(tipo):
-    """
-    Formata tipo de remarketing como badge colorido
-
-    Args:
-        tipo: Tipo de remarketing
+    status = pd.Series(
+        '🔄 Ativo (análise em ' + (24 - horas.fillna(0)).astype(int).astype(str) + 'h)',
+        index=leads.index,
+        dtype=object
+    )
+    status[horas >= 24] = '⏳ Aguardando Análise'
+    status[horas.isna()] = '⚠️ Sem data'
+    status[leads['analisado_em'].notna()] = '✅ Analisado'
+    leads['status_badge'] = status
 
-    Returns:
-        str: Badge formatado
-    """
-    badges = {
+    leads['tipo_badge'] = leads['tipo_conversa'].map({
         'REMARKETING_RECENTE': '🟢 Recente (24-48h)',
         'REMARKETING_MEDIO': '🟡 Médio (48h-7d)',
         'REMARKETING_FRIO': '🔴 Frio (7d+)',
-    }
-    return badges.get(tipo, '-')
+    }).fillna('-')
 
+    leads['inatividade_formatada'] = format_inactivity_times(horas)
 
-def format_score_numerico(score):
-    """
-    Formata score de prioridade como número (0-5)
-
-    Args:
-        score: Score de 0 a 5
-
-    Returns:
-        str: Score numérico formatado ou '-' se inválido
-    """
-    if pd.isna(score) or score is None:
-        return '-'
+    score = pd.to_numeric(leads['score_prioridade'], errors='coerce').fillna(-1).astype(int)
+    leads['score_visual'] = score.astype(str).where(score.between(0, 5), '-')
 
-    score = int(score)
-    if score < 0 or score > 5:
-        return '-'
+    return leads
 
-    return str(score)
 
-
-def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
+def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant', filters=None):
     """
     Renderiza seção de Análise de Remarketing (FASE 8)
 
@@ -2080,10 +2598,14 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
     - Botões de disparo (individual, selecionados, todos)
     - Expanders sincronizados com página atual
 
+    Contagens, filtros, inatividade e paginação são feitos no banco
+    (keyset): cada página busca só os seus leads, independente do total.
+
     Args:
         df: DataFrame com conversas (já filtrado)
         tenant_id: ID do tenant
         tenant_slug: Slug do tenant (para nome do arquivo CSV)
+        filters: Filtros rápidos ativos (ver build_remarketing_filters)
     """
     st.markdown("# 🤖 Análise de Remarketing")
 
@@ -2091,48 +2613,15 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
         st.info("ℹ️ Nenhum dado disponível para análise de remarketing")
         return
 
-    # Filtrar apenas leads
-    leads_df = df[df['is_lead'] == True].copy()
-
-    if leads_df.empty:
+    if not (df['is_lead'] == True).any():
         st.info("ℹ️ Nenhum lead encontrado no período selecionado")
         return
 
-    # Calcular tempo de inatividade para todos os leads
-    leads_df['horas_inativo'] = leads_df['ultimo_contato'].apply(calculate_inactivity_hours)
-
-    # Classificar leads
-    analisados = len(leads_df[leads_df['analisado_em'].notna()])
-    aguardando_24h = len(leads_df[(leads_df['horas_inativo'] >= 24) & (leads_df['analisado_em'].isna())])
-    ativos = len(leads_df[leads_df['horas_inativo'] < 24])
-
     # === LAYOUT COMPACTO: CARDS + GRÁFICO === [OTIMIZADO - 2025-11-24]
-    # Coluna 1 (30%): Cards de resumo de análise de remarketing
+    # Coluna 1 (30%): Cards de resumo de análise de remarketing (preenchida após os filtros)
     # Coluna 2 (70%): Gráfico de distribuição de scores
     col_cards, col_graph = st.columns([0.3, 0.7])
 
-    with col_cards:
-        st.markdown("**📊 Análise de Remarketing**")
-        st.caption("Leads inativos 24h+")
-
-        st.metric(
-            "✅ Analisados",
-            format_number(analisados),
-            help="Leads inativos 24h+ com análise de remarketing"
-        )
-
-        st.metric(
-            "⏳ Aguardando 24h",
-            format_number(aguardando_24h),
-            help="Leads inativos 24h+ sem análise (serão analisados no próximo ETL)"
-        )
-
-        st.metric(
-            "🔄 Ativos",
-            format_number(ativos),
-            help="Leads com última msg < 24h (janela de follow-up manual)"
-        )
-
     with col_graph:
         # === GRÁFICO DE DISTRIBUIÇÃO DE SCORES === [MOVIDO - 2025-11-24]
         numeric_score_dist = prepare_numeric_score_distribution(df)
@@ -2149,7 +2638,7 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
 
     with col_export_btn:
         # Preparar dados de export
-        ai_csv_data = prepare_ai_analysis_csv_export(df)
+        ai_csv_data = prepare_ai_analysis_csv_export(df, tenant_id)
         if ai_csv_data:
             # Gerar nome do arquivo
             from datetime import datetime
@@ -2202,6 +2691,32 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
             help="Filtrar por score de prioridade (0 = todos, 1-5 = mínimo)"
         )
 
+    # === CONTAGENS NO BANCO (uma query, inatividade via NOW()) ===
+    summary = load_remarketing_summary(tenant_id, filters, tipo_filter, score_filter)
+    aguardando_24h = summary['aguardando_24h']
+
+    with col_cards:
+        st.markdown("**📊 Análise de Remarketing**")
+        st.caption("Leads inativos 24h+")
+
+        st.metric(
+            "✅ Analisados",
+            format_number(summary['analisados']),
+            help="Leads inativos 24h+ com análise de remarketing"
+        )
+
+        st.metric(
+            "⏳ Aguardando 24h",
+            format_number(aguardando_24h),
+            help="Leads inativos 24h+ sem análise (serão analisados no próximo ETL)"
+        )
+
+        st.metric(
+            "🔄 Ativos",
+            format_number(summary['ativos']),
+            help="Leads com última msg < 24h (janela de follow-up manual)"
+        )
+
     with col_btn:
         # Botão "Analisar Pendentes" (futuro - FASE 8.4)
         if aguardando_24h > 0:
@@ -2214,59 +2729,65 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
         else:
             st.success("✅ Todos os leads inativos (24h+) foram analisados!")
 
-    # === APLICAR FILTROS ===
-    leads_display = leads_df.copy()
-
-    # Filtro por tipo
-    if tipo_filter:
-        leads_display = leads_display[leads_display['tipo_conversa'].isin(tipo_filter)]
-
-    # Filtro por score mínimo
-    if score_filter > 0:
-        leads_display = leads_display[leads_display['score_prioridade'] >= score_filter]
-
-    # === FILTRAR APENAS LEADS ANALISADOS COM SUGESTÃO DE DISPARO ===
     # IMPORTANTE: Só exibir leads que têm sugestão (prontos para disparo)
-    leads_analisados = leads_display[
-        (leads_display['analisado_em'].notna()) &
-        (leads_display['sugestao_disparo'].notna()) &
-        (leads_display['sugestao_disparo'] != '')
-    ].copy()
+    total_leads = summary['total_prontos']
 
-    if leads_analisados.empty:
+    if total_leads == 0:
         st.info("ℹ️ Nenhum lead com sugestão de disparo encontrado")
         return
 
-    # Ordenar por inatividade (mais recentes primeiro)
-    leads_analisados = leads_analisados.sort_values('ultimo_contato', ascending=False)
+    # === PAGINAÇÃO (keyset) ===
+    # remarketing_cursors[página] = (ultimo_contato, conversation_id) do último
+    # lead da página anterior. Mudou filtro: volta para a página 1.
+    LEADS_PER_PAGE = REMARKETING_PAGE_SIZE
+    total_pages = (total_leads + LEADS_PER_PAGE - 1) // LEADS_PER_PAGE
 
-    # Adicionar colunas formatadas
-    leads_analisados['status_badge'] = leads_analisados.apply(get_remarketing_status_badge, axis=1)
-    leads_analisados['tipo_badge'] = leads_analisados['tipo_conversa'].apply(format_tipo_remarketing_badge)
-    leads_analisados['inatividade_formatada'] = leads_analisados['horas_inativo'].apply(format_inactivity_time)
-    leads_analisados['score_visual'] = leads_analisados['score_prioridade'].apply(format_score_numerico)
+    filters_signature = (
+        tenant_id,
+        tuple(sorted((key, str(value)) for key, value in (filters or {}).items())),
+        tuple(tipo_filter),
+        score_filter,
+    )
+    if st.session_state.get('remarketing_filters_signature') != filters_signature:
+        st.session_state.remarketing_filters_signature = filters_signature
+        st.session_state.remarketing_cursors = {1: None}
+        st.session_state.remarketing_page = 1
 
-    # === PAGINAÇÃO ===
     # Inicializar estado de paginação
     if 'remarketing_page' not in st.session_state:
         st.session_state.remarketing_page = 1
 
-    # Configuração
-    LEADS_PER_PAGE = 20
-    total_leads = len(leads_analisados)
-    total_pages = (total_leads + LEADS_PER_PAGE - 1) // LEADS_PER_PAGE
-
     # Garantir que página está dentro dos limites
     if st.session_state.remarketing_page > total_pages and total_pages > 0:
         st.session_state.remarketing_page = total_pages
     if st.session_state.remarketing_page < 1:
         st.session_state.remarketing_page = 1
 
-    # Calcular offset
-    offset = (st.session_state.remarketing_page - 1) * LEADS_PER_PAGE
+    current_page = st.session_state.remarketing_page
+    cursors = st.session_state.remarketing_cursors
+
+    if current_page not in cursors:
+        # Salto direto para página não visitada
+        cursors[current_page] = seek_remarketing_cursor(
+            tenant_id, current_page, filters, tipo_filter, score_filter, LEADS_PER_PAGE
+        )
 
-    # Paginar
-    leads_paginated = leads_analisados.iloc[offset:offset + LEADS_PER_PAGE].copy()
+    offset = (current_page - 1) * LEADS_PER_PAGE
+
+    leads_paginated = load_remarketing_page(
+        tenant_id, filters, tipo_filter, score_filter, cursor=cursors[current_page], limit=LEADS_PER_PAGE
+    )
+
+    if len(leads_paginated) == LEADS_PER_PAGE:
+        last = leads_paginated.iloc[-1]
+        cursors[current_page + 1] = (last['ultimo_contato'], int(last['conversation_id']))
+
+    # Badges só da página (vetorizado) + análise IA completa da página
+    leads_paginated = add_remarketing_badges(leads_paginated)
+    leads_paginated = attach_conversation_details(
+        leads_paginated, tenant_id, columns=('analise_ia', 'dados_extraidos_ia', 'metadados_analise_ia')
+    )
+    page_rows = leads_paginated.to_dict('records')
 
     # Inicializar seleção global (persiste entre páginas)
     if 'selected_remarketing_leads' not in st.session_state:
@@ -2338,7 +2859,7 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
         st.divider()
 
         # === LINHAS DA TABELA ===
-        for idx, row in leads_paginated.iterrows():
+        for row in page_rows:
             col_check, col_id, col_nome, col_tel, col_tipo, col_inativ, col_score, col_analise, col_sugestao = st.columns([0.4, 0.7, 1.5, 1.2, 1.5, 0.8, 0.6, 2, 1.5])
 
             conv_id = row['conversation_id']
@@ -2439,7 +2960,7 @@ def render_remarketing_analysis_section(df, tenant_id, tenant_slug='tenant'):
     with tab2:
         st.info(f"📋 Mostrando análise detalhada dos **{len(leads_paginated)}** leads da página atual")
 
-        for idx, row in leads_paginated.iterrows():
+        for row in page_rows:
             with st.expander(
                 f"💬 {row['contact_name']} (ID: #{row['conversation_display_id']}) - Score: {row['score_visual']}/5",
                 expanded=False
@@ -2724,8 +3245,8 @@ def show_client_dashboard(session, tenant_id=None):
         # Resetar seleções de remarketing
         if 'selected_remarketing_leads' in st.session_state:
             st.session_state.selected_remarketing_leads = set()
-        # IMPORTANTE: Limpar cache do Streamlit para forçar reload dos dados
-        st.cache_data.clear()
+        # Cache de queries é por tenant + versão do ETL: não é preciso limpar
+        # (st.cache_data.clear() descartava o cache de todas as sessões)
         # Atualizar tenant atual
         st.session_state.last_viewed_tenant_id = display_tenant_id
 
@@ -2834,10 +3355,31 @@ def show_client_dashboard(session, tenant_id=None):
     # Usar DataFrame filtrado para o restante do dashboard
     df = df_filtered
 
+    # === ROLLUP DIÁRIO === [FASE 9.5]
+    # KPIs e gráficos leem o agregado mantido pelo ETL. Filtros por contato,
+    # status, classificação ou score só existem nas linhas: nesses casos
+    # (ou sem rollup disponível) os agregados são calculados em pandas.
+    # As linhas (df_original) continuam sendo carregadas: tabela de leads,
+    # export completo, categorias e remarketing dependem delas. O rollup
+    # evita a agregação, não a leitura.
+    rollup = None
+    row_level_filters = (
+        st.session_state.filter_nome or
+        st.session_state.filter_telefone or
+        st.session_state.filter_status_list or
+        st.session_state.filter_classificacao or
+        st.session_state.filter_score_min > 0
+    )
+    if not row_level_filters:
+        inbox_names = list(st.session_state.filter_inboxes)
+        if selected_inbox_name != "Todas as Inboxes":
+            inbox_names = [name for name in inbox_names if name == selected_inbox_name] if inbox_names else [selected_inbox_name]
+        rollup = select_rollup(load_daily_rollup(display_tenant_id, date_start, date_end), df, inbox_names)
+
     # === ANÁLISE POR INBOX (MÉTRICAS CONSOLIDADAS) === [FASE 5]
     # NOTA: Removida duplicação de KPIs - métricas agora aparecem apenas
     #       na seção "Métricas Consolidadas" dentro da Análise por Inbox
-    render_inbox_analysis(df)
+    render_inbox_analysis(df, rollup=rollup)
 
     st.divider()
 
@@ -2845,8 +3387,12 @@ def show_client_dashboard(session, tenant_id=None):
     st.markdown("# 📊 Análise de Leads")
 
     # Linha 1: Leads por dia (largura completa)
-    leads_by_day = prepare_leads_by_day(df)
-    render_leads_chart(leads_by_day, df_full=df)
+    if rollup is not None:
+        leads_by_day = prepare_leads_by_day_from_rollup(rollup)
+        render_leads_chart(leads_by_day, leads_by_day_inbox=prepare_leads_by_day_with_inbox_from_rollup(rollup))
+    else:
+        leads_by_day = prepare_leads_by_day(df)
+        render_leads_chart(leads_by_day, df_full=df)
 
     st.divider()
 
@@ -2855,29 +3401,42 @@ def show_client_dashboard(session, tenant_id=None):
     col1, col2 = st.columns(2)
 
     with col1:
-        leads_by_inbox = prepare_leads_by_inbox(df)
+        leads_by_inbox = prepare_leads_by_inbox_from_rollup(rollup) if rollup is not None else prepare_leads_by_inbox(df)
         render_leads_by_inbox_chart(leads_by_inbox)
 
     with col2:
         # === CATEGORIAS DE CONVERSAS === [NOVO - 2025-11-19]
-        categories_data = prepare_conversation_categories(df)
+        categories_data = prepare_conversation_categories(df, display_tenant_id)
         render_categories_chart(categories_data)
 
     st.divider()
 
     # === DISTRIBUIÇÃO POR PERÍODO === [FASE 5.5 - NOVO]
-    period_dist = prepare_period_distribution(df)
+    period_dist = prepare_period_distribution_from_rollup(rollup) if rollup is not None else prepare_period_distribution(df)
     render_period_distribution_chart(period_dist)
 
     st.divider()
 
     # === TABELA DE LEADS ===
-    render_leads_table(df, df_original, tenant_name, date_start, date_end)
+    render_leads_table(df, df_original, tenant_name, date_start, date_end, display_tenant_id)
 
     st.divider()
 
     # === ANÁLISE DE REMARKETING === [FASE 8 - NOVO]
-    render_remarketing_analysis_section(df, display_tenant_id, session['tenant_slug'])
+    # Mesmos filtros rápidos, aplicados no banco (tabela paginada por keyset)
+    status_map_filter = {"Aberta": 0, "Resolvida": 1, "Pendente": 2}
+    remarketing_filters = {
+        'date_start': date_start,
+        'date_end': date_end,
+        'inbox_name': selected_inbox_name if selected_inbox_name != "Todas as Inboxes" else None,
+        'inbox_names': list(st.session_state.filter_inboxes),
+        'contact_name': st.session_state.filter_nome,
+        'contact_phone': st.session_state.filter_telefone,
+        'status_values': [status_map_filter[s] for s in st.session_state.filter_status_list if s in status_map_filter],
+        'classificacao': list(st.session_state.filter_classificacao),
+        'score_min': st.session_state.filter_score_min,
+    }
+    render_remarketing_analysis_section(df, display_tenant_id, session['tenant_slug'], filters=remarketing_filters)
 
     st.divider()
 
@@ -2895,6 +3454,13 @@ def show_client_dashboard(session, tenant_id=None):
             st.write(f"**Inboxes:** {len(tenant_info['inbox_ids']) if tenant_info else 0}")
             st.write(f"**Período:** {date_start.strftime('%d/%m/%Y')} - {date_end.strftime('%d/%m/%Y')}")
 
+        cache_stats = get_query_cache().get_stats()
+        st.caption(
+            f"Cache de dados: {cache_stats['hit_rate']:.0f}% hits "
+            f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}) | "
+            f"{cache_stats['entries']} entradas, {cache_stats['size_mb']:.1f}/{cache_stats['max_mb']:.0f} MB"
+        )
+
 
 # ============================================================================
 # TESTES LOCAIS
@@ -27,13 +27,14 @@ Autor: Isaac (via Claude Code)
 Data: 2025-11-09
 """
 
-from .base_analyzer import BaseAnalyzer, AnalyzerFactory
+from .base_analyzer import BaseAnalyzer, AnalyzerFactory, ANALYSIS_COLUMNS
 from .regex_analyzer import RegexAnalyzer, add_lead_analysis
 from .openai_analyzer import OpenAIAnalyzer, add_openai_analysis
 
 __all__ = [
     'BaseAnalyzer',
     'AnalyzerFactory',
+    'ANALYSIS_COLUMNS',
     'RegexAnalyzer',
     'OpenAIAnalyzer',
     'add_lead_analysis',
@@ -0,0 +1,266 @@
+"""
+Adaptive Concurrency Limiter - ETL V4 Multi-Tenant
+===================================================
+
+Controle de concorrência AIMD (Additive Increase / Multiplicative Decrease)
+para chamadas assíncronas à OpenAI:
+
+- Sucesso: limite sobe ~1 requisição por "janela" (+1/limite por resposta)
+- 429: limite cai pela metade e todas as requisições pausam pelo retry-after
+- Headers x-ratelimit-remaining-*: quando a folga da cota fica abaixo de
+  HEADROOM_RATIO, o limite recua antes de tomar 429
+
+Fase: ETL V5 - Async OpenAI
+Data: 2026-10-17
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Folga mínima da cota (remaining/limit) antes de reduzir a concorrência
+HEADROOM_RATIO = 0.1
+
+# Espera padrão em 429 sem header de retry (segundos)
+DEFAULT_RETRY_AFTER = 2.0
+
+# Formato dos headers x-ratelimit-reset-*: "20ms", "1s", "6m0s", "1h2m3.5s"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Converte duração no formato da OpenAI ("6m0s", "20ms") em segundos.
+
+    Args:
+        value: Valor do header
+
+    Returns:
+        Segundos ou None se vazio/inválido
+
+    Example:
+        >>> parse_duration('1m30s')
+        90.0
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+
+    return float(sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts))
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Extrai o tempo de espera (segundos) dos headers de uma resposta 429.
+
+    Ordem: retry-after-ms, retry-after (segundos ou data HTTP),
+    x-ratelimit-reset-requests / x-ratelimit-reset-tokens (o maior).
+
+    Args:
+        headers: Headers da resposta
+
+    Returns:
+        Segundos ou None se nenhum header presente
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    resets = [
+        parse_duration(headers.get('x-ratelimit-reset-requests')),
+        parse_duration(headers.get('x-ratelimit-reset-tokens')),
+    ]
+    resets = [reset for reset in resets if reset is not None]
+
+    return max(resets) if resets else None
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limita requisições em voo com ajuste AIMD.
+
+    Uso (dentro de um event loop):
+        limiter = AdaptiveConcurrencyLimiter(initial=5, max_limit=50)
+
+        await limiter.acquire()
+        try:
+            raw = await client.chat.completions.with_raw_response.create(...)
+            limiter.record_success(raw.headers)
+        except RateLimitError as e:
+            delay = limiter.record_rate_limit(e.response.headers)
+        finally:
+            await limiter.release()
+    """
+
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 50,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        Args:
+            initial: Concorrência inicial
+            min_limit: Concorrência mínima
+            max_limit: Concorrência máxima
+            decrease_factor: Fator multiplicativo aplicado em 429
+        """
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+
+        # Vários 429 da mesma janela contam como um único decréscimo
+        self._decrease_blocked_until = 0.0
+        self._condition = asyncio.Condition()
+
+        self.stats = {
+            'rate_limited': 0,
+            'decreases': 0,
+            'peak_limit': int(self.limit),
+        }
+
+    @property
+    def current_limit(self) -> int:
+        """Número máximo de requisições em voo neste momento"""
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        """Aguarda vaga (respeitando pausas de retry-after) e ocupa um slot"""
+        async with self._condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                if self.in_flight < self.current_limit:
+                    break
+
+                await self._condition.wait()
+
+            self.in_flight += 1
+
+    async def release(self):
+        """Libera o slot e acorda quem está esperando (o limite pode ter mudado)"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record_success(self, headers: Optional[Mapping[str, str]] = None):
+        """
+        Registra resposta bem-sucedida e ajusta o limite.
+
+        Args:
+            headers: Headers da resposta (x-ratelimit-*)
+        """
+        if headers and self._quota_is_low(headers):
+            self._decrease()
+
+            if _header_int(headers, 'x-ratelimit-remaining-requests') == 0:
+                self._pause(parse_duration(headers.get('x-ratelimit-reset-requests')))
+            return
+
+        # Additive increase: ~+1 após `limit` respostas
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.stats['peak_limit'] = max(self.stats['peak_limit'], self.current_limit)
+
+    def record_rate_limit(self, headers: Optional[Mapping[str, str]] = None) -> float:
+        """
+        Registra um 429: reduz o limite e pausa todas as requisições.
+
+        Args:
+            headers: Headers da resposta 429
+
+        Returns:
+            float: Segundos de espera aplicados (retry-after)
+        """
+        self.stats['rate_limited'] += 1
+
+        delay = parse_retry_after(headers)
+        if delay is None:
+            delay = DEFAULT_RETRY_AFTER
+
+        self._decrease(block_seconds=delay)
+        self._pause(delay)
+
+        return delay
+
+    def _quota_is_low(self, headers: Mapping[str, str]) -> bool:
+        for kind in ('requests', 'tokens'):
+            remaining = _header_int(headers, f'x-ratelimit-remaining-{kind}')
+            total = _header_int(headers, f'x-ratelimit-limit-{kind}')
+
+            if remaining is not None and total and remaining < total * HEADROOM_RATIO:
+                return True
+
+        return False
+
+    def _decrease(self, block_seconds: float = 1.0):
+        now = time.monotonic()
+        if now < self._decrease_blocked_until:
+            return
+
+        previous = self.current_limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._decrease_blocked_until = now + block_seconds
+        self.stats['decreases'] += 1
+
+        logger.info(f"Concorrência OpenAI reduzida: {previous} → {self.current_limit}")
+
+    def _pause(self, seconds: Optional[float]):
+        if seconds:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
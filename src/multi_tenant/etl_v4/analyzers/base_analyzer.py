@@ -23,6 +23,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Colunas de conversations_analytics escritas por analyze_dataframe (qualquer analyzer).
+# O loader não regrava estas colunas quando a análise foi pulada (entrada inalterada).
+ANALYSIS_COLUMNS = (
+    'is_lead',
+    'visit_scheduled',
+    'crm_converted',
+    'ai_probability_label',
+    'ai_probability_score',
+    'nome_mapeado_bot',
+    'analise_ia',
+    'sugestao_disparo',
+    'precisa_remarketing',
+    'status_resolucao',
+    'nivel_interesse',
+    'dados_extraidos_ia',
+)
+
 
 class BaseAnalyzer(ABC):
     """
@@ -31,6 +48,10 @@ class BaseAnalyzer(ABC):
     Todos os analyzers (Regex, OpenAI, etc) devem implementar esta interface.
     """
 
+    # Colunas do DataFrame que influenciam o resultado da análise.
+    # Usadas pelo transformer para calcular analysis_input_hash.
+    INPUT_COLUMNS = ('message_compiled',)
+
     def __init__(self, tenant_id: int):
         """
         Inicializa o analyzer.
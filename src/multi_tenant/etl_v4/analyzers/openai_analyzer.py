@@ -18,14 +18,17 @@ Data: 2025-11-09
 import os
 import json
 import time
+import asyncio
 import logging
 from datetime import datetime
 from typing import Dict, Optional, List, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError
 
 from .base_analyzer import BaseAnalyzer
+from .adaptive_limiter import AdaptiveConcurrencyLimiter
+from ...utils.llm_cache import LLMResponseCache, get_llm_cache
 
 # Configurar logging
 logging.basicConfig(
@@ -46,11 +49,29 @@ class OpenAIAnalyzer(BaseAnalyzer):
     # Modelo padrão (pode ser sobrescrito por tenant config)
     DEFAULT_MODEL = 'gpt-4o-mini'
 
+    # Namespace no cache de respostas (ver utils.llm_cache)
+    CACHE_NAMESPACE = 'etl_analyzer'
+
+    # Colunas enviadas no prompt (ver analyze_dataframe)
+    INPUT_COLUMNS = ('message_compiled', 'contact_name', 'contact_messages_count')
+
     # Retry config
     MAX_RETRIES = 3
     RETRY_DELAY = 2  # segundos
 
-    def __init__(self, tenant_id: int, api_key: str, model: Optional[str] = None):
+    # Modo assíncrono (AsyncOpenAI + concorrência adaptativa AIMD)
+    MAX_RATE_LIMIT_RETRIES = 8  # 429 não contam em MAX_RETRIES
+    INITIAL_CONCURRENCY = 5
+    DEFAULT_MAX_CONCURRENCY = 50
+
+    def __init__(
+        self,
+        tenant_id: int,
+        api_key: str,
+        model: Optional[str] = None,
+        async_mode: Optional[bool] = None,
+        max_concurrency: Optional[int] = None
+    ):
         """
         Inicializa o OpenAI Analyzer.
 
@@ -58,6 +79,10 @@ class OpenAIAnalyzer(BaseAnalyzer):
             tenant_id: ID do tenant
             api_key: OpenAI API key
             model: Modelo a usar (default: gpt-4o-mini)
+            async_mode: Usar AsyncOpenAI com concorrência adaptativa em analyze_dataframe
+                (default: env OPENAI_ASYNC_MODE ou False)
+            max_concurrency: Teto de requisições simultâneas no modo async
+                (default: env OPENAI_MAX_CONCURRENCY ou 50)
 
         Raises:
             ValueError: Se api_key não fornecida
@@ -71,6 +96,16 @@ class OpenAIAnalyzer(BaseAnalyzer):
         self.model = model or self.DEFAULT_MODEL
         self.client = OpenAI(api_key=self.api_key)
 
+        if async_mode is None:
+            async_mode = os.getenv('OPENAI_ASYNC_MODE', 'false').lower() == 'true'
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('OPENAI_MAX_CONCURRENCY', str(self.DEFAULT_MAX_CONCURRENCY)))
+
+        self.async_mode = async_mode
+        self.max_concurrency = max_concurrency
+        self.async_client = None  # criado por lote em _analyze_rows_async_main
+        self.limiter_stats = {}
+
         # Estatísticas de uso
         self.stats = {
             'total_calls': 0,
@@ -78,9 +113,11 @@ class OpenAIAnalyzer(BaseAnalyzer):
             'failed_calls': 0,
             'total_tokens': 0,
             'fallback_to_default': 0,
+            'cache_hits': 0,
         }
 
-        logger.info(f"OpenAIAnalyzer inicializado - Modelo: {self.model}")
+        logger.info(f"OpenAIAnalyzer inicializado - Modelo: {self.model}"
+                    f"{' (async)' if self.async_mode else ''}")
 
     def _get_analysis_prompt(self) -> str:
         """
@@ -322,8 +359,55 @@ Retorne APENAS o JSON, sem texto adicional antes ou depois."""
         Returns:
             Dict com análise completa (compatível com BaseAnalyzer)
         """
-        # Resultado default
-        result = {
+        message_text = self._prepare_message_text(message_text)
+        if message_text is None:
+            return self._default_result()
+
+        # Chamar OpenAI com retry
+        analysis = self._call_openai_with_retry(
+            conversation_text=message_text,
+            contact_name=contact_name or "Lead",
+            message_count=message_count or 0
+        )
+
+        return self._finish_analysis(analysis)
+
+    async def analyze_conversation_async(
+        self,
+        limiter: AdaptiveConcurrencyLimiter,
+        message_text: Optional[str],
+        contact_name: Optional[str] = None,
+        message_count: Optional[int] = None
+    ) -> Dict[str, any]:
+        """
+        Versão assíncrona de analyze_conversation (usa AsyncOpenAI).
+
+        Args:
+            limiter: Limitador de concorrência compartilhado pelo lote
+            message_text: Texto compilado da conversa
+            contact_name: Nome do contato (para contexto)
+            message_count: Número de mensagens (para contexto)
+
+        Returns:
+            Dict com análise completa (compatível com BaseAnalyzer)
+        """
+        message_text = self._prepare_message_text(message_text)
+        if message_text is None:
+            return self._default_result()
+
+        analysis = await self._call_openai_async(
+            limiter,
+            conversation_text=message_text,
+            contact_name=contact_name or "Lead",
+            message_count=message_count or 0
+        )
+
+        return self._finish_analysis(analysis)
+
+    @staticmethod
+    def _default_result() -> Dict[str, any]:
+        """Resultado default (conversa sem texto ou falha na API)"""
+        return {
             'is_lead': False,
             'visit_scheduled': False,
             'crm_converted': False,
@@ -334,33 +418,33 @@ Retorne APENAS o JSON, sem texto adicional antes ou depois."""
             'sugestao_disparo': '',
         }
 
+    def _prepare_message_text(self, message_text: Optional[str]) -> Optional[str]:
+        """
+        Valida e sanitiza o texto da conversa.
+
+        Returns:
+            Texto pronto para envio ou None se não deve ser analisado
+        """
         # Validar entrada
         if not message_text or not isinstance(message_text, str):
             logger.warning(f"Texto de mensagem vazio ou inválido para tenant {self.tenant_id}")
-            return result
+            return None
 
         # SANITIZAR texto de entrada (remover NULL bytes antes de enviar para OpenAI)
         message_text = self._sanitize_text(message_text)
 
         if len(message_text) < 10:
             logger.debug(f"Texto muito curto ({len(message_text)} chars), retornando default")
-            return result
-
-        # Preparar contexto
-        contact_info = contact_name or "Lead"
-        msg_count = message_count or 0
+            return None
 
-        # Chamar OpenAI com retry
-        analysis = self._call_openai_with_retry(
-            conversation_text=message_text,
-            contact_name=contact_info,
-            message_count=msg_count
-        )
+        return message_text
 
+    def _finish_analysis(self, analysis: Optional[Dict]) -> Dict[str, any]:
+        """Converte a resposta da OpenAI (ou a falha) no resultado final"""
         if not analysis:
             logger.warning(f"Falha na análise OpenAI para tenant {self.tenant_id}, retornando default")
             self.stats['failed_calls'] += 1
-            return result
+            return self._default_result()
 
         # Processar resposta OpenAI
         result = self._process_openai_response(analysis)
@@ -385,29 +469,19 @@ Retorne APENAS o JSON, sem texto adicional antes ou depois."""
         Returns:
             Dict com análise ou None em caso de erro
         """
-        user_message = f"""NOME DO LEAD: {contact_name}
-TOTAL DE MENSAGENS DO LEAD: {message_count}
+        request = self._build_request(conversation_text, contact_name, message_count)
 
-CONVERSA COMPLETA:
-{conversation_text}
-
-Analise esta conversa e retorne o JSON com as informações solicitadas."""
+        cache_key = self._cache_key(request)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
 
         for attempt in range(self.MAX_RETRIES):
             try:
                 self.stats['total_calls'] += 1
 
                 # Chamar OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self._get_analysis_prompt()},
-                        {"role": "user", "content": user_message}
-                    ],
-                    temperature=0.3,  # Baixa temperatura para consistência
-                    max_tokens=1500,
-                    response_format={"type": "json_object"}  # Força JSON
-                )
+                response = self.client.chat.completions.create(**request)
 
                 # Extrair resposta
                 content = response.choices[0].message.content
@@ -418,6 +492,7 @@ Analise esta conversa e retorne o JSON com as informações solicitadas."""
                     self.stats['total_tokens'] += response.usage.total_tokens
 
                 logger.debug(f"OpenAI API call sucesso (tentativa {attempt + 1}/{self.MAX_RETRIES})")
+                get_llm_cache().set(cache_key, analysis, namespace=self.CACHE_NAMESPACE, model=self.model)
                 return analysis
 
             except json.JSONDecodeError as e:
@@ -435,6 +510,131 @@ Analise esta conversa e retorne o JSON com as informações solicitadas."""
         logger.error(f"Falha após {self.MAX_RETRIES} tentativas para tenant {self.tenant_id}")
         return None
 
+    def _build_request(self, conversation_text: str, contact_name: str, message_count: int) -> Dict:
+        """
+        Monta os parâmetros de chat.completions.create para uma conversa.
+
+        Args:
+            conversation_text: Texto da conversa
+            contact_name: Nome do contato
+            message_count: Número de mensagens
+
+        Returns:
+            Dict de kwargs para a API
+        """
+        user_message = f"""NOME DO LEAD: {contact_name}
+TOTAL DE MENSAGENS DO LEAD: {message_count}
+
+CONVERSA COMPLETA:
+{conversation_text}
+
+Analise esta conversa e retorne o JSON com as informações solicitadas."""
+
+        return {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": self._get_analysis_prompt()},
+                {"role": "user", "content": user_message}
+            ],
+            'temperature': 0.3,  # Baixa temperatura para consistência
+            'max_tokens': 1500,
+            'response_format': {"type": "json_object"}  # Força JSON
+        }
+
+    def _cache_key(self, request: Dict) -> str:
+        """Chave do cache: modelo + mensagens (prompt de sistema e conversa) + parâmetros"""
+        params = {k: v for k, v in request.items() if k not in ('model', 'messages')}
+        return LLMResponseCache.make_key(self.CACHE_NAMESPACE, request['model'], request['messages'], **params)
+
+    def _get_cached(self, cache_key: str) -> Optional[Dict]:
+        """Busca análise no cache de respostas (sem custo de tokens/latência)"""
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            logger.debug(f"Análise servida do cache para tenant {self.tenant_id}")
+        return cached
+
+    async def _call_openai_async(
+        self,
+        limiter: AdaptiveConcurrencyLimiter,
+        conversation_text: str,
+        contact_name: str,
+        message_count: int
+    ) -> Optional[Dict]:
+        """
+        Chama OpenAI (async) com retry e controle de rate limit.
+
+        - 429: respeita retry-after e reduz a concorrência (não conta em MAX_RETRIES)
+        - 429 insufficient_quota: desiste imediatamente (cota esgotada)
+        - Outros erros: retry com RETRY_DELAY, até MAX_RETRIES
+
+        Args:
+            limiter: Limitador de concorrência compartilhado
+            conversation_text: Texto da conversa
+            contact_name: Nome do contato
+            message_count: Número de mensagens
+
+        Returns:
+            Dict com análise ou None em caso de erro
+        """
+        request = self._build_request(conversation_text, contact_name, message_count)
+
+        cache_key = self._cache_key(request)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+
+        attempt = 0
+        rate_limited = 0
+
+        while attempt < self.MAX_RETRIES and rate_limited <= self.MAX_RATE_LIMIT_RETRIES:
+            retry_delay = 0.0
+
+            await limiter.acquire()
+            try:
+                self.stats['total_calls'] += 1
+
+                raw = await self.async_client.chat.completions.with_raw_response.create(**request)
+                limiter.record_success(raw.headers)
+                response = raw.parse()
+
+                analysis = json.loads(response.choices[0].message.content)
+
+                # Rastrear tokens
+                if getattr(response, 'usage', None):
+                    self.stats['total_tokens'] += response.usage.total_tokens
+
+                get_llm_cache().set(cache_key, analysis, namespace=self.CACHE_NAMESPACE, model=self.model)
+                return analysis
+
+            except RateLimitError as e:
+                if getattr(e, 'code', None) == 'insufficient_quota':
+                    logger.error(f"Cota OpenAI esgotada para tenant {self.tenant_id}: {e}")
+                    return None
+
+                rate_limited += 1
+                delay = limiter.record_rate_limit(e.response.headers if e.response is not None else None)
+                logger.warning(f"Rate limit OpenAI (429 #{rate_limited}) - aguardando {delay:.1f}s, "
+                               f"concorrência {limiter.current_limit}")
+
+            except json.JSONDecodeError as e:
+                attempt += 1
+                logger.warning(f"Erro JSON (tentativa {attempt}/{self.MAX_RETRIES}): {e}")
+
+            except Exception as e:
+                attempt += 1
+                logger.error(f"Erro OpenAI (tentativa {attempt}/{self.MAX_RETRIES}): {e}")
+                retry_delay = self.RETRY_DELAY
+
+            finally:
+                await limiter.release()
+
+            if retry_delay and attempt < self.MAX_RETRIES:
+                await asyncio.sleep(retry_delay)
+
+        logger.error(f"Falha após {attempt} tentativas e {rate_limited} rate limits para tenant {self.tenant_id}")
+        return None
+
     def _sanitize_text(self, text: str) -> str:
         """
         Remove NULL bytes e caracteres inválidos para PostgreSQL.
@@ -680,51 +880,10 @@ Analise esta conversa e retorne o JSON com as informações solicitadas."""
 
         start_time = time.time()
 
-        # PROCESSAMENTO PARALELO - 5 workers simultâneos
-        logger.info(f"🚀 Iniciando processamento PARALELO com 5 workers...")
-
-        results_list = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            # Criar futures para cada conversa
-            future_to_idx = {
-                executor.submit(
-                    self.analyze_conversation,
-                    message_text=row.get('message_compiled', None),
-                    contact_name=row.get('contact_name', None),
-                    message_count=row.get('contact_messages_count', 0)
-                ): idx
-                for idx, row in df_to_analyze.iterrows()
-            }
-
-            # Processar resultados conforme completam
-            completed = 0
-            for future in as_completed(future_to_idx):
-                idx = future_to_idx[future]
-                try:
-                    result = future.result(timeout=30)  # 30s timeout por conversa
-                    results_list.append((idx, result))
-                    completed += 1
-
-                    # Log progresso a cada 10 conversas
-                    if completed % 10 == 0:
-                        elapsed = time.time() - start_time
-                        rate = completed / elapsed if elapsed > 0 else 0
-                        eta = (to_process - completed) / rate if rate > 0 else 0
-                        logger.info(f"  ⏳ {completed}/{to_process} ({completed/to_process*100:.1f}%) - "
-                                  f"{rate:.1f} conv/s - ETA: {eta/60:.1f} min")
-                except Exception as e:
-                    logger.error(f"Erro ao processar conversa {idx}: {e}")
-                    # Resultado default em caso de erro
-                    results_list.append((idx, {
-                        'is_lead': False,
-                        'visit_scheduled': False,
-                        'crm_converted': False,
-                        'ai_probability_label': 'N/A',
-                        'ai_probability_score': 0.0,
-                        'nome_mapeado_bot': '',
-                        'analise_ia': '',
-                        'sugestao_disparo': '',
-                    }))
+        if self.async_mode:
+            results_list = self._analyze_rows_async(df_to_analyze, start_time)
+        else:
+            results_list = self._analyze_rows_threaded(df_to_analyze, start_time)
 
         # Ordenar resultados pelo índice original
         results_list.sort(key=lambda x: x[0])
@@ -785,6 +944,122 @@ Analise esta conversa e retorne o JSON com as informações solicitadas."""
 
         return df_final
 
+    def _analyze_rows_threaded(self, df_to_analyze: pd.DataFrame, start_time: float) -> List[Tuple]:
+        """
+        Analisa as conversas com o cliente síncrono em um pool de 5 threads.
+
+        Returns:
+            Lista de (índice, resultado)
+        """
+        to_process = len(df_to_analyze)
+
+        # PROCESSAMENTO PARALELO - 5 workers simultâneos
+        logger.info(f"🚀 Iniciando processamento PARALELO com 5 workers...")
+
+        results_list = []
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            # Criar futures para cada conversa
+            future_to_idx = {
+                executor.submit(
+                    self.analyze_conversation,
+                    message_text=row.get('message_compiled', None),
+                    contact_name=row.get('contact_name', None),
+                    message_count=row.get('contact_messages_count', 0)
+                ): idx
+                for idx, row in df_to_analyze.iterrows()
+            }
+
+            # Processar resultados conforme completam
+            completed = 0
+            for future in as_completed(future_to_idx):
+                idx = future_to_idx[future]
+                try:
+                    result = future.result(timeout=30)  # 30s timeout por conversa
+                    results_list.append((idx, result))
+                    completed += 1
+
+                    # Log progresso a cada 10 conversas
+                    if completed % 10 == 0:
+                        elapsed = time.time() - start_time
+                        rate = completed / elapsed if elapsed > 0 else 0
+                        eta = (to_process - completed) / rate if rate > 0 else 0
+                        logger.info(f"  ⏳ {completed}/{to_process} ({completed/to_process*100:.1f}%) - "
+                                  f"{rate:.1f} conv/s - ETA: {eta/60:.1f} min")
+                except Exception as e:
+                    logger.error(f"Erro ao processar conversa {idx}: {e}")
+                    # Resultado default em caso de erro
+                    results_list.append((idx, self._default_result()))
+
+        return results_list
+
+    def _analyze_rows_async(self, df_to_analyze: pd.DataFrame, start_time: float) -> List[Tuple]:
+        """
+        Analisa as conversas com AsyncOpenAI e concorrência adaptativa (AIMD).
+
+        A concorrência começa em INITIAL_CONCURRENCY e sobe até max_concurrency
+        enquanto a cota tiver folga; cai pela metade em 429 ou quando os headers
+        x-ratelimit-remaining-* indicam cota quase esgotada.
+
+        Returns:
+            Lista de (índice, resultado)
+        """
+        logger.info(f"🚀 Iniciando processamento ASYNC (concorrência adaptativa "
+                    f"{self.INITIAL_CONCURRENCY}→{self.max_concurrency})...")
+
+        return asyncio.run(self._analyze_rows_async_main(df_to_analyze, start_time))
+
+    async def _analyze_rows_async_main(self, df_to_analyze: pd.DataFrame, start_time: float) -> List[Tuple]:
+        to_process = len(df_to_analyze)
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=min(self.INITIAL_CONCURRENCY, self.max_concurrency),
+            max_limit=self.max_concurrency
+        )
+
+        # SDK sem retry interno: os 429 precisam chegar ao limiter
+        owns_client = self.async_client is None
+        if owns_client:
+            self.async_client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+
+        async def analyze_row(idx, row):
+            try:
+                result = await self.analyze_conversation_async(
+                    limiter,
+                    message_text=row.get('message_compiled', None),
+                    contact_name=row.get('contact_name', None),
+                    message_count=row.get('contact_messages_count', 0)
+                )
+            except Exception as e:
+                logger.error(f"Erro ao processar conversa {idx}: {e}")
+                result = self._default_result()
+            return idx, result
+
+        results_list = []
+        try:
+            tasks = [analyze_row(idx, row) for idx, row in df_to_analyze.iterrows()]
+
+            for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+                results_list.append(await task)
+
+                # Log progresso a cada 10 conversas
+                if completed % 10 == 0:
+                    elapsed = time.time() - start_time
+                    rate = completed / elapsed if elapsed > 0 else 0
+                    eta = (to_process - completed) / rate if rate > 0 else 0
+                    logger.info(f"  ⏳ {completed}/{to_process} ({completed/to_process*100:.1f}%) - "
+                              f"{rate:.1f} conv/s - ETA: {eta/60:.1f} min - "
+                              f"concorrência {limiter.current_limit}")
+        finally:
+            if owns_client:
+                await self.async_client.close()
+                self.async_client = None
+
+        self.limiter_stats = dict(limiter.stats, final_limit=limiter.current_limit)
+        logger.info(f"Concorrência OpenAI: pico {limiter.stats['peak_limit']}, "
+                    f"{limiter.stats['rate_limited']} respostas 429, "
+                    f"{limiter.stats['decreases']} reduções")
+
+        return results_list
+
     def get_usage_stats(self) -> Dict:
         """
         Retorna estatísticas de uso da API.
@@ -796,6 +1071,7 @@ Analise esta conversa e retorne o JSON com as informações solicitadas."""
             **self.stats,
             'tenant_id': self.tenant_id,
             'model': self.model,
+            'concurrency': self.limiter_stats,
             'success_rate': round(
                 (self.stats['successful_calls'] / self.stats['total_calls'] * 100)
                 if self.stats['total_calls'] > 0 else 0,
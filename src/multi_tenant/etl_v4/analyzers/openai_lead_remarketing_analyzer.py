@@ -39,6 +39,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 
 from multi_tenant.utils.rate_limiter import get_rate_limiter
 from multi_tenant.utils.cost_tracker import get_cost_tracker
+from multi_tenant.utils.llm_cache import LLMResponseCache, get_llm_cache
 
 # Configurar logging
 logging.basicConfig(
@@ -75,6 +76,14 @@ class OpenAILeadRemarketingAnalyzer:
     COST_OUTPUT_PER_1M = 0.600  # USD
     USD_TO_BRL = 5.50  # Taxa de câmbio aproximada
 
+    # Batch API: 50% do preço síncrono (resultado em até 24h)
+    BATCH_COST_MULTIPLIER = 0.5
+    BATCH_ENDPOINT = '/v1/chat/completions'
+
+    # Cache de respostas (ver utils.llm_cache)
+    CACHE_NAMESPACE = 'remarketing'
+    PROMPT_VERSION = '1.0'
+
     def __init__(
         self,
         tenant_id: int,
@@ -116,6 +125,7 @@ class OpenAILeadRemarketingAnalyzer:
             'failed_calls': 0,
             'total_tokens': 0,
             'total_cost_brl': 0.0,
+            'cache_hits': 0,
         }
 
         logger.info(
@@ -212,6 +222,30 @@ RETORNE APENAS O JSON, sem texto adicional."""
         Returns:
             User prompt formatado
         """
+        conversa_texto = self._format_conversation(conversa_compilada)
+
+        return f"""
+DADOS DO LEAD:
+- Nome: {contact_name or 'Não identificado'}
+- Canal: {inbox_name or 'Desconhecido'}
+- Tempo Inativo: {tempo_inativo_horas:.1f} horas (~{int(tempo_inativo_horas/24)} dias)
+
+CONVERSA COMPLETA:
+{conversa_texto}
+
+ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
+"""
+
+    def _format_conversation(self, conversa_compilada: Dict[str, Any]) -> str:
+        """
+        Formata as mensagens úteis da conversa para o prompt.
+
+        Args:
+            conversa_compilada: Conversa em formato JSONB
+
+        Returns:
+            Texto com até 30 mensagens no formato "[sender] texto"
+        """
         # Extrair mensagens da conversa compilada
         # message_compiled do banco já vem como lista, não como dict com 'messages'
         if isinstance(conversa_compilada, list):
@@ -240,19 +274,32 @@ RETORNE APENAS O JSON, sem texto adicional."""
 
             mensagens_formatadas.append(f"[{sender}] {content}")
 
-        conversa_texto = "\n".join(mensagens_formatadas[:30])  # Limitar a 30 mensagens úteis
+        return "\n".join(mensagens_formatadas[:30])  # Limitar a 30 mensagens úteis
 
-        return f"""
-DADOS DO LEAD:
-- Nome: {contact_name or 'Não identificado'}
-- Canal: {inbox_name or 'Desconhecido'}
-- Tempo Inativo: {tempo_inativo_horas:.1f} horas (~{int(tempo_inativo_horas/24)} dias)
-
-CONVERSA COMPLETA:
-{conversa_texto}
+    def _cache_key(
+        self,
+        conversa_compilada: Dict[str, Any],
+        contact_name: str,
+        inbox_name: str,
+        tipo_remarketing: str
+    ) -> str:
+        """
+        Chave do cache de respostas.
 
-ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
-"""
+        Usa a faixa de inatividade (tipo_remarketing, que define o prompt de
+        sistema) e não as horas exatas, que mudam a cada execução.
+        """
+        return LLMResponseCache.make_key(
+            self.CACHE_NAMESPACE,
+            self.model,
+            self.PROMPT_VERSION,
+            self._build_system_prompt(tipo_remarketing),
+            self._format_conversation(conversa_compilada),
+            contact_name,
+            inbox_name,
+            temperature=0.3,
+            max_tokens=800
+        )
 
     def _calculate_cost(self, tokens_input: int, tokens_output: int) -> float:
         """
@@ -302,6 +349,24 @@ ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
             f"Tipo: {tipo_remarketing} | Inativo: {tempo_inativo_horas:.1f}h"
         )
 
+        # Resposta já obtida para a mesma conversa/prompt: sem tokens nem latência
+        cache_key = self._cache_key(conversa_compilada, contact_name, inbox_name, tipo_remarketing)
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            logger.info(f"♻️  Lead {conversation_id} servido do cache de respostas")
+            return self._build_resultado(
+                dados_extraidos=cached,
+                tokens_input=0,
+                tokens_output=0,
+                tokens_total=0,
+                contact_name=contact_name,
+                inbox_name=inbox_name,
+                tipo_remarketing=tipo_remarketing,
+                tempo_inativo_horas=tempo_inativo_horas,
+                from_cache=True
+            )
+
         # [FASE 9.1] Obter instâncias globais de Rate Limiter e Cost Tracker
         rate_limiter = get_rate_limiter()
         cost_tracker = get_cost_tracker()
@@ -326,9 +391,8 @@ ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
             raise Exception("Rate limit timeout - try again later")
 
         # Construir prompts
-        system_prompt = self._build_system_prompt(tipo_remarketing)
-        user_prompt = self._build_user_prompt(
-            conversa_compilada, contact_name, inbox_name, tempo_inativo_horas
+        request_params = self._build_request_params(
+            conversa_compilada, contact_name, inbox_name, tipo_remarketing, tempo_inativo_horas
         )
 
         # Retry loop
@@ -339,101 +403,37 @@ ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
 
                 # Chamar OpenAI API
                 response: ChatCompletion = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.3,  # Baixa temperatura para consistência
-                    max_tokens=800,  # Suficiente para análise + JSON
+                    **request_params,
                     timeout=self.TIMEOUT_SECONDS
                 )
 
                 elapsed_time = time.time() - start_time
 
                 # Extrair resposta
-                content = response.choices[0].message.content.strip()
-
-                # Parsear JSON
-                try:
-                    dados_extraidos = json.loads(content)
-                except json.JSONDecodeError:
-                    # Tentar extrair JSON de markdown code block
-                    if '```json' in content:
-                        json_start = content.find('```json') + 7
-                        json_end = content.find('```', json_start)
-                        content = content[json_start:json_end].strip()
-                        dados_extraidos = json.loads(content)
-                    else:
-                        raise
-
-                # Validar estrutura mínima
-                required_fields = ['score_prioridade', 'analise_contextual']
-                for field in required_fields:
-                    if field not in dados_extraidos:
-                        raise ValueError(f"Campo obrigatório ausente: {field}")
-
-                # Extrair score de prioridade
-                score_prioridade = int(dados_extraidos.get('score_prioridade', 0))
-                if not (0 <= score_prioridade <= 5):
-                    score_prioridade = max(0, min(5, score_prioridade))
-
-                # Gerar sugestão de remarketing usando template
-                sugestao_disparo = self.template_manager.generate_remarketing_message(
-                    tipo_remarketing=tipo_remarketing,
+                dados_extraidos = self._parse_analysis_content(response.choices[0].message.content)
+                get_llm_cache().set(cache_key, dados_extraidos, namespace=self.CACHE_NAMESPACE, model=self.model)
+
+                resultado = self._build_resultado(
                     dados_extraidos=dados_extraidos,
+                    tokens_input=response.usage.prompt_tokens,
+                    tokens_output=response.usage.completion_tokens,
+                    tokens_total=response.usage.total_tokens,
                     contact_name=contact_name,
                     inbox_name=inbox_name,
-                    tempo_inativo_horas=tempo_inativo_horas
-                )
-
-                # Calcular custo
-                tokens_input = response.usage.prompt_tokens
-                tokens_output = response.usage.completion_tokens
-                tokens_total = response.usage.total_tokens
-                custo_brl = self._calculate_cost(tokens_input, tokens_output)
-
-                # Atualizar estatísticas
-                self.stats['total_calls'] += 1
-                self.stats['successful_calls'] += 1
-                self.stats['total_tokens'] += tokens_total
-                self.stats['total_cost_brl'] += custo_brl
-
-                # [FASE 9.1] Registrar custo real e uso de rate limit
-                rate_limiter.record_request(tokens_total)
-                cost_tracker.record_cost(
-                    tenant_id=self.tenant_id,
-                    cost_brl=custo_brl,
-                    tokens=tokens_total,
-                    requests=1
+                    tipo_remarketing=tipo_remarketing,
+                    tempo_inativo_horas=tempo_inativo_horas,
+                    elapsed_time=elapsed_time
                 )
 
-                # Montar resultado
-                resultado = {
-                    'tipo_conversa': tipo_remarketing,
-                    'analise_ia': dados_extraidos.get('analise_contextual', ''),
-                    'sugestao_disparo': sugestao_disparo,
-                    'score_prioridade': score_prioridade,
-                    'dados_extraidos_ia': dados_extraidos,
-                    'metadados_analise_ia': {
-                        'modelo': self.model,
-                        'tokens_prompt': tokens_input,
-                        'tokens_completion': tokens_output,
-                        'tokens_total': tokens_total,
-                        'custo_brl': custo_brl,
-                        'tempo_segundos': round(elapsed_time, 2),
-                        'versao_prompt': '1.0',
-                        'template_usado': f'{tipo_remarketing}_v1',
-                        'analisado_em': datetime.now().isoformat(),
-                        'tempo_inativo_horas': tempo_inativo_horas
-                    },
-                    'analisado_em': datetime.now()
-                }
+                # [FASE 9.1] Registrar uso de rate limit
+                rate_limiter.record_request(resultado['metadados_analise_ia']['tokens_total'])
 
                 logger.info(
                     f"✅ Lead {conversation_id} analisado com sucesso - "
-                    f"Score: {score_prioridade} | Custo: R$ {custo_brl:.4f} | "
-                    f"Tokens: {tokens_total} | Tempo: {elapsed_time:.2f}s"
+                    f"Score: {resultado['score_prioridade']} | "
+                    f"Custo: R$ {resultado['metadados_analise_ia']['custo_brl']:.4f} | "
+                    f"Tokens: {resultado['metadados_analise_ia']['tokens_total']} | "
+                    f"Tempo: {elapsed_time:.2f}s"
                 )
 
                 return resultado
@@ -459,6 +459,234 @@ ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
         # Nunca deve chegar aqui, mas por segurança
         raise last_exception or Exception(f"Falha desconhecida ao analisar lead {conversation_id}")
 
+    def _build_request_params(
+        self,
+        conversa_compilada: Dict[str, Any],
+        contact_name: str,
+        inbox_name: str,
+        tipo_remarketing: str,
+        tempo_inativo_horas: float
+    ) -> Dict[str, Any]:
+        """
+        Monta os parâmetros de chat.completions (mesmos no modo síncrono e no Batch API).
+
+        Returns:
+            Dict com model, messages, temperature e max_tokens
+        """
+        return {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": self._build_system_prompt(tipo_remarketing)},
+                {"role": "user", "content": self._build_user_prompt(
+                    conversa_compilada, contact_name, inbox_name, tempo_inativo_horas
+                )}
+            ],
+            'temperature': 0.3,  # Baixa temperatura para consistência
+            'max_tokens': 800,  # Suficiente para análise + JSON
+        }
+
+    def _parse_analysis_content(self, content: str) -> Dict[str, Any]:
+        """
+        Converte o conteúdo retornado pela OpenAI no JSON de dados extraídos.
+
+        Args:
+            content: Texto da resposta (JSON puro ou em bloco markdown)
+
+        Returns:
+            Dict com dados extraídos
+
+        Raises:
+            json.JSONDecodeError / ValueError: Se resposta inválida
+        """
+        content = content.strip()
+
+        # Parsear JSON
+        try:
+            dados_extraidos = json.loads(content)
+        except json.JSONDecodeError:
+            # Tentar extrair JSON de markdown code block
+            if '```json' in content:
+                json_start = content.find('```json') + 7
+                json_end = content.find('```', json_start)
+                content = content[json_start:json_end].strip()
+                dados_extraidos = json.loads(content)
+            else:
+                raise
+
+        # Validar estrutura mínima
+        required_fields = ['score_prioridade', 'analise_contextual']
+        for field in required_fields:
+            if field not in dados_extraidos:
+                raise ValueError(f"Campo obrigatório ausente: {field}")
+
+        return dados_extraidos
+
+    def _build_resultado(
+        self,
+        dados_extraidos: Dict[str, Any],
+        tokens_input: int,
+        tokens_output: int,
+        tokens_total: int,
+        contact_name: str,
+        inbox_name: str,
+        tipo_remarketing: str,
+        tempo_inativo_horas: float,
+        elapsed_time: Optional[float] = None,
+        cost_multiplier: float = 1.0,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        from_cache: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Monta o resultado final (formato de save_analysis_to_db) e registra custo.
+
+        Args:
+            dados_extraidos: JSON retornado pela OpenAI
+            tokens_input: Tokens de entrada
+            tokens_output: Tokens de saída
+            tokens_total: Total de tokens
+            contact_name: Nome do contato
+            inbox_name: Nome do inbox
+            tipo_remarketing: Tipo de remarketing
+            tempo_inativo_horas: Horas de inatividade
+            elapsed_time: Tempo da chamada (None no Batch API)
+            cost_multiplier: Multiplicador de preço (BATCH_COST_MULTIPLIER no Batch API)
+            extra_metadata: Campos adicionais para metadados_analise_ia
+            from_cache: Resposta veio do cache (não conta chamada nem custo)
+
+        Returns:
+            Dict com resultado da análise completa
+        """
+        # Extrair score de prioridade
+        score_prioridade = int(dados_extraidos.get('score_prioridade', 0))
+        if not (0 <= score_prioridade <= 5):
+            score_prioridade = max(0, min(5, score_prioridade))
+
+        # Gerar sugestão de remarketing usando template
+        sugestao_disparo = self.template_manager.generate_remarketing_message(
+            tipo_remarketing=tipo_remarketing,
+            dados_extraidos=dados_extraidos,
+            contact_name=contact_name,
+            inbox_name=inbox_name,
+            tempo_inativo_horas=tempo_inativo_horas
+        )
+
+        # Calcular custo
+        custo_brl = round(self._calculate_cost(tokens_input, tokens_output) * cost_multiplier, 6)
+
+        if not from_cache:
+            # Atualizar estatísticas
+            self.stats['total_calls'] += 1
+            self.stats['successful_calls'] += 1
+            self.stats['total_tokens'] += tokens_total
+            self.stats['total_cost_brl'] += custo_brl
+
+            # [FASE 9.1] Registrar custo real
+            get_cost_tracker().record_cost(
+                tenant_id=self.tenant_id,
+                cost_brl=custo_brl,
+                tokens=tokens_total,
+                requests=1
+            )
+
+        metadados = {
+            'modelo': self.model,
+            'tokens_prompt': tokens_input,
+            'tokens_completion': tokens_output,
+            'tokens_total': tokens_total,
+            'custo_brl': custo_brl,
+            'tempo_segundos': round(elapsed_time, 2) if elapsed_time is not None else None,
+            'versao_prompt': '1.0',
+            'template_usado': f'{tipo_remarketing}_v1',
+            'analisado_em': datetime.now().isoformat(),
+            'tempo_inativo_horas': tempo_inativo_horas,
+            'cache_hit': from_cache
+        }
+        metadados.update(extra_metadata or {})
+
+        # Montar resultado
+        return {
+            'tipo_conversa': tipo_remarketing,
+            'analise_ia': dados_extraidos.get('analise_contextual', ''),
+            'sugestao_disparo': sugestao_disparo,
+            'score_prioridade': score_prioridade,
+            'dados_extraidos_ia': dados_extraidos,
+            'metadados_analise_ia': metadados,
+            'analisado_em': datetime.now()
+        }
+
+    def build_batch_request(
+        self,
+        custom_id: str,
+        conversa_compilada: Dict[str, Any],
+        contact_name: str,
+        inbox_name: str,
+        tipo_remarketing: str,
+        tempo_inativo_horas: float
+    ) -> Dict[str, Any]:
+        """
+        Monta uma linha do arquivo JSONL do Batch API para um lead.
+
+        Args:
+            custom_id: Identificador da linha (volta no arquivo de resultado)
+            conversa_compilada: Conversa em formato JSONB
+            contact_name: Nome do contato
+            inbox_name: Nome do inbox
+            tipo_remarketing: Tipo de remarketing
+            tempo_inativo_horas: Horas de inatividade
+
+        Returns:
+            Dict serializável em JSON (custom_id, method, url, body)
+        """
+        return {
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': self.BATCH_ENDPOINT,
+            'body': self._build_request_params(
+                conversa_compilada, contact_name, inbox_name, tipo_remarketing, tempo_inativo_horas
+            )
+        }
+
+    def build_result_from_batch(
+        self,
+        response_body: Dict[str, Any],
+        contact_name: str,
+        inbox_name: str,
+        tipo_remarketing: str,
+        tempo_inativo_horas: float,
+        batch_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Converte o body de uma resposta do Batch API no resultado da análise.
+
+        Args:
+            response_body: 'response.body' da linha de saída (chat completion)
+            contact_name: Nome do contato
+            inbox_name: Nome do inbox
+            tipo_remarketing: Tipo de remarketing
+            tempo_inativo_horas: Horas de inatividade
+            batch_id: ID do batch (registrado nos metadados)
+
+        Returns:
+            Dict com resultado da análise completa (custo com desconto do Batch API)
+        """
+        usage = response_body.get('usage') or {}
+        dados_extraidos = self._parse_analysis_content(
+            response_body['choices'][0]['message']['content']
+        )
+
+        return self._build_resultado(
+            dados_extraidos=dados_extraidos,
+            tokens_input=usage.get('prompt_tokens', 0),
+            tokens_output=usage.get('completion_tokens', 0),
+            tokens_total=usage.get('total_tokens', 0),
+            contact_name=contact_name,
+            inbox_name=inbox_name,
+            tipo_remarketing=tipo_remarketing,
+            tempo_inativo_horas=tempo_inativo_horas,
+            cost_multiplier=self.BATCH_COST_MULTIPLIER,
+            extra_metadata={'modo': 'batch', 'batch_id': batch_id}
+        )
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Retorna estatísticas de uso do analyzer.
@@ -486,5 +714,6 @@ ANALISE A CONVERSA E RETORNE O JSON COM OS DADOS ESTRUTURADOS.
             'failed_calls': 0,
             'total_tokens': 0,
             'total_cost_brl': 0.0,
+            'cache_hits': 0,
         }
         logger.info(f"Estatísticas resetadas para tenant {self.tenant_id}")
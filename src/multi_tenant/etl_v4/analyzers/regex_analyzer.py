@@ -17,6 +17,7 @@ Data: 2025-11-09
 import logging
 import re
 from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from .base_analyzer import BaseAnalyzer
 
@@ -31,6 +32,9 @@ logger = logging.getLogger(__name__)
 class RegexAnalyzer(BaseAnalyzer):
     """Analisa conversas para detectar leads, visitas e conversões"""
 
+    # Score também depende de status e intervenção humana
+    INPUT_COLUMNS = ('message_compiled', 'status', 'has_human_intervention')
+
     # ========================================================================
     # KEYWORDS DE DETECÇÃO (Configuráveis por tenant no futuro)
     # ========================================================================
@@ -197,6 +201,12 @@ class RegexAnalyzer(BaseAnalyzer):
         self.conversion_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.CONVERSION_KEYWORDS]
         self.negative_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.NEGATIVE_KEYWORDS]
 
+        # Uma alternation por família (analyze_dataframe varre a coluna uma vez por família)
+        self.lead_regex = self._combine_patterns(self.LEAD_KEYWORDS)
+        self.visit_regex = self._combine_patterns(self.VISIT_KEYWORDS)
+        self.conversion_regex = self._combine_patterns(self.CONVERSION_KEYWORDS)
+        self.negative_regex = self._combine_patterns(self.NEGATIVE_KEYWORDS)
+
         logger.info(f"Padrões carregados: {len(self.lead_patterns)} lead, "
                    f"{len(self.visit_patterns)} visit, "
                    f"{len(self.conversion_patterns)} conversion")
@@ -339,22 +349,49 @@ class RegexAnalyzer(BaseAnalyzer):
 
         logger.info(f"Analisando {len(df)} conversas para tenant {self.tenant_id}")
 
-        # Aplicar análise linha por linha
-        results = df.apply(
-            lambda row: self.analyze_conversation(
-                message_text=row.get('message_compiled', None),
-                status=row.get('status', None),
-                has_human_intervention=row.get('has_human_intervention', False),
-            ),
-            axis=1
+        # Análise vetorizada (mesmo resultado de analyze_conversation linha a linha)
+        raw_text = df['message_compiled'] if 'message_compiled' in df.columns else pd.Series(None, index=df.index, dtype=object)
+        has_text = raw_text.map(lambda value: isinstance(value, str) and bool(value))
+
+        # Mesma normalização de analyze_conversation (split/join é mais rápido que regex \s+)
+        text = raw_text.where(has_text, '').map(lambda value: ' '.join(value.split()))
+
+        # 1. Keywords NEGATIVAS descartam a conversa (score 0)
+        analyzable = has_text & ~text.str.contains(self.negative_regex, na=False)
+
+        # 2-4. Uma varredura por família
+        is_lead = analyzable & text.str.contains(self.lead_regex, na=False)
+        visit_scheduled = analyzable & text.str.contains(self.visit_regex, na=False)
+        crm_converted = analyzable & text.str.contains(self.conversion_regex, na=False)
+
+        # 5. Score: keywords de lead contam 5 pontos cada até 50 (10 ocorrências)
+        lead_count = self._count_lead_keywords(text, is_lead, cap=10)
+
+        status = df['status'] if 'status' in df.columns else pd.Series(None, index=df.index, dtype=object)
+        human = (
+            df['has_human_intervention'].astype(bool)
+            if 'has_human_intervention' in df.columns
+            else pd.Series(False, index=df.index)
         )
 
-        # Extrair cada campo do resultado
-        df['is_lead'] = results.apply(lambda x: x['is_lead'])
-        df['visit_scheduled'] = results.apply(lambda x: x['visit_scheduled'])
-        df['crm_converted'] = results.apply(lambda x: x['crm_converted'])
-        df['ai_probability_label'] = results.apply(lambda x: x['ai_probability_label'])
-        df['ai_probability_score'] = results.apply(lambda x: x['ai_probability_score'])
+        score = (
+            lead_count * 5
+            + visit_scheduled * 20
+            + crm_converted * 30
+            + (status == 'resolved') * 10
+            + human * 10
+        ).clip(upper=100).astype(float).round(1)
+        score = score.where(analyzable, 0.0)
+
+        df['is_lead'] = is_lead.astype(bool)
+        df['visit_scheduled'] = visit_scheduled.astype(bool)
+        df['crm_converted'] = crm_converted.astype(bool)
+        df['ai_probability_label'] = np.select(
+            [score >= 70, score >= 40, score > 0],
+            ['Alto', 'Médio', 'Baixo'],
+            default='N/A'
+        )
+        df['ai_probability_score'] = score
 
         # Estatísticas
         lead_count = df['is_lead'].sum()
@@ -366,6 +403,46 @@ class RegexAnalyzer(BaseAnalyzer):
 
         return df
 
+    @staticmethod
+    def _combine_patterns(patterns: List[str]) -> "re.Pattern":
+        """
+        Compila uma família de keywords em uma única alternation.
+
+        Args:
+            patterns: Lista de regex da família
+
+        Returns:
+            re.Pattern: (?:p1)|(?:p2)|... com IGNORECASE
+        """
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+    def _count_lead_keywords(self, text: pd.Series, is_lead: pd.Series, cap: int) -> pd.Series:
+        """
+        Conta ocorrências de keywords de lead por conversa, limitado a `cap`.
+
+        A contagem soma os matches de cada padrão separadamente (como em
+        analyze_conversation, onde padrões sobrepostos contam em dobro).
+        Só varre conversas que são lead e ainda não atingiram o limite.
+
+        Args:
+            text: Textos normalizados
+            is_lead: Máscara de conversas com pelo menos uma keyword de lead
+            cap: Contagem a partir da qual o score não muda mais
+
+        Returns:
+            pd.Series de int com a contagem (0 para não-leads)
+        """
+        counts = pd.Series(0, index=text.index, dtype='int64')
+        pending = is_lead.copy()
+
+        for pattern in self.lead_patterns:
+            if not pending.any():
+                break
+            counts[pending] += text[pending].str.count(pattern)
+            pending &= counts < cap
+
+        return counts.clip(upper=cap)
+
     def _calculate_lead_score(
         self,
         lead_count: int,
@@ -0,0 +1,271 @@
+"""
+Conversation Messages - ETL V4 Multi-Tenant
+===========================================
+
+Mantém conversation_messages: uma linha por mensagem de
+conversations_analytics.message_compiled (seq, sender, sent_at, text...).
+
+Manutenção (ConversationLoader.load_chunk):
+    - Depois do UPSERT, as mensagens das conversas gravadas com
+      message_compiled são substituídas (DELETE + INSERT ... SELECT
+      jsonb_array_elements): o JSON é decodificado uma vez, no banco, na carga
+    - Conversas com UPDATE restrito (message_compiled inalterado) não são tocadas
+    - Se a regravação falhar, as mensagens antigas das conversas são
+      removidas (invalidate_conversation_messages): sem linhas, o predicado
+      volta ao JSON em vez de responder com dados desatualizados
+
+Leitura:
+    - responder_exists_sql(): predicado "o bot/agente respondeu?" resolvido
+      pelo índice parcial idx_conversation_messages_responder; NULL
+      (desconhecido) para conversas sem linhas normalizadas
+    - messages_table_available() / responder_predicate_sql(): consumidores
+      usam o caminho antigo (JSON) enquanto a migration não foi aplicada
+
+Backfill: sql/migrations/20261017_create_conversation_messages.sql
+(ou __main__ para um tenant).
+
+Fase: 9.9 - Conversation Messages
+Data: 2026-10-17
+"""
+
+import logging
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MESSAGES_TABLE = 'conversation_messages'
+
+# Remetentes que contam como resposta do bot/agente (ver has_bot_or_agent_response)
+RESPONDER_SENDERS = ('AgentBot', 'User', 'Agent')
+
+# Mesma conversão do backfill da migration. Conversões tolerantes: um elemento
+# malformado vira NULL/FALSE em vez de abortar o INSERT do chunk inteiro
+# (conversation_messages_try_timestamptz é criada pela migration)
+_INSERT_MESSAGES = f"""
+    INSERT INTO {MESSAGES_TABLE} (
+        tenant_id, conversation_id, seq, sender, sender_name, message_type, is_private, sent_at, text
+    )
+    SELECT
+        ca.tenant_id,
+        ca.conversation_id,
+        m.seq::INTEGER,
+        LEFT(m.msg->>'sender', 50),
+        LEFT(m.msg->>'sender_name', 255),
+        CASE WHEN m.msg->>'message_type' ~ '^-?[0-9]{{1,4}}$' THEN (m.msg->>'message_type')::SMALLINT END,
+        COALESCE(LOWER(m.msg->>'private') IN ('true', 't', '1'), FALSE),
+        conversation_messages_try_timestamptz(m.msg->>'sent_at'),
+        m.msg->>'text'
+    FROM conversations_analytics ca
+    CROSS JOIN LATERAL jsonb_array_elements(ca.message_compiled) WITH ORDINALITY AS m(msg, seq)
+    WHERE ca.tenant_id = :tenant_id
+      AND ca.message_compiled IS NOT NULL
+      AND jsonb_typeof(ca.message_compiled) = 'array'
+"""
+
+
+def refresh_conversation_messages(
+    engine: Engine,
+    tenant_id: int,
+    conversation_ids: Optional[Iterable[int]] = None
+) -> int:
+    """
+    Substitui as mensagens normalizadas das conversas (a partir de message_compiled).
+
+    Args:
+        engine: Engine do banco local (owner/etl_service)
+        tenant_id: ID do tenant
+        conversation_ids: Conversas a atualizar (None = todas do tenant)
+
+    Returns:
+        int: Número de mensagens gravadas
+
+    Example:
+        >>> refresh_conversation_messages(engine, 1, chunk['conversation_id'])
+    """
+    params = {'tenant_id': int(tenant_id)}
+    delete_condition = insert_condition = ''
+
+    if conversation_ids is not None:
+        params['conversation_ids'] = [int(cid) for cid in conversation_ids]
+        if not params['conversation_ids']:
+            return 0
+        delete_condition = ' AND conversation_id = ANY(:conversation_ids)'
+        insert_condition = ' AND ca.conversation_id = ANY(:conversation_ids)'
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {MESSAGES_TABLE} WHERE tenant_id = :tenant_id{delete_condition}"),
+            params
+        )
+        result = conn.execute(
+            text(_INSERT_MESSAGES + insert_condition),
+            params
+        )
+        inserted = result.rowcount or 0
+
+    logger.debug(f"Tenant {tenant_id}: {inserted} mensagens normalizadas")
+    return inserted
+
+
+def invalidate_conversation_messages(
+    engine: Engine,
+    tenant_id: int,
+    conversation_ids: Iterable[int]
+) -> int:
+    """
+    Remove as mensagens normalizadas das conversas (regravação falhou).
+
+    Sem linhas, responder_exists_sql retorna NULL e os consumidores usam
+    message_compiled até a próxima carga da conversa.
+
+    Args:
+        engine: Engine do banco local (owner/etl_service)
+        tenant_id: ID do tenant
+        conversation_ids: Conversas a invalidar
+
+    Returns:
+        int: Número de mensagens removidas
+    """
+    ids = [int(cid) for cid in conversation_ids]
+    if not ids:
+        return 0
+
+    with engine.begin() as conn:
+        result = conn.execute(
+            text(f"DELETE FROM {MESSAGES_TABLE} WHERE tenant_id = :tenant_id AND conversation_id = ANY(:conversation_ids)"),
+            {'tenant_id': int(tenant_id), 'conversation_ids': ids}
+        )
+        return result.rowcount or 0
+
+
+def responder_exists_sql(alias: str = 'ca') -> str:
+    """
+    Predicado SQL: a conversa tem mensagem do bot/agente.
+
+    TRUE/FALSE quando a conversa tem linhas em conversation_messages; NULL
+    quando não tem (ex: carga que falhou ao normalizar), para o consumidor
+    recorrer ao JSON (responder_predicate_sql, lead_has_response).
+
+    Args:
+        alias: Alias de conversations_analytics na query
+
+    Returns:
+        str: Expressão booleana (EXISTS pelo índice parcial de remetentes, ou NULL)
+
+    Example:
+        >>> f"SELECT conversation_id, {responder_exists_sql('ca')} AS has_response FROM conversations_analytics ca"
+    """
+    senders = ', '.join(f"'{sender}'" for sender in RESPONDER_SENDERS)
+    conversation = (
+        f"msg.tenant_id = {alias}.tenant_id "
+        f"AND msg.conversation_id = {alias}.conversation_id"
+    )
+    return (
+        f"(CASE WHEN EXISTS (SELECT 1 FROM {MESSAGES_TABLE} msg "
+        f"WHERE {conversation} AND msg.sender IN ({senders})) THEN TRUE "
+        f"WHEN EXISTS (SELECT 1 FROM {MESSAGES_TABLE} msg WHERE {conversation}) THEN FALSE END)"
+    )
+
+
+def responder_exists_json_sql(alias: str = 'ca') -> str:
+    """
+    Mesmo predicado de responder_exists_sql, direto sobre message_compiled (JSONB).
+
+    Usado enquanto conversation_messages não existe; message_compiled que não
+    é lista conta como "sem resposta" (igual a has_bot_or_agent_response).
+
+    Args:
+        alias: Alias de conversations_analytics na query
+
+    Returns:
+        str: Expressão booleana SQL
+    """
+    senders = ', '.join(f"'{sender}'" for sender in RESPONDER_SENDERS)
+    return (
+        f"(CASE WHEN jsonb_typeof({alias}.message_compiled) = 'array' THEN EXISTS ("
+        f"SELECT 1 FROM jsonb_array_elements({alias}.message_compiled) AS msg(item) "
+        f"WHERE msg.item->>'sender' IN ({senders})) ELSE FALSE END)"
+    )
+
+
+def responder_predicate_sql(engine: Engine, alias: str = 'ca') -> str:
+    """
+    Predicado "o bot/agente respondeu?" para o banco da engine.
+
+    Returns:
+        str: responder_exists_sql com responder_exists_json_sql para conversas
+            sem mensagens normalizadas (tabela disponível), ou só o JSON
+    """
+    if messages_table_available(engine):
+        return f"COALESCE({responder_exists_sql(alias)}, {responder_exists_json_sql(alias)})"
+    return responder_exists_json_sql(alias)
+
+
+# Bancos onde a tabela já foi encontrada (migration aplicada)
+_table_available: Dict[str, bool] = {}
+_table_available_lock = Lock()
+
+
+def messages_table_available(engine: Engine) -> bool:
+    """
+    Verifica se conversation_messages existe (resultado positivo cacheado por banco).
+
+    Args:
+        engine: Engine do banco local
+
+    Returns:
+        bool: True se a migration foi aplicada
+    """
+    key = str(engine.url)
+
+    with _table_available_lock:
+        if key in _table_available:
+            return _table_available[key]
+
+    try:
+        with engine.connect() as conn:
+            available = conn.execute(
+                text("SELECT to_regclass(:table) IS NOT NULL"),
+                {'table': MESSAGES_TABLE}
+            ).scalar()
+    except Exception as e:
+        logger.warning(f"Não foi possível verificar {MESSAGES_TABLE}: {e}")
+        return False
+
+    if not available:
+        # Não cacheado: passa a ser usada assim que a migration for aplicada
+        logger.info(f"{MESSAGES_TABLE} não encontrada: usando message_compiled (migration pendente)")
+        return False
+
+    with _table_available_lock:
+        _table_available[key] = True
+
+    return True
+
+
+def reset_messages_table_cache() -> None:
+    """Esquece a verificação de messages_table_available (útil para testes)."""
+    with _table_available_lock:
+        _table_available.clear()
+
+
+if __name__ == "__main__":
+    # Executar da raiz do projeto: python -m src.multi_tenant.etl_v4.conversation_messages
+    import argparse
+
+    from ..utils.db_engines import get_engine
+
+    parser = argparse.ArgumentParser(description='Reconstrói conversation_messages a partir de message_compiled')
+    parser.add_argument('--tenant-id', type=int, required=True, help='Tenant a reconstruir')
+    args = parser.parse_args()
+
+    print(f"{refresh_conversation_messages(get_engine('etl'), args.tenant_id)} mensagens gravadas")
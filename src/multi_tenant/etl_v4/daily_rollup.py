@@ -0,0 +1,192 @@
+"""
+Daily Rollup - ETL V4 Multi-Tenant
+==================================
+
+Mantém conversations_daily_rollup: agregado de conversations_analytics por
+(tenant_id, conversation_date, inbox_id, periodo) usado pelos KPIs e
+gráficos do dashboard.
+
+Manutenção incremental:
+    - Após cada carga (ConversationLoader.load_chunk), os dias presentes
+      no chunk são recalculados (DELETE + INSERT ... SELECT do dia inteiro)
+    - Alterações fora da carga (ex: remarketing marcando SKIP_NO_RESPONSE)
+      recalculam os dias das conversas afetadas
+
+Recalcular o dia inteiro (em vez de somar deltas) mantém o agregado exato
+mesmo com UPDATEs e reprocessamentos.
+
+Fase: 9.5 - Daily Rollup
+Data: 2026-10-17
+"""
+
+import logging
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'conversations_daily_rollup'
+
+# Período do dia: a coluna gravada pelo transformer ('' = sem horário), a
+# mesma que o dashboard agrupa sem rollup
+PERIOD_EXPRESSION = "COALESCE(conversation_period, '')"
+
+_DELETE_DAYS = text(f"""
+    DELETE FROM {ROLLUP_TABLE}
+    WHERE tenant_id = :tenant_id
+      AND conversation_date = ANY(:dates)
+""")
+
+_INSERT_DAYS = text(f"""
+    INSERT INTO {ROLLUP_TABLE} (
+        tenant_id, conversation_date, inbox_id, periodo, inbox_name,
+        total_conversas, total_leads, total_sem_resposta, total_visitas, total_crm,
+        total_ia, total_humano, total_resolvidas, response_time_sum, response_time_count,
+        updated_at
+    )
+    SELECT
+        tenant_id,
+        conversation_date,
+        COALESCE(inbox_id, -1),
+        {PERIOD_EXPRESSION},
+        MAX(inbox_name),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE is_lead),
+        COUNT(*) FILTER (WHERE is_lead AND tipo_conversa = 'SKIP_NO_RESPONSE'),
+        COUNT(*) FILTER (WHERE visit_scheduled),
+        COUNT(*) FILTER (WHERE crm_converted),
+        COUNT(*) FILTER (WHERE has_human_intervention = FALSE),
+        COUNT(*) FILTER (WHERE has_human_intervention = TRUE),
+        COUNT(*) FILTER (WHERE is_resolved),
+        COALESCE(SUM(first_response_time_minutes), 0),
+        COUNT(first_response_time_minutes),
+        NOW()
+    FROM conversations_analytics
+    WHERE tenant_id = :tenant_id
+      AND conversation_date = ANY(:dates)
+    GROUP BY 1, 2, 3, 4
+""")
+
+_DATES_OF_CONVERSATIONS = text("""
+    SELECT DISTINCT conversation_date
+    FROM conversations_analytics
+    WHERE tenant_id = :tenant_id
+      AND conversation_id = ANY(:conversation_ids)
+      AND conversation_date IS NOT NULL
+""")
+
+
+def refresh_daily_rollup(engine: Engine, tenant_id: int, dates: Iterable[date]) -> int:
+    """
+    Recalcula o rollup dos dias informados de um tenant.
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+        dates: Dias (conversation_date) a recalcular
+
+    Returns:
+        int: Número de linhas gravadas no rollup
+
+    Example:
+        >>> refresh_daily_rollup(engine, 1, [date(2026, 10, 16), date(2026, 10, 17)])
+        14
+    """
+    dates = sorted({d for d in dates if d is not None})
+    if not dates:
+        return 0
+
+    params = {'tenant_id': int(tenant_id), 'dates': dates}
+
+    # Mesma transação: o dashboard nunca vê o dia apagado e ainda não regravado
+    with engine.begin() as conn:
+        conn.execute(_DELETE_DAYS, params)
+        rows = conn.execute(_INSERT_DAYS, params).rowcount
+
+    logger.info(f"Rollup diário: tenant {tenant_id}, {len(dates)} dia(s), {rows} linha(s)")
+    return rows
+
+
+def refresh_daily_rollup_for_conversations(
+    engine: Engine,
+    tenant_id: int,
+    conversation_ids: Iterable[int]
+) -> int:
+    """
+    Recalcula o rollup dos dias das conversas informadas
+    (para alterações feitas fora da carga do ETL).
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+        conversation_ids: Conversas alteradas
+
+    Returns:
+        int: Número de linhas gravadas no rollup
+    """
+    conversation_ids = [int(cid) for cid in conversation_ids]
+    if not conversation_ids:
+        return 0
+
+    with engine.connect() as conn:
+        dates = [row[0] for row in conn.execute(
+            _DATES_OF_CONVERSATIONS,
+            {'tenant_id': int(tenant_id), 'conversation_ids': conversation_ids}
+        )]
+
+    return refresh_daily_rollup(engine, tenant_id, dates)
+
+
+def safe_refresh_daily_rollup_for_conversations(
+    engine: Engine,
+    tenant_id: int,
+    conversation_ids: Iterable[int]
+) -> Optional[int]:
+    """
+    Igual a refresh_daily_rollup_for_conversations, mas nunca interrompe o
+    chamador (ex: tabela ainda não migrada). Retorna None em caso de erro.
+    """
+    try:
+        return refresh_daily_rollup_for_conversations(engine, tenant_id, conversation_ids)
+    except Exception as e:
+        logger.warning(f"Rollup diário não atualizado (tenant {tenant_id}): {e}")
+        return None
+
+
+def rebuild_daily_rollup(engine: Engine, tenant_id: int) -> int:
+    """
+    Reconstrói o rollup completo de um tenant (backfill/reconciliação).
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+
+    Returns:
+        int: Número de linhas gravadas no rollup
+    """
+    with engine.connect() as conn:
+        dates: List[date] = [row[0] for row in conn.execute(
+            text("""
+                SELECT DISTINCT conversation_date
+                FROM conversations_analytics
+                WHERE tenant_id = :tenant_id AND conversation_date IS NOT NULL
+            """),
+            {'tenant_id': int(tenant_id)}
+        )]
+
+        # Dias que sumiram da origem também saem do rollup
+        conn.execute(
+            text(f"DELETE FROM {ROLLUP_TABLE} WHERE tenant_id = :tenant_id AND NOT (conversation_date = ANY(:dates))"),
+            {'tenant_id': int(tenant_id), 'dates': dates}
+        )
+        conn.commit()
+
+    return refresh_daily_rollup(engine, tenant_id, dates)
@@ -8,6 +8,8 @@ Funcionalidades:
     - Extração por tenant (filtrado por inbox_ids)
     - Extração incremental (com watermark)
     - Processamento em chunks (evitar memory error)
+    - Paginação keyset (seek) por (conversation_updated_at, conversation_id)
+    - Streaming por cursor server-side (uma única execução da query)
     - Logging estruturado
 
 Autor: Isaac (via Claude Code)
@@ -15,13 +17,14 @@ Data: 2025-11-06
 """
 
 import logging
-import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Generator
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from ..utils.db_engines import get_engine
+
 # Configurar logging estruturado
 logging.basicConfig(
     level=logging.INFO,
@@ -29,6 +32,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Modos de paginação suportados por extract_conversations
+PAGINATION_KEYSET = 'keyset'
+PAGINATION_OFFSET = 'offset'
+PAGINATION_STREAM = 'stream'
+PAGINATION_MODES = (PAGINATION_KEYSET, PAGINATION_OFFSET, PAGINATION_STREAM)
+
 
 class RemoteExtractor:
     """Extrai dados do banco remoto Chatwoot"""
@@ -45,26 +54,13 @@ class RemoteExtractor:
         logger.info("RemoteExtractor inicializado")
 
     def _create_remote_engine(self) -> Engine:
-        """Cria engine de conexão com banco remoto"""
-        host = os.getenv('REMOTE_DB_HOST', '178.156.206.184')
-        port = os.getenv('REMOTE_DB_PORT', '5432')
-        database = os.getenv('REMOTE_DB_NAME', 'chatwoot')
-        user = os.getenv('REMOTE_DB_USER', 'hetzner_hyago_read')
-        password = os.getenv('REMOTE_DB_PASSWORD', 'c1d46b41391f')
-
-        connection_string = f"postgresql://{user}:{password}@{host}:{port}/{database}"
-
-        engine = create_engine(
-            connection_string,
-            pool_size=3,  # Máximo 3 conexões simultâneas
-            max_overflow=2,  # +2 em picos
-            pool_timeout=30,  # Timeout de 30s
-            pool_pre_ping=True,  # Verificar conexão antes de usar
-            echo=False  # Não logar queries SQL (usar logger em vez disso)
-        )
+        """
+        Retorna a engine do banco remoto do registro (pool único por processo).
 
-        logger.info(f"Engine remota criada: {host}:{port}/{database}")
-        return engine
+        Credenciais via REMOTE_DB_HOST/PORT/NAME/USER/PASSWORD; pool de
+        3 conexões (+2 em picos), timeout de 30s.
+        """
+        return get_engine('chatwoot')
 
     def get_tenant_inbox_ids(self, local_engine: Engine, tenant_id: int) -> List[int]:
         """
@@ -215,16 +211,32 @@ class RemoteExtractor:
         inbox_ids: List[int],
         watermark_start: Optional[datetime] = None,
         watermark_end: Optional[datetime] = None,
-        chunk_size: int = 10000
+        chunk_size: int = 10000,
+        pagination: str = PAGINATION_KEYSET
     ) -> Generator[pd.DataFrame, None, None]:
         """
         Extrai conversas de múltiplos inboxes em chunks.
 
+        Paginação:
+            - 'keyset' (default): cada chunk continua a partir da última tupla
+              (conversation_updated_at, conversation_id) lida. Custo linear no
+              tamanho do resultado e sem pular/duplicar linhas entre chunks.
+            - 'offset': LIMIT/OFFSET legado (custo quadrático em full syncs).
+            - 'stream': uma única query para toda a janela de watermark, lida
+              por cursor server-side nomeado em blocos de chunk_size linhas.
+              Sem replanejamento por chunk; a conexão remota fica aberta até o
+              consumidor esgotar o generator. Colunas NUMERIC (Decimal) viram
+              float, como nos modos que usam pd.read_sql.
+
         Args:
             inbox_ids: Lista de inbox_ids para extrair
             watermark_start: Data mínima (extração incremental)
             watermark_end: Data máxima (opcional, default=NOW)
             chunk_size: Tamanho do chunk (default=10000)
+            pagination: Modo de paginação ('keyset', 'offset' ou 'stream').
+                        'stream' lê a janela inteira por cursor server-side
+                        (conexão aberta durante a iteração) e converte
+                        NUMERIC para float
 
         Yields:
             DataFrame com dados de conversas (chunk por chunk)
@@ -313,8 +325,10 @@ class RemoteExtractor:
             query += " AND conversation_updated_at <= :watermark_end"
             params['watermark_end'] = watermark_end
 
-        # Ordenar por data para watermark
-        query += " ORDER BY conversation_updated_at ASC"
+        if pagination not in PAGINATION_MODES:
+            raise ValueError(
+                f"Modo de paginação inválido: {pagination} (válidos: {', '.join(PAGINATION_MODES)})"
+            )
 
         # Log da extração
         logger.info(f"Iniciando extração de conversas")
@@ -322,6 +336,156 @@ class RemoteExtractor:
         logger.info(f"  Watermark start: {watermark_start}")
         logger.info(f"  Watermark end: {watermark_end or 'NOW()'}")
         logger.info(f"  Chunk size: {chunk_size}")
+        logger.info(f"  Paginação: {pagination}")
+
+        if pagination == PAGINATION_KEYSET:
+            yield from self._extract_keyset(query, params, chunk_size)
+        elif pagination == PAGINATION_STREAM:
+            yield from self._extract_stream(query, params, chunk_size)
+        else:
+            yield from self._extract_offset(query, params, chunk_size)
+
+    def _extract_keyset(
+        self,
+        query: str,
+        params: Dict,
+        chunk_size: int
+    ) -> Generator[pd.DataFrame, None, None]:
+        """
+        Executa a query base em chunks usando paginação keyset (seek).
+
+        Cada chunk filtra por (conversation_updated_at, conversation_id) maior que
+        a última tupla lida, então o Postgres não reavalia as linhas já extraídas.
+        conversation_id desempata linhas com o mesmo conversation_updated_at.
+
+        Args:
+            query: Query base (SELECT ... WHERE ...) sem ORDER BY/LIMIT
+            params: Parâmetros da query base
+            chunk_size: Tamanho do chunk
+
+        Yields:
+            DataFrame com dados de conversas (chunk por chunk)
+        """
+        last_updated_at = None
+        last_conversation_id = None
+        total_extracted = 0
+
+        while True:
+            chunk_query = query
+            chunk_params = dict(params)
+
+            if last_updated_at is not None:
+                chunk_query += (
+                    " AND (conversation_updated_at, conversation_id)"
+                    " > (:last_updated_at, :last_conversation_id)"
+                )
+                chunk_params['last_updated_at'] = last_updated_at
+                chunk_params['last_conversation_id'] = last_conversation_id
+
+            chunk_query += (
+                " ORDER BY conversation_updated_at ASC, conversation_id ASC"
+                f" LIMIT {chunk_size}"
+            )
+
+            try:
+                df = pd.read_sql(
+                    text(chunk_query),
+                    self.remote_engine,
+                    params=chunk_params
+                )
+            except Exception as e:
+                logger.error(
+                    f"Erro ao extrair chunk (após updated_at={last_updated_at}, "
+                    f"conversation_id={last_conversation_id}): {str(e)}"
+                )
+                raise
+
+            if df.empty:
+                logger.info(f"Extração finalizada: {total_extracted} conversas extraídas")
+                break
+
+            total_extracted += len(df)
+            logger.info(f"Chunk extraído: {len(df)} conversas (total: {total_extracted})")
+
+            # Guardar cursor antes do yield (o consumidor pode alterar o DataFrame)
+            last_row = df.iloc[-1]
+            last_updated_at = last_row['conversation_updated_at']
+            last_conversation_id = int(last_row['conversation_id'])
+
+            yield df
+
+            if len(df) < chunk_size:
+                logger.info(f"Extração finalizada: {total_extracted} conversas extraídas")
+                break
+
+    def _extract_stream(
+        self,
+        query: str,
+        params: Dict,
+        chunk_size: int
+    ) -> Generator[pd.DataFrame, None, None]:
+        """
+        Executa a query base uma única vez e lê o resultado por cursor server-side.
+
+        Usa stream_results/yield_per (cursor nomeado no psycopg2), então o
+        Postgres planeja a query uma vez e entrega o resultado em blocos de
+        chunk_size linhas, sem materializar tudo na memória do cliente.
+
+        Args:
+            query: Query base (SELECT ... WHERE ...) sem ORDER BY/LIMIT
+            params: Parâmetros da query base
+            chunk_size: Tamanho do chunk
+
+        Yields:
+            DataFrame com dados de conversas (chunk por chunk)
+        """
+        query += " ORDER BY conversation_updated_at ASC, conversation_id ASC"
+
+        total_extracted = 0
+
+        try:
+            with self.remote_engine.connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True,
+                    yield_per=chunk_size
+                ).execute(text(query), params)
+
+                columns = list(result.keys())
+
+                for rows in result.partitions(chunk_size):
+                    # coerce_float: NUMERIC (Decimal) vira float, como no pd.read_sql
+                    df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+                    total_extracted += len(df)
+                    logger.info(f"Chunk extraído (stream): {len(df)} conversas (total: {total_extracted})")
+
+                    yield df
+
+        except Exception as e:
+            logger.error(f"Erro ao extrair via stream (após {total_extracted} conversas): {str(e)}")
+            raise
+
+        logger.info(f"Extração finalizada: {total_extracted} conversas extraídas")
+
+    def _extract_offset(
+        self,
+        query: str,
+        params: Dict,
+        chunk_size: int
+    ) -> Generator[pd.DataFrame, None, None]:
+        """
+        Executa a query base em chunks usando LIMIT/OFFSET (modo legado).
+
+        Args:
+            query: Query base (SELECT ... WHERE ...) sem ORDER BY/LIMIT
+            params: Parâmetros da query base
+            chunk_size: Tamanho do chunk
+
+        Yields:
+            DataFrame com dados de conversas (chunk por chunk)
+        """
+        # Ordenar por data para watermark
+        query += " ORDER BY conversation_updated_at ASC"
 
         # Executar query em chunks
         offset = 0
@@ -360,7 +524,8 @@ class RemoteExtractor:
         tenant_id: int,
         watermark_start: Optional[datetime] = None,
         watermark_end: Optional[datetime] = None,
-        chunk_size: int = 10000
+        chunk_size: int = 10000,
+        pagination: str = PAGINATION_KEYSET
     ) -> Generator[pd.DataFrame, None, None]:
         """
         Extrai conversas de um tenant específico.
@@ -371,6 +536,7 @@ class RemoteExtractor:
             watermark_start: Data mínima (extração incremental)
             watermark_end: Data máxima (opcional)
             chunk_size: Tamanho do chunk
+            pagination: Modo de paginação ('keyset', 'offset' ou 'stream')
 
         Yields:
             DataFrame com dados de conversas do tenant
@@ -389,7 +555,8 @@ class RemoteExtractor:
             inbox_ids=inbox_ids,
             watermark_start=watermark_start,
             watermark_end=watermark_end,
-            chunk_size=chunk_size
+            chunk_size=chunk_size,
+            pagination=pagination
         )
 
     def test_connection(self) -> bool:
@@ -7,21 +7,38 @@ Responsável por carregar dados transformados no banco local.
 Funcionalidades:
     - UPSERT (INSERT ... ON CONFLICT UPDATE)
     - Unique key: (tenant_id, conversation_id)
-    - Batch inserts usando pandas to_sql
+    - Bulk load via COPY para tabela de staging + UPSERT set-based
+    - Batch inserts (executemany) como caminho legado
     - Atualização de etl_inserted_at e etl_updated_at
+    - Rollup diário (conversations_daily_rollup) dos dias carregados
+    - Contadores por tenant (tenant_metrics) atualizados pela diferença do chunk
+    - Mensagens normalizadas (conversation_messages) das conversas regravadas
     - Logging estruturado
 
 Autor: Isaac (via Claude Code)
 Data: 2025-11-06
 """
 
+import csv
+import io
+import json
 import logging
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
+from .analyzers.base_analyzer import ANALYSIS_COLUMNS
+from .conversation_messages import (
+    invalidate_conversation_messages,
+    messages_table_available,
+    refresh_conversation_messages,
+)
+from .daily_rollup import refresh_daily_rollup
+from .tenant_metrics import apply_metrics_delta, chunk_contacts, compute_metrics_delta, snapshot_conversations
+from .transformer import ANALYSIS_UNCHANGED_FLAG
+
 # Configurar logging estruturado
 logging.basicConfig(
     level=logging.INFO,
@@ -29,19 +46,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tipos PostgreSQL que precisam de inteiros "limpos" no COPY (123, não 123.0)
+INTEGER_PG_TYPES = ('smallint', 'integer', 'bigint')
+
+# Tipos PostgreSQL JSON (dict/list precisam ser serializados antes do COPY)
+JSON_PG_TYPES = ('json', 'jsonb')
+
+# Marcador de NULL no CSV enviado ao COPY
+COPY_NULL = '\\N'
+
+# Colunas não regravadas quando a entrada da análise não mudou
+# (análise pulada pelo transformer e message_compiled idêntico)
+NARROWED_UPDATE_EXCLUDED_COLUMNS = ANALYSIS_COLUMNS + ('message_compiled', 'analysis_input_hash')
+
 
 class ConversationLoader:
     """Carrega dados de conversas no banco local usando UPSERT"""
 
-    def __init__(self, local_engine: Engine):
+    def __init__(
+        self,
+        local_engine: Engine,
+        use_copy: bool = True,
+        maintain_rollup: bool = True,
+        maintain_metrics: bool = True,
+        maintain_messages: bool = True
+    ):
         """
         Inicializa o loader.
 
         Args:
             local_engine: Engine SQLAlchemy conectada ao banco local
+            use_copy: Se True (default), carrega via COPY + staging.
+                      Se False, usa o UPSERT executemany legado.
+            maintain_rollup: Se True (default), recalcula o rollup diário
+                             dos dias presentes em cada chunk
+            maintain_metrics: Se True (default), atualiza tenant_metrics
+                              com a diferença de cada chunk
+            maintain_messages: Se True (default), regrava conversation_messages
+                               das conversas com message_compiled novo
         """
         self.local_engine = local_engine
-        logger.info("ConversationLoader inicializado")
+        self.use_copy = use_copy
+        self.maintain_rollup = maintain_rollup
+        self.maintain_metrics = maintain_metrics
+        self.maintain_messages = maintain_messages
+        self._column_types = None  # Cache {coluna: data_type} de conversations_analytics
+        logger.info(f"ConversationLoader inicializado (modo: {'COPY' if use_copy else 'executemany'})")
 
     def load_chunk(self, df: pd.DataFrame) -> Dict[str, int]:
         """
@@ -64,20 +114,154 @@ class ConversationLoader:
 
         logger.info(f"Carregando {len(df)} conversas no banco local")
 
-        # Preparar dados para insert
-        df_prepared = self._prepare_for_insert(df)
-
-        # Executar UPSERT
-        inserted, updated = self._upsert_conversations(df_prepared)
+        # Linhas com análise pulada (ver ConversationTransformer) recebem UPDATE
+        # restrito: sem colunas de análise nem message_compiled
+        if ANALYSIS_UNCHANGED_FLAG in df.columns:
+            narrowed_mask = df[ANALYSIS_UNCHANGED_FLAG].fillna(False).astype(bool)
+            df = df.drop(columns=[ANALYSIS_UNCHANGED_FLAG])
+        else:
+            narrowed_mask = pd.Series(False, index=df.index)
+
+        # Estado anterior das conversas do chunk (diferença para tenant_metrics)
+        metrics_snapshot = self._snapshot_tenant_metrics(df) if self.maintain_metrics else None
+
+        inserted, updated = 0, 0
+
+        df_full = df[~narrowed_mask]
+        if not df_full.empty:
+            full_inserted, full_updated = self._upsert(self._prepare_for_insert(df_full))
+            inserted += full_inserted
+            updated += full_updated
+
+        df_narrowed = df[narrowed_mask]
+        if not df_narrowed.empty:
+            logger.info(f"{len(df_narrowed)} conversas com UPDATE restrito (análise e mensagens inalteradas)")
+            df_narrowed = df_narrowed.drop(
+                columns=[col for col in NARROWED_UPDATE_EXCLUDED_COLUMNS if col in df_narrowed.columns]
+            )
+            narrowed_inserted, narrowed_updated = self._upsert(self._prepare_for_insert(df_narrowed))
+            inserted += narrowed_inserted
+            updated += narrowed_updated
 
         logger.info(f"Carga concluída: {inserted} inseridas, {updated} atualizadas")
 
+        if self.maintain_rollup:
+            self._refresh_daily_rollup(df)
+
+        if metrics_snapshot is not None:
+            self._update_tenant_metrics(df, narrowed_mask, metrics_snapshot)
+
+        if self.maintain_messages:
+            self._refresh_conversation_messages(df_full)
+
         return {
             'inserted': inserted,
             'updated': updated,
             'total': len(df)
         }
 
+    def _refresh_daily_rollup(self, df: pd.DataFrame) -> None:
+        """
+        Recalcula o rollup diário dos dias presentes no chunk.
+
+        Falhas não interrompem a carga (ex: migration do rollup ainda não aplicada).
+        """
+        if 'tenant_id' not in df.columns or 'conversation_date' not in df.columns:
+            return
+
+        dates_by_tenant = (
+            pd.DataFrame({
+                'tenant_id': df['tenant_id'],
+                'conversation_date': pd.to_datetime(df['conversation_date'], errors='coerce').dt.date,
+            })
+            .dropna()
+            .drop_duplicates()
+            .groupby('tenant_id')['conversation_date']
+        )
+
+        for tenant_id, dates in dates_by_tenant:
+            try:
+                refresh_daily_rollup(self.local_engine, int(tenant_id), dates.tolist())
+            except Exception as e:
+                logger.warning(f"Rollup diário não atualizado (tenant {tenant_id}): {e}")
+
+    def _refresh_conversation_messages(self, df: pd.DataFrame) -> None:
+        """
+        Regrava conversation_messages das conversas carregadas com message_compiled.
+
+        Conversas com UPDATE restrito ficam de fora (mensagens inalteradas).
+        Sem a migration, nada a fazer. Se a regravação falhar, as mensagens
+        antigas dessas conversas são removidas (o predicado de resposta volta
+        ao JSON); se nem isso for possível, a carga falha.
+        """
+        if df.empty or 'message_compiled' not in df.columns or 'tenant_id' not in df.columns:
+            return
+
+        if not messages_table_available(self.local_engine):
+            return
+
+        for tenant_id, group in df.groupby('tenant_id'):
+            try:
+                refresh_conversation_messages(self.local_engine, int(tenant_id), group['conversation_id'])
+            except Exception as e:
+                logger.error(
+                    f"Mensagens normalizadas não regravadas (tenant {tenant_id}, {len(group)} conversas): {e}. "
+                    f"Removendo as antigas: remarketing usa message_compiled até a próxima carga"
+                )
+                invalidate_conversation_messages(self.local_engine, int(tenant_id), group['conversation_id'])
+
+    def _snapshot_tenant_metrics(self, df: pd.DataFrame) -> Optional[Dict[int, pd.DataFrame]]:
+        """
+        Lê (status, is_lead) atuais das conversas do chunk, por tenant.
+
+        Retorna None em caso de erro: o chunk é carregado sem atualizar
+        tenant_metrics (corrigido na próxima reconciliação).
+        """
+        if 'tenant_id' not in df.columns:
+            return None
+
+        try:
+            return {
+                int(tenant_id): snapshot_conversations(self.local_engine, int(tenant_id), group['conversation_id'])
+                for tenant_id, group in df.groupby('tenant_id')
+            }
+        except Exception as e:
+            logger.warning(f"Tenant metrics não atualizadas neste chunk: {e}")
+            return None
+
+    def _update_tenant_metrics(
+        self,
+        df: pd.DataFrame,
+        narrowed_mask: pd.Series,
+        snapshot: Dict[int, pd.DataFrame]
+    ) -> None:
+        """
+        Soma a diferença do chunk aos contadores de cada tenant.
+
+        Falhas não interrompem a carga (ex: migration ainda não aplicada).
+        """
+        written = df.copy()
+        if 'is_lead' in written.columns:
+            # UPDATE restrito não regrava is_lead: mantém o valor anterior
+            written['is_lead'] = written['is_lead'].astype(object).where(~narrowed_mask, None)
+
+        for tenant_id, group in written.groupby('tenant_id'):
+            try:
+                before = snapshot[int(tenant_id)]
+                contact_ids, lead_contact_ids = chunk_contacts(before, group)
+                apply_metrics_delta(
+                    self.local_engine, int(tenant_id), compute_metrics_delta(before, group),
+                    contact_ids, lead_contact_ids
+                )
+            except Exception as e:
+                logger.warning(f"Tenant metrics não atualizadas (tenant {tenant_id}): {e}")
+
+    def _upsert(self, df: pd.DataFrame) -> Tuple[int, int]:
+        """Executa o UPSERT no modo configurado (COPY ou executemany)"""
+        if self.use_copy:
+            return self._copy_upsert_conversations(df)
+        return self._upsert_conversations(df)
+
     def _prepare_for_insert(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Prepara DataFrame para inserção no PostgreSQL.
@@ -201,6 +385,158 @@ class ConversationLoader:
             logger.error(f"Erro ao executar UPSERT: {str(e)}")
             raise
 
+    def _copy_upsert_conversations(self, df: pd.DataFrame) -> Tuple[int, int]:
+        """
+        Executa UPSERT em massa: COPY para staging temporária + INSERT ... SELECT.
+
+        Fluxo (uma única transação):
+            1. CREATE TEMP TABLE com as colunas do chunk (ON COMMIT DROP)
+            2. COPY do chunk (CSV em memória) para a staging
+            3. INSERT ... SELECT ... ON CONFLICT DO UPDATE ... RETURNING (xmax = 0)
+
+        O RETURNING (xmax = 0) distingue linhas inseridas de atualizadas, então
+        as contagens são exatas e não é preciso o COUNT prévio.
+
+        Args:
+            df: DataFrame preparado para inserção
+
+        Returns:
+            Tupla (inserted_count, updated_count)
+        """
+        if df.empty:
+            return 0, 0
+
+        columns = [col for col in df.columns if col not in ['id']]
+        columns_str = ', '.join(columns)
+
+        update_set = [
+            f"{col} = EXCLUDED.{col}"
+            for col in columns
+            if col not in ['tenant_id', 'conversation_id']
+        ]
+        update_set.append("etl_updated_at = NOW()")
+        update_set_str = ', '.join(update_set)
+
+        # Um chunk não pode afetar a mesma linha duas vezes no ON CONFLICT:
+        # se a view devolver duplicatas, manter a versão mais recente
+        order_by = 'tenant_id, conversation_id'
+        if 'conversation_updated_at' in columns:
+            order_by += ', conversation_updated_at DESC NULLS LAST'
+
+        upsert_query = text(f"""
+            WITH upserted AS (
+                INSERT INTO conversations_analytics ({columns_str})
+                SELECT DISTINCT ON (tenant_id, conversation_id) {columns_str}
+                FROM stage_conversations_analytics
+                ORDER BY {order_by}
+                ON CONFLICT (tenant_id, conversation_id)
+                DO UPDATE SET {update_set_str}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT
+                COUNT(*) FILTER (WHERE inserted) AS inserted_count,
+                COUNT(*) FILTER (WHERE NOT inserted) AS updated_count
+            FROM upserted
+        """)
+
+        try:
+            with self.local_engine.begin() as conn:
+                column_types = self._get_column_types(conn)
+                buffer = self._to_copy_buffer(df[columns], column_types)
+
+                # 1. Staging com os mesmos tipos da tabela destino (sem constraints/índices)
+                conn.execute(text(f"""
+                    CREATE TEMP TABLE stage_conversations_analytics
+                    ON COMMIT DROP
+                    AS SELECT {columns_str}
+                    FROM conversations_analytics
+                    WITH NO DATA
+                """))
+
+                # 2. COPY (psycopg2 copy_expert na conexão DBAPI da transação)
+                logger.debug(f"COPY de {len(df)} conversas para staging...")
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.copy_expert(
+                        f"COPY stage_conversations_analytics ({columns_str}) "
+                        f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                        buffer
+                    )
+                finally:
+                    cursor.close()
+
+                # 3. UPSERT set-based com contagem exata
+                row = conn.execute(upsert_query).fetchone()
+                inserted_count, updated_count = int(row[0]), int(row[1])
+
+                logger.debug(f"UPSERT (COPY) concluído: {inserted_count} inseridas, {updated_count} atualizadas")
+
+                return inserted_count, updated_count
+
+        except Exception as e:
+            logger.error(f"Erro ao executar UPSERT via COPY: {str(e)}")
+            raise
+
+    def _get_column_types(self, conn) -> Dict[str, str]:
+        """
+        Retorna {coluna: data_type} de conversations_analytics (cacheado por instância).
+
+        Args:
+            conn: Conexão SQLAlchemy aberta
+
+        Returns:
+            Dicionário com o data_type (information_schema) de cada coluna
+        """
+        if self._column_types is None:
+            result = conn.execute(text("""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_name = 'conversations_analytics'
+                  AND table_schema = current_schema()
+            """))
+            self._column_types = {row[0]: row[1] for row in result}
+
+        return self._column_types
+
+    def _to_copy_buffer(self, df: pd.DataFrame, column_types: Dict[str, str]) -> io.StringIO:
+        """
+        Serializa o DataFrame em CSV compatível com COPY.
+
+        - Colunas inteiras no destino: floats (ex: 123.0) viram Int64 (123)
+        - Colunas JSON/JSONB no destino: dict/list viram texto JSON
+        - None/NaN viram o marcador COPY_NULL
+
+        Args:
+            df: DataFrame preparado para inserção
+            column_types: Tipos das colunas destino (ver _get_column_types)
+
+        Returns:
+            Buffer posicionado no início, pronto para copy_expert
+        """
+        df_copy = df.copy()
+
+        for col in df_copy.columns:
+            col_type = column_types.get(col)
+
+            if col_type in INTEGER_PG_TYPES:
+                df_copy[col] = pd.to_numeric(df_copy[col], errors='coerce').round().astype('Int64')
+            elif col_type in JSON_PG_TYPES:
+                df_copy[col] = df_copy[col].apply(
+                    lambda x: json.dumps(x) if isinstance(x, (list, dict)) else x
+                )
+
+        buffer = io.StringIO()
+        df_copy.to_csv(
+            buffer,
+            index=False,
+            header=False,
+            na_rep=COPY_NULL,
+            quoting=csv.QUOTE_MINIMAL
+        )
+        buffer.seek(0)
+
+        return buffer
+
     def get_existing_conversation_ids(
         self,
         tenant_id: int,
@@ -245,6 +581,50 @@ class ConversationLoader:
 
         return existing
 
+    def get_existing_hashes(
+        self,
+        tenant_id: int,
+        conversation_ids: list
+    ) -> Dict[int, Tuple[str, str]]:
+        """
+        Busca os fingerprints salvos das conversas (para detecção de mudança).
+
+        Args:
+            tenant_id: ID do tenant
+            conversation_ids: Lista de conversation_ids do chunk
+
+        Returns:
+            {conversation_id: (content_hash, analysis_input_hash)} das conversas existentes
+
+        Example:
+            >>> loader = ConversationLoader(engine)
+            >>> hashes = loader.get_existing_hashes(1, chunk['conversation_id'].tolist())
+            >>> df = transformer.transform_chunk(chunk, existing_hashes=hashes)
+        """
+        if not conversation_ids:
+            return {}
+
+        query = text("""
+            SELECT conversation_id, content_hash, analysis_input_hash
+            FROM conversations_analytics
+            WHERE tenant_id = :tenant_id
+              AND conversation_id = ANY(:conversation_ids)
+        """)
+
+        with self.local_engine.connect() as conn:
+            result = conn.execute(
+                query,
+                {
+                    'tenant_id': tenant_id,
+                    'conversation_ids': [int(x) for x in conversation_ids]
+                }
+            )
+            hashes = {row[0]: (row[1], row[2]) for row in result}
+
+        logger.debug(f"Tenant {tenant_id}: {len(hashes)}/{len(conversation_ids)} fingerprints encontrados")
+
+        return hashes
+
     def get_load_statistics(self, tenant_id: int) -> Dict[str, any]:
         """
         Retorna estatísticas de dados carregados para um tenant.
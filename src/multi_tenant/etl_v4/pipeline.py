@@ -9,6 +9,7 @@ Funcionalidades:
     - Extração incremental (com watermark)
     - Extração full (sem watermark)
     - Advisory locks (evita execução simultânea)
+    - Execução pipelined opcional (extract/transform/load em paralelo, com backpressure)
     - Logging estruturado e detalhado
     - Estatísticas completas
 
@@ -18,19 +19,21 @@ Data: 2025-11-06
 
 import logging
 import os
+import queue
 import sys
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
-from urllib.parse import quote_plus
+from typing import Optional, Dict, Any, Iterator
 
-from sqlalchemy import create_engine, text
+import pandas as pd
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
 # Adicionar diretório raiz ao path
 sys.path.append('/home/tester/projetos/geniai-analytics')
 
 # Importar módulos do ETL
-from src.multi_tenant.etl_v4.extractor import RemoteExtractor
+from src.multi_tenant.etl_v4.extractor import RemoteExtractor, PAGINATION_MODES
 from src.multi_tenant.etl_v4.transformer import ConversationTransformer
 from src.multi_tenant.etl_v4.loader import ConversationLoader
 from src.multi_tenant.etl_v4.watermark_manager import WatermarkManager
@@ -38,6 +41,7 @@ from src.multi_tenant.etl_v4.remarketing_analyzer import (
     detect_and_reset_reopened_conversations,
     analyze_inactive_leads
 )
+from src.multi_tenant.utils.db_engines import get_engine
 
 # Configurar logging estruturado
 logging.basicConfig(
@@ -46,6 +50,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Modo pipelined: intervalo (s) para os workers checarem se outro estágio falhou
+PIPELINE_POLL_SECONDS = 0.5
+
+# Sentinela de fim de fluxo entre estágios do modo pipelined
+_PIPELINE_DONE = object()
+
 
 class ETLPipeline:
     """Orquestra o pipeline completo de ETL multi-tenant"""
@@ -73,30 +83,13 @@ class ETLPipeline:
         logger.info("ETLPipeline inicializado")
 
     def _create_local_engine(self) -> Engine:
-        """Cria engine para banco local usando variáveis de ambiente"""
-        host = os.getenv('LOCAL_DB_HOST', 'localhost')
-        port = os.getenv('LOCAL_DB_PORT', '5432')
-        database = os.getenv('LOCAL_DB_NAME', 'geniai_analytics')
-        # Usar johan_geniai (owner) para bypassa RLS no ETL
-        user = os.getenv('LOCAL_DB_USER', 'johan_geniai')
-        password = os.getenv('LOCAL_DB_PASSWORD', 'vlVMVM6UNz2yYSBlzodPjQvZh')
-
-        # URL encode password
-        password_encoded = quote_plus(password)
-
-        connection_string = f"postgresql://{user}:{password_encoded}@{host}:{port}/{database}"
-
-        engine = create_engine(
-            connection_string,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_pre_ping=True,
-            echo=False
-        )
+        """
+        Retorna a engine do banco local do registro (pool único por processo).
 
-        logger.info(f"Engine local criada: {host}:{port}/{database}")
-        return engine
+        Usa o papel 'etl' (johan_geniai, owner) para bypassar RLS no ETL;
+        credenciais via ETL_DB_USER/ETL_DB_PASSWORD e LOCAL_DB_HOST/PORT/NAME.
+        """
+        return get_engine('etl')
 
     def _get_tenant_config(self, tenant_id: int) -> Dict[str, Any]:
         """
@@ -143,7 +136,10 @@ class ETLPipeline:
         tenant_id: int,
         force_full: bool = False,
         chunk_size: int = 10000,
-        triggered_by: str = 'manual'
+        triggered_by: str = 'manual',
+        pagination: Optional[str] = None,
+        pipelined: Optional[bool] = None,
+        max_in_flight_chunks: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Executa ETL para um tenant específico.
@@ -153,6 +149,12 @@ class ETLPipeline:
             force_full: Se True, ignora watermark e faz full sync
             chunk_size: Tamanho do chunk para extração
             triggered_by: Quem disparou a execução
+            pagination: Modo de extração ('keyset', 'offset' ou 'stream').
+                        Se None, usa ETL_PAGINATION_MODE (default: keyset)
+            pipelined: Se True, extract/transform/load rodam em workers próprios
+                       com filas entre eles. Se None, usa ETL_PIPELINED (default: False)
+            max_in_flight_chunks: Máximo de chunks em memória no modo pipelined
+                                  (backpressure). Se None, usa ETL_MAX_IN_FLIGHT_CHUNKS (default: 2)
 
         Returns:
             Dicionário com estatísticas da execução
@@ -168,6 +170,21 @@ class ETLPipeline:
 
         execution_id = None
         lock_acquired = False
+        pagination = pagination or os.getenv('ETL_PAGINATION_MODE', 'keyset')
+
+        if pipelined is None:
+            pipelined = os.getenv('ETL_PIPELINED', 'false').lower() in ('1', 'true', 'yes')
+        if max_in_flight_chunks is None:
+            max_in_flight_chunks = int(os.getenv('ETL_MAX_IN_FLIGHT_CHUNKS', '2'))
+
+        # Totais por chunk (atualizados pelos estágios extract/transform/load)
+        totals = {
+            'chunks': 0,
+            'extracted': 0,
+            'inserted': 0,
+            'updated': 0,
+            'unchanged': 0
+        }
 
         # Estatísticas OpenAI (rastreadas ao longo da execução)
         openai_stats = {
@@ -230,11 +247,6 @@ class ETLPipeline:
             logger.info("FASE 1: EXTRACT")
             logger.info("-" * 80)
 
-            total_extracted = 0
-            total_inserted = 0
-            total_updated = 0
-            chunk_count = 0
-
             # 6. Criar transformer com config do tenant (Fase 5.6 - OpenAI)
             openai_api_key = os.getenv('OPENAI_API_KEY') if use_openai else None
 
@@ -248,43 +260,36 @@ class ETLPipeline:
             loader = ConversationLoader(self.local_engine)
 
             # Extrair em chunks
-            for chunk in self.extractor.extract_by_tenant(
+            chunks = self.extractor.extract_by_tenant(
                 local_engine=self.local_engine,
                 tenant_id=tenant_id,
                 watermark_start=watermark_start,
                 watermark_end=watermark_end,
-                chunk_size=chunk_size
-            ):
-                chunk_count += 1
-                chunk_size_actual = len(chunk)
-                total_extracted += chunk_size_actual
-
-                logger.info(f"Chunk {chunk_count}: {chunk_size_actual} conversas extraídas")
-
-                # 7. TRANSFORM - Transformar dados
-                logger.info(f"Chunk {chunk_count}: TRANSFORM")
-                df_transformed = transformer.transform_chunk(chunk)
-
-                # 7.1 Coletar estatísticas OpenAI (se usando OpenAI)
-                if use_openai and hasattr(transformer, 'lead_analyzer'):
-                    analyzer = transformer.lead_analyzer
-                    if hasattr(analyzer, 'get_usage_stats'):
-                        usage = analyzer.get_usage_stats()
-                        openai_stats['api_calls'] += usage.get('successful_calls', 0)
-                        openai_stats['total_tokens'] += usage.get('total_tokens', 0)
+                chunk_size=chunk_size,
+                pagination=pagination
+            )
 
-                # 8. LOAD - Carregar dados
-                logger.info(f"Chunk {chunk_count}: LOAD")
-                load_stats = loader.load_chunk(df_transformed)
+            stage_args = {
+                'transformer': transformer,
+                'loader': loader,
+                'tenant_id': tenant_id,
+                'force_full': force_full,
+                'use_openai': use_openai,
+                'openai_stats': openai_stats,
+                'totals': totals
+            }
 
-                total_inserted += load_stats['inserted']
-                total_updated += load_stats['updated']
+            if pipelined:
+                logger.info(f"Execução PIPELINED (máx. {max_in_flight_chunks} chunks em voo)")
+                self._run_chunks_pipelined(chunks, max_in_flight_chunks=max_in_flight_chunks, **stage_args)
+            else:
+                self._run_chunks_serial(chunks, **stage_args)
 
-                logger.info(
-                    f"Chunk {chunk_count}: "
-                    f"{load_stats['inserted']} inseridas, "
-                    f"{load_stats['updated']} atualizadas"
-                )
+            chunk_count = totals['chunks']
+            total_extracted = totals['extracted']
+            total_inserted = totals['inserted']
+            total_updated = totals['updated']
+            total_unchanged = totals['unchanged']
 
             # FASE 3.5: RESET REOPENED CONVERSATIONS
             logger.info("")
@@ -372,6 +377,7 @@ class ETLPipeline:
             logger.info(f"Conversas extraídas: {total_extracted}")
             logger.info(f"Conversas inseridas: {total_inserted}")
             logger.info(f"Conversas atualizadas: {total_updated}")
+            logger.info(f"Conversas inalteradas (puladas): {total_unchanged}")
             logger.info(f"Watermark: {watermark_start} → {watermark_end}")
             logger.info("=" * 80)
 
@@ -384,6 +390,7 @@ class ETLPipeline:
                 'records_extracted': total_extracted,
                 'records_inserted': total_inserted,
                 'records_updated': total_updated,
+                'records_unchanged': total_unchanged,
                 'watermark_start': watermark_start,
                 'watermark_end': watermark_end
             }
@@ -397,9 +404,9 @@ class ETLPipeline:
                     execution_id=execution_id,
                     status='error',
                     stats={
-                        'records_extracted': total_extracted if 'total_extracted' in locals() else 0,
-                        'records_inserted': total_inserted if 'total_inserted' in locals() else 0,
-                        'records_updated': total_updated if 'total_updated' in locals() else 0,
+                        'records_extracted': totals['extracted'],
+                        'records_inserted': totals['inserted'],
+                        'records_updated': totals['updated'],
                         'records_failed': 0
                     },
                     error_message=str(e)
@@ -418,11 +425,209 @@ class ETLPipeline:
                 self.watermark_manager.release_lock(tenant_id)
                 logger.info(f"Lock liberado para tenant {tenant_id}")
 
+    def _transform_stage(
+        self,
+        chunk: pd.DataFrame,
+        chunk_number: int,
+        transformer: ConversationTransformer,
+        loader: ConversationLoader,
+        tenant_id: int,
+        force_full: bool,
+        use_openai: bool,
+        openai_stats: Dict[str, Any],
+        totals: Dict[str, int]
+    ) -> pd.DataFrame:
+        """
+        Estágio TRANSFORM de um chunk (detecção de mudança + análise de leads).
+
+        Returns:
+            DataFrame transformado, pronto para o estágio LOAD
+        """
+        # Fingerprints salvos: pula conversas inalteradas e análises repetidas
+        # (full forçado reprocessa tudo)
+        existing_hashes = None
+        if not force_full:
+            existing_hashes = loader.get_existing_hashes(
+                tenant_id, chunk['conversation_id'].tolist()
+            )
+
+        logger.info(f"Chunk {chunk_number}: TRANSFORM")
+        df_transformed = transformer.transform_chunk(chunk, existing_hashes=existing_hashes)
+        totals['unchanged'] += transformer.last_change_stats['unchanged']
+
+        # Coletar estatísticas OpenAI (se usando OpenAI)
+        if use_openai and hasattr(transformer, 'lead_analyzer'):
+            analyzer = transformer.lead_analyzer
+            if hasattr(analyzer, 'get_usage_stats'):
+                usage = analyzer.get_usage_stats()
+                openai_stats['api_calls'] += usage.get('successful_calls', 0)
+                openai_stats['total_tokens'] += usage.get('total_tokens', 0)
+
+        return df_transformed
+
+    def _load_stage(
+        self,
+        df_transformed: pd.DataFrame,
+        chunk_number: int,
+        loader: ConversationLoader,
+        totals: Dict[str, int]
+    ) -> None:
+        """Estágio LOAD de um chunk (UPSERT no banco local)"""
+        logger.info(f"Chunk {chunk_number}: LOAD")
+        load_stats = loader.load_chunk(df_transformed)
+
+        totals['inserted'] += load_stats['inserted']
+        totals['updated'] += load_stats['updated']
+
+        logger.info(
+            f"Chunk {chunk_number}: "
+            f"{load_stats['inserted']} inseridas, "
+            f"{load_stats['updated']} atualizadas"
+        )
+
+    def _run_chunks_serial(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        transformer: ConversationTransformer,
+        loader: ConversationLoader,
+        tenant_id: int,
+        force_full: bool,
+        use_openai: bool,
+        openai_stats: Dict[str, Any],
+        totals: Dict[str, int]
+    ) -> None:
+        """
+        Processa os chunks em série: extract N → transform N → load N → extract N+1.
+        """
+        for chunk in chunks:
+            totals['chunks'] += 1
+            totals['extracted'] += len(chunk)
+            chunk_number = totals['chunks']
+
+            logger.info(f"Chunk {chunk_number}: {len(chunk)} conversas extraídas")
+
+            df_transformed = self._transform_stage(
+                chunk, chunk_number, transformer, loader, tenant_id,
+                force_full, use_openai, openai_stats, totals
+            )
+            self._load_stage(df_transformed, chunk_number, loader, totals)
+
+    def _run_chunks_pipelined(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        transformer: ConversationTransformer,
+        loader: ConversationLoader,
+        tenant_id: int,
+        force_full: bool,
+        use_openai: bool,
+        openai_stats: Dict[str, Any],
+        totals: Dict[str, int],
+        max_in_flight_chunks: int = 2
+    ) -> None:
+        """
+        Processa os chunks com extract, transform e load em workers separados.
+
+        Os estágios se comunicam por filas. Um semáforo limita os chunks em voo
+        (extraídos e ainda não carregados) a max_in_flight_chunks: o extractor
+        só busca o próximo chunk depois que o loader libera uma vaga.
+
+        Qualquer erro em um estágio interrompe os demais e é relançado aqui.
+        """
+        in_flight = threading.BoundedSemaphore(max(1, max_in_flight_chunks))
+        stop = threading.Event()
+        errors = []
+        transform_queue = queue.Queue()
+        load_queue = queue.Queue()
+
+        def get(source_queue):
+            """Lê da fila verificando periodicamente se outro estágio falhou"""
+            while not stop.is_set():
+                try:
+                    return source_queue.get(timeout=PIPELINE_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+            return _PIPELINE_DONE
+
+        def extract_worker():
+            chunk_iter = iter(chunks)
+            try:
+                while not stop.is_set():
+                    # Backpressure: esperar vaga antes de extrair o próximo chunk
+                    if not in_flight.acquire(timeout=PIPELINE_POLL_SECONDS):
+                        continue
+                    try:
+                        chunk = next(chunk_iter)
+                    except StopIteration:
+                        in_flight.release()
+                        break
+
+                    totals['chunks'] += 1
+                    totals['extracted'] += len(chunk)
+                    logger.info(f"Chunk {totals['chunks']}: {len(chunk)} conversas extraídas")
+                    transform_queue.put((totals['chunks'], chunk))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                # Fecha o generator (libera cursor/conexão remota no modo stream)
+                if hasattr(chunk_iter, 'close'):
+                    chunk_iter.close()
+                transform_queue.put(_PIPELINE_DONE)
+
+        def transform_worker():
+            try:
+                while True:
+                    item = get(transform_queue)
+                    if item is _PIPELINE_DONE:
+                        break
+                    chunk_number, chunk = item
+                    df_transformed = self._transform_stage(
+                        chunk, chunk_number, transformer, loader, tenant_id,
+                        force_full, use_openai, openai_stats, totals
+                    )
+                    load_queue.put((chunk_number, df_transformed))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                load_queue.put(_PIPELINE_DONE)
+
+        workers = [
+            threading.Thread(target=extract_worker, name=f'etl-extract-{tenant_id}', daemon=True),
+            threading.Thread(target=transform_worker, name=f'etl-transform-{tenant_id}', daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        # LOAD roda na thread chamadora
+        try:
+            while True:
+                item = get(load_queue)
+                if item is _PIPELINE_DONE:
+                    break
+                chunk_number, df_transformed = item
+                try:
+                    self._load_stage(df_transformed, chunk_number, loader, totals)
+                finally:
+                    in_flight.release()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for worker in workers:
+                worker.join()
+
+        if errors:
+            raise errors[0]
+
     def run_for_all_tenants(
         self,
         force_full: bool = False,
         chunk_size: int = 10000,
-        triggered_by: str = 'scheduler'
+        triggered_by: str = 'scheduler',
+        pagination: Optional[str] = None,
+        pipelined: Optional[bool] = None,
+        max_in_flight_chunks: Optional[int] = None
     ) -> Dict[int, Dict[str, Any]]:
         """
         Executa ETL para todos os tenants ativos.
@@ -431,6 +636,10 @@ class ETLPipeline:
             force_full: Se True, ignora watermark e faz full sync
             chunk_size: Tamanho do chunk para extração
             triggered_by: Quem disparou a execução
+            pagination: Modo de extração ('keyset', 'offset' ou 'stream')
+            pipelined: Se True, usa execução pipelined por tenant
+            max_in_flight_chunks: Máximo de chunks em memória no modo pipelined
+                                  (repassado a cada tenant)
 
         Returns:
             Dicionário com estatísticas por tenant {tenant_id: stats}
@@ -470,7 +679,10 @@ class ETLPipeline:
                     tenant_id=tenant_id,
                     force_full=force_full,
                     chunk_size=chunk_size,
-                    triggered_by=triggered_by
+                    triggered_by=triggered_by,
+                    pagination=pagination,
+                    pipelined=pipelined,
+                    max_in_flight_chunks=max_in_flight_chunks
                 )
                 results[tenant_id] = stats
             except Exception as e:
@@ -552,6 +764,24 @@ def main():
         default=10000,
         help='Tamanho do chunk para extração (default: 10000)'
     )
+    parser.add_argument(
+        '--pagination',
+        choices=PAGINATION_MODES,
+        default=None,
+        help='Modo de extração remota: keyset, offset ou stream (default: ETL_PAGINATION_MODE ou keyset)'
+    )
+    parser.add_argument(
+        '--pipelined',
+        action='store_true',
+        default=None,
+        help='Executar extract/transform/load em paralelo com filas limitadas (default: ETL_PIPELINED)'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=None,
+        help='Máximo de chunks em memória no modo pipelined (default: ETL_MAX_IN_FLIGHT_CHUNKS ou 2)'
+    )
     parser.add_argument(
         '--test',
         action='store_true',
@@ -579,7 +809,10 @@ def main():
             tenant_id=args.tenant_id,
             force_full=args.full,
             chunk_size=args.chunk_size,
-            triggered_by='cli'
+            triggered_by='cli',
+            pagination=args.pagination,
+            pipelined=args.pipelined,
+            max_in_flight_chunks=args.max_in_flight
         )
 
         if stats['success']:
@@ -606,7 +839,10 @@ def main():
         results = pipeline.run_for_all_tenants(
             force_full=args.full,
             chunk_size=args.chunk_size,
-            triggered_by='cli'
+            triggered_by='cli',
+            pagination=args.pagination,
+            pipelined=args.pipelined,
+            max_in_flight_chunks=args.max_in_flight
         )
 
         # Verificar se todos tiveram sucesso
@@ -0,0 +1,196 @@
+"""
+Query Plans - ETL V4 Multi-Tenant
+=================================
+
+Confere na inicialização o plano (EXPLAIN) das queries mais frequentes do
+remarketing/backlog e avisa quando alguma faz Seq Scan em tabela grande
+(ex: índice parcial ausente ou inutilizado por mudança no predicado).
+
+Queries verificadas (HOT_QUERIES, mesmos predicados do código de origem):
+    - remarketing_inactive_leads: fetch_inactive_leads / pré-filtro SKIP_NO_RESPONSE
+    - remarketing_pending_count: contagem de scripts/analysis/run_continuous_analysis.sh
+    - campaign_eligible_leads: CampaignService.get_eligible_leads (filtros padrão)
+    - BacklogProcessor acrescenta a própria query (get_active_tenants)
+
+Índices esperados: sql/migrations/20261017_add_remarketing_pending_indexes.sql
+
+Configuração (env):
+    - QUERY_PLAN_CHECK_ENABLED (default: true)
+
+Fase: 9.10 - Query Plans
+Data: 2026-10-17
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .remarketing_analyzer import INACTIVE_LEAD_CONDITIONS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Tabelas em que Seq Scan indica índice faltando
+WATCHED_TABLES = ('conversations_analytics',)
+
+# Abaixo disso o planner prefere Seq Scan com razão (tabela pequena)
+SEQ_SCAN_MIN_ROWS = 10000
+
+HOT_QUERIES: Dict[str, str] = {
+    'remarketing_inactive_leads': f"""
+        SELECT ca.conversation_id
+        FROM conversations_analytics ca
+        WHERE {INACTIVE_LEAD_CONDITIONS}
+        ORDER BY ca.mc_last_message_at ASC
+        LIMIT 50
+    """,
+    'remarketing_pending_count': """
+        SELECT COUNT(*)
+        FROM conversations_analytics
+        WHERE tenant_id = :tenant_id
+          AND is_lead = true
+          AND tipo_conversa IS NULL
+          AND mc_last_message_at < NOW() - INTERVAL '24 hours'
+    """,
+    'campaign_eligible_leads': """
+        SELECT ca.conversation_id
+        FROM conversations_analytics ca
+        WHERE ca.tenant_id = :tenant_id
+          AND ca.is_lead = true
+          AND ca.contact_phone IS NOT NULL
+          AND ca.contact_phone != ''
+          AND ca.analise_ia IS NOT NULL AND ca.analise_ia != ''
+        ORDER BY ca.ai_probability_score DESC NULLS LAST, ca.mc_last_message_at DESC
+        LIMIT 100 OFFSET 0
+    """,
+}
+
+
+def find_seq_scans(plan: Any, tables=WATCHED_TABLES) -> List[str]:
+    """
+    Lista as tabelas lidas por Seq Scan em um plano EXPLAIN (FORMAT JSON).
+
+    Args:
+        plan: Resultado do EXPLAIN (lista com {'Plan': ...}, dict de nó ou lista de nós)
+        tables: Tabelas consideradas
+
+    Returns:
+        Lista de nomes de tabela (uma entrada por nó Seq Scan)
+
+    Example:
+        >>> find_seq_scans([{'Plan': {'Node Type': 'Seq Scan', 'Relation Name': 'conversations_analytics'}}])
+        ['conversations_analytics']
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    if isinstance(plan, list):
+        return [table for node in plan for table in find_seq_scans(node, tables)]
+
+    if not isinstance(plan, dict):
+        return []
+
+    if 'Plan' in plan:
+        return find_seq_scans(plan['Plan'], tables)
+
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        found.append(plan['Relation Name'])
+
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child, tables))
+
+    return found
+
+
+def _table_sizes(conn, tables) -> Dict[str, float]:
+    """Linhas estimadas (pg_class.reltuples) de cada tabela"""
+    rows = conn.execute(
+        text("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:tables) AND relkind = 'r'"),
+        {'tables': list(tables)}
+    )
+    return {row[0]: float(row[1]) for row in rows}
+
+
+def check_hot_query_plans(
+    engine: Engine,
+    tenant_id: Optional[int] = None,
+    extra_queries: Optional[Dict[str, str]] = None
+) -> Dict[str, List[str]]:
+    """
+    Executa EXPLAIN das queries frequentes e avisa sobre Seq Scans.
+
+    Nunca interrompe a inicialização: erros viram warning.
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: Tenant usado nos parâmetros (default: qualquer tenant com conversas)
+        extra_queries: Queries adicionais {nome: sql} (parâmetro :tenant_id)
+
+    Returns:
+        {nome_da_query: [tabelas com Seq Scan]} apenas das queries com problema
+
+    Example:
+        >>> check_hot_query_plans(engine, extra_queries={'backlog_active_tenants': ACTIVE_TENANTS_QUERY})
+    """
+    if os.getenv('QUERY_PLAN_CHECK_ENABLED', 'true').lower() != 'true':
+        return {}
+
+    queries = {**HOT_QUERIES, **(extra_queries or {})}
+    problems = {}
+    checked = 0
+
+    try:
+        with engine.connect() as conn:
+            sizes = _table_sizes(conn, WATCHED_TABLES)
+            large_tables = tuple(table for table, rows in sizes.items() if rows >= SEQ_SCAN_MIN_ROWS)
+            if not large_tables:
+                logger.debug("Verificação de planos ignorada: tabelas pequenas")
+                return {}
+
+            if tenant_id is None:
+                tenant_id = conn.execute(text("SELECT tenant_id FROM conversations_analytics LIMIT 1")).scalar() or 0
+
+            for name, sql in queries.items():
+                try:
+                    plan = conn.execute(
+                        text(f"EXPLAIN (FORMAT JSON) {sql}"), {'tenant_id': tenant_id}
+                    ).scalar()
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"EXPLAIN de '{name}' falhou: {e}")
+                    continue
+
+                checked += 1
+                seq_scans = find_seq_scans(plan, large_tables)
+                if seq_scans:
+                    problems[name] = seq_scans
+                    logger.warning(
+                        f"⚠️  Query '{name}' faz Seq Scan em {', '.join(sorted(set(seq_scans)))} "
+                        f"(índice ausente? ver sql/migrations/20261017_add_remarketing_pending_indexes.sql)"
+                    )
+    except Exception as e:
+        logger.warning(f"Verificação de planos não executada: {e}")
+        return problems
+
+    if checked and not problems:
+        logger.info(f"✅ Planos de {checked} queries frequentes sem Seq Scan")
+
+    return problems
+
+
+if __name__ == "__main__":
+    # Executar da raiz do projeto: python -m src.multi_tenant.etl_v4.query_plans
+    from ..utils.db_engines import get_engine
+
+    result = check_hot_query_plans(get_engine('etl'))
+    for query_name, tables in result.items():
+        print(f"{query_name}: Seq Scan em {', '.join(tables)}")
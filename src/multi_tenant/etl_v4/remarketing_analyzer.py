@@ -24,7 +24,8 @@ import os
 import json
 import logging
 from decimal import Decimal
-from typing import Dict, Any, Optional
+from threading import Lock
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
@@ -32,6 +33,27 @@ from sqlalchemy.engine import Engine
 from openai import OpenAI
 
 from .analyzers.openai_lead_remarketing_analyzer import OpenAILeadRemarketingAnalyzer
+from .conversation_messages import messages_table_available, responder_exists_sql, responder_predicate_sql
+from .daily_rollup import safe_refresh_daily_rollup_for_conversations
+
+
+# Leads inativos 24h+ pendentes de análise de remarketing (alias ca)
+# IMPORTANTE: Busca por tipo_conversa IS NULL (campo novo de remarketing)
+# ao invés de analise_ia IS NULL (campo antigo pode estar preenchido)
+INACTIVE_LEAD_CONDITIONS = """
+            ca.tenant_id = :tenant_id
+            AND ca.is_lead = true                                   -- Apenas leads qualificados
+            AND ca.tipo_conversa IS NULL                            -- Pendentes de análise
+            AND ca.mc_last_message_at < NOW() - INTERVAL '24 hours' -- REGRA: 24h de inatividade
+            AND ca.message_compiled IS NOT NULL                     -- Tem conversa compilada
+"""
+
+SKIP_NO_RESPONSE_TYPE = 'SKIP_NO_RESPONSE'
+SKIP_NO_RESPONSE_REASON = 'Pulado: conversa sem resposta do bot/agente'
+
+# Leads enviados ao Batch API aguardando resultado (remarketing_batch.py);
+# sql/migrations/20261017_create_remarketing_batch_leads.sql
+BATCH_LEADS_TABLE = 'remarketing_batch_leads'
 
 
 def validate_openai_api_key(api_key: str) -> bool:
@@ -97,6 +119,25 @@ def has_bot_or_agent_response(message_compiled: Any) -> bool:
     return False
 
 
+def lead_has_response(lead: Dict[str, Any]) -> bool:
+    """
+    Verifica se o lead teve resposta do bot/agente.
+
+    Usa has_response (calculado em SQL sobre conversation_messages por
+    fetch_inactive_leads) e só decodifica message_compiled quando a coluna
+    não está disponível.
+
+    Args:
+        lead: Lead retornado por fetch_inactive_leads
+
+    Returns:
+        True se houver pelo menos 1 mensagem do bot/agente
+    """
+    if lead.get('has_response') is not None:
+        return bool(lead['has_response'])
+    return has_bot_or_agent_response(lead.get('message_compiled'))
+
+
 def detect_and_reset_reopened_conversations(
     local_engine: Engine,
     tenant_id: int
@@ -158,11 +199,191 @@ def detect_and_reset_reopened_conversations(
                 f"Análises invalidadas."
             )
             logger.debug(f"IDs resetados: {ids}")
+            safe_refresh_daily_rollup_for_conversations(local_engine, tenant_id, ids)
             return len(resetados)
 
         return 0
 
 
+# Bancos onde a tabela já foi encontrada (migration aplicada)
+_batch_leads_available: Dict[str, bool] = {}
+_batch_leads_available_lock = Lock()
+
+
+def batch_leads_table_available(engine: Engine) -> bool:
+    """
+    Verifica se remarketing_batch_leads existe (resultado positivo cacheado por banco).
+
+    Args:
+        engine: Engine do banco local
+
+    Returns:
+        bool: True se a migration foi aplicada
+    """
+    key = str(engine.url)
+
+    with _batch_leads_available_lock:
+        if key in _batch_leads_available:
+            return _batch_leads_available[key]
+
+    try:
+        with engine.connect() as conn:
+            available = conn.execute(
+                text("SELECT to_regclass(:table) IS NOT NULL"),
+                {'table': BATCH_LEADS_TABLE}
+            ).scalar()
+    except Exception as e:
+        logger.warning(f"Não foi possível verificar {BATCH_LEADS_TABLE}: {e}")
+        return False
+
+    if not available:
+        # Não cacheado: passa a ser usada assim que a migration for aplicada
+        logger.info(f"{BATCH_LEADS_TABLE} não encontrada: leads em batch pendente não são excluídos (migration pendente)")
+        return False
+
+    with _batch_leads_available_lock:
+        _batch_leads_available[key] = True
+
+    return True
+
+
+def reset_batch_leads_table_cache() -> None:
+    """Esquece a verificação de batch_leads_table_available (útil para testes)."""
+    with _batch_leads_available_lock:
+        _batch_leads_available.clear()
+
+
+def fetch_inactive_leads(
+    local_engine: Engine,
+    tenant_id: int,
+    limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Busca leads inativos 24h+ pendentes de análise de remarketing.
+
+    Leads enviados em um batch ainda não aplicado (remarketing_batch_leads)
+    ficam de fora, no modo síncrono e no Batch API.
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        limit: Máximo de leads
+
+    Returns:
+        Lista de leads (dicts), mais antigos primeiro
+    """
+    # "Tem resposta do bot/agente?" via conversation_messages (índice parcial),
+    # sem decodificar message_compiled; sem a migration ou sem mensagens normalizadas
+    # da conversa (has_response NULL), lead_has_response usa o JSON
+    has_response_column = ''
+    if messages_table_available(local_engine):
+        has_response_column = f"{responder_exists_sql('ca')} AS has_response,"
+
+    # Leads já enviados em um batch pendente (Batch API) não são selecionados de novo
+    pending_batch_condition = ''
+    if batch_leads_table_available(local_engine):
+        pending_batch_condition = (
+            f"AND NOT EXISTS (SELECT 1 FROM {BATCH_LEADS_TABLE} rbl "
+            f"WHERE rbl.tenant_id = ca.tenant_id AND rbl.conversation_id = ca.conversation_id)"
+        )
+
+    # Buscar leads inativos 24h+ sem análise de remarketing (INACTIVE_LEAD_CONDITIONS)
+    query = text(f"""
+        SELECT
+            {has_response_column}
+            conversation_id,
+            display_id,
+            message_compiled,
+            contact_name,
+            account_name,
+            contact_messages_count,
+            mc_last_message_at,
+            EXTRACT(EPOCH FROM (NOW() - mc_last_message_at)) / 3600 AS horas_inativo
+        FROM conversations_analytics ca
+        WHERE {INACTIVE_LEAD_CONDITIONS}
+            {pending_batch_condition}
+        ORDER BY mc_last_message_at ASC
+        LIMIT :limit
+    """)
+
+    with local_engine.connect() as conn:
+        result = conn.execute(query, {
+            'tenant_id': tenant_id,
+            'limit': limit
+        })
+        leads = [dict(row._mapping) for row in result]
+
+    return leads
+
+
+def mark_skipped_no_response_many(
+    local_engine: Engine,
+    tenant_id: int,
+    conversation_ids: List[int]
+) -> int:
+    """
+    Marca várias conversas sem resposta do bot/agente em um único UPDATE.
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        conversation_ids: IDs das conversas
+
+    Returns:
+        int: Conversas marcadas
+    """
+    if not conversation_ids:
+        return 0
+
+    with local_engine.begin() as conn:
+        result = conn.execute(text("""
+            UPDATE conversations_analytics
+            SET tipo_conversa = :tipo_conversa,
+                analise_ia = :analise_ia
+            WHERE tenant_id = :tenant_id
+              AND conversation_id = ANY(:conversation_ids)
+        """), {
+            'tenant_id': tenant_id,
+            'conversation_ids': [int(cid) for cid in conversation_ids],
+            'tipo_conversa': SKIP_NO_RESPONSE_TYPE,
+            'analise_ia': SKIP_NO_RESPONSE_REASON
+        })
+        return result.rowcount or 0
+
+
+def skip_inactive_leads_without_response(local_engine: Engine, tenant_id: int) -> List[int]:
+    """
+    Pré-filtro: marca SKIP_NO_RESPONSE em todos os leads pendentes sem
+    resposta do bot/agente, em um único UPDATE set-based.
+
+    Roda antes de fetch_inactive_leads: o LIMIT passa a contar só leads
+    analisáveis (os pulados não consomem o orçamento da execução).
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+
+    Returns:
+        Lista de conversation_id marcados
+    """
+    query = text(f"""
+        UPDATE conversations_analytics ca
+        SET tipo_conversa = :tipo_conversa,
+            analise_ia = :analise_ia
+        WHERE {INACTIVE_LEAD_CONDITIONS}
+            AND NOT {responder_predicate_sql(local_engine, 'ca')}
+        RETURNING ca.conversation_id
+    """)
+
+    with local_engine.begin() as conn:
+        result = conn.execute(query, {
+            'tenant_id': tenant_id,
+            'tipo_conversa': SKIP_NO_RESPONSE_TYPE,
+            'analise_ia': SKIP_NO_RESPONSE_REASON
+        })
+        return [row[0] for row in result]
+
+
 def analyze_inactive_leads(
     local_engine: Engine,
     tenant_id: int,
@@ -179,8 +400,10 @@ def analyze_inactive_leads(
     - AND mc_last_message_at < NOW() - INTERVAL '24 hours'   (REGRA: 24h de inatividade)
     - AND message_compiled IS NOT NULL                       (tem conversa compilada)
 
-    Filtros Python (após query):
-    - has_bot_or_agent_response() -> pula se não tem resposta do bot/agente
+    Pré-filtro (antes da query, set-based):
+    - skip_inactive_leads_without_response() -> um único UPDATE marca
+      SKIP_NO_RESPONSE em todos os candidatos sem resposta do bot/agente;
+      o limit conta apenas leads analisáveis
 
     Args:
         local_engine: Engine do banco local
@@ -235,42 +458,31 @@ def analyze_inactive_leads(
     logger.info("FASE 4: ANALYZE INACTIVE LEADS (24h+)")
     logger.info("-" * 80)
 
-    # Buscar leads inativos 24h+ sem análise de remarketing
-    # IMPORTANTE: Busca por tipo_conversa IS NULL (campo novo de remarketing)
-    # ao invés de analise_ia IS NULL (campo antigo pode estar preenchido)
-    query = text("""
-        SELECT
-            conversation_id,
-            display_id,
-            message_compiled,
-            contact_name,
-            account_name,
-            contact_messages_count,
-            mc_last_message_at,
-            EXTRACT(EPOCH FROM (NOW() - mc_last_message_at)) / 3600 AS horas_inativo
-        FROM conversations_analytics
-        WHERE
-            tenant_id = :tenant_id
-            AND is_lead = true                                   -- Apenas leads qualificados
-            AND tipo_conversa IS NULL                            -- Pendentes de análise
-            AND mc_last_message_at < NOW() - INTERVAL '24 hours' -- REGRA: 24h de inatividade
-            AND message_compiled IS NOT NULL                     -- Tem conversa compilada
-        ORDER BY mc_last_message_at ASC
-        LIMIT :limit
-    """)
+    # PRÉ-FILTRO: leads sem resposta do bot/agente marcados em um único UPDATE
+    skipped_ids = skip_inactive_leads_without_response(local_engine, tenant_id)
+    if skipped_ids:
+        logger.info(f"⏭️  {len(skipped_ids)} leads PULADOS: sem resposta do bot/agente")
 
-    with local_engine.connect() as conn:
-        result = conn.execute(query, {
-            'tenant_id': tenant_id,
-            'limit': limit
-        })
-        leads = [dict(row._mapping) for row in result]
+    leads = fetch_inactive_leads(local_engine, tenant_id, limit)
+
+    # Leads gravados entre o pré-filtro e a busca: mesma regra, também em lote
+    analyzable = [lead for lead in leads if lead_has_response(lead)]
+    late_skipped_ids = [lead['conversation_id'] for lead in leads if not lead_has_response(lead)]
+    if late_skipped_ids:
+        mark_skipped_no_response_many(local_engine, tenant_id, late_skipped_ids)
+        skipped_ids.extend(late_skipped_ids)
+    leads = analyzable
+
+    if skipped_ids:
+        # Sem resposta entra na contagem do rollup diário
+        safe_refresh_daily_rollup_for_conversations(local_engine, tenant_id, skipped_ids)
 
     if not leads:
         logger.info("✅ Nenhum lead inativo (24h+) para analisar")
         return {
             'analyzed_count': 0,
             'failed_count': 0,
+            'skipped_no_response': len(skipped_ids),
             'total_tokens': 0,
             'total_cost_brl': 0.0
         }
@@ -286,32 +498,12 @@ def analyze_inactive_leads(
 
     analyzed_count = 0
     failed_count = 0
-    skipped_no_response = 0
+    skipped_no_response = len(skipped_ids)
     total_tokens = 0
     total_cost_brl = 0.0
 
     for lead in leads:
         try:
-            # FILTRO: Pular conversas sem resposta do bot/agente
-            if not has_bot_or_agent_response(lead['message_compiled']):
-                skipped_no_response += 1
-                logger.info(
-                    f"⏭️  Lead #{lead['display_id']} PULADO: "
-                    f"Sem resposta do bot/agente (apenas {lead['contact_messages_count']} msgs do contato)"
-                )
-
-                # Marcar no banco para não reprocessar
-                with local_engine.connect() as conn:
-                    conn.execute(text("""
-                        UPDATE conversations_analytics
-                        SET tipo_conversa = 'SKIP_NO_RESPONSE',
-                            analise_ia = 'Pulado: conversa sem resposta do bot/agente'
-                        WHERE conversation_id = :conversation_id
-                    """), {'conversation_id': lead['conversation_id']})
-                    conn.commit()
-
-                continue
-
             # Verificar limite de custo
             if total_cost_brl >= max_cost_brl:
                 logger.warning(
@@ -339,7 +531,8 @@ def analyze_inactive_leads(
             save_analysis_to_db(
                 local_engine=local_engine,
                 conversation_id=lead['conversation_id'],
-                resultado=resultado
+                resultado=resultado,
+                tenant_id=tenant_id
             )
 
             analyzed_count += 1
@@ -378,17 +571,36 @@ def analyze_inactive_leads(
 def save_analysis_to_db(
     local_engine: Engine,
     conversation_id: int,
-    resultado: Dict[str, Any]
-) -> None:
+    resultado: Dict[str, Any],
+    tenant_id: int,
+    submitted_at: Optional[datetime] = None
+) -> bool:
     """
     Salva resultado da análise no banco de dados.
 
+    Com submitted_at (resultado do Batch API, aplicado até 24h depois do
+    envio) só grava se o lead continua pendente: tipo_conversa ainda NULL
+    e nenhuma mensagem nova depois do envio (conversa reaberta e resetada
+    por detect_and_reset_reopened_conversations no meio tempo).
+
     Args:
         local_engine: Engine do banco local
         conversation_id: ID da conversa
         resultado: Dicionário com resultado da análise
+        tenant_id: ID do tenant da conversa
+        submitted_at: Momento em que o lead foi enviado ao Batch API (opcional)
+
+    Returns:
+        bool: False se a análise foi descartada (lead já mudou de estado)
     """
-    query = text("""
+    stale_guard = ""
+    if submitted_at is not None:
+        stale_guard = """
+          AND tipo_conversa IS NULL
+          AND (mc_last_message_at IS NULL OR mc_last_message_at <= :submitted_at)
+        """
+
+    query = text(f"""
         UPDATE conversations_analytics
         SET
             tipo_conversa = :tipo_conversa,
@@ -399,7 +611,8 @@ def save_analysis_to_db(
             dados_extraidos_ia = cast(:dados_extraidos_ia as jsonb),
             metadados_analise_ia = cast(:metadados_analise_ia as jsonb),
             analisado_em = :analisado_em
-        WHERE conversation_id = :conversation_id
+        WHERE tenant_id = :tenant_id
+          AND conversation_id = :conversation_id{stale_guard}
     """)
 
     # Extrair nome_completo do JSON da IA
@@ -409,8 +622,10 @@ def save_analysis_to_db(
         nome_mapeado = ''
 
     with local_engine.connect() as conn:
-        conn.execute(query, {
+        result = conn.execute(query, {
+            'tenant_id': int(tenant_id),
             'conversation_id': conversation_id,
+            'submitted_at': submitted_at,
             'tipo_conversa': resultado['tipo_conversa'],
             'analise_ia': resultado['analise_ia'],
             'sugestao_disparo': resultado['sugestao_disparo'],
@@ -421,3 +636,5 @@ def save_analysis_to_db(
             'analisado_em': resultado['analisado_em']
         })
         conn.commit()
+
+    return result.rowcount > 0
@@ -0,0 +1,599 @@
+"""
+Remarketing Batch - ETL V4 Multi-Tenant
+========================================
+
+Modo offline da análise de leads inativos (24h+) via OpenAI Batch API.
+
+Em vez de uma chamada síncrona por lead (analyze_inactive_leads), os leads
+pendentes viram um arquivo JSONL que é enviado ao Batch API:
+
+1. submit_inactive_leads_batch: busca leads, gera JSONL, faz upload e cria o batch
+2. wait_for_batch: faz polling até o batch terminar (ou timeout)
+3. apply_batch_results: lê o arquivo de saída e grava via save_analysis_to_db
+
+Trade-off: resultado em até 24h, ~50% do custo e sem limite de throughput
+(o rate limit síncrono não se aplica).
+
+Leads enviados ficam em remarketing_batch_leads (com o batch_id) até o
+resultado ser aplicado: nenhuma execução seleciona o mesmo lead de novo
+enquanto o batch está pendente. Batches terminados e ainda não aplicados
+(execução interrompida) são aplicados na próxima execução
+(fetch_finished_pending_batches).
+
+Para testes locais, OPENAI_BATCH_BASE_URL aponta o cliente para um endpoint fake.
+
+Fase: 9.3 - Backlog via Batch API
+Data: 2026-10-17
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from openai import OpenAI
+
+from .analyzers.openai_lead_remarketing_analyzer import OpenAILeadRemarketingAnalyzer
+from .daily_rollup import safe_refresh_daily_rollup_for_conversations
+from .remarketing_analyzer import (
+    BATCH_LEADS_TABLE,
+    batch_leads_table_available,
+    fetch_inactive_leads,
+    lead_has_response,
+    mark_skipped_no_response_many,
+    save_analysis_to_db,
+    skip_inactive_leads_without_response,
+)
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Limites do Batch API
+BATCH_MAX_REQUESTS = 50000
+BATCH_COMPLETION_WINDOW = '24h'
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Polling
+DEFAULT_POLL_SECONDS = 60
+DEFAULT_WAIT_TIMEOUT_SECONDS = 24 * 3600
+
+# Estimativa de tokens por lead (mesma de analyze_lead)
+ESTIMATED_TOKENS_PER_LEAD = 600
+
+
+def get_batch_client(api_key: str) -> OpenAI:
+    """
+    Cria cliente OpenAI para o Batch API.
+
+    OPENAI_BATCH_BASE_URL permite apontar para um endpoint fake/local.
+
+    Args:
+        api_key: Chave da API OpenAI
+
+    Returns:
+        Cliente OpenAI
+    """
+    base_url = os.getenv('OPENAI_BATCH_BASE_URL') or None
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def build_custom_id(conversation_id: int, horas_inativo: float) -> str:
+    """
+    Monta o custom_id de uma linha do batch.
+
+    Carrega as horas de inatividade do momento do envio para que o resultado
+    possa ser aplicado sem estado em memória (ex: retomando um batch).
+
+    Example:
+        >>> build_custom_id(123, 50.5)
+        'lead-123-50.50'
+    """
+    return f"lead-{conversation_id}-{float(horas_inativo):.2f}"
+
+
+def parse_custom_id(custom_id: str) -> Tuple[int, float]:
+    """
+    Extrai (conversation_id, horas_inativo) de um custom_id.
+
+    Example:
+        >>> parse_custom_id('lead-123-50.50')
+        (123, 50.5)
+    """
+    _, conversation_id, horas_inativo = custom_id.split('-', 2)
+    return int(conversation_id), float(horas_inativo)
+
+
+def register_batch_leads(
+    local_engine: Engine,
+    tenant_id: int,
+    batch_id: str,
+    conversation_ids: List[int]
+) -> int:
+    """
+    Marca os leads enviados em um batch (excluídos da seleção até a aplicação).
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        batch_id: ID do batch na OpenAI
+        conversation_ids: Conversas enviadas no batch
+
+    Returns:
+        int: Leads marcados (0 se a migration não foi aplicada)
+    """
+    if not conversation_ids:
+        return 0
+
+    if not batch_leads_table_available(local_engine):
+        logger.warning(
+            f"⚠️  {BATCH_LEADS_TABLE} não existe: leads do batch {batch_id} podem ser reenviados "
+            f"antes do resultado (aplique sql/migrations/20261017_create_remarketing_batch_leads.sql)"
+        )
+        return 0
+
+    with local_engine.begin() as conn:
+        result = conn.execute(text(f"""
+            INSERT INTO {BATCH_LEADS_TABLE} (tenant_id, conversation_id, batch_id)
+            SELECT :tenant_id, conversation_id, :batch_id
+            FROM unnest(CAST(:conversation_ids AS INTEGER[])) AS conversation_id
+            ON CONFLICT (tenant_id, conversation_id) DO UPDATE
+            SET batch_id = EXCLUDED.batch_id,
+                submitted_at = NOW()
+        """), {
+            'tenant_id': tenant_id,
+            'batch_id': batch_id,
+            'conversation_ids': [int(cid) for cid in conversation_ids]
+        })
+        return result.rowcount or 0
+
+
+def release_batch_leads(local_engine: Engine, batch_id: str) -> int:
+    """
+    Remove a marcação dos leads de um batch (resultado aplicado).
+
+    Leads sem resultado válido voltam a ser selecionados na próxima execução.
+
+    Args:
+        local_engine: Engine do banco local
+        batch_id: ID do batch
+
+    Returns:
+        int: Leads liberados
+    """
+    if not batch_leads_table_available(local_engine):
+        return 0
+
+    with local_engine.begin() as conn:
+        result = conn.execute(
+            text(f"DELETE FROM {BATCH_LEADS_TABLE} WHERE batch_id = :batch_id"),
+            {'batch_id': batch_id}
+        )
+        return result.rowcount or 0
+
+
+def pending_batch_ids(local_engine: Engine, tenant_id: int) -> List[str]:
+    """
+    Lista os batches do tenant com leads ainda marcados (resultado não aplicado).
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+
+    Returns:
+        Lista de batch_id, mais antigos primeiro
+    """
+    if not batch_leads_table_available(local_engine):
+        return []
+
+    with local_engine.connect() as conn:
+        result = conn.execute(text(f"""
+            SELECT batch_id
+            FROM {BATCH_LEADS_TABLE}
+            WHERE tenant_id = :tenant_id
+            GROUP BY batch_id
+            ORDER BY MIN(submitted_at)
+        """), {'tenant_id': tenant_id})
+        return [row[0] for row in result]
+
+
+def fetch_finished_pending_batches(local_engine: Engine, tenant_id: int, client: OpenAI) -> List[Any]:
+    """
+    Consulta os batches pendentes do tenant e retorna os que já terminaram.
+
+    Batches ainda em andamento continuam marcados (seus leads seguem fora da
+    seleção); os terminados devem ser aplicados com apply_batch_results.
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        client: Cliente OpenAI
+
+    Returns:
+        Lista de objetos Batch com status terminal
+    """
+    finished = []
+
+    for batch_id in pending_batch_ids(local_engine, tenant_id):
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in BATCH_TERMINAL_STATUSES:
+            finished.append(batch)
+        else:
+            logger.info(f"⏳ Tenant {tenant_id}: batch {batch_id} ainda em {batch.status}; leads seguem reservados")
+
+    return finished
+
+
+def submit_inactive_leads_batch(
+    local_engine: Engine,
+    tenant_id: int,
+    client: OpenAI,
+    analyzer: OpenAILeadRemarketingAnalyzer,
+    limit: int = BATCH_MAX_REQUESTS,
+    work_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Gera o JSONL com os leads pendentes do tenant e cria o batch.
+
+    Leads sem resposta do bot/agente são marcados como SKIP_NO_RESPONSE antes
+    da busca, em um único UPDATE (mesmo pré-filtro de analyze_inactive_leads):
+    não entram no arquivo nem consomem o limit. Os
+    leads enviados são marcados com o batch_id (register_batch_leads).
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        client: Cliente OpenAI (ver get_batch_client)
+        analyzer: Analyzer do tenant (prompts e parâmetros do modelo)
+        limit: Máximo de leads no batch (teto do Batch API: 50.000)
+        work_dir: Diretório do arquivo JSONL temporário, removido após o
+            upload (default: BATCH_WORK_DIR ou /tmp)
+
+    Returns:
+        Dict com batch_id (None se nada a enviar), requests, skipped_no_response
+    """
+    limit = min(limit, BATCH_MAX_REQUESTS)
+
+    # PRÉ-FILTRO: leads sem resposta marcados em um único UPDATE (não consomem o limit)
+    skipped_ids = skip_inactive_leads_without_response(local_engine, tenant_id)
+
+    leads = fetch_inactive_leads(local_engine, tenant_id, limit)
+
+    # Leads gravados entre o pré-filtro e a busca: mesma regra, também em lote
+    late_skipped_ids = [lead['conversation_id'] for lead in leads if not lead_has_response(lead)]
+    if late_skipped_ids:
+        mark_skipped_no_response_many(local_engine, tenant_id, late_skipped_ids)
+        skipped_ids.extend(late_skipped_ids)
+        leads = [lead for lead in leads if lead_has_response(lead)]
+
+    work_dir = work_dir or os.getenv('BATCH_WORK_DIR', tempfile.gettempdir())
+    input_path = os.path.join(
+        work_dir,
+        f"remarketing_batch_tenant{tenant_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+
+    requests = 0
+    submitted_ids = []
+
+    try:
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for lead in leads:
+                horas_inativo = float(lead['horas_inativo'])
+                line = analyzer.build_batch_request(
+                    custom_id=build_custom_id(lead['conversation_id'], horas_inativo),
+                    conversa_compilada=lead['message_compiled'],
+                    contact_name=lead['contact_name'] or 'Cliente',
+                    inbox_name=lead['account_name'] or 'Equipe',
+                    tipo_remarketing=analyzer.get_remarketing_type(horas_inativo),
+                    tempo_inativo_horas=horas_inativo
+                )
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+                submitted_ids.append(lead['conversation_id'])
+                requests += 1
+
+        skipped_no_response = len(skipped_ids)
+        if skipped_ids:
+            # Sem resposta entra na contagem do rollup diário
+            safe_refresh_daily_rollup_for_conversations(local_engine, tenant_id, skipped_ids)
+
+        if requests == 0:
+            logger.info(f"✅ Tenant {tenant_id}: nenhum lead para enviar ao Batch API")
+            return {'batch_id': None, 'requests': 0, 'skipped_no_response': skipped_no_response}
+
+        with open(input_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose='batch')
+
+    finally:
+        # O JSONL tem as conversas completas: não fica em disco depois do upload
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=analyzer.BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata={'tenant_id': str(tenant_id), 'origem': 'remarketing_backlog'}
+    )
+
+    try:
+        register_batch_leads(local_engine, tenant_id, batch.id, submitted_ids)
+    except Exception as e:
+        # O batch já foi criado: segue para ser aguardado/aplicado normalmente
+        logger.error(f"❌ Tenant {tenant_id}: leads do batch {batch.id} não marcados como pendentes: {e}")
+
+    logger.info(
+        f"📤 Tenant {tenant_id}: batch {batch.id} criado com {requests} leads "
+        f"({skipped_no_response} pulados sem resposta)"
+    )
+
+    return {
+        'batch_id': batch.id,
+        'requests': requests,
+        'skipped_no_response': skipped_no_response
+    }
+
+
+def wait_for_batch(
+    client: OpenAI,
+    batch_id: str,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    timeout_seconds: float = DEFAULT_WAIT_TIMEOUT_SECONDS,
+    should_stop: Optional[Callable[[], bool]] = None
+):
+    """
+    Faz polling do batch até status terminal, timeout ou should_stop().
+
+    Args:
+        client: Cliente OpenAI
+        batch_id: ID do batch
+        poll_seconds: Intervalo entre consultas
+        timeout_seconds: Tempo máximo de espera
+        should_stop: Callback para interromper (ex: shutdown graceful)
+
+    Returns:
+        Último objeto Batch consultado (status pode não ser terminal)
+    """
+    deadline = time.monotonic() + timeout_seconds
+
+    while True:
+        batch = client.batches.retrieve(batch_id)
+
+        counts = getattr(batch, 'request_counts', None)
+        progress = f" ({counts.completed}/{counts.total})" if counts else ""
+        logger.info(f"⏳ Batch {batch_id}: {batch.status}{progress}")
+
+        if batch.status in BATCH_TERMINAL_STATUSES:
+            return batch
+
+        if time.monotonic() >= deadline or (should_stop and should_stop()):
+            logger.warning(f"⚠️  Batch {batch_id} ainda em {batch.status}; retome depois com --resume-batch")
+            return batch
+
+        time.sleep(poll_seconds)
+
+
+def _fetch_lead_context(
+    local_engine: Engine,
+    tenant_id: int,
+    conversation_ids: List[int]
+) -> Dict[int, Dict[str, Any]]:
+    """Busca contact_name/account_name dos leads do batch no tenant (uma query)"""
+    if not conversation_ids:
+        return {}
+
+    query = text("""
+        SELECT conversation_id, display_id, contact_name, account_name
+        FROM conversations_analytics
+        WHERE tenant_id = :tenant_id
+          AND conversation_id = ANY(:conversation_ids)
+    """)
+
+    with local_engine.connect() as conn:
+        result = conn.execute(query, {'tenant_id': tenant_id, 'conversation_ids': conversation_ids})
+        return {row.conversation_id: dict(row._mapping) for row in result}
+
+
+def _read_jsonl(client: OpenAI, file_id: Optional[str]) -> List[Dict[str, Any]]:
+    if not file_id:
+        return []
+
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def apply_batch_results(
+    local_engine: Engine,
+    client: OpenAI,
+    batch,
+    analyzer: OpenAILeadRemarketingAnalyzer
+) -> Dict[str, Any]:
+    """
+    Lê o arquivo de saída do batch e grava cada análise via save_analysis_to_db.
+
+    Linhas com erro (no arquivo de saída ou no arquivo de erros) contam como
+    falha; o lead continua pendente e entra no próximo batch. Ao final a
+    marcação dos leads do batch é removida (release_batch_leads).
+
+    O resultado chega até 24h depois do envio: leads que deixaram de estar
+    pendentes nesse meio tempo (já classificados, ou com mensagem nova depois
+    de batch.created_at) não são sobrescritos e contam em stale_count.
+
+    Args:
+        local_engine: Engine do banco local
+        client: Cliente OpenAI
+        batch: Objeto Batch com status 'completed' (ou terminal com saída parcial)
+        analyzer: Analyzer do tenant do batch (tenant_id escopa as consultas)
+
+    Returns:
+        Dict com analyzed_count, failed_count, stale_count, total_tokens, total_cost_brl
+    """
+    created_at = getattr(batch, 'created_at', None)
+    submitted_at = datetime.fromtimestamp(created_at, tz=timezone.utc) if created_at else None
+
+    output_lines = _read_jsonl(client, getattr(batch, 'output_file_id', None))
+    error_lines = _read_jsonl(client, getattr(batch, 'error_file_id', None))
+
+    parsed = [(line, *parse_custom_id(line['custom_id'])) for line in output_lines]
+    context = _fetch_lead_context(
+        local_engine, analyzer.tenant_id, [conversation_id for _, conversation_id, _ in parsed]
+    )
+
+    analyzed_count = 0
+    failed_count = len(error_lines)
+    stale_count = 0
+    total_tokens = 0
+    total_cost_brl = 0.0
+
+    for line, conversation_id, horas_inativo in parsed:
+        response = line.get('response') or {}
+
+        if line.get('error') or response.get('status_code') != 200:
+            failed_count += 1
+            logger.error(f"❌ Lead {conversation_id} falhou no batch: {line.get('error') or response.get('status_code')}")
+            continue
+
+        lead = context.get(conversation_id, {})
+
+        try:
+            resultado = analyzer.build_result_from_batch(
+                response_body=response['body'],
+                contact_name=lead.get('contact_name') or 'Cliente',
+                inbox_name=lead.get('account_name') or 'Equipe',
+                tipo_remarketing=analyzer.get_remarketing_type(horas_inativo),
+                tempo_inativo_horas=horas_inativo,
+                batch_id=batch.id
+            )
+
+            saved = save_analysis_to_db(
+                local_engine=local_engine,
+                conversation_id=conversation_id,
+                resultado=resultado,
+                tenant_id=analyzer.tenant_id,
+                submitted_at=submitted_at
+            )
+
+            if not saved:
+                # Conversa reaberta/resetada ou já analisada depois do envio
+                stale_count += 1
+                logger.info(f"⏭️  Lead {conversation_id}: mudou depois do envio do batch, resultado descartado")
+                continue
+
+            analyzed_count += 1
+            total_tokens += resultado['metadados_analise_ia']['tokens_total']
+            total_cost_brl += resultado['metadados_analise_ia']['custo_brl']
+
+        except Exception as e:
+            failed_count += 1
+            logger.error(f"❌ Erro ao aplicar resultado do lead {conversation_id}: {e}")
+
+    release_batch_leads(local_engine, batch.id)
+
+    logger.info(
+        f"BATCH {batch.id} APLICADO: {analyzed_count} sucesso, {failed_count} falhas, "
+        f"{stale_count} descartados (lead mudou após o envio) | "
+        f"Tokens: {total_tokens} | Custo: R$ {total_cost_brl:.4f}"
+    )
+
+    return {
+        'analyzed_count': analyzed_count,
+        'failed_count': failed_count,
+        'stale_count': stale_count,
+        'total_tokens': total_tokens,
+        'total_cost_brl': total_cost_brl
+    }
+
+
+def create_batch_analyzer(tenant_id: int, api_key: str) -> OpenAILeadRemarketingAnalyzer:
+    """Cria o analyzer do tenant com o mesmo modelo do modo síncrono"""
+    return OpenAILeadRemarketingAnalyzer(
+        tenant_id=tenant_id,
+        api_key=api_key,
+        model=os.getenv('OPENAI_MODEL', 'gpt-4o-mini-2024-07-18')
+    )
+
+
+def analyze_inactive_leads_batch(
+    local_engine: Engine,
+    tenant_id: int,
+    openai_api_key: Optional[str] = None,
+    limit: int = BATCH_MAX_REQUESTS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    timeout_seconds: float = DEFAULT_WAIT_TIMEOUT_SECONDS,
+    client: Optional[OpenAI] = None,
+    analyzer: Optional[OpenAILeadRemarketingAnalyzer] = None,
+    work_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Versão Batch API de analyze_inactive_leads: envia, aguarda e aplica.
+
+    Args:
+        local_engine: Engine do banco local
+        tenant_id: ID do tenant
+        openai_api_key: Chave OpenAI (se None, usa env var)
+        limit: Máximo de leads no batch
+        poll_seconds: Intervalo de polling
+        timeout_seconds: Tempo máximo de espera pelo batch
+        client: Cliente OpenAI (default: get_batch_client)
+        analyzer: Analyzer do tenant (default: create_batch_analyzer)
+        work_dir: Diretório do arquivo JSONL
+
+    Returns:
+        Dicionário com estatísticas (mesmas chaves de analyze_inactive_leads + batch_id/batch_status)
+    """
+    api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
+    if not api_key and (client is None or analyzer is None):
+        logger.warning("⏭️  Análise em batch PULADA: OPENAI_API_KEY não configurada")
+        return {
+            'analyzed_count': 0,
+            'failed_count': 0,
+            'total_tokens': 0,
+            'total_cost_brl': 0.0,
+            'skipped': True
+        }
+
+    client = client or get_batch_client(api_key)
+    analyzer = analyzer or create_batch_analyzer(tenant_id, api_key)
+
+    stats = {
+        'analyzed_count': 0,
+        'failed_count': 0,
+        'stale_count': 0,
+        'skipped_no_response': 0,
+        'total_tokens': 0,
+        'total_cost_brl': 0.0,
+        'batch_id': None,
+        'batch_status': None
+    }
+
+    def add_applied(applied: Dict[str, Any]) -> None:
+        for key in ('analyzed_count', 'failed_count', 'stale_count', 'total_tokens', 'total_cost_brl'):
+            stats[key] += applied[key]
+
+    # Batches de execuções anteriores que já terminaram
+    for finished in fetch_finished_pending_batches(local_engine, tenant_id, client):
+        add_applied(apply_batch_results(local_engine, client, finished, analyzer))
+
+    submitted = submit_inactive_leads_batch(
+        local_engine, tenant_id, client, analyzer, limit=limit, work_dir=work_dir
+    )
+    stats['skipped_no_response'] = submitted['skipped_no_response']
+    stats['batch_id'] = submitted['batch_id']
+
+    if not submitted['batch_id']:
+        return stats
+
+    batch = wait_for_batch(client, submitted['batch_id'], poll_seconds, timeout_seconds)
+    stats['batch_status'] = batch.status
+
+    if batch.status in BATCH_TERMINAL_STATUSES:
+        add_applied(apply_batch_results(local_engine, client, batch, analyzer))
+
+    return stats
@@ -0,0 +1,445 @@
+"""
+Tenant Metrics - ETL V4 Multi-Tenant
+====================================
+
+Mantém tenant_metrics: uma linha por tenant com os totais do painel admin
+(conversas, visitas, conversas de lead) e sketches HyperLogLog dos
+contatos distintos.
+
+Manutenção incremental (ConversationLoader.load_chunk):
+    - Antes do UPSERT: snapshot (status, is_lead) das conversas do chunk
+    - Depois: soma a diferença antes/depois aos contadores e adiciona os
+      contact_id do chunk aos sketches (add é idempotente)
+
+Reconciliação (refresh_tenant_metrics / __main__):
+    - Recalcula contadores e reconstrói os sketches a partir de
+      conversations_analytics (backfill e correção de desvios, ex: contato
+      que deixou de ser lead continua no sketch até a próxima reconciliação)
+    - Agendada por systemd/tenant-metrics-reconcile.timer
+
+Leitura (painel admin): load_tenant_metrics / load_global_metrics leem
+O(tenants) linhas; contatos distintos globais = união dos sketches.
+Tenants ainda não reconciliados (refreshed_at NULL: sketches ausentes ou
+parciais, ex: logo após a migration) têm os contatos contados direto em
+conversations_analytics.
+
+Fase: 9.8 - Tenant Metrics
+Data: 2026-10-17
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ..utils.hyperloglog import HyperLogLog
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+METRICS_TABLE = 'tenant_metrics'
+
+# status = 1 conta como visita (mesmo critério do painel admin)
+VISIT_STATUS = 1
+
+_SNAPSHOT = text("""
+    SELECT conversation_id, status, is_lead
+    FROM conversations_analytics
+    WHERE tenant_id = :tenant_id
+      AND conversation_id = ANY(:conversation_ids)
+""")
+
+
+def snapshot_conversations(engine: Engine, tenant_id: int, conversation_ids: Iterable[int]) -> pd.DataFrame:
+    """
+    Lê (status, is_lead) atuais das conversas de um chunk, antes do UPSERT.
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+        conversation_ids: Conversas do chunk
+
+    Returns:
+        pd.DataFrame: conversation_id, status, is_lead (só as já existentes)
+    """
+    conversation_ids = [int(cid) for cid in conversation_ids]
+    if not conversation_ids:
+        return pd.DataFrame(columns=['conversation_id', 'status', 'is_lead'])
+
+    with engine.connect() as conn:
+        return pd.read_sql(
+            _SNAPSHOT, conn,
+            params={'tenant_id': int(tenant_id), 'conversation_ids': conversation_ids}
+        )
+
+
+def _resolve_is_lead(before: pd.DataFrame, after: pd.DataFrame) -> pd.Series:
+    """is_lead gravado por conversa: nulo em after = valor anterior (before)"""
+    old_is_lead = after['conversation_id'].map(before.set_index('conversation_id')['is_lead'])
+    if 'is_lead' not in after.columns:
+        return old_is_lead
+    return after['is_lead'].where(after['is_lead'].notna(), old_is_lead)
+
+
+def compute_metrics_delta(before: pd.DataFrame, after: pd.DataFrame) -> Dict[str, int]:
+    """
+    Diferença dos contadores causada por um chunk.
+
+    Args:
+        before: Snapshot anterior (conversation_id, status, is_lead)
+        after: Conversas gravadas (conversation_id, status, is_lead);
+               is_lead nulo = coluna não regravada (mantém o valor anterior)
+
+    Returns:
+        Dict com total_conversations, total_visits, total_lead_conversations
+
+    Example:
+        >>> compute_metrics_delta(before, after)
+        {'total_conversations': 3, 'total_visits': 1, 'total_lead_conversations': -1}
+    """
+    after = after.drop_duplicates(subset='conversation_id', keep='last')
+    previous = before.set_index('conversation_id')
+    existing = after['conversation_id'].isin(previous.index)
+
+    old_status = after['conversation_id'].map(previous['status'])
+    old_is_lead = after['conversation_id'].map(previous['is_lead'])
+    new_status = after['status'] if 'status' in after.columns else old_status
+    new_is_lead = _resolve_is_lead(before, after)
+
+    def visits(status):
+        return int((pd.to_numeric(status, errors='coerce') == VISIT_STATUS).sum())
+
+    def leads(is_lead):
+        return int(is_lead.fillna(False).astype(bool).sum())
+
+    return {
+        'total_conversations': int((~existing).sum()),
+        'total_visits': visits(new_status) - visits(old_status[existing]),
+        'total_lead_conversations': leads(new_is_lead) - leads(old_is_lead[existing]),
+    }
+
+
+def chunk_contacts(before: pd.DataFrame, after: pd.DataFrame) -> Tuple[List[int], List[int]]:
+    """
+    Contatos de um chunk para os sketches (todos e os de conversas de lead).
+
+    Args:
+        before: Snapshot anterior (ver snapshot_conversations)
+        after: Conversas gravadas (conversation_id, contact_id, is_lead)
+
+    Returns:
+        tuple: (contact_ids, lead_contact_ids)
+    """
+    if 'contact_id' not in after.columns:
+        return [], []
+
+    valid = after['contact_id'].notna()
+    is_lead = _resolve_is_lead(before, after).fillna(False).astype(bool)
+
+    contact_ids = after.loc[valid, 'contact_id'].astype(int).tolist()
+    lead_contact_ids = after.loc[valid & is_lead, 'contact_id'].astype(int).tolist()
+    return contact_ids, lead_contact_ids
+
+
+def apply_metrics_delta(
+    engine: Engine,
+    tenant_id: int,
+    delta: Dict[str, int],
+    contact_ids: Iterable = (),
+    lead_contact_ids: Iterable = ()
+) -> None:
+    """
+    Soma a diferença aos contadores e adiciona contatos aos sketches do tenant.
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+        delta: Resultado de compute_metrics_delta
+        contact_ids: contact_id das conversas do chunk
+        lead_contact_ids: contact_id das conversas de lead do chunk
+    """
+    params = {'tenant_id': int(tenant_id)}
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"INSERT INTO {METRICS_TABLE} (tenant_id) VALUES (:tenant_id) ON CONFLICT (tenant_id) DO NOTHING"),
+            params
+        )
+
+        # FOR UPDATE: merge dos sketches sem perder atualizações concorrentes
+        row = conn.execute(
+            text(f"SELECT contacts_hll, lead_contacts_hll FROM {METRICS_TABLE} WHERE tenant_id = :tenant_id FOR UPDATE"),
+            params
+        ).fetchone()
+
+        contacts = HyperLogLog.from_bytes(row[0])
+        contacts.update(contact_ids)
+        lead_contacts = HyperLogLog.from_bytes(row[1])
+        lead_contacts.update(lead_contact_ids)
+
+        conn.execute(
+            text(f"""
+                UPDATE {METRICS_TABLE}
+                SET total_conversations = total_conversations + :total_conversations,
+                    total_visits = total_visits + :total_visits,
+                    total_lead_conversations = total_lead_conversations + :total_lead_conversations,
+                    contacts_hll = :contacts_hll,
+                    lead_contacts_hll = :lead_contacts_hll,
+                    last_sync = NOW(),
+                    updated_at = NOW()
+                WHERE tenant_id = :tenant_id
+            """),
+            {
+                **params,
+                **delta,
+                'contacts_hll': contacts.to_bytes(),
+                'lead_contacts_hll': lead_contacts.to_bytes(),
+            }
+        )
+
+
+def refresh_tenant_metrics(engine: Engine, tenant_id: int) -> Dict[str, int]:
+    """
+    Recalcula os contadores e reconstrói os sketches de um tenant.
+
+    Args:
+        engine: Engine do banco local
+        tenant_id: ID do tenant
+
+    Returns:
+        Dict com os totais gravados e contatos distintos estimados
+    """
+    params = {'tenant_id': int(tenant_id)}
+    contacts = HyperLogLog()
+    lead_contacts = HyperLogLog()
+
+    with engine.connect() as conn:
+        totals = conn.execute(
+            text("""
+                SELECT
+                    COUNT(*) AS total_conversations,
+                    COUNT(*) FILTER (WHERE status = :visit_status) AS total_visits,
+                    COUNT(*) FILTER (WHERE is_lead) AS total_lead_conversations,
+                    MAX(etl_updated_at) AS last_sync
+                FROM conversations_analytics
+                WHERE tenant_id = :tenant_id
+            """),
+            {**params, 'visit_status': VISIT_STATUS}
+        ).mappings().one()
+
+        # Streaming: contatos distintos sem materializar a lista inteira
+        result = conn.execution_options(stream_results=True).execute(
+            text("""
+                SELECT contact_id, BOOL_OR(COALESCE(is_lead, FALSE)) AS is_lead
+                FROM conversations_analytics
+                WHERE tenant_id = :tenant_id AND contact_id IS NOT NULL
+                GROUP BY contact_id
+            """),
+            params
+        )
+        for contact_id, is_lead in result:
+            contacts.add(contact_id)
+            if is_lead:
+                lead_contacts.add(contact_id)
+
+    metrics = {
+        'total_conversations': int(totals['total_conversations'] or 0),
+        'total_visits': int(totals['total_visits'] or 0),
+        'total_lead_conversations': int(totals['total_lead_conversations'] or 0),
+    }
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"""
+                INSERT INTO {METRICS_TABLE} (
+                    tenant_id, total_conversations, total_visits, total_lead_conversations,
+                    contacts_hll, lead_contacts_hll, last_sync, refreshed_at, updated_at
+                )
+                VALUES (
+                    :tenant_id, :total_conversations, :total_visits, :total_lead_conversations,
+                    :contacts_hll, :lead_contacts_hll, :last_sync, NOW(), NOW()
+                )
+                ON CONFLICT (tenant_id) DO UPDATE SET
+                    total_conversations = EXCLUDED.total_conversations,
+                    total_visits = EXCLUDED.total_visits,
+                    total_lead_conversations = EXCLUDED.total_lead_conversations,
+                    contacts_hll = EXCLUDED.contacts_hll,
+                    lead_contacts_hll = EXCLUDED.lead_contacts_hll,
+                    last_sync = EXCLUDED.last_sync,
+                    refreshed_at = NOW(),
+                    updated_at = NOW()
+            """),
+            {
+                **params,
+                **metrics,
+                'contacts_hll': contacts.to_bytes(),
+                'lead_contacts_hll': lead_contacts.to_bytes(),
+                'last_sync': totals['last_sync'],
+            }
+        )
+
+    logger.info(
+        f"Tenant metrics reconciliadas: tenant {tenant_id}, {metrics['total_conversations']} conversas, "
+        f"~{contacts.count()} contatos"
+    )
+    return {**metrics, 'contacts': contacts.count(), 'lead_contacts': lead_contacts.count()}
+
+
+def refresh_all_tenant_metrics(engine: Engine) -> int:
+    """
+    Reconcilia tenant_metrics de todos os tenants com conversas.
+
+    Returns:
+        int: Número de tenants reconciliados
+    """
+    with engine.connect() as conn:
+        tenant_ids = [row[0] for row in conn.execute(
+            text("SELECT DISTINCT tenant_id FROM conversations_analytics ORDER BY tenant_id")
+        )]
+
+    for tenant_id in tenant_ids:
+        refresh_tenant_metrics(engine, tenant_id)
+
+    return len(tenant_ids)
+
+
+def _count_contacts(conn, tenant_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """Contatos distintos (todos, de leads) por tenant, contados direto"""
+    rows = conn.execute(
+        text("""
+            SELECT
+                tenant_id,
+                COUNT(DISTINCT contact_id) AS contacts,
+                COUNT(DISTINCT contact_id) FILTER (WHERE is_lead) AS lead_contacts
+            FROM conversations_analytics
+            WHERE tenant_id = ANY(:tenant_ids)
+              AND contact_id IS NOT NULL
+            GROUP BY tenant_id
+        """),
+        {'tenant_ids': [int(tenant_id) for tenant_id in tenant_ids]}
+    )
+    return {row[0]: (int(row[1]), int(row[2])) for row in rows}
+
+
+def load_tenant_metrics(engine: Engine) -> Dict[int, Dict]:
+    """
+    Lê os contadores de todos os tenants (contatos distintos estimados pelos sketches).
+
+    Tenants sem reconciliação completa (refreshed_at NULL ou sketch NULL)
+    têm os contatos contados direto em conversations_analytics e
+    contacts_sketch None.
+
+    Args:
+        engine: Engine com acesso a todos os tenants (owner/admin)
+
+    Returns:
+        {tenant_id: {'conversation_count', 'visit_count', 'lead_count',
+                     'contact_count', 'last_sync', 'contacts_sketch', ...}}
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT tenant_id, total_conversations, total_visits, total_lead_conversations,
+                   contacts_hll, lead_contacts_hll, last_sync, refreshed_at
+            FROM {METRICS_TABLE}
+        """)).mappings().all()
+
+        unreconciled = [
+            row['tenant_id'] for row in rows
+            if row['refreshed_at'] is None or row['contacts_hll'] is None or row['lead_contacts_hll'] is None
+        ]
+        counted = _count_contacts(conn, unreconciled) if unreconciled else {}
+
+    if unreconciled:
+        logger.warning(
+            f"tenant_metrics sem reconciliação para {len(unreconciled)} tenant(s): contatos contados direto "
+            f"(execute python -m src.multi_tenant.etl_v4.tenant_metrics)"
+        )
+
+    metrics = {}
+    for row in rows:
+        tenant_id = row['tenant_id']
+
+        if tenant_id in unreconciled:
+            contacts = None
+            contact_count, lead_count = counted.get(tenant_id, (0, 0))
+        else:
+            contacts = HyperLogLog.from_bytes(row['contacts_hll'])
+            contact_count = contacts.count()
+            lead_count = HyperLogLog.from_bytes(row['lead_contacts_hll']).count()
+
+        metrics[tenant_id] = {
+            'conversation_count': int(row['total_conversations']),
+            'visit_count': int(row['total_visits']),
+            'lead_conversation_count': int(row['total_lead_conversations']),
+            'contact_count': contact_count,
+            'lead_count': lead_count,
+            'last_sync': row['last_sync'],
+            'contacts_sketch': contacts,
+        }
+
+    return metrics
+
+
+def load_global_metrics(engine: Engine, tenant_metrics: Optional[Dict[int, Dict]] = None) -> Dict[str, int]:
+    """
+    Métricas globais do painel admin a partir de tenant_metrics.
+
+    Args:
+        engine: Engine com acesso a todos os tenants (owner/admin)
+        tenant_metrics: Resultado de load_tenant_metrics (evita reler)
+
+    Returns:
+        Dict com active_tenants, total_conversations, total_leads (contatos
+        distintos estimados, união dos sketches; contagem direta enquanto
+        algum tenant não foi reconciliado) e total_visits
+    """
+    if tenant_metrics is None:
+        tenant_metrics = load_tenant_metrics(engine)
+
+    sketches = [metrics['contacts_sketch'] for metrics in tenant_metrics.values()]
+
+    with engine.connect() as conn:
+        active_tenants = conn.execute(text(
+            "SELECT COUNT(*) FROM tenants WHERE status = 'active' AND id != 0 AND deleted_at IS NULL"
+        )).scalar()
+
+        if any(sketch is None for sketch in sketches):
+            total_leads = conn.execute(text(
+                "SELECT COUNT(DISTINCT contact_id) FROM conversations_analytics WHERE contact_id IS NOT NULL"
+            )).scalar() or 0
+        else:
+            contacts = HyperLogLog()
+            for sketch in sketches:
+                contacts.merge(sketch)
+            total_leads = contacts.count()
+
+    return {
+        'active_tenants': int(active_tenants or 0),
+        'total_conversations': sum(m['conversation_count'] for m in tenant_metrics.values()),
+        'total_leads': int(total_leads),
+        'total_visits': sum(m['visit_count'] for m in tenant_metrics.values()),
+    }
+
+
+# Job de reconciliação
+if __name__ == "__main__":
+    # Executar da raiz do projeto: python -m src.multi_tenant.etl_v4.tenant_metrics
+    import argparse
+
+    from ..utils.db_engines import get_engine
+
+    parser = argparse.ArgumentParser(description='Reconcilia tenant_metrics (contadores e sketches de contatos)')
+    parser.add_argument('--tenant-id', type=int, help='Reconciliar apenas este tenant')
+    args = parser.parse_args()
+
+    etl_engine = get_engine('etl')
+    if args.tenant_id:
+        print(refresh_tenant_metrics(etl_engine, args.tenant_id))
+    else:
+        print(f"{refresh_all_tenant_metrics(etl_engine)} tenant(s) reconciliado(s)")
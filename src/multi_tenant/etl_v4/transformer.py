@@ -10,16 +10,18 @@ Funcionalidades:
     - Mapeamento de colunas (remoto → local)
     - Usar proxies temporários para colunas ausentes
     - Análise de leads (Regex ou OpenAI)
+    - Fingerprints de mudança (content_hash / analysis_input_hash)
     - Logging estruturado
 
 Autor: Isaac (via Claude Code)
 Data: 2025-11-09 (Updated: Fase 5.6 - OpenAI Integration)
 """
 
+import hashlib
 import logging
 import json
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 
@@ -33,6 +35,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Colunas ignoradas no content_hash (mudam sem alterar o conteúdo da conversa)
+FINGERPRINT_EXCLUDED_COLUMNS = ('tenant_id', 'conversation_updated_at')
+
+# Coluna interna: linhas cuja análise foi pulada (entrada do analyzer inalterada).
+# Consumida (e removida) pelo ConversationLoader.
+ANALYSIS_UNCHANGED_FLAG = '_analysis_unchanged'
+
 
 class ConversationTransformer:
     """Transforma dados de conversas do formato remoto para o formato local"""
@@ -75,12 +84,26 @@ class ConversationTransformer:
             logger.info(f"ConversationTransformer inicializado para tenant {tenant_id} "
                        f"SEM análise de leads")
 
-    def transform_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Estatísticas de detecção de mudança do último chunk
+        self.last_change_stats = {'unchanged': 0, 'analysis_skipped': 0}
+
+    def transform_chunk(
+        self,
+        df: pd.DataFrame,
+        existing_hashes: Optional[Dict[int, Tuple[Optional[str], Optional[str]]]] = None
+    ) -> pd.DataFrame:
         """
         Transforma um chunk de dados extraídos.
 
+        Se existing_hashes for informado (ver ConversationLoader.get_existing_hashes):
+            - Conversas com content_hash igual ao salvo são removidas do chunk
+            - Conversas com analysis_input_hash igual ao salvo não são reanalisadas
+              e ficam marcadas com ANALYSIS_UNCHANGED_FLAG para o loader
+
         Args:
             df: DataFrame com dados extraídos do banco remoto
+            existing_hashes: {conversation_id: (content_hash, analysis_input_hash)}
+                             das conversas já carregadas (opcional)
 
         Returns:
             DataFrame transformado e pronto para carga
@@ -110,10 +133,30 @@ class ConversationTransformer:
         # Campos calculados (se não existirem)
         df = self._add_calculated_fields(df)
 
+        # Fingerprints (antes da análise: só conteúdo vindo do Chatwoot)
+        df = self._add_fingerprints(df)
+
+        self.last_change_stats = {'unchanged': 0, 'analysis_skipped': 0}
+        if existing_hashes:
+            df = self._apply_change_detection(df, existing_hashes)
+            if df.empty:
+                logger.info("Nenhuma conversa com mudança de conteúdo neste chunk")
+                return df
+
         # ✅ FASE 4: Análise de Leads com IA
         if self.enable_lead_analysis and self.lead_analyzer:
             logger.info("Aplicando análise de leads (Fase 4)")
-            df = self.lead_analyzer.analyze_dataframe(df)
+
+            if ANALYSIS_UNCHANGED_FLAG in df.columns:
+                unchanged = df[ANALYSIS_UNCHANGED_FLAG]
+                df_to_analyze = df[~unchanged].copy()
+
+                if not df_to_analyze.empty:
+                    df_to_analyze = self._analyze(df_to_analyze)
+
+                df = pd.concat([df_to_analyze, df[unchanged]]).loc[df.index]
+            else:
+                df = self._analyze(df)
 
             # Mostrar estatísticas
             stats = self.lead_analyzer.get_statistics(df)
@@ -127,6 +170,129 @@ class ConversationTransformer:
         logger.info(f"Transformação concluída: {len(df)} conversas processadas")
         return df
 
+    def _analyze(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aplica o analyzer e invalida o analysis_input_hash de análises vazias.
+
+        Conversas cuja análise OpenAI voltou vazia (falha/timeout) ficam sem
+        hash, então serão reanalisadas na próxima execução.
+
+        Args:
+            df: DataFrame com conversas a analisar
+
+        Returns:
+            DataFrame com colunas de análise
+        """
+        df = self.lead_analyzer.analyze_dataframe(df)
+
+        if 'analise_ia' in df.columns and 'analysis_input_hash' in df.columns:
+            empty_analysis = df['analise_ia'].isna() | (df['analise_ia'] == '')
+            df.loc[empty_analysis, 'analysis_input_hash'] = None
+
+        return df
+
+    def _add_fingerprints(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adiciona content_hash e analysis_input_hash (MD5 hex) por conversa.
+
+        - content_hash: todas as colunas extraídas/calculadas, exceto
+          FINGERPRINT_EXCLUDED_COLUMNS
+        - analysis_input_hash: nome do analyzer + INPUT_COLUMNS do analyzer
+          (apenas se a análise de leads estiver habilitada)
+
+        Args:
+            df: DataFrame normalizado (antes da análise)
+
+        Returns:
+            DataFrame com as colunas de hash
+        """
+        content_columns = sorted(
+            col for col in df.columns
+            if col not in FINGERPRINT_EXCLUDED_COLUMNS
+        )
+        df['content_hash'] = self._hash_columns(df, content_columns)
+
+        if self.enable_lead_analysis and self.lead_analyzer:
+            input_columns = [col for col in self.lead_analyzer.INPUT_COLUMNS if col in df.columns]
+            df['analysis_input_hash'] = self._hash_columns(
+                df, input_columns, prefix=self.lead_analyzer.analyzer_name
+            )
+
+        return df
+
+    @staticmethod
+    def _hash_columns(df: pd.DataFrame, columns: List[str], prefix: str = '') -> pd.Series:
+        """
+        Calcula MD5 (hex) da concatenação textual das colunas, linha a linha.
+
+        Args:
+            df: DataFrame
+            columns: Colunas (ordem importa)
+            prefix: Texto fixo incluído no hash (ex: nome do analyzer)
+
+        Returns:
+            Series com hash por linha
+        """
+        joined = df[columns].astype(str).agg('\x1f'.join, axis=1) if columns else pd.Series('', index=df.index)
+        return (prefix + '\x1f' + joined).map(
+            lambda value: hashlib.md5(value.encode('utf-8')).hexdigest()
+        )
+
+    def _apply_change_detection(
+        self,
+        df: pd.DataFrame,
+        existing_hashes: Dict[int, Tuple[Optional[str], Optional[str]]]
+    ) -> pd.DataFrame:
+        """
+        Remove conversas sem mudança e marca as que não precisam de reanálise.
+
+        Uma conversa só é descartada se o content_hash não mudou E (análise
+        de leads desabilitada OU analysis_input_hash igual ao gravado). Hash
+        de análise gravado como NULL (análise vazia/falha) ou de outro
+        analyzer (ex: regex -> OpenAI) faz a conversa ser reanalisada.
+
+        Args:
+            df: DataFrame com fingerprints
+            existing_hashes: {conversation_id: (content_hash, analysis_input_hash)}
+
+        Returns:
+            DataFrame apenas com conversas alteradas/novas ou a reanalisar
+        """
+        conversation_ids = df['conversation_id'].astype('Int64')
+        previous_content = conversation_ids.map(
+            {cid: hashes[0] for cid, hashes in existing_hashes.items()}
+        )
+        same_content = (df['content_hash'] == previous_content).fillna(False).astype(bool)
+
+        same_input = None
+        if 'analysis_input_hash' in df.columns:
+            previous_input = conversation_ids.map(
+                {cid: hashes[1] for cid, hashes in existing_hashes.items()}
+            )
+            same_input = (df['analysis_input_hash'] == previous_input).fillna(False).astype(bool)
+            unchanged = same_content & same_input
+        else:
+            unchanged = same_content
+
+        df = df[~unchanged].copy()
+
+        analysis_skipped = 0
+        if same_input is not None and not df.empty:
+            df[ANALYSIS_UNCHANGED_FLAG] = same_input[~unchanged]
+            analysis_skipped = int(df[ANALYSIS_UNCHANGED_FLAG].sum())
+
+        self.last_change_stats = {
+            'unchanged': int(unchanged.sum()),
+            'analysis_skipped': analysis_skipped
+        }
+
+        logger.info(
+            f"Detecção de mudança: {self.last_change_stats['unchanged']} conversas inalteradas (puladas), "
+            f"{analysis_skipped} sem mudança de conteúdo para análise"
+        )
+
+        return df
+
     def _normalize_datatypes(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Normaliza tipos de dados para match com o schema do banco local.
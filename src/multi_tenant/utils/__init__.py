@@ -7,7 +7,12 @@ Modulo com utilitarios compartilhados do sistema multi-tenant.
 Componentes:
 - TemplateManager: Gerenciador de templates de remarketing
 - RateLimiter: Controle global de taxa de requisições OpenAI
+- TokenBucket: Limite de requisições por minuto entre threads (get_token_bucket)
 - CostTracker: Rastreamento de custos por tenant/dia/mês
+- LLMResponseCache: Cache persistente de respostas OpenAI (TTL + LRU)
+- SharedQueryCache: Cache de queries dos dashboards versionado pelo ETL
+- Engine Registry: Engines SQLAlchemy compartilhadas por papel (pool por processo)
+- HyperLogLog: Sketch de contatos distintos (tenant_metrics)
 - ETL Schedule: Cálculo de próxima execução ETL
 
 Fase: 8.1 - Foundation
@@ -16,16 +21,31 @@ Data: 2025-11-14
 """
 
 from .template_manager import TemplateManager
-from .rate_limiter import RateLimiter, get_rate_limiter
+from .rate_limiter import RateLimiter, get_rate_limiter, TokenBucket, get_token_bucket
 from .cost_tracker import CostTracker, get_cost_tracker
+from .llm_cache import LLMResponseCache, get_llm_cache
+from .query_cache import SharedQueryCache, get_query_cache, tenant_query_cache
+from .db_engines import get_engine, get_engine_for_url, get_pool_stats
+from .hyperloglog import HyperLogLog
 from .etl_schedule import get_next_etl_time, format_etl_countdown
 
 __all__ = [
     'TemplateManager',
     'RateLimiter',
     'get_rate_limiter',
+    'TokenBucket',
+    'get_token_bucket',
     'CostTracker',
     'get_cost_tracker',
+    'LLMResponseCache',
+    'get_llm_cache',
+    'SharedQueryCache',
+    'get_query_cache',
+    'tenant_query_cache',
+    'get_engine',
+    'get_engine_for_url',
+    'get_pool_stats',
+    'HyperLogLog',
     'get_next_etl_time',
     'format_etl_countdown',
 ]
@@ -0,0 +1,136 @@
+"""
+HyperLogLog - Sistema de Análise Multi-Tenant
+=============================================
+
+Sketch de cardinalidade aproximada (contatos distintos) com memória fixa.
+
+Características:
+- 2^precision registradores de 1 byte (precision 12 = 4 KB, erro ~1,6%)
+- add() idempotente: adicionar o mesmo contato de novo não altera a contagem
+- merge() por máximo dos registradores: o sketch de vários tenants estima
+  a união (contatos repetidos entre tenants contam uma vez)
+- Serializável em bytes (coluna BYTEA)
+
+Uso:
+    >>> sketch = HyperLogLog()
+    >>> sketch.update([101, 102, 101])
+    >>> sketch.count()
+    2
+
+Fase: 9.8 - Tenant Metrics
+Data: 2026-10-17
+"""
+
+import hashlib
+import math
+from typing import Iterable, Optional
+
+
+class HyperLogLog:
+    """
+    Estimador HyperLogLog (Flajolet et al.) com correção para cardinalidades pequenas.
+    """
+
+    DEFAULT_PRECISION = 12
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None):
+        """
+        Inicializa o sketch.
+
+        Args:
+            precision: Bits de índice (4-16); m = 2^precision registradores
+            registers: Registradores serializados (ver to_bytes)
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"precision deve estar entre 4 e 16: {precision}")
+
+        self.precision = precision
+        self.m = 1 << precision
+
+        if registers is None:
+            self.registers = bytearray(self.m)
+        else:
+            if len(registers) != self.m:
+                raise ValueError(f"Sketch com {len(registers)} registradores, esperado {self.m}")
+            self.registers = bytearray(registers)
+
+    @staticmethod
+    def _hash(value) -> int:
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value) -> None:
+        """Adiciona um valor (convertido para str antes do hash)"""
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+
+        # Posição do primeiro bit 1 nos bits restantes (1-based)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable) -> None:
+        """Adiciona vários valores"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """
+        Incorpora outro sketch (união). Retorna self.
+
+        Args:
+            other: Sketch com a mesma precision
+        """
+        if other.precision != self.precision:
+            raise ValueError("Não é possível unir sketches com precisões diferentes")
+
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """
+        Estima o número de valores distintos.
+
+        Returns:
+            int: Cardinalidade estimada
+        """
+        m = self.m
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        # Cardinalidades pequenas: linear counting é mais preciso
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Serializa os registradores (para coluna BYTEA)"""
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], precision: int = DEFAULT_PRECISION) -> 'HyperLogLog':
+        """
+        Reconstrói um sketch serializado (None ou vazio = sketch vazio).
+
+        Args:
+            data: Bytes de to_bytes() (aceita memoryview do psycopg2)
+            precision: Precisão usada na serialização
+        """
+        if not data:
+            return cls(precision)
+        return cls(precision, bytes(data))
+
+    def __len__(self) -> int:
+        return self.count()
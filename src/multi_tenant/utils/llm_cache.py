@@ -0,0 +1,363 @@
+"""
+LLM Response Cache - Sistema de Análise Multi-Tenant
+=====================================================
+
+Cache persistente de respostas OpenAI, compartilhado entre analyzers,
+reprocessamentos e processos (ETL, backlog, campanhas).
+
+Chave: SHA-256 de (namespace, modelo, versão/prompt de sistema, entrada
+normalizada, parâmetros de geração). Qualquer mudança no prompt invalida
+a chave automaticamente.
+
+Funcionalidades:
+- Persistência em SQLite local (um arquivo por host, seguro entre processos)
+- TTL (expiração por idade) e LRU (limite de entradas, remove menos acessadas)
+- Contadores de hit/miss por processo
+
+As respostas contêm dados dos clientes (nomes, trechos de conversa): o
+arquivo é criado com permissão 0600 (diretório 0700), fora do /tmp
+compartilhado.
+
+Configuração (env):
+- LLM_CACHE_ENABLED (default: true)
+- LLM_CACHE_PATH (default: data/cache/llm_cache.sqlite3 na raiz do projeto)
+- LLM_CACHE_TTL_DAYS (default: 30)
+- LLM_CACHE_MAX_ENTRIES (default: 100000)
+
+Fase: 9.4 - LLM Response Cache
+Data: 2026-10-17
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from threading import RLock
+from typing import Any, Dict, Optional
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Cache de respostas LLM em SQLite com TTL + LRU.
+
+    Thread-safe; vários processos podem usar o mesmo arquivo (WAL).
+
+    Uso:
+        >>> cache = get_llm_cache()
+        >>> key = cache.make_key('remarketing', model, system_prompt, user_prompt)
+        >>> cached = cache.get(key)
+        >>> if cached is None:
+        ...     cached = call_openai(...)
+        ...     cache.set(key, cached, namespace='remarketing', model=model)
+    """
+
+    DB_FILE = str(Path(__file__).resolve().parents[3] / 'data' / 'cache' / 'llm_cache.sqlite3')
+    DEFAULT_TTL_DAYS = 30
+    DEFAULT_MAX_ENTRIES = 100_000
+
+    # Eviction roda a cada N gravações (evita COUNT(*) em toda escrita)
+    EVICTION_CHECK_EVERY = 100
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        enabled: bool = True
+    ):
+        """
+        Inicializa o cache.
+
+        Args:
+            db_path: Caminho do arquivo SQLite
+            ttl_seconds: Idade máxima de uma entrada
+            max_entries: Número máximo de entradas (LRU acima disso)
+            enabled: Se False, get() sempre retorna None e set() não grava
+        """
+        self.db_path = db_path or self.DB_FILE
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else self.DEFAULT_TTL_DAYS * 86400
+        self.max_entries = max_entries or self.DEFAULT_MAX_ENTRIES
+        self.enabled = enabled
+
+        self._lock = RLock()
+        self._writes_since_eviction = 0
+        self._conn = None
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'expired': 0,
+        }
+
+        if self.enabled:
+            try:
+                self._conn = self._connect()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"LLM cache desabilitado (erro ao abrir {self.db_path}): {e}")
+                self.enabled = False
+
+        logger.info(
+            f"LLMResponseCache inicializado - "
+            f"{'ativo' if self.enabled else 'desabilitado'}, "
+            f"TTL: {self.ttl_seconds / 86400:.0f}d, Max: {self.max_entries}"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.db_path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        # Só o usuário do serviço lê prompts/respostas (o SQLite cria -wal/-shm
+        # com a mesma permissão do arquivo principal)
+        os.close(os.open(self.db_path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.db_path, 0o600)
+
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access_at REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_response_cache (last_access_at)"
+        )
+        return conn
+
+    @staticmethod
+    def normalize(value: Any) -> Any:
+        """
+        Normaliza entrada para a chave: espaços colapsados em strings,
+        recursivo em listas/dicts.
+        """
+        if isinstance(value, str):
+            return ' '.join(value.split())
+        if isinstance(value, dict):
+            return {str(k): LLMResponseCache.normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [LLMResponseCache.normalize(v) for v in value]
+        return value
+
+    @classmethod
+    def make_key(cls, namespace: str, model: str, *inputs: Any, **params: Any) -> str:
+        """
+        Gera a chave do cache.
+
+        Args:
+            namespace: Origem da chamada (ex: 'etl_analyzer', 'remarketing')
+            model: Modelo OpenAI
+            *inputs: Prompt de sistema/versão e entradas (normalizadas)
+            **params: Parâmetros de geração (temperature, max_tokens, ...)
+
+        Returns:
+            str: SHA-256 hex
+        """
+        payload = json.dumps(
+            [namespace, model, cls.normalize(list(inputs)), cls.normalize(params)],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Busca resposta no cache (atualiza último acesso para o LRU).
+
+        Args:
+            key: Chave (ver make_key)
+
+        Returns:
+            Resposta (JSON desserializado) ou None se ausente/expirada
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM llm_response_cache WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+
+                if row is None:
+                    self.stats['misses'] += 1
+                    return None
+
+                response, created_at = row
+
+                if now - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (key,))
+                    self.stats['expired'] += 1
+                    self.stats['misses'] += 1
+                    return None
+
+                self._conn.execute(
+                    "UPDATE llm_response_cache SET last_access_at = ?, hit_count = hit_count + 1 "
+                    "WHERE cache_key = ?",
+                    (now, key)
+                )
+                self.stats['hits'] += 1
+                return json.loads(response)
+
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao ler LLM cache: {e}")
+                self.stats['misses'] += 1
+                return None
+
+    def set(self, key: str, response: Any, namespace: str, model: Optional[str] = None) -> None:
+        """
+        Grava resposta no cache.
+
+        Args:
+            key: Chave (ver make_key)
+            response: Resposta serializável em JSON
+            namespace: Origem da chamada
+            model: Modelo OpenAI
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_response_cache
+                        (cache_key, namespace, model, response, created_at, last_access_at, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                    """,
+                    (key, namespace, model, json.dumps(response, ensure_ascii=False, default=str), now, now)
+                )
+                self.stats['writes'] += 1
+
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= self.EVICTION_CHECK_EVERY:
+                    self.evict()
+
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao gravar LLM cache: {e}")
+
+    def evict(self) -> int:
+        """
+        Remove entradas expiradas (TTL) e, acima de max_entries, as menos acessadas (LRU).
+
+        Returns:
+            int: Número de entradas removidas
+        """
+        if not self.enabled:
+            return 0
+
+        with self._lock:
+            self._writes_since_eviction = 0
+
+            expired = self._conn.execute(
+                "DELETE FROM llm_response_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            ).rowcount
+
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+            overflow = max(0, count - self.max_entries)
+
+            if overflow:
+                self._conn.execute(
+                    """
+                    DELETE FROM llm_response_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_response_cache
+                        ORDER BY last_access_at ASC
+                        LIMIT ?
+                    )
+                    """,
+                    (overflow,)
+                )
+
+            self.stats['expired'] += expired
+            self.stats['evictions'] += overflow
+
+            if expired or overflow:
+                logger.info(f"LLM cache: {expired} expiradas, {overflow} removidas por LRU")
+
+            return expired + overflow
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna contadores do processo e total de entradas.
+
+        Returns:
+            Dict com hits, misses, hit_rate, writes, evictions, expired, entries
+        """
+        lookups = self.stats['hits'] + self.stats['misses']
+        entries = 0
+
+        if self.enabled:
+            with self._lock:
+                entries = self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+            'entries': entries,
+        }
+
+    def get_stats_summary(self) -> str:
+        """
+        Retorna resumo formatado das estatísticas do cache.
+
+        Returns:
+            String formatada com estatísticas
+        """
+        stats = self.get_stats()
+        return (
+            f"LLM Cache Status:\n"
+            f"Hits: {stats['hits']} | Misses: {stats['misses']} | Hit rate: {stats['hit_rate']:.1f}%\n"
+            f"Entries: {stats['entries']} / {self.max_entries}"
+        )
+
+
+# Instância global (singleton)
+_global_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Retorna instância global do cache de respostas LLM (singleton).
+
+    Returns:
+        LLMResponseCache instance
+    """
+    global _global_llm_cache
+
+    if _global_llm_cache is None:
+        _global_llm_cache = LLMResponseCache(
+            db_path=os.getenv('LLM_CACHE_PATH') or None,
+            ttl_seconds=float(os.getenv('LLM_CACHE_TTL_DAYS', LLMResponseCache.DEFAULT_TTL_DAYS)) * 86400,
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', LLMResponseCache.DEFAULT_MAX_ENTRIES)),
+            enabled=os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+        )
+
+    return _global_llm_cache
+
+
+def reset_llm_cache() -> None:
+    """Reseta instância global (útil para testes)."""
+    global _global_llm_cache
+    _global_llm_cache = None
@@ -0,0 +1,356 @@
+"""
+Shared Query Cache - Sistema de Análise Multi-Tenant
+=====================================================
+
+Cache em memória de resultados de queries dos dashboards, compartilhado por
+todas as sessões do processo Streamlit (vários usuários do mesmo tenant usam
+a mesma cópia).
+
+Versionamento:
+- Cada entrada guarda a "versão dos dados" do tenant: último etl_control com
+  status 'success' (watermark_end, finished_at)
+- Quando o ETL grava dados novos, a versão muda e SÓ as entradas daquele
+  tenant são descartadas; os demais tenants continuam em cache
+- Sem TTL: a entrada vale até chegarem dados novos (ou ser removida pelo LRU)
+
+Funcionalidades:
+- Orçamento de memória (bytes estimados) com remoção LRU
+- Uma única carga por chave mesmo com sessões concorrentes
+- Contadores de hit/miss/evictions/invalidações
+
+Configuração (env):
+- QUERY_CACHE_MAX_MB (default: 512)
+- QUERY_CACHE_VERSION_CHECK_SECONDS (default: 30) - intervalo mínimo entre
+  consultas da versão de um tenant
+
+Fase: 9.6 - Shared Query Cache
+Data: 2026-10-17
+"""
+
+import functools
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock, RLock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estima memória ocupada por um resultado (bytes).
+
+    Args:
+        value: DataFrame, dict/list ou objeto qualquer
+
+    Returns:
+        int: Bytes estimados
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SharedQueryCache:
+    """
+    Cache LRU por orçamento de memória, versionado pelos dados do tenant.
+
+    Uso:
+        >>> cache = get_query_cache()
+        >>> version = cache.get_data_version(engine, tenant_id)
+        >>> df = cache.get_or_load('conversations', tenant_id, version, args, lambda: query())
+
+    Os valores retornados são compartilhados entre sessões: trate como
+    somente leitura (use .copy() antes de alterar).
+    """
+
+    DEFAULT_MAX_MB = 512
+    DEFAULT_VERSION_CHECK_SECONDS = 30
+
+    def __init__(self, max_bytes: Optional[int] = None, version_check_seconds: Optional[float] = None):
+        """
+        Inicializa o cache.
+
+        Args:
+            max_bytes: Orçamento de memória (acima disso remove as entradas menos usadas)
+            version_check_seconds: Intervalo mínimo entre consultas da versão de um tenant
+        """
+        self.max_bytes = max_bytes or self.DEFAULT_MAX_MB * 1024 * 1024
+        self.version_check_seconds = (
+            version_check_seconds if version_check_seconds is not None
+            else self.DEFAULT_VERSION_CHECK_SECONDS
+        )
+
+        self._lock = RLock()
+        self._entries: 'OrderedDict[Tuple, Tuple[Any, int]]' = OrderedDict()
+        self._tenant_versions: Dict[int, Hashable] = {}
+        self._version_checked_at: Dict[int, Tuple[float, Hashable]] = {}
+        self._load_locks: Dict[Tuple, Lock] = {}
+        self.current_bytes = 0
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'too_large': 0,
+        }
+
+        logger.info(f"SharedQueryCache inicializado - Max: {self.max_bytes / 1024 / 1024:.0f} MB")
+
+    def get_data_version(self, engine: Engine, tenant_id: int) -> Hashable:
+        """
+        Retorna a versão dos dados do tenant (último ETL com sucesso).
+
+        Consultada no banco no máximo a cada version_check_seconds por tenant.
+
+        Args:
+            engine: Engine do banco
+            tenant_id: ID do tenant
+
+        Returns:
+            Tupla (watermark_end, finished_at) ou None se nunca houve ETL
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            checked = self._version_checked_at.get(tenant_id)
+            if checked and now - checked[0] < self.version_check_seconds:
+                return checked[1]
+
+        with engine.connect() as conn:
+            row = conn.execute(
+                text("""
+                    SELECT MAX(watermark_end), MAX(finished_at)
+                    FROM etl_control
+                    WHERE tenant_id = :tenant_id AND status = 'success'
+                """),
+                {'tenant_id': tenant_id}
+            ).fetchone()
+
+        version = (row[0], row[1]) if row else None
+
+        with self._lock:
+            self._version_checked_at[tenant_id] = (now, version)
+
+        return version
+
+    def get_or_load(
+        self,
+        namespace: str,
+        tenant_id: int,
+        version: Hashable,
+        args_key: Hashable,
+        loader: Callable[[], Any]
+    ) -> Any:
+        """
+        Retorna o valor em cache ou executa loader() e armazena.
+
+        Args:
+            namespace: Nome da query (ex: 'conversations')
+            tenant_id: ID do tenant
+            version: Versão dos dados do tenant (ver get_data_version)
+            args_key: Parâmetros da query (hashable)
+            loader: Função sem argumentos que executa a query
+
+        Returns:
+            Resultado da query (compartilhado, somente leitura)
+        """
+        self._check_version(tenant_id, version)
+        key = (tenant_id, namespace, version, args_key)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._entries[key][0]
+
+            load_lock = self._load_locks.setdefault(key, Lock())
+
+        # Sessões concorrentes pedindo a mesma chave esperam uma única carga
+        try:
+            with load_lock:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        self.stats['hits'] += 1
+                        return self._entries[key][0]
+                    self.stats['misses'] += 1
+
+                value = loader()
+                if value is not None:
+                    self._store(key, value)
+        finally:
+            # Também quando o loader falha: sem isso o lock da chave ficaria
+            # em _load_locks para sempre
+            with self._lock:
+                self._load_locks.pop(key, None)
+
+        return value
+
+    def invalidate_tenant(self, tenant_id: int) -> int:
+        """
+        Remove todas as entradas de um tenant.
+
+        Args:
+            tenant_id: ID do tenant
+
+        Returns:
+            int: Número de entradas removidas
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == tenant_id]
+            for key in keys:
+                self._remove(key)
+
+            self._version_checked_at.pop(tenant_id, None)
+            self._tenant_versions.pop(tenant_id, None)
+
+            if keys:
+                self.stats['invalidations'] += len(keys)
+                logger.info(f"Query cache: {len(keys)} entrada(s) do tenant {tenant_id} invalidada(s)")
+
+            return len(keys)
+
+    def _check_version(self, tenant_id: int, version: Hashable) -> None:
+        with self._lock:
+            previous = self._tenant_versions.get(tenant_id)
+            if tenant_id in self._tenant_versions and previous != version:
+                keys = [key for key in self._entries if key[0] == tenant_id and key[2] != version]
+                for key in keys:
+                    self._remove(key)
+                if keys:
+                    self.stats['invalidations'] += len(keys)
+                    logger.info(
+                        f"Query cache: novos dados do tenant {tenant_id} "
+                        f"({len(keys)} entrada(s) descartada(s))"
+                    )
+            self._tenant_versions[tenant_id] = version
+
+    def _store(self, key: Tuple, value: Any) -> None:
+        size = estimate_size(value)
+
+        with self._lock:
+            if size > self.max_bytes:
+                self.stats['too_large'] += 1
+                logger.warning(f"Query cache: resultado de {size / 1024 / 1024:.1f} MB maior que o orçamento, não armazenado")
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            # LRU: remove as menos usadas até caber no orçamento
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def _remove(self, key: Tuple) -> None:
+        _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self) -> None:
+        """Remove todas as entradas (mantém contadores)"""
+        with self._lock:
+            self._entries.clear()
+            self._tenant_versions.clear()
+            self._version_checked_at.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna contadores e ocupação do cache.
+
+        Returns:
+            Dict com hits, misses, hit_rate, evictions, invalidations, entries, size_mb
+        """
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+                'entries': len(self._entries),
+                'size_mb': round(self.current_bytes / 1024 / 1024, 2),
+                'max_mb': round(self.max_bytes / 1024 / 1024, 2),
+            }
+
+
+# Instância global (singleton) - compartilhada por todas as sessões do processo
+_global_query_cache: Optional[SharedQueryCache] = None
+_global_lock = Lock()
+
+
+def get_query_cache() -> SharedQueryCache:
+    """
+    Retorna instância global do cache de queries (singleton).
+
+    Returns:
+        SharedQueryCache instance
+    """
+    global _global_query_cache
+
+    with _global_lock:
+        if _global_query_cache is None:
+            _global_query_cache = SharedQueryCache(
+                max_bytes=int(float(os.getenv('QUERY_CACHE_MAX_MB', SharedQueryCache.DEFAULT_MAX_MB)) * 1024 * 1024),
+                version_check_seconds=float(os.getenv(
+                    'QUERY_CACHE_VERSION_CHECK_SECONDS', SharedQueryCache.DEFAULT_VERSION_CHECK_SECONDS
+                ))
+            )
+
+    return _global_query_cache
+
+
+def reset_query_cache() -> None:
+    """Reseta instância global (útil para testes)."""
+    global _global_query_cache
+    _global_query_cache = None
+
+
+def tenant_query_cache(namespace: str, engine_factory: Callable[[], Engine]):
+    """
+    Decorator: cacheia uma função de query cujo primeiro argumento é tenant_id.
+
+    A chave inclui os demais argumentos e a versão dos dados do tenant.
+
+    Args:
+        namespace: Nome da query no cache
+        engine_factory: Função que retorna a engine (para consultar a versão)
+
+    Example:
+        >>> @tenant_query_cache('conversations', get_database_engine)
+        ... def load_conversations(tenant_id, date_start=None, date_end=None):
+        ...     ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(tenant_id, *args, **kwargs):
+            cache = get_query_cache()
+            version = cache.get_data_version(engine_factory(), tenant_id)
+            args_key = (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(namespace, tenant_id, version, args_key, lambda: func(tenant_id, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
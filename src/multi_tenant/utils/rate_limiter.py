@@ -15,6 +15,10 @@ Estratégia de Rate Limiting:
 - Thread-safe para execuções paralelas futuras
 - Conservative limits (80% dos limites oficiais para margem de segurança)
 
+TokenBucket: limitador em memória para chamadas concorrentes de um mesmo
+processo (ex: geração de variáveis de campanha com vários workers), com
+instâncias compartilhadas por nome (get_token_bucket).
+
 Fase: 9.1 - Rate Limiting Foundation
 Relacionado: docs/private/checkpoints/FASE9_AUTOMACAO_MULTI_TENANT.md
 Autor: Isaac (via Claude Code)
@@ -28,7 +32,7 @@ import os
 from pathlib import Path
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
-from threading import RLock
+from threading import Lock, RLock
 
 # Configurar logging
 logging.basicConfig(
@@ -341,4 +345,122 @@ def get_rate_limiter() -> RateLimiter:
 def reset_rate_limiter() -> None:
     """Reseta instância global (útil para testes)."""
     global _global_rate_limiter
-    _global_rate_limiter = None
\ No newline at end of file
+    _global_rate_limiter = None
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe (em memória) para limitar requisições por minuto.
+
+    Cada acquire() reserva tokens na ordem de chegada: o saldo pode ficar
+    negativo e quem reservou dorme o tempo da dívida, fora do lock. Com
+    vários workers o ritmo agregado fica em rate_per_minute, com rajada
+    inicial de até `capacity`.
+
+    Example:
+        >>> bucket = TokenBucket(rate_per_minute=300)
+        >>> bucket.acquire()  # bloqueia se necessário
+        0.0
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Inicializa o bucket (cheio).
+
+        Args:
+            rate_per_minute: Tokens repostos por minuto
+            capacity: Máximo acumulado (default: 1 segundo de taxa, mínimo 1)
+        """
+        self._lock = Lock()
+        self._set_rate(rate_per_minute, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _set_rate(self, rate_per_minute: float, capacity: Optional[float]) -> None:
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute deve ser positivo")
+
+        self.rate_per_minute = rate_per_minute
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate_per_second))
+
+    def set_rate(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        """
+        Altera a taxa no próprio bucket, preservando o saldo e as reservas.
+
+        Os tokens acumulados até agora são repostos na taxa antiga; o saldo é
+        limitado à nova capacidade, mas a dívida de quem já reservou continua.
+
+        Args:
+            rate_per_minute: Tokens repostos por minuto
+            capacity: Máximo acumulado (default: 1 segundo de taxa, mínimo 1)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated_at) * self.rate_per_second
+            )
+            self._updated_at = now
+            self._set_rate(rate_per_minute, capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Reserva tokens, dormindo até que estejam disponíveis.
+
+        Args:
+            tokens: Quantidade a consumir
+
+        Returns:
+            Segundos aguardados
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated_at) * self.rate_per_second
+            )
+            self._updated_at = now
+            self._tokens -= tokens
+            wait_time = -self._tokens / self.rate_per_second if self._tokens < 0 else 0.0
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+        return wait_time
+
+
+# Buckets compartilhados por nome (ex: 'campaign_variables')
+_token_buckets: Dict[str, TokenBucket] = {}
+_token_buckets_lock = Lock()
+
+
+def get_token_bucket(name: str, rate_per_minute: float) -> TokenBucket:
+    """
+    Retorna o TokenBucket compartilhado do processo para `name`.
+
+    A primeira chamada define a taxa; chamadas com outra taxa a alteram no
+    mesmo bucket (set_rate), sem zerar o saldo de quem já o está usando.
+
+    Args:
+        name: Nome do limite (um por cota/API)
+        rate_per_minute: Tokens por minuto
+
+    Returns:
+        TokenBucket instance
+    """
+    with _token_buckets_lock:
+        bucket = _token_buckets.get(name)
+        if bucket is None:
+            bucket = TokenBucket(rate_per_minute)
+            _token_buckets[name] = bucket
+        elif bucket.rate_per_minute != rate_per_minute:
+            bucket.set_rate(rate_per_minute)
+        return bucket
+
+
+def reset_token_buckets() -> None:
+    """Descarta os buckets compartilhados (útil para testes)."""
+    with _token_buckets_lock:
+        _token_buckets.clear()
@@ -0,0 +1,23 @@
+"""
+Fixtures compartilhadas dos testes
+==================================
+
+- Cache de respostas LLM isolado por teste (arquivo em tmp_path), para que
+  respostas gravadas em uma execução não sejam servidas em outra.
+"""
+
+import pytest
+
+# O módulo é importado pelos dois caminhos (src.multi_tenant e multi_tenant)
+from multi_tenant.utils import llm_cache
+from src.multi_tenant.utils import llm_cache as src_llm_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', str(tmp_path / 'llm_cache.sqlite3'))
+    for module in (llm_cache, src_llm_cache):
+        module.reset_llm_cache()
+    yield
+    for module in (llm_cache, src_llm_cache):
+        module.reset_llm_cache()
@@ -0,0 +1,169 @@
+"""
+Testes da exportação em streaming das campanhas
+===============================================
+
+Testa:
+- iter_csv_chunks: blocos de bytes a partir de um gerador de leads, com
+  estatísticas e tamanho calculados durante a escrita
+- export / export_to_bytes / export_to_file: mesmo conteúdo e estatísticas
+- iter_exportable_leads: cursor no servidor (stream_results + yield_per)
+- count_exportable_leads: COUNT sem carregar os leads
+- CampaignXLSXExporter.export_to_file (apenas com openpyxl instalado)
+
+Não acessa o banco: a engine fake registra os statements.
+"""
+
+import csv
+import io
+
+import pytest
+
+from src.multi_tenant.campaigns.csv_exporter import CampaignCSVExporter
+from src.multi_tenant.campaigns.models import CampaignLead, LeadStatus
+from src.multi_tenant.campaigns.service import CampaignService
+
+
+def make_leads(count):
+    for i in range(count):
+        yield CampaignLead(
+            id=i + 1, campaign_id=7, conversation_id=100 + i,
+            contact_phone=None if i % 10 == 3 else f'11999{i:06d}',
+            contact_name='Ana Souza', var1='Ana',
+            var2=None if i % 10 == 5 else f'vi que você perguntou sobre o plano {i}',
+            var3=None if i % 10 == 5 else 'temos uma condição especial', status=LeadStatus.PROCESSED
+        )
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return len(self.rows)
+
+
+class FakeEngine:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+        self.options = {}
+        self.closed = False
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+        return False
+
+    def execution_options(self, **options):
+        self.options.update(options)
+        return self
+
+    def execute(self, query, params=None):
+        self.statements.append((str(query), params or {}))
+        return FakeResult(self.rows)
+
+
+def lead_row(lead_id):
+    return (
+        lead_id, 7, 100 + lead_id, '11999000000', 'Ana', 'Ana', 'oi', 'cta', None,
+        'processed', None, None, 0, None, None, None, None
+    )
+
+
+def test_csv_em_blocos_com_estatisticas():
+    exporter = CampaignCSVExporter()
+    stats = {}
+
+    chunks = list(exporter.iter_csv_chunks(make_leads(500), stats, chunk_size=1024))
+
+    assert len(chunks) > 1
+    content = b''.join(chunks)
+    assert stats['total_leads'] == 500
+    assert stats['skipped_no_phone'] == 50
+    assert stats['skipped_no_vars'] == 50
+    assert stats['exported'] == 400
+    assert stats['file_size_bytes'] == len(content)
+
+    rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+    assert rows[0] == CampaignCSVExporter.COLUMNS
+    assert len(rows) == 401
+
+
+def test_export_mantem_conteudo_e_estatisticas(tmp_path):
+    exporter = CampaignCSVExporter()
+
+    csv_content, stats = exporter.export(list(make_leads(120)))
+    csv_bytes, bytes_stats = exporter.export_to_bytes(make_leads(120))
+    file_stats = exporter.export_to_file(make_leads(120), tmp_path / 'campanha.csv')
+
+    assert csv_content.startswith('\ufeff')
+    assert csv_content.encode('utf-8') == csv_bytes == (tmp_path / 'campanha.csv').read_bytes()
+    assert stats == bytes_stats == file_stats
+    assert stats['file_size_bytes'] == len(csv_bytes)
+
+
+def test_export_para_arquivo_aberto():
+    output = io.BytesIO()
+
+    stats = CampaignCSVExporter(add_bom=False, include_header=False).export_to_file(make_leads(10), output)
+
+    assert stats['exported'] == 8
+    assert stats['file_size_bytes'] == len(output.getvalue())
+    assert output.getvalue().count(b'\n') == 8
+
+
+def test_iter_exportable_leads_usa_cursor_no_servidor():
+    engine = FakeEngine([lead_row(1), lead_row(2), lead_row(3)])
+    service = CampaignService(engine, tenant_id=1)
+
+    leads = service.iter_exportable_leads(7, batch_size=2)
+    assert engine.statements == []  # nada executado antes de consumir
+
+    first = next(leads)
+    assert first.id == 1
+    assert first.status == LeadStatus.PROCESSED
+    assert engine.options == {'stream_results': True, 'yield_per': 2}
+
+    assert [lead.id for lead in leads] == [2, 3]
+    assert engine.closed
+
+    sql, params = engine.statements[-1]
+    assert "status IN ('processed', 'exported')" in sql
+    assert 'export_count = 0' in sql
+    assert 'ORDER BY created_at' in sql
+    assert params == {'campaign_id': 7}
+
+
+def test_count_exportable_leads():
+    engine = FakeEngine([lead_row(1), lead_row(2)])
+    service = CampaignService(engine, tenant_id=1)
+
+    assert service.count_exportable_leads(7, only_not_exported=False) == 2
+
+    sql, _ = engine.statements[-1]
+    assert 'COUNT(*)' in sql
+    assert 'export_count' not in sql
+    assert 'ORDER BY' not in sql
+
+
+def test_xlsx_em_streaming(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    from src.multi_tenant.campaigns.csv_exporter import CampaignXLSXExporter
+
+    target = tmp_path / 'campanha.xlsx'
+    stats = CampaignXLSXExporter().export_to_file(make_leads(30), target)
+
+    assert stats == {'exported': 27, 'skipped': 3, 'total_leads': 30, 'file_size_bytes': target.stat().st_size}
+
+    ws = openpyxl.load_workbook(target, read_only=True)['Campanha']
+    rows = list(ws.values)
+    assert list(rows[0]) == CampaignCSVExporter.COLUMNS
+    assert len(rows) == 28
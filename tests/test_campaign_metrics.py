@@ -0,0 +1,105 @@
+"""
+Testes dos contadores das campanhas (campaigns/metrics.py)
+==========================================================
+
+Testa:
+- recount_campaign_metrics: filtros por campanha/tenant e só campanhas com desvio
+- reconcile_campaign_metrics: uma transação, retorna campanhas corrigidas
+- metric_triggers_installed: positivo cacheado, negativo reconsultado
+
+Não acessa o banco: a engine fake registra os statements.
+"""
+
+import pytest
+
+from src.multi_tenant.campaigns.metrics import (
+    metric_triggers_installed,
+    recount_campaign_metrics,
+    reconcile_campaign_metrics,
+    reset_metric_triggers_cache,
+)
+
+
+class FakeEngine:
+    url = 'postgresql://fake/metrics'
+
+    def __init__(self, fixed=(), triggers=0):
+        self.fixed = list(fixed)
+        self.triggers = triggers
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        self.statements.append((sql, params or {}))
+        if 'pg_trigger' in sql:
+            return FakeScalar(self.triggers)
+        return iter([(campaign_id,) for campaign_id in self.fixed])
+
+
+class FakeScalar:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+@pytest.fixture(autouse=True)
+def isolated_triggers_cache():
+    reset_metric_triggers_cache()
+    yield
+    reset_metric_triggers_cache()
+
+
+def test_recount_uma_campanha():
+    engine = FakeEngine(fixed=[7])
+
+    assert recount_campaign_metrics(engine, campaign_id=7) == [7]
+
+    sql, params = engine.statements[0]
+    assert 'c.id = :campaign_id' in sql
+    assert 'IS DISTINCT FROM' not in sql
+    assert params == {'campaign_id': 7}
+
+
+def test_reconcile_grava_so_desvios():
+    engine = FakeEngine(fixed=[3, 9])
+
+    assert reconcile_campaign_metrics(engine, tenant_id=2) == 2
+
+    sql, params = engine.statements[0]
+    assert 'c.tenant_id = :tenant_id' in sql
+    assert 'IS DISTINCT FROM' in sql
+    assert 'RETURNING c.id' in sql
+    assert params == {'tenant_id': 2}
+
+
+def test_reconcile_todas_as_campanhas():
+    engine = FakeEngine()
+
+    assert reconcile_campaign_metrics(engine) == 0
+    assert 'WHERE TRUE' in engine.statements[0][0]
+
+
+def test_triggers_cache_so_positivo():
+    engine = FakeEngine(triggers=0)
+
+    assert metric_triggers_installed(engine) is False
+    engine.triggers = 3  # migration aplicada
+    assert metric_triggers_installed(engine) is True
+
+    engine.triggers = 0
+    assert metric_triggers_installed(engine) is True
+    assert len([sql for sql, _ in engine.statements if 'pg_trigger' in sql]) == 2
@@ -0,0 +1,167 @@
+"""
+Testes das gravações em lote do CampaignService
+===============================================
+
+Testa:
+- update_leads_batch: um UPDATE ... FROM (VALUES ...) por lote, com
+  parâmetros por lead e métricas recalculadas uma vez
+- save_generation_results: conversão dos resultados do gerador
+- mark_leads_for_regeneration: um UPDATE para todos os leads (com histórico)
+- _update_campaign_metrics: nada a recontar com os triggers de contadores
+
+Não acessa o banco: a engine fake registra os statements.
+"""
+
+import json
+
+import pytest
+
+from src.multi_tenant.campaigns import service as service_module
+from src.multi_tenant.campaigns.metrics import reset_metric_triggers_cache
+from src.multi_tenant.campaigns.models import LeadStatus
+from src.multi_tenant.campaigns.service import CampaignService
+
+
+class FakeResult:
+    def __init__(self, rowcount, rows=()):
+        self.rowcount = rowcount
+        self.rows = list(rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+
+class FakeEngine:
+    url = 'postgresql://fake/campaigns'
+
+    def __init__(self, triggers=False):
+        self.triggers = triggers
+        self.statements = []
+        self.commits = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        if 'pg_trigger' in sql:
+            return FakeResult(1, [(3 if self.triggers else 0,)])
+
+        self.statements.append((sql, params or {}))
+        if 'UPDATE campaigns' in sql:
+            return FakeResult(1, [(params.get('campaign_id'),)])
+        if 'UPDATE campaign_leads' in sql:
+            rows = [key for key in (params or {}) if key.startswith('lead_id_')]
+            return FakeResult(len(rows) or len((params or {}).get('lead_ids', [])))
+        return FakeResult(1)
+
+    def commit(self):
+        self.commits += 1
+
+    def updates(self, table):
+        return [(sql, params) for sql, params in self.statements if f'UPDATE {table}' in sql]
+
+
+@pytest.fixture(autouse=True)
+def isolated_triggers_cache():
+    reset_metric_triggers_cache()
+    yield
+    reset_metric_triggers_cache()
+
+
+def make_service(triggers=False):
+    engine = FakeEngine(triggers)
+    return CampaignService(engine, tenant_id=1), engine
+
+
+def test_update_leads_batch_um_statement():
+    service, engine = make_service()
+
+    count = service.update_leads_batch(7, [
+        {'lead_id': 10, 'var1': 'Ana', 'var2': 'oi', 'var3': 'cta', 'status': LeadStatus.PROCESSED,
+         'generation_metadata': {'cost_brl': 0.01}},
+        {'lead_id': 11, 'status': LeadStatus.ERROR, 'error_message': 'timeout'},
+    ])
+
+    assert count == 2
+    lead_updates = engine.updates('campaign_leads')
+    assert len(lead_updates) == 1
+    sql, params = lead_updates[0]
+    assert 'FROM (VALUES' in sql
+    assert 'COALESCE(v.var1, cl.var1)' in sql
+    assert params['campaign_id'] == 7
+    assert params['status_0'] == 'processed'
+    assert json.loads(params['generation_metadata_0']) == {'cost_brl': 0.01}
+    assert params['var1_1'] is None
+    assert params['error_message_1'] == 'timeout'
+
+    # Métricas uma vez por lote, mesma transação
+    assert len(engine.updates('campaigns')) == 1
+    assert engine.commits == 1
+
+
+def test_update_leads_batch_divide_em_chunks(monkeypatch):
+    monkeypatch.setattr(service_module, 'LEAD_BATCH_UPDATE_CHUNK_SIZE', 2)
+    service, engine = make_service()
+
+    count = service.update_leads_batch(7, [{'lead_id': i, 'status': LeadStatus.PROCESSED} for i in range(5)])
+
+    assert count == 5
+    assert len(engine.updates('campaign_leads')) == 3
+    assert len(engine.updates('campaigns')) == 1
+
+
+def test_update_leads_batch_vazio():
+    service, engine = make_service()
+
+    assert service.update_leads_batch(7, []) == 0
+    assert engine.statements == []
+
+
+def test_save_generation_results():
+    service, engine = make_service()
+
+    service.save_generation_results(7, [
+        {'lead_id': 10, 'status': LeadStatus.PROCESSED, 'var1': 'Ana', 'var2': 'oi', 'var3': 'cta',
+         'message_preview': 'Oi Ana', 'metadata': {'cost_brl': 0.01}},
+        {'lead_id': 11, 'status': LeadStatus.ERROR, 'error_message': 'x' * 300},
+    ])
+
+    _, params = engine.updates('campaign_leads')[0]
+    assert params['message_preview_0'] == 'Oi Ana'
+    assert params['status_1'] == 'error'
+    assert len(params['error_message_1']) == 200
+    assert params['generation_metadata_1'] is None
+
+
+def test_mark_leads_for_regeneration_em_lote():
+    service, engine = make_service()
+
+    count = service.mark_leads_for_regeneration([1, 2, 3], campaign_id=7)
+
+    assert count == 3
+    lead_updates = engine.updates('campaign_leads')
+    assert len(lead_updates) == 1
+    sql, params = lead_updates[0]
+    assert 'reset_history' in sql
+    assert params['lead_ids'] == [1, 2, 3]
+    assert len(engine.updates('campaigns')) == 1
+
+
+def test_metricas_mantidas_pelos_triggers():
+    service, engine = make_service(triggers=True)
+
+    service.update_leads_batch(7, [{'lead_id': 10, 'status': LeadStatus.PROCESSED}])
+    service.mark_leads_for_regeneration([10], campaign_id=7)
+
+    assert len(engine.updates('campaign_leads')) == 2
+    assert engine.updates('campaigns') == []
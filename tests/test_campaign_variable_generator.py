@@ -0,0 +1,283 @@
+"""
+Testes do lote concorrente do CampaignVariableGenerator
+========================================================
+
+Testa:
+- TokenBucket: rajada inicial e espera proporcional à taxa
+- get_token_bucket: nova taxa alterada no mesmo bucket, sem zerar o saldo
+- generate_batch concorrente: resultados e on_result na ordem dos leads,
+  mesmo com respostas fora de ordem; chamadas simultâneas de fato
+- Interrupção por erros consecutivos e estatísticas da sessão
+- max_workers=1 mantém o modo serial
+- Análises do lote carregadas em uma query (ANY), sem message_compiled
+- Regeneração manual (flag no lead ou bypass_cache) ignora o cache LLM
+
+Não acessa a OpenAI nem o banco: cliente e engine fakes.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.multi_tenant.campaigns import variable_generator
+from src.multi_tenant.campaigns.models import REGENERATE_METADATA_KEY, Campaign, CampaignLead, LeadStatus
+from src.multi_tenant.campaigns.variable_generator import CampaignVariableGenerator
+from src.multi_tenant.utils.rate_limiter import TokenBucket, get_token_bucket, reset_token_buckets
+
+
+class FakeClient:
+    """Responde var1 = telefone do prompt; telefones 'erro-*' geram JSON inválido"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **request):
+        prompt = request['messages'][1]['content']
+        phone = prompt.split('- Telefone: ')[1].split('\n')[0]
+
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        time.sleep(self.delays.get(phone, 0.01))
+
+        with self.lock:
+            self.active -= 1
+
+        content = 'não é json' if phone.startswith('erro') else json.dumps(
+            {'var1': phone, 'var2': 'oferta', 'var3': 'responda'}
+        )
+        message = type('Message', (), {'content': content})
+        choice = type('Choice', (), {'message': message})
+        usage = type('Usage', (), {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120})
+        return type('Response', (), {'choices': [choice], 'usage': usage})
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeEngine:
+    """Devolve as linhas de `rows` filtradas pelos parâmetros da query"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        self.queries.append((str(query), params))
+        ids = params.get('conversation_ids', [params.get('conversation_id')])
+        return FakeResult([row for row in self.rows if row['conversation_id'] in ids])
+
+
+def analysis_row(conversation_id, **values):
+    row = dict.fromkeys([
+        'contact_name', 'contact_phone', 'nome_mapeado_bot', 'mc_last_message_at', 'tipo_conversa',
+        'nivel_interesse', 'analise_ia', 'sugestao_disparo', 'dados_extraidos_ia'
+    ])
+    row.update(conversation_id=conversation_id, **values)
+    return row
+
+
+@pytest.fixture(autouse=True)
+def isolated_token_buckets():
+    reset_token_buckets()
+    yield
+    reset_token_buckets()
+
+
+def make_generator(monkeypatch, client, engine=None, **kwargs):
+    monkeypatch.setattr(variable_generator, 'OpenAI', lambda api_key: client)
+    return CampaignVariableGenerator(
+        openai_api_key='sk-test', engine=engine or FakeEngine(), tenant_id=1, rate_limit_rpm=60000, **kwargs
+    )
+
+
+def make_leads(phones):
+    return [
+        CampaignLead(id=i + 1, campaign_id=1, conversation_id=100 + i, contact_phone=phone, contact_name='Ana')
+        for i, phone in enumerate(phones)
+    ]
+
+
+CAMPAIGN = Campaign(id=1, tenant_id=1, name='Teste', template_text='Oi {{1}}, {{2}}. {{3}}')
+
+
+def test_token_bucket_rajada_e_taxa():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 10/s
+
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(4)]
+    elapsed = time.monotonic() - start
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0
+    assert 0.15 <= elapsed < 1.0
+
+
+def test_get_token_bucket_altera_taxa_no_mesmo_bucket():
+    reset_token_buckets()
+    try:
+        bucket = get_token_bucket('teste_taxa', 600)  # capacidade 10
+        for _ in range(10):
+            bucket.acquire()
+
+        same = get_token_bucket('teste_taxa', 1200)
+
+        assert same is bucket
+        assert bucket.rate_per_minute == 1200
+        assert bucket.capacity == 20.0
+        # Saldo consumido continua consumido: sem rajada nova com a troca
+        assert bucket.acquire() > 0
+    finally:
+        reset_token_buckets()
+
+
+def test_lote_concorrente_mantem_ordem(monkeypatch):
+    phones = [f'5511{i:04d}' for i in range(12)]
+    # Primeiros leads respondem por último
+    client = FakeClient(delays={phone: 0.05 - i * 0.004 for i, phone in enumerate(phones)})
+    generator = make_generator(monkeypatch, client, max_workers=6)
+    leads = make_leads(phones)
+
+    seen = []
+    progress = []
+    main_thread = threading.current_thread()
+
+    def on_result(done, total, lead, result):
+        assert threading.current_thread() is main_thread
+        seen.append((done, total, lead.id, result['var1']))
+
+    results, stats = generator.generate_batch(
+        CAMPAIGN, leads,
+        on_progress=lambda done, total, lead: progress.append(done),
+        on_result=on_result
+    )
+
+    assert [r['var1'] for r in results] == phones
+    assert [r['lead_id'] for r in results] == [lead.id for lead in leads]
+    assert seen == [(i + 1, 12, i + 1, phone) for i, phone in enumerate(phones)]
+    assert progress == list(range(1, 13))
+    assert client.max_active > 1
+    assert stats['processed'] == 12
+    assert stats['tokens_total'] == 12 * 120
+    assert generator.get_session_stats()['calls'] == 12
+
+
+def test_lote_interrompe_apos_erros_consecutivos(monkeypatch):
+    phones = ['5511000', 'erro-1', 'erro-2', 'erro-3'] + [f'5511{i:03d}' for i in range(20)]
+    client = FakeClient()
+    generator = make_generator(monkeypatch, client, max_workers=4)
+
+    results, stats = generator.generate_batch(CAMPAIGN, make_leads(phones), max_errors=3)
+
+    assert [r['status'] for r in results] == [LeadStatus.PROCESSED] + [LeadStatus.ERROR] * 3
+    assert stats['errors'] == 3
+    # Leads ainda não submetidos não chegam à API
+    assert client.calls < len(phones)
+
+
+def test_lote_serial(monkeypatch):
+    client = FakeClient()
+    generator = make_generator(monkeypatch, client, max_workers=1)
+    phones = ['5511001', '5511002', '5511003']
+
+    results, stats = generator.generate_batch(CAMPAIGN, make_leads(phones))
+
+    assert [r['var1'] for r in results] == phones
+    assert client.max_active == 1
+    assert stats['processed'] == 3
+
+
+def test_lote_carrega_analises_em_uma_query(monkeypatch):
+    engine = FakeEngine([
+        analysis_row(
+            100, nome_mapeado_bot='Ana', mc_last_message_at=datetime.now() - timedelta(days=3),
+            dados_extraidos_ia=json.dumps({'interesse': 'plano anual', 'objecoes': ['preço', 'horário']})
+        ),
+        analysis_row(101, contact_name='Bruno', dados_extraidos_ia={'objetivo': 'emagrecer'}),
+    ])
+    client = FakeClient()
+    generator = make_generator(monkeypatch, client, engine=engine, max_workers=3)
+    prompts = []
+    original_build_prompt = generator._build_prompt
+
+    def build_prompt(campaign, lead, analysis):
+        prompts.append((lead.conversation_id, analysis))
+        return original_build_prompt(campaign, lead, analysis)
+
+    monkeypatch.setattr(generator, '_build_prompt', build_prompt)
+
+    results, stats = generator.generate_batch(CAMPAIGN, make_leads(['5511001', '5511002', '5511003']))
+
+    assert stats['processed'] == 3
+    assert len(engine.queries) == 1
+    sql, params = engine.queries[0]
+    assert 'ANY(:conversation_ids)' in sql
+    assert 'message_compiled' not in sql
+    assert params['conversation_ids'] == [100, 101, 102]
+
+    analyses = dict(prompts)
+    assert analyses[100]['interesse'] == 'plano anual'
+    assert analyses[100]['objecoes'] == 'preço, horário'
+    assert analyses[100]['dias_inativo'] == 3
+    assert analyses[101]['contact_name'] == 'Bruno'
+    assert analyses[101]['objetivo'] == 'emagrecer'
+    assert analyses[102] == {}  # conversa não encontrada: sem consulta extra
+
+    # Pré-carga descartada ao fim do lote
+    assert generator._get_lead_analysis(100)['contact_name'] == 'Ana'
+    assert len(engine.queries) == 2
+
+
+def test_regeneracao_manual_ignora_cache(monkeypatch):
+    client = FakeClient()
+    generator = make_generator(monkeypatch, client)
+    lead = make_leads(['5511001'])[0]
+
+    first = generator.generate_for_lead(CAMPAIGN, lead)
+    cached = generator.generate_for_lead(CAMPAIGN, lead)
+    assert client.calls == 1
+    assert cached['metadata']['cache_hit'] is True
+
+    # Lead marcado na regeneração manual: nova chamada à API
+    lead.generation_metadata = {REGENERATE_METADATA_KEY: True}
+    assert lead.regeneration_requested
+    regenerated = generator.generate_for_lead(CAMPAIGN, lead)
+    assert client.calls == 2
+    assert regenerated['metadata']['cache_hit'] is False
+    assert REGENERATE_METADATA_KEY not in regenerated['metadata']
+
+    # Flag explícito prevalece sobre o do lead
+    generator.generate_for_lead(CAMPAIGN, make_leads(['5511001'])[0], bypass_cache=True)
+    assert client.calls == 3
+    assert first['var1'] == regenerated['var1'] == '5511001'
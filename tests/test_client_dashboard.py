@@ -0,0 +1,152 @@
+"""
+Testes Unitários das funções puras do dashboard do cliente
+==========================================================
+
+Testa (sem banco):
+- select_rollup: recorte por inbox e conferência com as conversas carregadas
+  (total e sincronização posterior ao recálculo do dia)
+- format_inactivity_times / add_remarketing_badges: colunas de exibição
+  dos leads de remarketing (vetorizadas)
+- build_remarketing_filters / _keyset_condition: WHERE e paginação keyset
+  da tabela de remarketing
+
+Requer streamlit (importado pelo módulo do dashboard).
+"""
+
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('streamlit')
+
+from src.multi_tenant.dashboards.client_dashboard import (
+    REMARKETING_READY_CONDITION,
+    _keyset_condition,
+    add_remarketing_badges,
+    build_remarketing_filters,
+    format_inactivity_times,
+    select_rollup,
+)
+
+
+def _rollup(updated_at=datetime(2026, 10, 17, 3, 0)):
+    return pd.DataFrame({
+        'conversation_date': [date(2026, 10, 16), date(2026, 10, 16), date(2026, 10, 17)],
+        'inbox_name': ['Vendas', 'Suporte', 'Vendas'],
+        'total_conversas': [2, 1, 1],
+        'updated_at': [datetime(2026, 10, 16, 23, 0), datetime(2026, 10, 16, 23, 0), updated_at],
+    })
+
+
+def _conversations(synced_at=datetime(2026, 10, 17, 2, 0)):
+    return pd.DataFrame({
+        'conversation_date': [date(2026, 10, 16), date(2026, 10, 16), date(2026, 10, 17)],
+        'inbox_name': ['Vendas', 'Vendas', 'Vendas'],
+        'synced_at': [datetime(2026, 10, 16, 22, 0), datetime(2026, 10, 16, 22, 0), synced_at],
+    })
+
+
+def test_select_rollup_recorta_por_inbox():
+    selected = select_rollup(_rollup(), _conversations(), ['Vendas'])
+
+    assert selected['total_conversas'].sum() == 3
+
+
+def test_select_rollup_total_diferente():
+    assert select_rollup(_rollup(), _conversations(), None) is None
+    assert select_rollup(None, _conversations(), ['Vendas']) is None
+
+
+def test_select_rollup_dia_sincronizado_depois_do_recalculo():
+    # Mesmo total, mas a conversa do dia 17 mudou depois do recálculo
+    df = _conversations(synced_at=datetime(2026, 10, 17, 4, 0))
+
+    assert select_rollup(_rollup(), df, ['Vendas']) is None
+
+
+def test_select_rollup_dia_ausente_no_rollup():
+    rollup = _rollup()
+    rollup.loc[2, 'conversation_date'] = date(2026, 10, 15)
+
+    assert select_rollup(rollup, _conversations(), ['Vendas']) is None
+
+
+def test_format_inactivity_times():
+    horas = pd.Series([5.9, 53, 400, 1500, None, 'x'])
+
+    assert format_inactivity_times(horas).tolist() == ['5h', '2d 5h', '2sem', '2mes', '-', '-']
+
+
+def test_add_remarketing_badges():
+    leads = pd.DataFrame({
+        'analisado_em': [datetime(2026, 10, 17), None, None, None],
+        'horas_inativo': [30.0, 30.0, 5.5, None],
+        'tipo_conversa': ['REMARKETING_FRIO', 'REMARKETING_RECENTE', None, 'OUTRO'],
+        'score_prioridade': [5, 0, 9, None],
+    })
+
+    badges = add_remarketing_badges(leads)
+
+    assert badges['status_badge'].tolist() == [
+        '✅ Analisado', '⏳ Aguardando Análise', '🔄 Ativo (análise em 18h)', '⚠️ Sem data'
+    ]
+    assert badges['tipo_badge'].tolist() == ['🔴 Frio (7d+)', '🟢 Recente (24-48h)', '-', '-']
+    assert badges['inatividade_formatada'].tolist() == ['1d 6h', '1d 6h', '5h', '-']
+    assert badges['score_visual'].tolist() == ['5', '0', '-', '-']
+    assert 'status_badge' not in leads.columns  # não altera a página original
+
+
+def test_build_remarketing_filters():
+    where_base, table_condition, params = build_remarketing_filters(
+        7,
+        {
+            'date_start': date(2026, 10, 1), 'inbox_names': ('Vendas',),
+            'contact_name': '50%_off', 'status_values': (0, 2), 'score_min': 0.5,
+        },
+        tipo_filter=('REMARKETING_FRIO',),
+        score_min=3,
+    )
+
+    assert where_base.startswith('tenant_id = :tenant_id AND is_lead = TRUE')
+    assert 'conversation_date >= :date_start' in where_base
+    assert 'conversation_date <= :date_end' not in where_base
+    assert 'inbox_name = ANY(:inbox_names)' in where_base
+    assert 'contact_name ILIKE :contact_name' in where_base
+    assert 'ai_probability_score >= :ai_score_min' in where_base
+    assert REMARKETING_READY_CONDITION in table_condition
+    assert 'tipo_conversa = ANY(:tipo_filter)' in table_condition
+    assert 'score_prioridade >= :score_prioridade_min' in table_condition
+    assert params == {
+        'tenant_id': 7, 'date_start': date(2026, 10, 1), 'inbox_names': ['Vendas'],
+        'contact_name': '%50\\%\\_off%', 'status_values': [0, 2], 'ai_score_min': 0.5,
+        'tipo_filter': ['REMARKETING_FRIO'], 'score_prioridade_min': 3,
+    }
+
+
+def test_build_remarketing_filters_sem_filtros():
+    where_base, table_condition, params = build_remarketing_filters(7)
+
+    assert where_base == 'tenant_id = :tenant_id AND is_lead = TRUE'
+    assert table_condition == REMARKETING_READY_CONDITION
+    assert params == {'tenant_id': 7}
+
+
+def test_keyset_condition():
+    params = {}
+    assert _keyset_condition(None, params) == ''
+    assert params == {}
+
+    condition = _keyset_condition((pd.Timestamp('2026-10-17 10:00'), '42'), params)
+    assert 'mc_last_message_at < :cursor_contact' in condition
+    assert 'mc_last_message_at IS NULL' in condition
+    assert params == {'cursor_id': 42, 'cursor_contact': datetime(2026, 10, 17, 10, 0)}
+
+
+def test_keyset_condition_cursor_sem_data():
+    params = {}
+
+    condition = _keyset_condition((pd.NaT, 42), params)
+
+    assert condition == ' AND mc_last_message_at IS NULL AND conversation_id < :cursor_id'
+    assert params == {'cursor_id': 42}
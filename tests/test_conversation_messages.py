@@ -0,0 +1,182 @@
+"""
+Testes Unitários para conversation_messages
+===========================================
+
+Testa (sem banco):
+- Loader regrava as mensagens só das conversas com message_compiled novo;
+  falha na regravação remove as mensagens antigas (ou interrompe a carga)
+- Predicado SQL de resposta do bot/agente (NULL sem mensagens normalizadas)
+- lead_has_response: coluna calculada em SQL tem prioridade sobre o JSON
+- Verificação da tabela cacheada apenas quando encontrada
+"""
+
+import pandas as pd
+import pytest
+
+from src.multi_tenant.etl_v4 import conversation_messages
+from src.multi_tenant.etl_v4 import loader as loader_module
+from src.multi_tenant.etl_v4.conversation_messages import (
+    messages_table_available,
+    reset_messages_table_cache,
+    responder_exists_sql,
+    responder_predicate_sql,
+)
+from src.multi_tenant.etl_v4.loader import ConversationLoader
+from src.multi_tenant.etl_v4.remarketing_analyzer import lead_has_response
+from src.multi_tenant.etl_v4.transformer import ANALYSIS_UNCHANGED_FLAG
+
+
+def test_loader_regrava_mensagens_das_conversas_alteradas(monkeypatch):
+    calls = []
+    monkeypatch.setattr(loader_module, 'messages_table_available', lambda engine: True)
+    monkeypatch.setattr(
+        loader_module, 'refresh_conversation_messages',
+        lambda engine, tenant_id, ids: calls.append((tenant_id, sorted(ids)))
+    )
+
+    loader = ConversationLoader(local_engine=None, maintain_rollup=False, maintain_metrics=False)
+    monkeypatch.setattr(loader, '_upsert', lambda df: (len(df), 0))
+
+    loader.load_chunk(pd.DataFrame({
+        'tenant_id': [1, 1, 2],
+        'conversation_id': [10, 11, 20],
+        'message_compiled': [[{'text': 'oi'}], [{'text': 'oi'}], [{'text': 'olá'}]],
+        ANALYSIS_UNCHANGED_FLAG: [False, True, False],
+    }))
+
+    # Conversa 11 (UPDATE restrito) mantém as mensagens
+    assert calls == [(1, [10]), (2, [20])]
+
+
+def make_loader(monkeypatch, available=True):
+    monkeypatch.setattr(loader_module, 'messages_table_available', lambda engine: available)
+    loader = ConversationLoader(local_engine=None, maintain_rollup=False, maintain_metrics=False)
+    monkeypatch.setattr(loader, '_upsert', lambda df: (len(df), 0))
+    return loader
+
+
+CHUNK = {'tenant_id': [1], 'conversation_id': [10], 'message_compiled': [[{'text': 'oi'}]]}
+
+
+def test_loader_sem_tabela_de_mensagens(monkeypatch):
+    monkeypatch.setattr(
+        loader_module, 'refresh_conversation_messages',
+        lambda *args: pytest.fail('tabela ainda não existe')
+    )
+
+    stats = make_loader(monkeypatch, available=False).load_chunk(pd.DataFrame(CHUNK))
+
+    assert stats['inserted'] == 1
+
+
+def test_loader_invalida_mensagens_quando_regravacao_falha(monkeypatch):
+    invalidated = []
+
+    def fail(*args):
+        raise RuntimeError('invalid input syntax for type smallint')
+
+    monkeypatch.setattr(loader_module, 'refresh_conversation_messages', fail)
+    monkeypatch.setattr(
+        loader_module, 'invalidate_conversation_messages',
+        lambda engine, tenant_id, ids: invalidated.append((tenant_id, list(ids)))
+    )
+
+    stats = make_loader(monkeypatch).load_chunk(pd.DataFrame(CHUNK))
+
+    assert stats['inserted'] == 1
+    assert invalidated == [(1, [10])]
+
+
+def test_loader_falha_se_nao_consegue_invalidar(monkeypatch):
+    def fail(*args):
+        raise RuntimeError('connection lost')
+
+    monkeypatch.setattr(loader_module, 'refresh_conversation_messages', fail)
+    monkeypatch.setattr(loader_module, 'invalidate_conversation_messages', fail)
+
+    with pytest.raises(RuntimeError):
+        make_loader(monkeypatch).load_chunk(pd.DataFrame(CHUNK))
+
+
+def test_predicado_de_resposta():
+    sql = responder_exists_sql('ca')
+
+    assert 'msg.tenant_id = ca.tenant_id' in sql
+    assert 'msg.conversation_id = ca.conversation_id' in sql
+    assert "msg.sender IN ('AgentBot', 'User', 'Agent')) THEN TRUE" in sql
+    # Sem linhas normalizadas: nem TRUE nem FALSE (NULL)
+    assert sql.endswith('THEN FALSE END)')
+
+
+def test_predicado_recorre_ao_json_sem_mensagens(monkeypatch):
+    monkeypatch.setattr(conversation_messages, 'messages_table_available', lambda engine: True)
+
+    sql = responder_predicate_sql(None, 'ca')
+
+    assert sql.startswith('COALESCE((CASE WHEN EXISTS')
+    assert 'jsonb_array_elements(ca.message_compiled)' in sql
+
+
+def test_lead_has_response_prefere_coluna_sql():
+    bot_reply = [{'sender': 'Contact', 'text': 'oi'}, {'sender': 'AgentBot', 'text': 'olá'}]
+
+    assert lead_has_response({'has_response': False, 'message_compiled': bot_reply}) is False
+    assert lead_has_response({'has_response': True, 'message_compiled': None}) is True
+
+    # Sem a coluna (migration pendente): decodifica o JSON
+    assert lead_has_response({'message_compiled': bot_reply}) is True
+    assert lead_has_response({'message_compiled': '[{"sender": "Contact", "text": "oi"}]'}) is False
+
+
+class FakeEngine:
+    """Responde à verificação to_regclass"""
+
+    url = 'postgresql://etl@localhost/geniai_analytics'
+
+    def __init__(self, available):
+        self.available = available
+        self.queries = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params):
+        self.queries += 1
+        return self
+
+    def scalar(self):
+        return self.available
+
+
+def test_tabela_cacheada_apenas_quando_encontrada():
+    reset_messages_table_cache()
+    engine = FakeEngine(False)
+
+    assert messages_table_available(engine) is False
+    assert messages_table_available(engine) is False
+    assert engine.queries == 2
+
+    # Migration aplicada: passa a ser usada sem reiniciar o processo
+    engine.available = True
+    assert messages_table_available(engine) is True
+    assert messages_table_available(engine) is True
+    assert engine.queries == 3
+
+    reset_messages_table_cache()
+    assert conversation_messages._table_available == {}
+
+
+def test_conversoes_tolerantes():
+    """Elemento malformado não pode abortar o INSERT do chunk"""
+    sql = conversation_messages._INSERT_MESSAGES
+
+    assert "::TIMESTAMPTZ" not in sql
+    assert "::BOOLEAN" not in sql
+    assert "conversation_messages_try_timestamptz(m.msg->>'sent_at')" in sql
+    assert "CASE WHEN m.msg->>'message_type' ~ '^-?[0-9]{1,4}$'" in sql
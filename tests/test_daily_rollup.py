@@ -0,0 +1,66 @@
+"""
+Testes Unitários para a manutenção do rollup diário
+====================================================
+
+Testa (sem banco):
+- ConversationLoader recalcula os dias presentes no chunk, por tenant
+- Falha no rollup não interrompe a carga
+- Conversas sem data/dias vazios não geram consulta
+- Período do rollup vem de conversation_period (mesmo agrupamento do dashboard)
+"""
+
+from datetime import date
+
+import pandas as pd
+
+from src.multi_tenant.etl_v4 import daily_rollup
+from src.multi_tenant.etl_v4 import loader as loader_module
+from src.multi_tenant.etl_v4.loader import ConversationLoader
+
+
+def test_loader_recalcula_dias_do_chunk(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        loader_module, 'refresh_daily_rollup',
+        lambda engine, tenant_id, dates: calls.append((tenant_id, sorted(dates)))
+    )
+
+    loader = ConversationLoader(local_engine=None)
+    df = pd.DataFrame({
+        'tenant_id': [1, 1, 1, 2],
+        'conversation_id': [10, 11, 12, 20],
+        'conversation_date': [date(2026, 10, 16), date(2026, 10, 16), date(2026, 10, 17), None],
+    })
+
+    loader._refresh_daily_rollup(df)
+
+    # Tenant 2 só tem conversa sem data: nada a recalcular
+    assert calls == [(1, [date(2026, 10, 16), date(2026, 10, 17)])]
+
+
+def test_loader_ignora_falha_no_rollup(monkeypatch):
+    def fail(engine, tenant_id, dates):
+        raise RuntimeError('relation "conversations_daily_rollup" does not exist')
+
+    monkeypatch.setattr(loader_module, 'refresh_daily_rollup', fail)
+
+    loader = ConversationLoader(local_engine=None)
+    df = pd.DataFrame({'tenant_id': [1], 'conversation_date': ['2026-10-17']})
+
+    loader._refresh_daily_rollup(df)  # Não propaga a exceção
+
+
+def test_refresh_sem_dias_nao_acessa_banco():
+    assert daily_rollup.refresh_daily_rollup(None, 1, [None]) == 0
+    assert daily_rollup.refresh_daily_rollup_for_conversations(None, 1, []) == 0
+
+
+def test_safe_refresh_retorna_none_em_erro():
+    assert daily_rollup.safe_refresh_daily_rollup_for_conversations(None, 1, [10]) is None
+
+
+def test_periodo_usa_conversation_period():
+    sql = str(daily_rollup._INSERT_DAYS)
+
+    assert "COALESCE(conversation_period, '')" in sql
+    assert 'EXTRACT(HOUR' not in sql
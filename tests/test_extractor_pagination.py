@@ -0,0 +1,183 @@
+"""
+Testes Unitários para paginação do RemoteExtractor
+===================================================
+
+Testa:
+- Paginação keyset por (conversation_updated_at, conversation_id)
+- Modo offset legado
+- Validação do modo de paginação
+- Modo stream: uma execução, NUMERIC convertido para float
+
+Não acessa banco: pd.read_sql é substituído por um fake em memória.
+"""
+
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from src.multi_tenant.etl_v4 import extractor as extractor_module
+from src.multi_tenant.etl_v4.extractor import RemoteExtractor
+
+
+def _make_rows(n):
+    """Gera n conversas com timestamps repetidos (empates no updated_at)"""
+    base = pd.Timestamp('2025-11-01 10:00:00')
+    return pd.DataFrame({
+        'conversation_id': list(range(1, n + 1)),
+        'conversation_updated_at': [base + pd.Timedelta(minutes=i // 3) for i in range(n)],
+    })
+
+
+class FakeReadSql:
+    """Simula pd.read_sql aplicando o cursor keyset / offset nas linhas em memória"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, query, engine, params=None):
+        sql = str(query)
+        self.calls.append((sql, dict(params or {})))
+
+        df = self.rows.sort_values(['conversation_updated_at', 'conversation_id'])
+
+        if 'last_updated_at' in params:
+            key = (params['last_updated_at'], params['last_conversation_id'])
+            mask = [
+                (row.conversation_updated_at, row.conversation_id) > key
+                for row in df.itertuples()
+            ]
+            df = df[mask]
+
+        limit = int(sql.split('LIMIT')[1].split()[0])
+        offset = int(sql.split('OFFSET')[1].split()[0]) if 'OFFSET' in sql else 0
+        return df.iloc[offset:offset + limit].reset_index(drop=True)
+
+
+@pytest.fixture
+def fake_read_sql(monkeypatch):
+    fake = FakeReadSql(_make_rows(10))
+    monkeypatch.setattr(extractor_module.pd, 'read_sql', fake)
+    return fake
+
+
+def test_keyset_extrai_todas_as_linhas_sem_duplicar(fake_read_sql):
+    """Keyset percorre todas as linhas exatamente uma vez"""
+    extractor = RemoteExtractor(remote_engine=object())
+
+    chunks = list(extractor.extract_conversations([1], chunk_size=4))
+
+    ids = [cid for chunk in chunks for cid in chunk['conversation_id']]
+    assert ids == list(range(1, 11))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+
+
+def test_keyset_nao_usa_offset(fake_read_sql):
+    """Cada chunk continua da última tupla lida, sem OFFSET"""
+    extractor = RemoteExtractor(remote_engine=object())
+
+    list(extractor.extract_conversations([1], chunk_size=4))
+
+    first_sql, first_params = fake_read_sql.calls[0]
+    second_sql, second_params = fake_read_sql.calls[1]
+
+    assert 'OFFSET' not in first_sql and 'OFFSET' not in second_sql
+    assert 'last_updated_at' not in first_params
+    assert second_params['last_conversation_id'] == 4
+    assert 'ORDER BY conversation_updated_at ASC, conversation_id ASC' in second_sql
+
+
+def test_keyset_para_quando_chunk_incompleto(fake_read_sql):
+    """Chunk menor que chunk_size encerra sem query extra"""
+    extractor = RemoteExtractor(remote_engine=object())
+
+    list(extractor.extract_conversations([1], chunk_size=4))
+
+    assert len(fake_read_sql.calls) == 3
+
+
+def test_offset_legado(fake_read_sql):
+    """Modo offset continua disponível"""
+    extractor = RemoteExtractor(remote_engine=object())
+
+    chunks = list(extractor.extract_conversations([1], chunk_size=4, pagination='offset'))
+
+    ids = [cid for chunk in chunks for cid in chunk['conversation_id']]
+    assert ids == list(range(1, 11))
+    assert 'OFFSET 4' in fake_read_sql.calls[1][0]
+
+
+def test_modo_invalido():
+    """Modo de paginação desconhecido gera ValueError"""
+    extractor = RemoteExtractor(remote_engine=object())
+
+    with pytest.raises(ValueError):
+        list(extractor.extract_conversations([1], pagination='page'))
+
+
+class FakeStreamResult:
+    """Simula o CursorResult de uma execução com stream_results"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def keys(self):
+        return list(self.rows.columns)
+
+    def partitions(self, size):
+        records = list(self.rows.itertuples(index=False, name=None))
+        for i in range(0, len(records), size):
+            yield records[i:i + size]
+
+
+class FakeStreamEngine:
+    """Engine fake que registra execution_options e quantas queries rodaram"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.options = None
+        self.executions = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execution_options(self, **options):
+        self.options = options
+        return self
+
+    def execute(self, query, params):
+        self.executions += 1
+        return FakeStreamResult(self.rows)
+
+
+def test_stream_executa_query_uma_vez():
+    """Modo stream lê toda a janela com uma única execução via cursor server-side"""
+    engine = FakeStreamEngine(_make_rows(10))
+    extractor = RemoteExtractor(remote_engine=engine)
+
+    chunks = list(extractor.extract_conversations([1], chunk_size=4, pagination='stream'))
+
+    assert engine.executions == 1
+    assert engine.options == {'stream_results': True, 'yield_per': 4}
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert list(chunks[0].columns) == ['conversation_id', 'conversation_updated_at']
+
+
+def test_stream_converte_numeric_para_float():
+    """Decimal (NUMERIC) vira float como no pd.read_sql dos outros modos"""
+    rows = _make_rows(3)
+    rows['ai_probability_score'] = [Decimal('0.75'), Decimal('0.5'), None]
+    engine = FakeStreamEngine(rows)
+    extractor = RemoteExtractor(remote_engine=engine)
+
+    chunk = next(extractor.extract_conversations([1], chunk_size=4, pagination='stream'))
+
+    assert chunk['ai_probability_score'].dtype == float
+    assert chunk['ai_probability_score'].tolist()[:2] == [0.75, 0.5]
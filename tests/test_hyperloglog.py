@@ -0,0 +1,51 @@
+"""
+Testes Unitários para o HyperLogLog
+===================================
+
+Testa:
+- Contagem exata em cardinalidades pequenas (linear counting)
+- Erro dentro do esperado em cardinalidades grandes
+- add idempotente, união (merge) e serialização
+"""
+
+import pytest
+
+from src.multi_tenant.utils.hyperloglog import HyperLogLog
+
+
+def test_cardinalidade_pequena_e_idempotente():
+    sketch = HyperLogLog()
+    sketch.update([101, 102, 103, 101, 102])
+
+    assert sketch.count() == 3
+
+
+def test_erro_relativo_em_cardinalidade_grande():
+    sketch = HyperLogLog()
+    sketch.update(range(50000))
+
+    assert abs(sketch.count() - 50000) / 50000 < 0.05
+
+
+def test_merge_estima_a_uniao():
+    a = HyperLogLog()
+    a.update(range(0, 3000))
+    b = HyperLogLog()
+    b.update(range(2000, 5000))  # 1000 contatos em comum
+
+    assert abs(a.merge(b).count() - 5000) / 5000 < 0.05
+
+
+def test_serializacao():
+    sketch = HyperLogLog()
+    sketch.update(['a', 'b', 'c'])
+
+    restored = HyperLogLog.from_bytes(memoryview(sketch.to_bytes()))
+
+    assert restored.count() == 3
+    assert HyperLogLog.from_bytes(None).count() == 0
+
+
+def test_precisoes_diferentes_nao_unem():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(10))
@@ -0,0 +1,138 @@
+"""
+Testes Unitários para o LLMResponseCache
+========================================
+
+Testa:
+- Chave estável (normalização de espaços) e sensível a prompt/parâmetros
+- get/set, contadores de hit/miss
+- Expiração por TTL e remoção LRU acima de max_entries
+- Arquivo fora do /tmp, criado com permissão 0600 (diretório 0700)
+- OpenAIAnalyzer: segunda análise da mesma conversa não chama a API
+
+Não acessa a OpenAI: o cliente é substituído por um fake.
+"""
+
+import json
+import os
+import stat
+import time
+
+from src.multi_tenant.etl_v4.analyzers import openai_analyzer
+from src.multi_tenant.etl_v4.analyzers.openai_analyzer import OpenAIAnalyzer
+from src.multi_tenant.utils.llm_cache import LLMResponseCache, get_llm_cache
+
+
+def test_make_key_normaliza_entrada():
+    key = LLMResponseCache.make_key('ns', 'gpt-4o-mini', 'prompt', 'Oi,  tudo\n bem?', temperature=0.3)
+
+    assert key == LLMResponseCache.make_key('ns', 'gpt-4o-mini', 'prompt', 'Oi, tudo bem?', temperature=0.3)
+    assert key != LLMResponseCache.make_key('ns', 'gpt-4o-mini', 'prompt v2', 'Oi, tudo bem?', temperature=0.3)
+    assert key != LLMResponseCache.make_key('ns', 'gpt-4o-mini', 'prompt', 'Oi, tudo bem?', temperature=0.7)
+    assert key != LLMResponseCache.make_key('outro', 'gpt-4o-mini', 'prompt', 'Oi, tudo bem?', temperature=0.3)
+
+
+def test_get_set_e_contadores(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / 'cache.sqlite3'))
+
+    assert cache.get('k1') is None
+    cache.set('k1', {'score': 4, 'nome': 'Ana'}, namespace='ns', model='gpt-4o-mini')
+
+    assert cache.get('k1') == {'score': 4, 'nome': 'Ana'}
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 50.0
+    assert stats['entries'] == 1
+
+
+def test_persistente_entre_instancias(tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    LLMResponseCache(db_path=db_path).set('k1', {'ok': True}, namespace='ns')
+
+    assert LLMResponseCache(db_path=db_path).get('k1') == {'ok': True}
+
+
+def test_ttl_expira(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / 'cache.sqlite3'), ttl_seconds=0.05)
+    cache.set('k1', {'ok': True}, namespace='ns')
+
+    time.sleep(0.1)
+
+    assert cache.get('k1') is None
+    assert cache.stats['expired'] == 1
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_lru_remove_menos_acessadas(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / 'cache.sqlite3'), max_entries=2)
+
+    cache.set('k1', 1, namespace='ns')
+    time.sleep(0.01)
+    cache.set('k2', 2, namespace='ns')
+    time.sleep(0.01)
+    cache.get('k1')  # k1 passa a ser a mais recente
+    time.sleep(0.01)
+    cache.set('k3', 3, namespace='ns')
+
+    assert cache.evict() == 1
+    assert cache.get('k2') is None
+    assert cache.get('k1') == 1
+    assert cache.get('k3') == 3
+
+
+def test_arquivo_privado(tmp_path):
+    db_path = tmp_path / 'privado' / 'cache.sqlite3'
+    cache = LLMResponseCache(db_path=str(db_path))
+    cache.set('k1', {'nome': 'Ana'}, namespace='ns', model='gpt-4o-mini')
+
+    assert stat.S_IMODE(os.stat(db_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(db_path.parent).st_mode) == 0o700
+    assert not LLMResponseCache.DB_FILE.startswith('/tmp')
+
+
+def test_desabilitado_nao_grava(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / 'cache.sqlite3'), enabled=False)
+    cache.set('k1', {'ok': True}, namespace='ns')
+
+    assert cache.get('k1') is None
+    assert cache.get_stats()['entries'] == 0
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **request):
+        self.calls += 1
+        content = json.dumps({
+            'probabilidade_conversao': 4,
+            'visita_agendada': False,
+            'nome_mapeado_bot': 'Ana',
+            'analise_ia': 'Lead interessado',
+        })
+        message = type('Message', (), {'content': content})
+        choice = type('Choice', (), {'message': message})
+        usage = type('Usage', (), {'total_tokens': 10})
+        return type('Response', (), {'choices': [choice], 'usage': usage})
+
+
+def test_openai_analyzer_reaproveita_resposta(monkeypatch):
+    """Reprocessar a mesma conversa não gera nova chamada à API"""
+    client = FakeClient()
+    monkeypatch.setattr(openai_analyzer, 'OpenAI', lambda api_key: client)
+
+    first = OpenAIAnalyzer(tenant_id=1, api_key='sk-test')
+    result = first._call_openai_with_retry('Quero saber o valor do plano', 'Ana', 3)
+
+    # Nova instância (ex: outro run do ETL) usa o cache persistente
+    second = OpenAIAnalyzer(tenant_id=1, api_key='sk-test')
+    cached = second._call_openai_with_retry('Quero saber o valor  do plano', 'Ana', 3)
+
+    assert client.calls == 1
+    assert cached == result
+    assert second.stats['cache_hits'] == 1
+    assert second.stats['total_calls'] == 0
+    assert get_llm_cache().get_stats()['entries'] == 1
@@ -0,0 +1,59 @@
+"""
+Testes Unitários para o caminho COPY do ConversationLoader
+===========================================================
+
+Testa a serialização CSV enviada ao COPY (sem banco):
+- Inteiros vindos como float (123.0 → 123)
+- NULLs (None/NaN/NaT → marcador COPY_NULL)
+- dict/list em colunas JSONB
+"""
+
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+from src.multi_tenant.etl_v4.loader import ConversationLoader, COPY_NULL
+
+
+COLUMN_TYPES = {
+    'tenant_id': 'integer',
+    'conversation_id': 'integer',
+    'resolution_time_seconds': 'integer',
+    'contact_name': 'character varying',
+    'is_lead': 'boolean',
+    'message_compiled': 'jsonb',
+}
+
+
+def _read_rows(buffer):
+    return list(csv.reader(io.StringIO(buffer.getvalue())))
+
+
+def test_copy_buffer_serializa_tipos():
+    """Floats inteiros, JSON e NULLs são serializados para o COPY"""
+    loader = ConversationLoader(local_engine=None)
+    df = pd.DataFrame({
+        'tenant_id': [1, 1],
+        'conversation_id': [10, 11],
+        'resolution_time_seconds': [123.0, np.nan],
+        'contact_name': ['Maria, "Mari"', None],
+        'is_lead': [True, False],
+        'message_compiled': [[{'text': 'oi', 'sender': 'Contact'}], None],
+    })
+
+    rows = _read_rows(loader._to_copy_buffer(df, COLUMN_TYPES))
+
+    assert rows[0] == ['1', '10', '123', 'Maria, "Mari"', 'True', '[{"text": "oi", "sender": "Contact"}]']
+    assert rows[1] == ['1', '11', COPY_NULL, COPY_NULL, 'False', COPY_NULL]
+
+
+def test_copy_buffer_preserva_string_vazia():
+    """String vazia não vira NULL (NULL usa marcador próprio)"""
+    loader = ConversationLoader(local_engine=None)
+    df = pd.DataFrame({'tenant_id': [1], 'conversation_id': [1], 'contact_name': ['']})
+
+    rows = _read_rows(loader._to_copy_buffer(df, COLUMN_TYPES))
+
+    assert rows[0][2] == ''
@@ -0,0 +1,127 @@
+"""
+Testes da categorização de conversas em lote (app.utils.metrics)
+
+Testa:
+- Parse único das transcrições (colunas de texto reaproveitadas)
+- Mesmas categorias da regra linha a linha (score = peso x padrões, empate pela ordem)
+- Detecção de visitas vetorizada igual à versão por conversa
+- Agregação de calculate_conversation_categories
+"""
+
+import json
+import re
+
+import pandas as pd
+
+from app.utils import metrics
+from app.utils.metrics import (
+    CATEGORY_PATTERNS,
+    TRANSCRIPT_TEXT_COLUMN,
+    add_transcript_text_columns,
+    calculate_conversation_categories,
+    categorize_conversations,
+    count_visits_scheduled,
+    detect_visit_scheduled,
+    detect_visits_scheduled,
+)
+
+
+def _transcript(*messages):
+    return json.dumps([
+        {'text': text, 'sender': sender, 'message_type': message_type}
+        for text, sender, message_type in messages
+    ])
+
+
+def _row_wise_category(text):
+    scores = {}
+    for category, config in CATEGORY_PATTERNS.items():
+        score = sum(config['weight'] for pattern in config['keywords'] if re.search(pattern, text))
+        if score > 0:
+            scores[category] = score
+    return max(scores, key=scores.get) if scores else 'OUTROS'
+
+
+TRANSCRIPTS = [
+    _transcript(('Qual o valor do plano?', 'Contact', 0), ('O plano custa R$ 99', 'AgentBot', 1)),
+    _transcript(('Quero agendar uma visita', 'Contact', 0), ('Visita agendada para amanhã às 10h', 'AgentBot', 1)),
+    _transcript(('Quero cancelar', 'Contact', 0), ('Qual o valor?', 'Contact', 0)),
+    _transcript(('Me fala sobre a academia', 'Contact', 0)),
+    _transcript(('Preciso de ajuda', 'Contact', 0), ('Quanto custa?', 'AgentBot', 2)),
+    _transcript(('Oi', 'Contact', 0)),
+    None,
+    'null',
+    '{json inválido',
+]
+
+
+def _frame():
+    return pd.DataFrame({'message_compiled': TRANSCRIPTS}, index=range(10, 10 + len(TRANSCRIPTS)))
+
+
+def test_parse_unico_das_transcricoes(monkeypatch):
+    calls = []
+    original = metrics.flatten_transcript
+
+    def counting(value):
+        calls.append(value)
+        return original(value)
+
+    monkeypatch.setattr(metrics, 'flatten_transcript', counting)
+
+    df = add_transcript_text_columns(_frame())
+    categorize_conversations(df)
+    detect_visits_scheduled(df)
+
+    assert len(calls) == len(TRANSCRIPTS)
+    assert df.loc[10, TRANSCRIPT_TEXT_COLUMN] == 'qual o valor do plano? o plano custa r$ 99'
+    # Mensagens de sistema (message_type 2/3) fora do texto
+    assert 'quanto custa' not in df.loc[14, TRANSCRIPT_TEXT_COLUMN]
+    # DataFrame original não é alterado (pode vir do cache compartilhado)
+    assert TRANSCRIPT_TEXT_COLUMN not in _frame().columns
+
+
+def test_categorias_iguais_a_regra_linha_a_linha():
+    df = add_transcript_text_columns(_frame())
+
+    categories = categorize_conversations(df)
+
+    expected = [_row_wise_category(text) for text in df[TRANSCRIPT_TEXT_COLUMN]]
+    assert categories.tolist() == expected
+    assert list(categories.index) == list(df.index)
+    assert categories[10] == 'PREÇO/PLANOS'
+    assert categories[11] == 'AGENDAMENTO'
+    # Empate CANCELAMENTO x PREÇO (peso 2 cada): vence a ordem de CATEGORY_PATTERNS
+    assert categories[12] == 'PREÇO/PLANOS'
+    assert categories.loc[15:].tolist() == ['OUTROS'] * 4
+
+
+def test_visitas_vetorizado_igual_ao_escalar():
+    df = _frame()
+
+    visits = detect_visits_scheduled(df)
+
+    assert visits.tolist() == [detect_visit_scheduled(value) for value in TRANSCRIPTS]
+    assert visits[11]
+    assert count_visits_scheduled(df) == 1
+
+
+def test_calculate_conversation_categories():
+    df = _frame()
+
+    result = calculate_conversation_categories(df, min_threshold=15.0)
+
+    assert list(result.columns) == ['categoria', 'quantidade', 'percentual', 'cor']
+    assert result['quantidade'].sum() == len(TRANSCRIPTS)
+    assert result.iloc[0]['categoria'] == '📦 Outros'
+    assert result.iloc[0]['quantidade'] == 7
+    assert result.iloc[1]['categoria'] == '💰 Preços & Planos'
+    assert result['quantidade'].is_monotonic_decreasing
+
+
+def test_dataframe_vazio():
+    empty = pd.DataFrame({'message_compiled': []})
+
+    assert calculate_conversation_categories(empty).empty
+    assert categorize_conversations(empty).empty
+    assert count_visits_scheduled(empty) == 0
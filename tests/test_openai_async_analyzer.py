@@ -0,0 +1,160 @@
+"""
+Testes Unitários para o modo async do OpenAIAnalyzer
+=====================================================
+
+Testa:
+- Parsing de retry-after / x-ratelimit-reset-*
+- Ajuste AIMD do AdaptiveConcurrencyLimiter
+- analyze_dataframe em modo async com 429 (retry respeitando retry-after)
+
+Não acessa a API: o AsyncOpenAI é substituído por um cliente fake.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pandas as pd
+from openai import RateLimitError
+
+from src.multi_tenant.etl_v4.analyzers.adaptive_limiter import (
+    AdaptiveConcurrencyLimiter,
+    parse_duration,
+    parse_retry_after,
+)
+from src.multi_tenant.etl_v4.analyzers import openai_analyzer
+from src.multi_tenant.etl_v4.analyzers.openai_analyzer import OpenAIAnalyzer
+
+
+def test_parse_duration():
+    assert parse_duration('1m30s') == 90.0
+    assert parse_duration('20ms') == 0.02
+    assert parse_duration('2') == 2.0
+    assert parse_duration('') is None
+
+
+def test_parse_retry_after_prioridade():
+    assert parse_retry_after({'retry-after-ms': '1500', 'retry-after': '9'}) == 1.5
+    assert parse_retry_after({'retry-after': '3'}) == 3.0
+    assert parse_retry_after({'x-ratelimit-reset-requests': '1s', 'x-ratelimit-reset-tokens': '6s'}) == 6.0
+    assert parse_retry_after({}) is None
+
+
+def test_limiter_aimd():
+    """Sucesso sobe aos poucos; 429 corta pela metade (uma vez por janela)"""
+    limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=10)
+
+    for _ in range(4):
+        limiter.record_success({})
+    assert limiter.current_limit == 4  # 4 + 4 * 1/~4 ≈ 4.9
+
+    for _ in range(10):
+        limiter.record_success({})
+    assert limiter.current_limit == 6
+
+    delay = limiter.record_rate_limit({'retry-after': '0.2'})
+    assert delay == 0.2
+    assert limiter.current_limit == 3
+    assert limiter.paused_until > time.monotonic()
+
+    # Segundo 429 da mesma janela não reduz de novo
+    limiter.record_rate_limit({'retry-after': '0.2'})
+    assert limiter.current_limit == 3
+    assert limiter.stats['rate_limited'] == 2
+
+
+def test_limiter_reduz_com_cota_baixa():
+    """x-ratelimit-remaining-* abaixo da folga reduz antes do 429"""
+    limiter = AdaptiveConcurrencyLimiter(initial=8, max_limit=10)
+
+    limiter.record_success({
+        'x-ratelimit-limit-tokens': '100000',
+        'x-ratelimit-remaining-tokens': '5000',
+    })
+
+    assert limiter.current_limit == 4
+
+
+def test_limiter_respeita_limite_de_concorrencia():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, max_limit=2)
+    peak = {'value': 0}
+
+    async def worker():
+        await limiter.acquire()
+        try:
+            peak['value'] = max(peak['value'], limiter.in_flight)
+            await asyncio.sleep(0.01)
+        finally:
+            await limiter.release()
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert peak['value'] == 2
+
+
+class FakeRawResponse:
+    def __init__(self, content, headers):
+        self.headers = headers
+        self._content = content
+
+    def parse(self):
+        message = type('Message', (), {'content': self._content})
+        choice = type('Choice', (), {'message': message})
+        usage = type('Usage', (), {'total_tokens': 10})
+        return type('Response', (), {'choices': [choice], 'usage': usage})
+
+
+class FakeAsyncClient:
+    """Retorna 429 na primeira chamada, depois sucesso"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = self
+        self.completions = self
+        self.with_raw_response = self
+
+    async def create(self, **request):
+        self.calls.append(time.monotonic())
+        if len(self.calls) == 1:
+            response = httpx.Response(
+                429,
+                headers={'retry-after-ms': '200'},
+                request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+            )
+            raise RateLimitError('rate limited', response=response, body=None)
+
+        content = json.dumps({
+            'probabilidade_conversao': 4,
+            'visita_agendada': False,
+            'nome_mapeado_bot': 'Ana',
+            'analise_ia': 'Lead interessado',
+        })
+        return FakeRawResponse(content, {'x-ratelimit-remaining-requests': '900', 'x-ratelimit-limit-requests': '1000'})
+
+
+def test_analyze_dataframe_async_com_429(monkeypatch):
+    """429 é refeito após o retry-after e não vira falha"""
+    # Cliente síncrono não é usado no modo async
+    monkeypatch.setattr(openai_analyzer, 'OpenAI', lambda api_key: None)
+    analyzer = OpenAIAnalyzer(tenant_id=1, api_key='sk-test', async_mode=True, max_concurrency=1)
+    client = FakeAsyncClient()
+    analyzer.async_client = client
+
+    df = pd.DataFrame({
+        'message_compiled': ['Quero saber o valor do plano mensal', 'Tenho interesse em aula experimental'],
+        'contact_name': ['Ana', 'Bruno'],
+        'contact_messages_count': [3, 4],
+    })
+
+    result = analyzer.analyze_dataframe(df, skip_analyzed=False)
+
+    assert len(client.calls) == 3
+    assert client.calls[1] - client.calls[0] >= 0.2
+    assert analyzer.stats['successful_calls'] == 2
+    assert analyzer.stats['failed_calls'] == 0
+    assert list(result['analise_ia']) == ['Lead interessado', 'Lead interessado']
+    assert analyzer.get_usage_stats()['concurrency']['rate_limited'] == 1
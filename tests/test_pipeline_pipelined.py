@@ -0,0 +1,140 @@
+"""
+Testes Unitários para o modo pipelined do ETLPipeline
+======================================================
+
+Testa (sem banco, com transformer/loader fakes):
+- Todos os chunks passam por transform e load, na ordem
+- Backpressure: nunca mais que max_in_flight_chunks em memória
+- Erro em um estágio interrompe o pipeline e é relançado
+- run_for_all_tenants repassa max_in_flight_chunks a cada tenant
+"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from src.multi_tenant.etl_v4.pipeline import ETLPipeline
+
+
+class FakeTransformer:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.last_change_stats = {'unchanged': 0, 'analysis_skipped': 0}
+
+    def transform_chunk(self, df, existing_hashes=None):
+        if self.fail_on is not None and df['conversation_id'].iloc[0] == self.fail_on:
+            raise RuntimeError('falha no transform')
+        return df
+
+
+class FakeLoader:
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.loaded = []
+
+    def get_existing_hashes(self, tenant_id, conversation_ids):
+        return {}
+
+    def load_chunk(self, df):
+        time.sleep(0.01)  # loader mais lento que o extractor
+        self.loaded.append(int(df['conversation_id'].iloc[0]))
+        self.tracker.done()
+        return {'inserted': len(df), 'updated': 0, 'total': len(df)}
+
+
+class InFlightTracker:
+    """Conta chunks extraídos e ainda não carregados"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def started(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def done(self):
+        with self.lock:
+            self.current -= 1
+
+
+def _chunks(n, tracker):
+    for i in range(n):
+        tracker.started()
+        yield pd.DataFrame({'conversation_id': [i * 10 + 1, i * 10 + 2]})
+
+
+def _run(n_chunks, max_in_flight, transformer):
+    pipeline = ETLPipeline(local_engine=object(), remote_engine=object())
+    tracker = InFlightTracker()
+    loader = FakeLoader(tracker)
+    totals = {'chunks': 0, 'extracted': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    pipeline._run_chunks_pipelined(
+        _chunks(n_chunks, tracker),
+        transformer=transformer,
+        loader=loader,
+        tenant_id=1,
+        force_full=False,
+        use_openai=False,
+        openai_stats={'api_calls': 0, 'total_tokens': 0, 'cost_brl': 0.0},
+        totals=totals,
+        max_in_flight_chunks=max_in_flight
+    )
+    return totals, loader, tracker
+
+
+def test_pipelined_processa_todos_os_chunks_em_ordem():
+    totals, loader, _ = _run(6, 2, FakeTransformer())
+
+    assert loader.loaded == [1, 11, 21, 31, 41, 51]
+    assert totals['chunks'] == 6
+    assert totals['extracted'] == 12
+    assert totals['inserted'] == 12
+
+
+def test_pipelined_respeita_limite_de_chunks_em_voo():
+    _, _, tracker = _run(8, 2, FakeTransformer())
+
+    assert tracker.peak <= 2
+
+
+def test_pipelined_propaga_erro_de_estagio():
+    with pytest.raises(RuntimeError, match='falha no transform'):
+        _run(6, 2, FakeTransformer(fail_on=21))
+
+
+class FakeTenantEngine:
+    """local_engine com os tenants ativos de inbox_tenant_mapping"""
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        return [(1,), (2,)]
+
+
+def test_todos_os_tenants_repassa_limite_de_chunks_em_voo(monkeypatch):
+    pipeline = ETLPipeline(local_engine=FakeTenantEngine(), remote_engine=object())
+    calls = []
+
+    def fake_run_for_tenant(**kwargs):
+        calls.append(kwargs)
+        return {'success': True, 'records_extracted': 0, 'records_inserted': 0, 'records_updated': 0}
+
+    monkeypatch.setattr(pipeline, 'run_for_tenant', fake_run_for_tenant)
+
+    pipeline.run_for_all_tenants(pipelined=True, max_in_flight_chunks=5)
+
+    assert [call['tenant_id'] for call in calls] == [1, 2]
+    assert all(call['pipelined'] and call['max_in_flight_chunks'] == 5 for call in calls)
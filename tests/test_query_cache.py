@@ -0,0 +1,150 @@
+"""
+Testes Unitários para o SharedQueryCache
+========================================
+
+Testa:
+- hit/miss e compartilhamento da mesma cópia
+- Loader com erro não deixa o lock da chave em _load_locks
+- Nova versão (ETL) invalida apenas o tenant afetado
+- Remoção LRU por orçamento de memória
+- Decorator tenant_query_cache com engine fake (versão consultada com throttle)
+"""
+
+import pandas as pd
+import pytest
+
+from src.multi_tenant.utils import query_cache
+from src.multi_tenant.utils.query_cache import SharedQueryCache, estimate_size, tenant_query_cache
+
+
+def _frame(rows):
+    return pd.DataFrame({'conversation_id': range(rows), 'inbox_name': ['Centro'] * rows})
+
+
+def test_hit_miss_e_mesma_copia():
+    cache = SharedQueryCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return _frame(3)
+
+    first = cache.get_or_load('conversations', 1, 'v1', ('2026-01-01',), loader)
+    second = cache.get_or_load('conversations', 1, 'v1', ('2026-01-01',), loader)
+
+    assert second is first
+    assert len(loads) == 1
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_loader_com_erro_libera_lock_da_chave():
+    cache = SharedQueryCache()
+
+    def failing_loader():
+        raise RuntimeError('conexão perdida')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('conversations', 1, 'v1', ('2026-01-01',), failing_loader)
+
+    assert cache._load_locks == {}
+    # Próxima chamada carrega normalmente
+    assert len(cache.get_or_load('conversations', 1, 'v1', ('2026-01-01',), lambda: _frame(2))) == 2
+    assert cache._load_locks == {}
+
+
+def test_nova_versao_invalida_somente_o_tenant():
+    cache = SharedQueryCache()
+    cache.get_or_load('conversations', 1, 'v1', (), lambda: _frame(2))
+    cache.get_or_load('conversations', 2, 'v1', (), lambda: _frame(2))
+
+    reloaded = cache.get_or_load('conversations', 1, 'v2', (), lambda: _frame(5))
+
+    assert len(reloaded) == 5
+    assert cache.stats['invalidations'] == 1
+    assert cache.get_stats()['entries'] == 2
+
+    # Tenant 2 continua em cache
+    cache.get_or_load('conversations', 2, 'v1', (), lambda: _frame(9))
+    assert cache.stats['hits'] == 1
+
+
+def test_lru_por_orcamento_de_memoria():
+    size = estimate_size(_frame(100))
+    cache = SharedQueryCache(max_bytes=int(size * 2.5))
+
+    cache.get_or_load('q', 1, 'v1', ('a',), lambda: _frame(100))
+    cache.get_or_load('q', 1, 'v1', ('b',), lambda: _frame(100))
+    cache.get_or_load('q', 1, 'v1', ('a',), lambda: _frame(100))  # 'a' passa a ser a mais recente
+    cache.get_or_load('q', 1, 'v1', ('c',), lambda: _frame(100))
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+    assert cache.current_bytes <= cache.max_bytes
+
+    keys = [key[3] for key in cache._entries]
+    assert keys == [('a',), ('c',)]
+
+
+def test_resultado_maior_que_orcamento_nao_e_armazenado():
+    cache = SharedQueryCache(max_bytes=10)
+
+    cache.get_or_load('q', 1, 'v1', (), lambda: _frame(100))
+
+    assert cache.get_stats()['entries'] == 0
+    assert cache.stats['too_large'] == 1
+
+
+class FakeEngine:
+    """Responde à consulta de versão em etl_control"""
+
+    def __init__(self, version):
+        self.version = version
+        self.queries = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params):
+        self.queries += 1
+        return self
+
+    def fetchone(self):
+        return self.version
+
+
+def test_decorator_versiona_pelo_etl(monkeypatch):
+    monkeypatch.setattr(query_cache, '_global_query_cache', SharedQueryCache(version_check_seconds=0))
+    engine = FakeEngine(('2026-10-17 10:00', '2026-10-17 10:05'))
+    calls = []
+
+    @tenant_query_cache('conversations', lambda: engine)
+    def load(tenant_id, date_start=None):
+        calls.append((tenant_id, date_start))
+        return _frame(1)
+
+    load(1, '2026-01-01')
+    load(1, '2026-01-01')
+    assert calls == [(1, '2026-01-01')]
+
+    # ETL terminou: nova versão recarrega
+    engine.version = ('2026-10-17 11:00', '2026-10-17 11:05')
+    load(1, '2026-01-01')
+    assert len(calls) == 2
+
+
+def test_versao_consultada_com_throttle():
+    cache = SharedQueryCache(version_check_seconds=60)
+    engine = FakeEngine(('w1', 'f1'))
+
+    assert cache.get_data_version(engine, 1) == ('w1', 'f1')
+    engine.version = ('w2', 'f2')
+    assert cache.get_data_version(engine, 1) == ('w1', 'f1')
+    assert engine.queries == 1
@@ -0,0 +1,119 @@
+"""
+Testes Unitários para a verificação de planos (query_plans)
+===========================================================
+
+Testa (sem banco):
+- Seq Scans encontrados em qualquer nível do plano JSON
+- Aviso só para tabelas grandes e queries com problema
+- Falha de EXPLAIN não interrompe a verificação
+"""
+
+import json
+
+from src.multi_tenant.etl_v4 import query_plans
+from src.multi_tenant.etl_v4.query_plans import HOT_QUERIES, check_hot_query_plans, find_seq_scans
+
+
+def _plan(*nodes):
+    return [{'Plan': {'Node Type': 'Limit', 'Plans': [{'Node Type': 'Sort', 'Plans': list(nodes)}]}}]
+
+
+SEQ_SCAN = {'Node Type': 'Seq Scan', 'Relation Name': 'conversations_analytics'}
+INDEX_SCAN = {'Node Type': 'Index Scan', 'Relation Name': 'conversations_analytics',
+              'Index Name': 'idx_conversations_remarketing_pending'}
+
+
+def test_find_seq_scans_percorre_o_plano():
+    assert find_seq_scans(_plan(SEQ_SCAN)) == ['conversations_analytics']
+    assert find_seq_scans(_plan(INDEX_SCAN)) == []
+    # Tabelas fora da lista (ex: tenants) não contam
+    assert find_seq_scans(_plan({'Node Type': 'Seq Scan', 'Relation Name': 'tenants'})) == []
+    # psycopg2 pode devolver o JSON como texto
+    assert find_seq_scans(json.dumps(_plan(SEQ_SCAN))) == ['conversations_analytics']
+
+
+class FakeResult:
+    def __init__(self, rows=None, value=None):
+        self.rows = rows or []
+        self.value = value
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return self.value
+
+
+class FakeEngine:
+    """Responde pg_class, tenant padrão e EXPLAIN (plano por query)"""
+
+    def __init__(self, reltuples, plans):
+        self.reltuples = reltuples
+        self.plans = plans  # {nome: plano ou exceção}
+        self.explained = []
+        self.rollbacks = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if 'pg_class' in sql:
+            return FakeResult(rows=[('conversations_analytics', self.reltuples)])
+        if sql.startswith('EXPLAIN'):
+            name = next(name for name, query in HOT_QUERIES.items() if query in sql)
+            self.explained.append((name, params['tenant_id']))
+            plan = self.plans[name]
+            if isinstance(plan, Exception):
+                raise plan
+            return FakeResult(value=plan)
+        return FakeResult(value=7)
+
+
+def _engine(reltuples, seq_scan_query=None, failing_query=None):
+    plans = {name: _plan(SEQ_SCAN if name == seq_scan_query else INDEX_SCAN) for name in HOT_QUERIES}
+    if failing_query:
+        plans[failing_query] = RuntimeError('column does not exist')
+    return FakeEngine(reltuples, plans)
+
+
+def test_avisa_apenas_queries_com_seq_scan():
+    engine = _engine(500000, seq_scan_query='remarketing_pending_count')
+
+    problems = check_hot_query_plans(engine)
+
+    assert problems == {'remarketing_pending_count': ['conversations_analytics']}
+    assert len(engine.explained) == len(HOT_QUERIES)
+    assert {tenant_id for _, tenant_id in engine.explained} == {7}
+
+
+def test_tabela_pequena_nao_e_verificada():
+    engine = _engine(query_plans.SEQ_SCAN_MIN_ROWS - 1, seq_scan_query='remarketing_pending_count')
+
+    assert check_hot_query_plans(engine) == {}
+    assert engine.explained == []
+
+
+def test_falha_de_explain_nao_interrompe():
+    engine = _engine(500000, seq_scan_query='campaign_eligible_leads', failing_query='remarketing_inactive_leads')
+
+    problems = check_hot_query_plans(engine, tenant_id=3)
+
+    assert problems == {'campaign_eligible_leads': ['conversations_analytics']}
+    assert engine.rollbacks == 1
+
+
+def test_desabilitado_por_env(monkeypatch):
+    monkeypatch.setenv('QUERY_PLAN_CHECK_ENABLED', 'false')
+    engine = _engine(500000, seq_scan_query='remarketing_pending_count')
+
+    assert check_hot_query_plans(engine) == {}
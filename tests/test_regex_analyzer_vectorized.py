@@ -0,0 +1,70 @@
+"""
+Testes Unitários para a análise vetorizada do RegexAnalyzer
+===========================================================
+
+Testa:
+- analyze_dataframe (vetorizado) produz o mesmo resultado de
+  analyze_conversation aplicado linha a linha
+- Textos vazios/nulos e keywords negativas
+"""
+
+import random
+
+import pandas as pd
+
+from src.multi_tenant.etl_v4.analyzers.regex_analyzer import RegexAnalyzer
+
+
+FRAGMENTS = [
+    'Olá, boa tarde', 'Quero agendar uma aula experimental', 'amanhã às 18h',
+    'Quanto custa a matrícula?', 'tenho interesse no plano anual', 'valor do pacote',
+    'Matrícula realizada com sucesso!', 'Pagamento confirmado via Pix', 'pix enviado',
+    'Não quero mais, desisti', 'só queria saber', 'quero quero quero quero quero',
+    'horário horários unidade', 'crossfit e musculação', 'quero emagrecer rápido',
+    'te vejo segunda\\nàs 7:30', 'contrato\\n\\nassinado', 'check-in feito', 'obrigado',
+]
+
+
+def _expected(analyzer, row):
+    return analyzer.analyze_conversation(
+        message_text=row.get('message_compiled', None),
+        status=row.get('status', None),
+        has_human_intervention=row.get('has_human_intervention', False),
+    )
+
+
+def test_vetorizado_igual_ao_linha_a_linha():
+    """Mesmas flags, score e label da análise por linha"""
+    rng = random.Random(42)
+    rows = []
+    for i in range(300):
+        text = ' '.join(rng.sample(FRAGMENTS, rng.randint(1, 6))).replace('\\n', '\n')
+        rows.append({
+            'conversation_id': i,
+            'message_compiled': text,
+            'status': rng.choice(['open', 'resolved', 'pending', None]),
+            'has_human_intervention': rng.choice([True, False]),
+        })
+    rows.append({'conversation_id': 900, 'message_compiled': None, 'status': 'resolved', 'has_human_intervention': True})
+    rows.append({'conversation_id': 901, 'message_compiled': '', 'status': 'resolved', 'has_human_intervention': True})
+    df = pd.DataFrame(rows)
+
+    analyzer = RegexAnalyzer(tenant_id=1)
+    expected = [_expected(analyzer, row) for _, row in df.iterrows()]
+
+    result = analyzer.analyze_dataframe(df.copy())
+
+    for column in ['is_lead', 'visit_scheduled', 'crm_converted', 'ai_probability_label', 'ai_probability_score']:
+        assert list(result[column]) == [e[column] for e in expected], column
+
+
+def test_vetorizado_sem_colunas_opcionais():
+    """status e has_human_intervention são opcionais"""
+    df = pd.DataFrame({'message_compiled': ['Quero agendar amanhã', 'Não quero', None]})
+
+    result = RegexAnalyzer(tenant_id=1).analyze_dataframe(df)
+
+    assert list(result['is_lead']) == [True, False, False]
+    assert list(result['visit_scheduled']) == [True, False, False]
+    assert list(result['ai_probability_label']) == ['Baixo', 'N/A', 'N/A']
+    assert list(result['ai_probability_score']) == [25.0, 0.0, 0.0]
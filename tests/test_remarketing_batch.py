@@ -0,0 +1,405 @@
+"""
+Testes Unitários para o modo Batch API da análise de remarketing
+=================================================================
+
+Testa:
+- Geração do JSONL (custom_id, endpoint, leads sem resposta pulados)
+- Fluxo completo envio → polling → aplicação contra um endpoint de batch fake
+- Linhas com erro contam como falha e não são gravadas
+- Leads enviados ficam reservados (batch_id) até a aplicação do resultado;
+  batches terminados de execuções anteriores são aplicados antes do envio
+- Resultado de lead que mudou depois do envio é descartado (stale_count);
+  gravação escopada pelo tenant
+
+Não acessa banco nem OpenAI: consultas/gravações são substituídas por fakes.
+"""
+
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.multi_tenant.etl_v4 import remarketing_analyzer, remarketing_batch
+from src.multi_tenant.etl_v4.analyzers import openai_lead_remarketing_analyzer as analyzer_module
+from src.multi_tenant.etl_v4.analyzers.openai_lead_remarketing_analyzer import OpenAILeadRemarketingAnalyzer
+from src.multi_tenant.etl_v4.conversation_messages import reset_messages_table_cache
+from src.multi_tenant.etl_v4.remarketing_analyzer import lead_has_response
+
+
+MESSAGES_WITH_RESPONSE = [
+    {'sender': 'Contact', 'text': 'Oi, quanto custa o plano?'},
+    {'sender': 'AgentBot', 'text': 'Olá! O plano mensal custa R$ 99.'},
+]
+MESSAGES_WITHOUT_RESPONSE = [{'sender': 'Contact', 'text': 'Oi?'}]
+
+
+class FakeTemplateManager:
+    def generate_remarketing_message(self, tipo_remarketing, contact_name, **kwargs):
+        return f"{tipo_remarketing}: Olá {contact_name}"
+
+
+class FakeCostTracker:
+    def __init__(self):
+        self.recorded = []
+
+    def record_cost(self, tenant_id, cost_brl, tokens, requests):
+        self.recorded.append(cost_brl)
+
+
+class FakeBatchEndpoint:
+    """
+    Simula o Batch API (files + batches) em memória.
+
+    O batch fica 'in_progress' na primeira consulta e 'completed' na segunda;
+    a conversa 3 retorna erro 500.
+    """
+
+    def __init__(self):
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+        self.stored = {}
+        self.batch_requests = []
+        self.retrieves = 0
+
+    def _create_file(self, file, purpose):
+        file_id = f"file-{len(self.stored)}"
+        self.stored[file_id] = file.read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def _file_content(self, file_id):
+        return SimpleNamespace(text=self.stored[file_id])
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata):
+        self.batch_requests = [json.loads(line) for line in self.stored[input_file_id].splitlines()]
+        self.endpoint = endpoint
+        self.metadata = metadata
+        return SimpleNamespace(id='batch-1', status='validating')
+
+    def _retrieve(self, batch_id):
+        self.retrieves += 1
+        if self.retrieves == 1:
+            return SimpleNamespace(id=batch_id, status='in_progress', request_counts=None)
+
+        lines = []
+        for request in self.batch_requests:
+            conversation_id, _ = remarketing_batch.parse_custom_id(request['custom_id'])
+            if conversation_id == 3:
+                lines.append({'custom_id': request['custom_id'], 'response': {'status_code': 500, 'body': {}}, 'error': None})
+                continue
+
+            content = json.dumps({'score_prioridade': 4, 'analise_contextual': f'Lead {conversation_id}', 'nome_completo': 'Ana Souza'})
+            lines.append({
+                'custom_id': request['custom_id'],
+                'response': {
+                    'status_code': 200,
+                    'body': {
+                        'choices': [{'message': {'content': content}}],
+                        'usage': {'prompt_tokens': 400, 'completion_tokens': 200, 'total_tokens': 600},
+                    },
+                },
+                'error': None,
+            })
+
+        self.stored['file-out'] = '\n'.join(json.dumps(line) for line in lines)
+        return SimpleNamespace(
+            id=batch_id, status='completed', request_counts=None, created_at=1792195200,  # 2026-10-17 00:00 UTC
+            output_file_id='file-out', error_file_id=None
+        )
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(analyzer_module, 'OpenAI', lambda api_key: None)
+    tracker = FakeCostTracker()
+    monkeypatch.setattr(analyzer_module, 'get_cost_tracker', lambda: tracker)
+    instance = OpenAILeadRemarketingAnalyzer(tenant_id=7, api_key='sk-test', template_manager=FakeTemplateManager())
+    instance.cost_tracker_fake = tracker
+    return instance
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    leads = [
+        {'conversation_id': 1, 'display_id': 11, 'message_compiled': MESSAGES_WITH_RESPONSE,
+         'contact_name': 'Ana', 'account_name': 'Unidade Centro', 'contact_messages_count': 3, 'horas_inativo': 30.0},
+        {'conversation_id': 2, 'display_id': 12, 'message_compiled': MESSAGES_WITHOUT_RESPONSE,
+         'contact_name': 'Bruno', 'account_name': None, 'contact_messages_count': 3, 'horas_inativo': 100.0},
+        {'conversation_id': 3, 'display_id': 13, 'message_compiled': MESSAGES_WITH_RESPONSE,
+         'contact_name': None, 'account_name': None, 'contact_messages_count': 4, 'horas_inativo': 200.0},
+    ]
+    db = SimpleNamespace(saved={}, skipped=[], late_skipped=[], reserved={}, stale=set(), save_calls=[])
+
+    def skip_without_response(engine, tenant_id):
+        # Pré-filtro set-based: marca e tira os leads sem resposta da seleção
+        skipped = [lead['conversation_id'] for lead in leads if not lead_has_response(lead)]
+        leads[:] = [lead for lead in leads if lead_has_response(lead)]
+        db.skipped.extend(skipped)
+        return skipped
+
+    monkeypatch.setattr(remarketing_batch, 'skip_inactive_leads_without_response', skip_without_response)
+    monkeypatch.setattr(remarketing_batch, 'fetch_inactive_leads', lambda engine, tenant_id, limit: leads[:limit])
+    monkeypatch.setattr(
+        remarketing_batch, 'mark_skipped_no_response_many',
+        lambda engine, tenant_id, ids: db.late_skipped.extend(ids)
+    )
+    monkeypatch.setattr(
+        remarketing_batch, '_fetch_lead_context',
+        lambda engine, tenant_id, ids: {
+            lead['conversation_id']: lead for lead in leads if tenant_id == 7 and lead['conversation_id'] in ids
+        }
+    )
+    monkeypatch.setattr(
+        remarketing_batch, 'register_batch_leads',
+        lambda engine, tenant_id, batch_id, ids: db.reserved.update(dict.fromkeys(ids, batch_id))
+    )
+    monkeypatch.setattr(
+        remarketing_batch, 'release_batch_leads',
+        lambda engine, batch_id: [db.reserved.pop(cid) for cid, bid in list(db.reserved.items()) if bid == batch_id]
+    )
+    monkeypatch.setattr(
+        remarketing_batch, 'pending_batch_ids',
+        lambda engine, tenant_id: sorted(set(db.reserved.values()))
+    )
+
+    def save(local_engine, conversation_id, resultado, tenant_id, submitted_at=None):
+        db.save_calls.append((tenant_id, conversation_id, submitted_at))
+        if conversation_id in db.stale:
+            return False
+        db.saved[conversation_id] = resultado
+        return True
+
+    monkeypatch.setattr(remarketing_batch, 'save_analysis_to_db', save)
+    return db
+
+
+def test_custom_id_roundtrip():
+    assert remarketing_batch.parse_custom_id(remarketing_batch.build_custom_id(42, 73.456)) == (42, 73.46)
+
+
+def test_submit_gera_jsonl(analyzer, fake_db, tmp_path):
+    """Leads sem resposta são marcados antes da busca e ficam fora do arquivo"""
+    endpoint = FakeBatchEndpoint()
+
+    # limit=2: o lead pulado não consome o limite
+    result = remarketing_batch.submit_inactive_leads_batch(
+        None, 7, endpoint, analyzer, limit=2, work_dir=str(tmp_path)
+    )
+
+    assert result['batch_id'] == 'batch-1'
+    assert result['requests'] == 2
+    assert list(tmp_path.iterdir()) == []  # JSONL removido após o upload
+    assert fake_db.reserved == {1: 'batch-1', 3: 'batch-1'}
+    assert fake_db.skipped == [2]
+    assert fake_db.late_skipped == []
+    assert result['skipped_no_response'] == 1
+    assert endpoint.endpoint == '/v1/chat/completions'
+    assert endpoint.metadata['tenant_id'] == '7'
+
+    first = endpoint.batch_requests[0]
+    assert first['custom_id'] == 'lead-1-30.00'
+    assert first['method'] == 'POST'
+    assert first['body']['model'] == analyzer.model
+    assert 'timeout' not in first['body']
+
+
+def test_fluxo_completo_contra_endpoint_fake(analyzer, fake_db, tmp_path):
+    """Envio, polling e aplicação via save_analysis_to_db"""
+    endpoint = FakeBatchEndpoint()
+
+    stats = remarketing_batch.analyze_inactive_leads_batch(
+        None, 7, client=endpoint, analyzer=analyzer, poll_seconds=0, work_dir=str(tmp_path)
+    )
+
+    assert endpoint.retrieves == 2
+    assert stats['batch_status'] == 'completed'
+    assert stats['analyzed_count'] == 1
+    assert stats['failed_count'] == 1
+    assert stats['skipped_no_response'] == 1
+    assert list(fake_db.saved) == [1]
+    assert fake_db.reserved == {}
+
+    resultado = fake_db.saved[1]
+    assert resultado['tipo_conversa'] == 'REMARKETING_RECENTE'
+    assert resultado['score_prioridade'] == 4
+    assert resultado['sugestao_disparo'] == 'REMARKETING_RECENTE: Olá Ana'
+    assert resultado['metadados_analise_ia']['batch_id'] == 'batch-1'
+
+    # Custo do Batch API = metade do síncrono
+    full_cost = analyzer._calculate_cost(400, 200)
+    assert resultado['metadados_analise_ia']['custo_brl'] == pytest.approx(full_cost * 0.5)
+    assert stats['total_cost_brl'] == pytest.approx(full_cost * 0.5)
+
+
+def test_timeout_nao_aplica(analyzer, fake_db, tmp_path):
+    """Batch não terminado no timeout não grava nada (leads continuam pendentes)"""
+    endpoint = FakeBatchEndpoint()
+
+    stats = remarketing_batch.analyze_inactive_leads_batch(
+        None, 7, client=endpoint, analyzer=analyzer, poll_seconds=0, timeout_seconds=0, work_dir=str(tmp_path)
+    )
+
+    assert stats['batch_status'] == 'in_progress'
+    assert stats['analyzed_count'] == 0
+    assert fake_db.saved == {}
+    # Leads seguem reservados para o batch pendente
+    assert fake_db.reserved == {1: 'batch-1', 3: 'batch-1'}
+
+
+def test_batch_terminado_aplicado_na_execucao_seguinte(analyzer, fake_db, tmp_path, monkeypatch):
+    """Execução interrompida: a próxima aplica o batch pendente e libera os leads"""
+    endpoint = FakeBatchEndpoint()
+    remarketing_batch.analyze_inactive_leads_batch(
+        None, 7, client=endpoint, analyzer=analyzer, poll_seconds=0, timeout_seconds=0, work_dir=str(tmp_path)
+    )
+
+    # Nada novo a enviar: o batch anterior (agora completed) é aplicado
+    monkeypatch.setattr(remarketing_batch, 'fetch_inactive_leads', lambda engine, tenant_id, limit: [])
+    stats = remarketing_batch.analyze_inactive_leads_batch(
+        None, 7, client=endpoint, analyzer=analyzer, poll_seconds=0, work_dir=str(tmp_path)
+    )
+
+    assert stats['batch_id'] is None
+    assert stats['analyzed_count'] == 1
+    assert stats['failed_count'] == 1
+    assert list(fake_db.saved) == [1]
+    assert fake_db.reserved == {}
+
+
+class FakeSelectEngine:
+    """Tabelas de migration presentes; registra a query de leads"""
+
+    url = 'postgresql://etl@localhost/geniai_analytics'
+
+    def __init__(self):
+        self.queries = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        if 'to_regclass' in sql:
+            return SimpleNamespace(scalar=lambda: True)
+        self.queries.append(sql)
+        return []
+
+
+def test_busca_exclui_leads_em_batch_pendente():
+    remarketing_analyzer.reset_batch_leads_table_cache()
+    reset_messages_table_cache()
+    engine = FakeSelectEngine()
+
+    assert remarketing_analyzer.fetch_inactive_leads(engine, 7, 10) == []
+
+    sql = engine.queries[0]
+    assert 'NOT EXISTS (SELECT 1 FROM remarketing_batch_leads rbl' in sql
+    assert 'rbl.tenant_id = ca.tenant_id' in sql
+
+    remarketing_analyzer.reset_batch_leads_table_cache()
+    reset_messages_table_cache()
+
+
+def test_jsonl_removido_quando_upload_falha(analyzer, fake_db, tmp_path):
+    endpoint = FakeBatchEndpoint()
+
+    def fail_upload(file, purpose):
+        raise ConnectionError('upload interrompido')
+
+    endpoint.files.create = fail_upload
+
+    with pytest.raises(ConnectionError):
+        remarketing_batch.submit_inactive_leads_batch(None, 7, endpoint, analyzer, limit=10, work_dir=str(tmp_path))
+
+    assert list(tmp_path.iterdir()) == []
+    assert fake_db.reserved == {}
+
+
+def test_lead_sem_resposta_apos_pre_filtro(analyzer, fake_db, tmp_path, monkeypatch):
+    """Lead gravado depois do pré-filtro: marcado em lote, fora do arquivo"""
+    monkeypatch.setattr(remarketing_batch, 'skip_inactive_leads_without_response', lambda engine, tenant_id: [])
+    endpoint = FakeBatchEndpoint()
+
+    result = remarketing_batch.submit_inactive_leads_batch(None, 7, endpoint, analyzer, limit=10, work_dir=str(tmp_path))
+
+    assert fake_db.late_skipped == [2]
+    assert result['skipped_no_response'] == 1
+    assert [request['custom_id'] for request in endpoint.batch_requests] == ['lead-1-30.00', 'lead-3-200.00']
+
+
+def test_resultado_de_lead_alterado_apos_envio_e_descartado(analyzer, fake_db, tmp_path):
+    """Lead reaberto (ou já analisado) depois do envio: análise do batch não sobrescreve"""
+    fake_db.stale.add(1)
+    endpoint = FakeBatchEndpoint()
+
+    stats = remarketing_batch.analyze_inactive_leads_batch(
+        None, 7, client=endpoint, analyzer=analyzer, poll_seconds=0, work_dir=str(tmp_path)
+    )
+
+    assert stats['analyzed_count'] == 0
+    assert stats['stale_count'] == 1
+    assert stats['failed_count'] == 1
+    assert stats['total_cost_brl'] == 0
+    assert fake_db.saved == {}
+    assert fake_db.reserved == {}
+
+    submitted_at = datetime(2026, 10, 17, 0, 0, tzinfo=timezone.utc)
+    assert fake_db.save_calls == [(7, 1, submitted_at)]
+
+
+class FakeUpdateEngine:
+    """Registra o UPDATE de save_analysis_to_db; rowcount configurável"""
+
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        return SimpleNamespace(rowcount=self.rowcount)
+
+    def commit(self):
+        pass
+
+
+RESULTADO = {
+    'tipo_conversa': 'REMARKETING_RECENTE', 'analise_ia': 'ok', 'sugestao_disparo': 'Oi',
+    'score_prioridade': 3, 'dados_extraidos_ia': {'nome_completo': 'Ana'},
+    'metadados_analise_ia': {}, 'analisado_em': datetime(2026, 10, 17),
+}
+
+
+def test_save_analysis_escopo_e_guarda_de_lead_alterado():
+    engine = FakeUpdateEngine(rowcount=0)
+    submitted_at = datetime(2026, 10, 16, tzinfo=timezone.utc)
+
+    assert remarketing_analyzer.save_analysis_to_db(engine, 5, RESULTADO, 7, submitted_at=submitted_at) is False
+
+    sql, params = engine.statements[0]
+    assert 'tenant_id = :tenant_id' in sql
+    assert 'tipo_conversa IS NULL' in sql
+    assert 'mc_last_message_at <= :submitted_at' in sql
+    assert params['tenant_id'] == 7
+    assert params['submitted_at'] == submitted_at
+
+    # Modo síncrono: só o escopo do tenant
+    engine = FakeUpdateEngine(rowcount=1)
+    assert remarketing_analyzer.save_analysis_to_db(engine, 5, RESULTADO, 7) is True
+    sql, _ = engine.statements[0]
+    assert 'tenant_id = :tenant_id' in sql
+    assert 'tipo_conversa IS NULL' not in sql
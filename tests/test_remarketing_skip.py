@@ -0,0 +1,107 @@
+"""
+Testes Unitários para o pré-filtro de remarketing (SKIP_NO_RESPONSE)
+====================================================================
+
+Testa (sem banco e sem OpenAI):
+- Pré-filtro set-based antes da busca: o limit vai só para leads analisáveis
+- Leads sem resposta que escapam do pré-filtro são marcados em um único UPDATE
+- Rollup diário atualizado uma vez com todos os pulados
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.multi_tenant.etl_v4 import remarketing_analyzer
+from src.multi_tenant.etl_v4.conversation_messages import responder_exists_json_sql
+
+WITH_RESPONSE = [{'sender': 'Contact', 'text': 'oi'}, {'sender': 'AgentBot', 'text': 'olá'}]
+WITHOUT_RESPONSE = [{'sender': 'Contact', 'text': 'oi'}]
+
+
+def _lead(conversation_id, messages):
+    return {
+        'conversation_id': conversation_id, 'display_id': conversation_id, 'message_compiled': messages,
+        'contact_name': 'Ana', 'account_name': 'Centro', 'contact_messages_count': 1, 'horas_inativo': 30.0,
+    }
+
+
+class FakeAnalyzer:
+    def __init__(self, **kwargs):
+        self.analyzed = []
+
+    def get_remarketing_type(self, horas_inativo):
+        return 'REMARKETING_RECENTE'
+
+    def analyze_lead(self, conversation_id, **kwargs):
+        self.analyzed.append(conversation_id)
+        return {
+            'tipo_conversa': 'REMARKETING_RECENTE',
+            'score_prioridade': 3,
+            'metadados_analise_ia': {'tokens_total': 10, 'custo_brl': 0.001},
+        }
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = SimpleNamespace(
+        prefiltered=[7, 8], leads=[_lead(1, WITH_RESPONSE), _lead(2, WITHOUT_RESPONSE), _lead(3, WITH_RESPONSE)],
+        fetch_limits=[], bulk_marked=[], rollup=[], saved=[]
+    )
+
+    monkeypatch.setenv('ANALYZE_LEADS_ENABLED', 'true')
+    monkeypatch.setattr(remarketing_analyzer, 'validate_openai_api_key', lambda api_key: True)
+    monkeypatch.setattr(remarketing_analyzer, 'OpenAILeadRemarketingAnalyzer', FakeAnalyzer)
+    monkeypatch.setattr(
+        remarketing_analyzer, 'skip_inactive_leads_without_response',
+        lambda engine, tenant_id: list(db.prefiltered)
+    )
+
+    def fetch(engine, tenant_id, limit):
+        db.fetch_limits.append(limit)
+        return db.leads[:limit]
+
+    monkeypatch.setattr(remarketing_analyzer, 'fetch_inactive_leads', fetch)
+    monkeypatch.setattr(
+        remarketing_analyzer, 'mark_skipped_no_response_many',
+        lambda engine, tenant_id, ids: db.bulk_marked.append(list(ids))
+    )
+    monkeypatch.setattr(
+        remarketing_analyzer, 'safe_refresh_daily_rollup_for_conversations',
+        lambda engine, tenant_id, ids: db.rollup.append(list(ids))
+    )
+    monkeypatch.setattr(
+        remarketing_analyzer, 'save_analysis_to_db',
+        lambda local_engine, conversation_id, resultado, tenant_id: db.saved.append(conversation_id)
+    )
+    return db
+
+
+def test_pre_filtro_antes_da_busca(fake_db):
+    stats = remarketing_analyzer.analyze_inactive_leads(None, 1, openai_api_key='sk-test', limit=10)
+
+    assert fake_db.fetch_limits == [10]
+    assert fake_db.saved == [1, 3]
+    # Lead 2 escapou do pré-filtro: marcado em lote, não vai para a OpenAI
+    assert fake_db.bulk_marked == [[2]]
+    assert fake_db.rollup == [[7, 8, 2]]
+    assert stats['analyzed_count'] == 2
+    assert stats['skipped_no_response'] == 3
+
+
+def test_somente_pulados(fake_db):
+    fake_db.leads = []
+
+    stats = remarketing_analyzer.analyze_inactive_leads(None, 1, openai_api_key='sk-test', limit=10)
+
+    assert stats['analyzed_count'] == 0
+    assert stats['skipped_no_response'] == 2
+    assert fake_db.rollup == [[7, 8]]
+    assert fake_db.bulk_marked == []
+
+
+def test_predicado_json_sem_tabela_de_mensagens():
+    sql = responder_exists_json_sql('ca')
+
+    assert "jsonb_typeof(ca.message_compiled) = 'array'" in sql
+    assert "msg.item->>'sender' IN ('AgentBot', 'User', 'Agent')" in sql
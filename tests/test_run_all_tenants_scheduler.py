@@ -0,0 +1,100 @@
+"""
+Testes Unitários para o scheduler paralelo de tenants
+======================================================
+
+Testa:
+- Ordenação LPT (mais longos primeiro) a partir do histórico do etl_control
+- Timeout por tenant no worker
+- main confere os planos das queries frequentes antes do pool
+
+Não acessa banco: o pipeline do worker é substituído por um fake.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from src.multi_tenant.etl_v4 import run_all_tenants
+
+
+def _tenant(tenant_id):
+    return {'id': tenant_id, 'name': f'Tenant {tenant_id}', 'slug': f't{tenant_id}'}
+
+
+def test_order_tenants_mais_longos_primeiro():
+    """Sem histórico primeiro, depois maior duração, depois maior volume"""
+    now = datetime.now()
+    tenants = [_tenant(1), _tenant(2), _tenant(3), _tenant(4)]
+    priorities = {
+        1: {'last_duration': 30, 'last_extracted': 100, 'last_watermark': now},
+        2: {'last_duration': 300, 'last_extracted': 5000, 'last_watermark': now},
+        4: {'last_duration': 30, 'last_extracted': 900, 'last_watermark': now - timedelta(hours=1)},
+    }
+
+    ordered = run_all_tenants.order_tenants(tenants, priorities)
+
+    assert [t['id'] for t in ordered] == [3, 2, 4, 1]
+    assert ordered[0]['priority'] is None
+    assert ordered[1]['priority']['last_duration'] == 300
+
+
+def test_order_tenants_empate_usa_watermark_mais_antigo():
+    """Mesma duração e volume: mais tempo desde o último watermark vem primeiro"""
+    now = datetime.now()
+    tenants = [_tenant(1), _tenant(2)]
+    priorities = {
+        1: {'last_duration': 10, 'last_extracted': 10, 'last_watermark': now},
+        2: {'last_duration': 10, 'last_extracted': 10, 'last_watermark': now - timedelta(days=1)},
+    }
+
+    ordered = run_all_tenants.order_tenants(tenants, priorities)
+
+    assert [t['id'] for t in ordered] == [2, 1]
+
+
+class SlowPipeline:
+    """Pipeline fake que demora mais que o timeout"""
+
+    def run_for_tenant(self, tenant_id, triggered_by):
+        time.sleep(5)
+        return {'success': True, 'tenant_id': tenant_id}
+
+
+class FastPipeline:
+    def run_for_tenant(self, tenant_id, triggered_by):
+        return {'success': True, 'tenant_id': tenant_id, 'triggered_by': triggered_by}
+
+
+def test_run_etl_for_tenant_respeita_timeout(monkeypatch):
+    """Tenant que excede o timeout retorna falha sem travar o worker"""
+    monkeypatch.setattr(run_all_tenants, '_WORKER_PIPELINE', SlowPipeline())
+
+    start = time.monotonic()
+    stats = run_all_tenants.run_etl_for_tenant(7, timeout_seconds=1)
+
+    assert time.monotonic() - start < 4
+    assert stats['success'] is False
+    assert stats['tenant_id'] == 7
+    assert 'Timeout' in stats['error']
+
+
+def test_run_etl_for_tenant_reutiliza_pipeline_do_worker(monkeypatch):
+    """O worker usa o pipeline criado no initializer"""
+    monkeypatch.setattr(run_all_tenants, '_WORKER_PIPELINE', FastPipeline())
+
+    stats = run_all_tenants.run_etl_for_tenant(3, timeout_seconds=10)
+
+    assert stats == {'success': True, 'tenant_id': 3, 'triggered_by': 'scheduler'}
+
+
+def test_main_confere_planos_antes_do_pool(monkeypatch):
+    """Planos verificados uma vez na inicialização, antes dos workers"""
+    calls = []
+    monkeypatch.setattr(run_all_tenants, 'get_active_tenants', lambda: [_tenant(1)])
+    monkeypatch.setattr(run_all_tenants, 'check_query_plans', lambda: calls.append('plans'))
+    monkeypatch.setattr(
+        run_all_tenants, 'run_tenants_parallel',
+        lambda tenants, max_workers, timeout_seconds: calls.append('pool') or {1: {'success': True}}
+    )
+
+    assert run_all_tenants.main([]) == 0
+    assert calls == ['plans', 'pool']
@@ -0,0 +1,206 @@
+"""
+Testes Unitários para tenant_metrics
+====================================
+
+Testa (sem banco):
+- Diferença dos contadores: inseridas, status e is_lead alterados
+- UPDATE restrito (is_lead nulo) mantém o valor anterior
+- ConversationLoader aplica a diferença por tenant e ignora falhas
+- load_tenant_metrics / load_global_metrics contam os contatos direto
+  enquanto o tenant não foi reconciliado (refreshed_at ou sketch NULL)
+"""
+
+import pandas as pd
+
+from src.multi_tenant.etl_v4 import loader as loader_module
+from src.multi_tenant.etl_v4.loader import ConversationLoader
+from src.multi_tenant.etl_v4.tenant_metrics import (
+    chunk_contacts,
+    compute_metrics_delta,
+    load_global_metrics,
+    load_tenant_metrics,
+)
+from src.multi_tenant.utils.hyperloglog import HyperLogLog
+
+
+def _before():
+    return pd.DataFrame({
+        'conversation_id': [10, 11],
+        'status': [1, 0],
+        'is_lead': [True, False],
+    })
+
+
+def test_delta_de_inseridas_e_atualizadas():
+    after = pd.DataFrame({
+        'conversation_id': [10, 11, 12],
+        'status': [0, 1, 1],           # 10 deixou de ser visita, 11 e 12 passaram a ser
+        'is_lead': [False, True, True],
+        'contact_id': [1, 2, 3],
+    })
+
+    delta = compute_metrics_delta(_before(), after)
+
+    assert delta == {
+        'total_conversations': 1,
+        'total_visits': 1,
+        'total_lead_conversations': 1,
+    }
+
+
+def test_is_lead_nulo_mantem_valor_anterior():
+    after = pd.DataFrame({
+        'conversation_id': [10, 11],
+        'status': [1, 0],
+        'is_lead': [None, None],
+        'contact_id': [1, None],
+    })
+
+    assert compute_metrics_delta(_before(), after) == {
+        'total_conversations': 0,
+        'total_visits': 0,
+        'total_lead_conversations': 0,
+    }
+    assert chunk_contacts(_before(), after) == ([1], [1])
+
+
+def test_loader_aplica_diferenca_por_tenant(monkeypatch):
+    applied = []
+    monkeypatch.setattr(loader_module, 'snapshot_conversations', lambda engine, tenant_id, ids: _before())
+    monkeypatch.setattr(
+        loader_module, 'apply_metrics_delta',
+        lambda engine, tenant_id, delta, contacts, leads: applied.append((tenant_id, delta, contacts, leads))
+    )
+
+    loader = ConversationLoader(local_engine=None, maintain_rollup=False)
+    monkeypatch.setattr(loader, '_upsert', lambda df: (len(df), 0))
+
+    df = pd.DataFrame({
+        'tenant_id': [1, 1],
+        'conversation_id': [11, 12],
+        'status': [0, 0],
+        'is_lead': [True, False],
+        'contact_id': [2, 3],
+    })
+    loader.load_chunk(df)
+
+    assert applied == [(
+        1,
+        {'total_conversations': 1, 'total_visits': 0, 'total_lead_conversations': 1},
+        [2, 3],
+        [2],
+    )]
+
+
+def test_loader_ignora_falha_nas_metricas(monkeypatch):
+    def fail(engine, tenant_id, ids):
+        raise RuntimeError('relation "tenant_metrics" does not exist')
+
+    monkeypatch.setattr(loader_module, 'snapshot_conversations', fail)
+
+    loader = ConversationLoader(local_engine=None, maintain_rollup=False)
+    monkeypatch.setattr(loader, '_upsert', lambda df: (len(df), 0))
+
+    stats = loader.load_chunk(pd.DataFrame({'tenant_id': [1], 'conversation_id': [10]}))
+
+    assert stats['inserted'] == 1
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows[0][0]
+
+
+class FakeMetricsEngine:
+    """Responde às leituras de tenant_metrics, tenants e conversations_analytics"""
+
+    def __init__(self, metrics_rows, counted_rows=(), total_contacts=0):
+        self.metrics_rows = metrics_rows
+        self.counted_rows = list(counted_rows)
+        self.total_contacts = total_contacts
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        self.statements.append((sql, params or {}))
+        if 'FROM tenant_metrics' in sql:
+            return FakeResult(self.metrics_rows)
+        if 'FROM tenants' in sql:
+            return FakeResult([(2,)])
+        if 'GROUP BY tenant_id' in sql:
+            return FakeResult(self.counted_rows)
+        return FakeResult([(self.total_contacts,)])
+
+
+def _sketch(values):
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch.to_bytes()
+
+
+def _metrics_row(tenant_id, contacts_hll, lead_contacts_hll, refreshed_at):
+    return {
+        'tenant_id': tenant_id, 'total_conversations': 10, 'total_visits': 2,
+        'total_lead_conversations': 4, 'contacts_hll': contacts_hll,
+        'lead_contacts_hll': lead_contacts_hll, 'last_sync': None, 'refreshed_at': refreshed_at,
+    }
+
+
+def test_tenant_reconciliado_usa_sketches():
+    engine = FakeMetricsEngine([_metrics_row(1, _sketch([1, 2, 3]), _sketch([1]), '2026-10-17')])
+
+    metrics = load_tenant_metrics(engine)
+
+    assert metrics[1]['contact_count'] == 3
+    assert metrics[1]['lead_count'] == 1
+    assert metrics[1]['contacts_sketch'] is not None
+    assert not any('GROUP BY tenant_id' in sql for sql, _ in engine.statements)
+
+
+def test_tenant_sem_reconciliacao_conta_direto():
+    engine = FakeMetricsEngine(
+        [
+            _metrics_row(1, _sketch([1, 2, 3]), _sketch([1]), '2026-10-17'),
+            _metrics_row(2, None, None, None),                  # backfill da migration
+            _metrics_row(3, _sketch([7]), _sketch([7]), None),  # sketch parcial (ETL)
+        ],
+        counted_rows=[(2, 40, 12), (3, 5, 1)],
+        total_contacts=48,
+    )
+
+    metrics = load_tenant_metrics(engine)
+
+    assert (metrics[2]['contact_count'], metrics[2]['lead_count']) == (40, 12)
+    assert (metrics[3]['contact_count'], metrics[3]['lead_count']) == (5, 1)
+    assert metrics[2]['contacts_sketch'] is None
+    assert metrics[3]['contacts_sketch'] is None
+
+    counted = [params for sql, params in engine.statements if 'GROUP BY tenant_id' in sql]
+    assert counted == [{'tenant_ids': [2, 3]}]
+
+    totals = load_global_metrics(engine, metrics)
+    assert totals['total_leads'] == 48
+    assert totals['active_tenants'] == 2
+    assert totals['total_conversations'] == 30
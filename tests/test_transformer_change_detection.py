@@ -0,0 +1,118 @@
+"""
+Testes Unitários para detecção de mudança no ConversationTransformer
+=====================================================================
+
+Testa:
+- content_hash / analysis_input_hash determinísticos
+- Conversas inalteradas são removidas do chunk
+- Conversas com entrada de análise inalterada não são reanalisadas
+- Análise falha (hash NULL) ou de outro analyzer é refeita mesmo sem mudança de conteúdo
+"""
+
+import pandas as pd
+
+from src.multi_tenant.etl_v4.transformer import ConversationTransformer, ANALYSIS_UNCHANGED_FLAG
+
+
+def _chunk(messages, statuses=None, updated_at='2025-11-01 10:00:00'):
+    n = len(messages)
+    return pd.DataFrame({
+        'conversation_id': list(range(1, n + 1)),
+        'conversation_created_at': ['2025-11-01 09:00:00'] * n,
+        'conversation_updated_at': [updated_at] * n,
+        'status': statuses or [0] * n,
+        't_messages': [2] * n,
+        'message_compiled': messages,
+    })
+
+
+def _hashes(df):
+    return {
+        int(row.conversation_id): (row.content_hash, row.analysis_input_hash)
+        for row in df.itertuples()
+    }
+
+
+def test_hashes_sao_deterministicos():
+    """Mesmo conteúdo gera os mesmos hashes; updated_at não entra no content_hash"""
+    transformer = ConversationTransformer(tenant_id=1)
+
+    first = transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi']))
+    second = transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi'], updated_at='2025-11-02 08:00:00'))
+
+    assert list(first['content_hash']) == list(second['content_hash'])
+    assert list(first['analysis_input_hash']) == list(second['analysis_input_hash'])
+    assert first['content_hash'].str.len().eq(32).all()
+
+
+def test_conversas_inalteradas_sao_puladas():
+    """content_hash igual ao salvo remove a conversa do chunk"""
+    transformer = ConversationTransformer(tenant_id=1)
+    existing = _hashes(transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi'])))
+
+    df = transformer.transform_chunk(
+        _chunk(['quero agendar amanhã', 'oi, mudou'], updated_at='2025-11-02 08:00:00'),
+        existing_hashes=existing
+    )
+
+    assert list(df['conversation_id']) == [2]
+    assert transformer.last_change_stats == {'unchanged': 1, 'analysis_skipped': 0}
+
+
+def test_analise_pulada_quando_entrada_inalterada(monkeypatch):
+    """Mudança fora das colunas de entrada do analyzer não dispara reanálise"""
+    transformer = ConversationTransformer(tenant_id=1)
+    existing = _hashes(transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi'])))
+
+    analyzed_ids = []
+    original = transformer.lead_analyzer.analyze_dataframe
+
+    def spy(df):
+        analyzed_ids.extend(df['conversation_id'].tolist())
+        return original(df)
+
+    monkeypatch.setattr(transformer.lead_analyzer, 'analyze_dataframe', spy)
+
+    chunk = _chunk(['quero agendar amanhã', 'oi mudou'])
+    chunk['t_messages'] = [5, 5]  # muda conteúdo, mas não a entrada do RegexAnalyzer
+    df = transformer.transform_chunk(chunk, existing_hashes=existing)
+
+    assert list(df['conversation_id']) == [1, 2]
+    assert list(df[ANALYSIS_UNCHANGED_FLAG]) == [True, False]
+    assert analyzed_ids == [2]
+
+
+def test_analise_falha_e_refeita_sem_mudanca_de_conteudo(monkeypatch):
+    """content_hash igual, mas analysis_input_hash gravado NULL: conversa é reanalisada"""
+    transformer = ConversationTransformer(tenant_id=1)
+    existing = _hashes(transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi'])))
+    existing[1] = (existing[1][0], None)        # análise vazia/falha na execução anterior
+    existing[2] = (existing[2][0], 'regex-old')  # analisada por outro analyzer
+
+    analyzed_ids = []
+    original = transformer.lead_analyzer.analyze_dataframe
+
+    def spy(df):
+        analyzed_ids.extend(df['conversation_id'].tolist())
+        return original(df)
+
+    monkeypatch.setattr(transformer.lead_analyzer, 'analyze_dataframe', spy)
+
+    df = transformer.transform_chunk(_chunk(['quero agendar amanhã', 'oi']), existing_hashes=existing)
+
+    assert list(df['conversation_id']) == [1, 2]
+    assert list(df[ANALYSIS_UNCHANGED_FLAG]) == [False, False]
+    assert analyzed_ids == [1, 2]
+    assert transformer.last_change_stats == {'unchanged': 0, 'analysis_skipped': 0}
+
+
+def test_sem_analise_de_leads_descarta_pelo_content_hash():
+    """Com a análise desabilitada só o content_hash decide"""
+    transformer = ConversationTransformer(tenant_id=1, enable_lead_analysis=False)
+    first = transformer.transform_chunk(_chunk(['oi']))
+    existing = {1: (first['content_hash'].iloc[0], None)}
+
+    df = transformer.transform_chunk(_chunk(['oi']), existing_hashes=existing)
+
+    assert df.empty
+    assert transformer.last_change_stats == {'unchanged': 1, 'analysis_skipped': 0}